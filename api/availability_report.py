@@ -0,0 +1,57 @@
+# api/availability_report.py
+
+"""
+Relatório de capacidade da agenda: slots livres e utilização por vendedor
+por dia, para os próximos N dias (até 90). Usa os mesmos hosts do chat
+(CAL_COM_HOSTS ou CAL_COM_USERNAME) e a contagem vetorizada de
+services/availability_analytics.py.
+
+Uso (a partir da raiz do repositório):
+    python -m api.availability_report --days 60
+    python -m api.availability_report --days 90 --json > capacidade.json
+"""
+
+import argparse
+import asyncio
+import json
+
+try:
+    from api.services.availability_analytics import MAX_DAYS, build_availability_report
+except ImportError:
+    from services.availability_analytics import MAX_DAYS, build_availability_report
+
+
+def print_report(report) -> None:
+    print(f"Capacidade de {report['days']} dias a partir de {report['generated_at']} "
+          f"(slots de {report['slot_minutes']} min, {report['timezone']})")
+    for host in report["hosts"]:
+        totals = host["totals"]
+        utilization = f"{totals['utilization']:.0%}" if totals["utilization"] is not None else "-"
+        print(f"\n{host['username']}: {totals['free']} livres de {totals['capacity']} (utilização {utilization})")
+        print(f"  {'dia':<10} {'capac.':>7} {'livres':>7} {'ocupados':>9} {'util.':>6}")
+        for day in host["days"]:
+            if not day["capacity"]:
+                continue
+            print(f"  {day['date']:<10} {day['capacity']:>7} {day['free']:>7} {day['booked']:>9} "
+                  f"{day['utilization']:>6.0%}")
+    for error in report["errors"]:
+        print(f"\n{error['username']}: erro ao buscar disponibilidade: {error['error']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Slots livres e utilização por vendedor por dia")
+    parser.add_argument("--days", type=int, default=30, help=f"Janela em dias (1–{MAX_DAYS})")
+    parser.add_argument("--json", action="store_true", help="Imprime o relatório em JSON")
+    args = parser.parse_args()
+    try:
+        report = asyncio.run(build_availability_report(args.days))
+    except ValueError as e:
+        raise SystemExit(str(e))
+    if args.json:
+        print(json.dumps(report, ensure_ascii=False, indent=2))
+    else:
+        print_report(report)
+
+
+if __name__ == "__main__":
+    main()
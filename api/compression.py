@@ -0,0 +1,48 @@
+# api/compression.py
+
+"""
+Compressão das respostas da API (gzip ou brotli) acima de um tamanho mínimo.
+
+Baseado no GZipMiddleware do Starlette: respostas pequenas (abaixo de
+`minimum_size`) seguem sem compressão; `text/event-stream` nunca é comprimido.
+Brotli é usado quando o cliente aceita `br` e o pacote `brotli` está instalado.
+"""
+
+from starlette.datastructures import Headers
+from starlette.middleware.gzip import GZipMiddleware, IdentityResponder
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+try:
+    import brotli
+except ImportError:  # brotli é opcional: sem ele, só gzip
+    brotli = None
+
+
+def _accepts(headers: Headers, encoding: str) -> bool:
+    accepted = headers.get("Accept-Encoding", "")
+    return encoding in (token.split(";")[0].strip() for token in accepted.split(","))
+
+
+class BrotliResponder(IdentityResponder):
+    content_encoding = "br"
+
+    def __init__(self, app: ASGIApp, minimum_size: int, quality: int = 4) -> None:
+        super().__init__(app, minimum_size)
+        self.compressor = brotli.Compressor(quality=quality)
+
+    def apply_compression(self, body: bytes, *, more_body: bool) -> bytes:
+        data = self.compressor.process(body)
+        return data + (self.compressor.flush() if more_body else self.compressor.finish())
+
+
+class CompressionMiddleware(GZipMiddleware):
+    def __init__(self, app: ASGIApp, minimum_size: int = 1024, compresslevel: int = 6,
+                 brotli_quality: int = 4) -> None:
+        super().__init__(app, minimum_size=minimum_size, compresslevel=compresslevel)
+        self.brotli_quality = brotli_quality
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] == "http" and brotli is not None and _accepts(Headers(scope=scope), "br"):
+            await BrotliResponder(self.app, self.minimum_size, self.brotli_quality)(scope, receive, send)
+            return
+        await super().__call__(scope, receive, send)
@@ -0,0 +1,271 @@
+# api/config.py
+
+"""
+Configuração centralizada da aplicação.
+
+As variáveis de ambiente são lidas (e o `.env` carregado) uma única vez,
+na primeira chamada a `get_settings()`, e ficam em cache no processo.
+Nada aqui é executado no import, para não pesar no cold start.
+"""
+
+import os
+from contextvars import ContextVar, Token
+from functools import lru_cache
+from typing import Optional
+
+from pydantic import BaseModel
+
+
+def _env(name: str, default: Optional[str] = None) -> Optional[str]:
+    """Lê uma variável de ambiente tratando string vazia como ausente."""
+    value = os.getenv(name)
+    if value is None or value.strip() == "":
+        return default
+    return value
+
+
+def _build_redis_url() -> Optional[str]:
+    """Monta a URL do Redis (Upstash) a partir das variáveis disponíveis."""
+    redis_url = _env("UPSTASH_REDIS_URL")
+    if redis_url:
+        return redis_url
+    redis_host = _env("REDIS_HOST")
+    redis_port = _env("REDIS_PORT")
+    redis_password = _env("REDIS_PASSWORD")
+    if redis_host and redis_port:
+        return f"rediss://{':' + redis_password + '@' if redis_password else ''}{redis_host}:{redis_port}"
+    return None
+
+
+class Settings(BaseModel):
+    # --- OpenAI ---
+    openai_api_key: Optional[str] = None
+    openai_assistant_id: Optional[str] = None
+    # Versão das instruções do assistente (entra na chave do cache de respostas);
+    # se ausente, usa o hash de `assistant_spec.py`
+    openai_instructions_version: Optional[str] = None
+
+    # --- Orçamento de tokens por run (ver services/usage_service.py) ---
+    openai_max_prompt_tokens: Optional[int] = None
+    openai_max_completion_tokens: Optional[int] = None
+    openai_trim_threshold_tokens: int = 8000
+    openai_truncation_last_messages: int = 20
+    openai_summary_enabled: bool = False
+    openai_summary_model: str = "gpt-4o-mini"
+    openai_summary_every_runs: int = 10
+
+    # --- Motor do chat: "assistants" (threads/runs) ou "completions" ---
+    # (services/chat_completions_service.py; o modelo padrão é o de assistant_spec.py)
+    chat_engine: str = "assistants"
+    chat_completions_model: Optional[str] = None
+    # Modelo por estágio da conversa, ex: "greeting=gpt-4o-mini,collecting=gpt-4o-mini" (services/model_router.py)
+    model_routing_rules: Optional[str] = None
+
+    # --- Cache de respostas (turnos sem tool calls / sem contexto) ---
+    response_cache_enabled: bool = False
+    response_cache_ttl_seconds: int = 3600
+    response_cache_max_entries: int = 256
+
+    # --- Controle de admissão do /api/chat (services/admission.py) ---
+    chat_max_in_flight: int = 20
+    chat_max_queue: int = 50
+    chat_queue_timeout_seconds: float = 15.0
+    chat_rate_per_minute: float = 20.0  # por IP e por sessão
+    chat_rate_burst: float = 5.0
+    # Prazo total de um turno (limita todas as chamadas de saída) e checagem de desconexão
+    chat_request_deadline_seconds: float = 170.0
+    chat_disconnect_poll_seconds: float = 0.5
+
+    # --- Monitor de dependências (services/health_monitor.py) ---
+    health_probe_interval_seconds: float = 15.0  # 0 = sem task em background (sonda sob demanda)
+    health_probe_timeout_seconds: float = 3.0
+    # Dependências sem as quais o chat não funciona: fora do ar => não pronto (503 na admissão)
+    health_required_dependencies: str = "redis,openai"
+
+    # --- Monitor do event loop (services/loop_monitor.py) ---
+    loop_monitor_interval_seconds: float = 0.5  # 0 = sem amostragem do atraso do loop
+    # Modo debug: loga a pilha de quem segura o loop por mais que isso (0 = desligado)
+    loop_slow_callback_ms: float = 0.0
+
+    # --- Shutdown gracioso e retomada de runs (services/run_recovery.py) ---
+    shutdown_drain_seconds: float = 20.0  # prazo para os turnos em andamento terminarem
+    shutdown_handoff_seconds: float = 5.0  # depois dele, runs restantes viram checkpoint
+    run_recovery_poll_seconds: float = 5.0  # 0 = este worker não retoma runs de outros
+    run_recovery_max_attempts: int = 5  # retomadas que falham voltam à fila até esse limite
+
+    # --- Multi-tenant (services/tenants.py) ---
+    tenant_config_ttl_seconds: float = 60.0  # cache em memória da config de cada empresa/host
+    tenant_max_active: int = 20  # empresas com serviços e pools HTTP aquecidos neste worker (LRU)
+    tenant_max_in_flight: int = 0  # turnos simultâneos por empresa neste worker (0 = só o limite global)
+
+    # --- WebSocket do chat (/api/ws/{session_id}) ---
+    ws_heartbeat_seconds: float = 25.0
+    ws_idle_timeout_seconds: float = 900.0
+
+    # --- Profiling sob demanda (api/profiling.py) ---
+    profiling_dir: Optional[str] = None  # None = desligado
+    profiling_token: Optional[str] = None  # valor do header X-Profile-Token
+    profiling_sample_rate: float = 0.0  # fração das requisições perfiladas
+    profiling_max_files: int = 200
+
+    # --- Gravação de tráfego para replay (services/traffic_recorder.py) ---
+    traffic_record_path: Optional[str] = None
+
+    # --- Redis ---
+    redis_url: Optional[str] = None
+
+    # --- Pipefy ---
+    pipefy_api_key: Optional[str] = None
+    pipefy_pipe_id: Optional[str] = None
+    pipefy_name_field_id: str = "nome_do_lead"
+    pipefy_email_field_id: str = "e_mail"
+    pipefy_company_field_id: str = "empresa"
+    pipefy_need_field_id: str = "necessidade_espec_fica"
+    pipefy_interest_field_id: str = "checklist_vertical"
+    pipefy_meeting_link_field_id: str = "link_da_reuni_o"
+    pipefy_meeting_time_field_id: str = "data_e_hora_da_reuni_o"
+    pipefy_email_field_name: str = "E-mail"
+    # Espelho local do pipe no Redis (services/pipefy_mirror.py)
+    pipefy_mirror_enabled: bool = False
+    pipefy_mirror_reconcile_seconds: int = 0  # 0 = sem reconciliação periódica no processo
+    pipefy_mirror_reconcile_pages: int = 5
+    # Token enviado pelo Pipefy no header X-Pipefy-Webhook-Token (configurado no webhook)
+    pipefy_webhook_token: Optional[str] = None
+
+    # --- Rotas internas (sincronização/reconciliação manual, cron) ---
+    internal_api_token: Optional[str] = None
+
+    # --- Cal.com ---
+    cal_com_api_key: Optional[str] = None
+    cal_com_username: Optional[str] = None
+    cal_com_event_type_id: Optional[int] = None
+    cal_com_event_duration_minutes: int = 30
+    # Modo multi-host: "usuario1:event_type_id,usuario2:event_type_id,..."
+    cal_com_hosts: Optional[str] = None
+    cal_com_host_selection: str = "round_robin"  # round_robin | lowest_load | first
+    cal_com_max_concurrency: int = 5
+    # Secret dos webhooks de booking (assinatura HMAC em X-Cal-Signature-256)
+    cal_com_webhook_secret: Optional[str] = None
+    # Prefetch especulativo de horários ao confirmar interesse (services/slot_store.py)
+    slot_prefetch_enabled: bool = True
+    slot_prefetch_ttl_seconds: int = 300
+    # Holds de horários no Redis contra double-booking (services/slot_hold_service.py)
+    slot_holds_enabled: bool = True
+    slot_hold_ttl_seconds: int = 600
+    slot_hold_candidate_factor: int = 3
+    # Escolha de horário resolvida localmente, sem run do modelo (services/slot_matcher.py)
+    slot_fast_path_enabled: bool = True
+    # Dados do lead guardados por thread para o atalho acima (services/slot_store.py)
+    lead_contacts_ttl_seconds: int = 86400
+    lead_contacts_max_entries: int = 5000
+
+    def require_redis_url(self) -> str:
+        """Retorna a URL do Redis ou falha se ela não estiver configurada."""
+        if not self.redis_url:
+            raise ValueError("Variáveis de ambiente Redis não configuradas")
+        return self.redis_url
+
+
+@lru_cache(maxsize=1)
+def get_settings() -> Settings:
+    """Carrega o `.env`, valida e retorna as configurações (em cache)."""
+    # Import tardio: python-dotenv só é necessário quando a config é lida
+    from dotenv import load_dotenv
+    load_dotenv()
+
+    try:
+        return Settings(
+            openai_api_key=_env("OPENAI_API_KEY"),
+            openai_assistant_id=_env("OPENAI_ASSISTANT_ID"),
+            openai_instructions_version=_env("OPENAI_INSTRUCTIONS_VERSION"),
+            openai_max_prompt_tokens=_env("OPENAI_MAX_PROMPT_TOKENS"),
+            openai_max_completion_tokens=_env("OPENAI_MAX_COMPLETION_TOKENS"),
+            openai_trim_threshold_tokens=_env("OPENAI_TRIM_THRESHOLD_TOKENS", "8000"),
+            openai_truncation_last_messages=_env("OPENAI_TRUNCATION_LAST_MESSAGES", "20"),
+            openai_summary_enabled=_env("OPENAI_SUMMARY_ENABLED", "false"),
+            openai_summary_model=_env("OPENAI_SUMMARY_MODEL", "gpt-4o-mini"),
+            openai_summary_every_runs=_env("OPENAI_SUMMARY_EVERY_RUNS", "10"),
+            chat_engine=_env("CHAT_ENGINE", "assistants"),
+            chat_completions_model=_env("CHAT_COMPLETIONS_MODEL"),
+            model_routing_rules=_env("MODEL_ROUTING_RULES"),
+            response_cache_enabled=_env("RESPONSE_CACHE_ENABLED", "false"),
+            response_cache_ttl_seconds=_env("RESPONSE_CACHE_TTL_SECONDS", "3600"),
+            response_cache_max_entries=_env("RESPONSE_CACHE_MAX_ENTRIES", "256"),
+            chat_max_in_flight=_env("CHAT_MAX_IN_FLIGHT", "20"),
+            chat_max_queue=_env("CHAT_MAX_QUEUE", "50"),
+            chat_queue_timeout_seconds=_env("CHAT_QUEUE_TIMEOUT_SECONDS", "15"),
+            chat_rate_per_minute=_env("CHAT_RATE_PER_MINUTE", "20"),
+            chat_rate_burst=_env("CHAT_RATE_BURST", "5"),
+            chat_request_deadline_seconds=_env("CHAT_REQUEST_DEADLINE_SECONDS", "170"),
+            chat_disconnect_poll_seconds=_env("CHAT_DISCONNECT_POLL_SECONDS", "0.5"),
+            health_probe_interval_seconds=_env("HEALTH_PROBE_INTERVAL_SECONDS", "15"),
+            health_probe_timeout_seconds=_env("HEALTH_PROBE_TIMEOUT_SECONDS", "3"),
+            health_required_dependencies=_env("HEALTH_REQUIRED_DEPENDENCIES", "redis,openai"),
+            loop_monitor_interval_seconds=_env("LOOP_MONITOR_INTERVAL_SECONDS", "0.5"),
+            loop_slow_callback_ms=_env("LOOP_SLOW_CALLBACK_MS", "0"),
+            shutdown_drain_seconds=_env("SHUTDOWN_DRAIN_SECONDS", "20"),
+            shutdown_handoff_seconds=_env("SHUTDOWN_HANDOFF_SECONDS", "5"),
+            run_recovery_poll_seconds=_env("RUN_RECOVERY_POLL_SECONDS", "5"),
+            run_recovery_max_attempts=_env("RUN_RECOVERY_MAX_ATTEMPTS", "5"),
+            tenant_config_ttl_seconds=_env("TENANT_CONFIG_TTL_SECONDS", "60"),
+            tenant_max_active=_env("TENANT_MAX_ACTIVE", "20"),
+            tenant_max_in_flight=_env("TENANT_MAX_IN_FLIGHT", "0"),
+            ws_heartbeat_seconds=_env("WS_HEARTBEAT_SECONDS", "25"),
+            ws_idle_timeout_seconds=_env("WS_IDLE_TIMEOUT_SECONDS", "900"),
+            profiling_dir=_env("PROFILING_DIR"),
+            profiling_token=_env("PROFILING_TOKEN"),
+            profiling_sample_rate=_env("PROFILING_SAMPLE_RATE", "0"),
+            profiling_max_files=_env("PROFILING_MAX_FILES", "200"),
+            traffic_record_path=_env("TRAFFIC_RECORD_PATH"),
+            redis_url=_build_redis_url(),
+            pipefy_api_key=_env("PIPEFY_API_KEY"),
+            pipefy_pipe_id=_env("PIPEFY_PIPE_ID"),
+            pipefy_name_field_id=_env("PIPEFY_NAME_FIELD_ID", "nome_do_lead"),
+            pipefy_email_field_id=_env("PIPEFY_EMAIL_FIELD_ID", "e_mail"),
+            pipefy_company_field_id=_env("PIPEFY_COMPANY_FIELD_ID", "empresa"),
+            pipefy_need_field_id=_env("PIPEFY_NEED_FIELD_ID", "necessidade_espec_fica"),
+            pipefy_interest_field_id=_env("PIPEFY_INTEREST_FIELD_ID", "checklist_vertical"),
+            pipefy_meeting_link_field_id=_env("PIPEFY_MEETING_LINK_FIELD_ID", "link_da_reuni_o"),
+            pipefy_meeting_time_field_id=_env("PIPEFY_MEETING_TIME_FIELD_ID", "data_e_hora_da_reuni_o"),
+            pipefy_email_field_name=_env("PIPEFY_EMAIL_FIELD_NAME", "E-mail"),
+            pipefy_mirror_enabled=_env("PIPEFY_MIRROR_ENABLED", "false"),
+            pipefy_mirror_reconcile_seconds=_env("PIPEFY_MIRROR_RECONCILE_SECONDS", "0"),
+            pipefy_mirror_reconcile_pages=_env("PIPEFY_MIRROR_RECONCILE_PAGES", "5"),
+            pipefy_webhook_token=_env("PIPEFY_WEBHOOK_TOKEN"),
+            internal_api_token=_env("INTERNAL_API_TOKEN"),
+            cal_com_api_key=_env("CAL_COM_API_KEY"),
+            cal_com_username=_env("CAL_COM_USERNAME"),
+            cal_com_event_type_id=_env("CAL_COM_EVENT_TYPE_ID"),
+            cal_com_event_duration_minutes=_env("CAL_COM_EVENT_DURATION_MINUTES", "30"),
+            cal_com_hosts=_env("CAL_COM_HOSTS"),
+            cal_com_host_selection=_env("CAL_COM_HOST_SELECTION", "round_robin"),
+            cal_com_max_concurrency=_env("CAL_COM_MAX_CONCURRENCY", "5"),
+            cal_com_webhook_secret=_env("CAL_COM_WEBHOOK_SECRET"),
+            slot_prefetch_enabled=_env("SLOT_PREFETCH_ENABLED", "true"),
+            slot_prefetch_ttl_seconds=_env("SLOT_PREFETCH_TTL_SECONDS", "300"),
+            slot_holds_enabled=_env("SLOT_HOLDS_ENABLED", "true"),
+            slot_hold_ttl_seconds=_env("SLOT_HOLD_TTL_SECONDS", "600"),
+            slot_hold_candidate_factor=_env("SLOT_HOLD_CANDIDATE_FACTOR", "3"),
+            slot_fast_path_enabled=_env("SLOT_FAST_PATH_ENABLED", "true"),
+            lead_contacts_ttl_seconds=_env("LEAD_CONTACTS_TTL_SECONDS", "86400"),
+            lead_contacts_max_entries=_env("LEAD_CONTACTS_MAX_ENTRIES", "5000"),
+        )
+    except ValueError as e:
+        raise ValueError(f"Configuração inválida no ambiente/.env: {e}") from e
+
+
+# Configuração efetiva da empresa (tenant) da requisição em curso (services/tenants.py)
+_tenant_settings: ContextVar[Optional[Settings]] = ContextVar("tenant_settings", default=None)
+
+
+def current_settings() -> Settings:
+    """Configuração da empresa da requisição em curso ou, fora dela, a do ambiente."""
+    return _tenant_settings.get() or get_settings()
+
+
+def use_settings(settings: Optional[Settings]) -> Token:
+    return _tenant_settings.set(settings)
+
+
+def reset_settings(token: Token) -> None:
+    _tenant_settings.reset(token)
@@ -0,0 +1,217 @@
+# api/import_leads.py
+
+"""
+Importação em lote de leads (CSV ou JSONL) para o Pipefy.
+
+O arquivo é lido de forma preguiçosa (linha a linha), os leads são
+deduplicados por e-mail em memória e processados em lotes: para cada lote,
+os cards existentes são resolvidos em UMA consulta (`find_cards_by_emails`)
+e o upsert é feito em UMA mutation (`upsert_leads_batch`), sob um rate limit
+compatível com a API do Pipefy. Ao fim de cada lote o progresso é gravado
+em um checkpoint, permitindo retomar a importação de onde parou.
+
+Colunas/chaves aceitas: name|nome, email|e_mail, company|empresa,
+need|necessidade, interest_confirmed|interesse_confirmado, meeting_link,
+meeting_datetime.
+
+Uso (a partir da raiz do repositório):
+    python -m api.import_leads leads.csv
+    python -m api.import_leads leads.jsonl --batch-size 50 --rate 8
+    python -m api.import_leads leads.jsonl --checkpoint leads.ckpt.json   # retoma se existir
+"""
+
+import argparse
+import asyncio
+import csv
+import json
+import os
+import time
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from pydantic import ValidationError
+
+try:
+    from api.models import Lead
+    from api.services.pipefy_service import PipefyService
+    from api.services.rate_limiter import TokenBucket
+except ImportError:
+    from models import Lead
+    from services.pipefy_service import PipefyService
+    from services.rate_limiter import TokenBucket
+
+# Nome da coluna no arquivo -> campo do modelo Lead
+FIELD_ALIASES = {
+    "name": "name", "nome": "name",
+    "email": "email", "e_mail": "email", "e-mail": "email",
+    "company": "company", "empresa": "company",
+    "need": "need", "necessidade": "need",
+    "interest_confirmed": "interest_confirmed", "interesse_confirmado": "interest_confirmed",
+    "meeting_link": "meeting_link",
+    "meeting_datetime": "meeting_datetime",
+}
+
+TRUE_VALUES = {"1", "true", "sim", "yes", "confirmado", "x"}
+
+
+class MalformedRecord(ValueError):
+    """Linha do JSONL que não é um objeto JSON válido (conta como registro inválido)."""
+
+
+def iter_records(path: Path) -> Iterator[Dict[str, Any]]:
+    """
+    Lê o arquivo de forma preguiçosa: um dict por linha (CSV com cabeçalho ou JSONL).
+    Uma linha JSONL malformada vira um `MalformedRecord`, rejeitado como os
+    registros inválidos, sem abortar a importação.
+    """
+    with open(path, newline="", encoding="utf-8") as f:
+        if path.suffix.lower() == ".csv":
+            yield from csv.DictReader(f)
+        else:
+            for line_number, line in enumerate(f, start=1):
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError as e:
+                    yield MalformedRecord(f"linha {line_number}: JSON malformado ({e.msg}, coluna {e.colno})")
+                    continue
+                if not isinstance(record, dict):
+                    yield MalformedRecord(f"linha {line_number}: esperado um objeto JSON, veio {type(record).__name__}")
+                    continue
+                yield record
+
+
+def record_to_lead(record: Dict[str, Any]) -> Lead:
+    if isinstance(record, MalformedRecord):
+        raise record
+    data = {}
+    for key, value in record.items():
+        field = FIELD_ALIASES.get(str(key).strip().lower())
+        if field is None or value in (None, ""):
+            continue
+        if field == "interest_confirmed" and isinstance(value, str):
+            value = value.strip().lower() in TRUE_VALUES
+        data[field] = value.strip() if isinstance(value, str) else value
+    if "email" in data:
+        data["email"] = data["email"].lower()
+    return Lead(**data)
+
+
+def _load_checkpoint(path: Optional[Path], source: Path) -> Dict[str, Any]:
+    if not path or not path.exists():
+        return {}
+    checkpoint = json.loads(path.read_text())
+    if checkpoint.get("source") != str(source):
+        raise ValueError(f"Checkpoint {path} pertence a outro arquivo ({checkpoint.get('source')})")
+    return checkpoint
+
+
+def _save_checkpoint(path: Optional[Path], source: Path, records_done: int, stats: Dict[str, Any]) -> None:
+    if not path:
+        return
+    tmp = path.with_suffix(path.suffix + ".tmp")
+    tmp.write_text(json.dumps({"source": str(source), "records_done": records_done, "stats": stats}, indent=2))
+    os.replace(tmp, path)  # Escrita atômica: um checkpoint nunca fica pela metade
+
+
+def iter_batches(records: Iterator[Dict[str, Any]], batch_size: int, skip: int, stats: Dict[str, Any],
+                 seen: set) -> Iterator[Tuple[int, List[Lead]]]:
+    """
+    Agrupa os registros em lotes de leads únicos por e-mail. Registros já
+    processados (antes do checkpoint) só alimentam o conjunto `seen`.
+    Gera (registros_consumidos, lote).
+    """
+    batch: Dict[str, Lead] = {}
+    consumed = 0
+    for consumed, record in enumerate(records, start=1):
+        try:
+            lead = record_to_lead(record)
+        except (ValidationError, TypeError, ValueError) as e:
+            if consumed > skip:
+                stats["invalid"] += 1
+                print(f"Registro {consumed} inválido, ignorado: {str(e).splitlines()[0]}")
+            continue
+        if consumed <= skip:
+            seen.add(lead.email)
+            continue
+        if lead.email in seen:
+            stats["duplicates"] += 1
+            continue
+        seen.add(lead.email)
+        batch[lead.email] = lead
+        if len(batch) >= batch_size:
+            yield consumed, list(batch.values())
+            batch = {}
+    if batch or consumed > skip:
+        yield consumed, list(batch.values())
+
+
+async def import_leads(source: Path, batch_size: int = 50, rate_per_second: float = 8.0,
+                       checkpoint_path: Optional[Path] = None,
+                       pipefy_service: Optional[PipefyService] = None) -> Dict[str, Any]:
+    """Executa a importação e retorna as estatísticas finais."""
+    checkpoint = _load_checkpoint(checkpoint_path, source)
+    skip = checkpoint.get("records_done", 0)
+    stats = {"created": 0, "updated": 0, "failed": 0, "invalid": 0, "duplicates": 0, "requests": 0}
+    stats.update(checkpoint.get("stats", {}))
+    if skip:
+        print(f"Retomando {source} a partir do registro {skip + 1}")
+
+    limiter = TokenBucket(rate=rate_per_second)
+    service = pipefy_service or PipefyService()
+    seen: set = set()
+    started_at = time.perf_counter()
+    imported_now = 0
+    try:
+        for records_done, leads in iter_batches(iter_records(source), batch_size, skip, stats, seen):
+            if leads:
+                await limiter.acquire()
+                found = await service.find_cards_by_emails(lead.email for lead in leads)
+                stats["requests"] += 1
+                if found.get("errors"):
+                    raise RuntimeError(f"Falha ao resolver cards existentes: {found['errors']}")
+
+                await limiter.acquire()
+                result = await service.upsert_leads_batch(leads, found["cards"])
+                stats["requests"] += 1
+                stats["created"] += len(result["created"])
+                stats["updated"] += len(result["updated"])
+                stats["failed"] += len(result["failed"])
+                for email, error in result["failed"].items():
+                    print(f"Falha ao importar {email}: {error}")
+                imported_now += len(leads)
+
+            _save_checkpoint(checkpoint_path, source, records_done, stats)
+            elapsed = time.perf_counter() - started_at
+            rate = imported_now / elapsed if elapsed > 0 else 0.0
+            print(f"[{records_done} registros] criados={stats['created']} atualizados={stats['updated']} "
+                  f"falhas={stats['failed']} duplicados={stats['duplicates']} ({rate:.1f} leads/s)")
+    finally:
+        if pipefy_service is None:
+            await service.close()
+
+    elapsed = time.perf_counter() - started_at
+    stats["elapsed_seconds"] = round(elapsed, 3)
+    stats["leads_per_second"] = round(imported_now / elapsed, 2) if elapsed > 0 else 0.0
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Importa leads (CSV/JSONL) para o Pipefy em lote")
+    parser.add_argument("source", type=Path, help="Arquivo .csv (com cabeçalho) ou .jsonl")
+    parser.add_argument("--batch-size", type=int, default=50, help="Leads por mutation GraphQL (padrão: 50)")
+    parser.add_argument("--rate", type=float, default=8.0, help="Requisições por segundo ao Pipefy (padrão: 8)")
+    parser.add_argument("--checkpoint", type=Path, default=None,
+                        help="Arquivo de checkpoint (padrão: <source>.checkpoint.json)")
+    parser.add_argument("--no-checkpoint", action="store_true", help="Não grava/retoma checkpoint")
+    args = parser.parse_args()
+
+    checkpoint = None if args.no_checkpoint else (args.checkpoint or args.source.with_name(args.source.name + ".checkpoint.json"))
+    stats = asyncio.run(import_leads(args.source, args.batch_size, args.rate, checkpoint))
+    print(f"Importação concluída: {json.dumps(stats, ensure_ascii=False)}")
+
+
+if __name__ == "__main__":
+    main()
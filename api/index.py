@@ -1,54 +1,130 @@
 # api/index.py
 
-from fastapi import FastAPI, HTTPException, Depends # <-- Adiciona Depends
+from fastapi import FastAPI, HTTPException, Depends, Header, Request, BackgroundTasks, WebSocket, WebSocketDisconnect # <-- Adiciona Depends
 from fastapi.middleware.cors import CORSMiddleware # Mantido para Docker local
-from typing import Dict, Annotated # <-- Adiciona Annotated
-from dotenv import load_dotenv
-import uuid
+from fastapi.responses import FileResponse, ORJSONResponse, Response
+from starlette.requests import HTTPConnection
+from typing import TYPE_CHECKING, Any, Dict, Annotated, Optional # <-- Adiciona Annotated
+from contextlib import asynccontextmanager
+from functools import lru_cache
+import hashlib
+import hmac
+import json
+import orjson
+import time
 import logging
-import os
 import redis.asyncio as redis
 import asyncio # <-- Adiciona asyncio para o health check
 
-load_dotenv()
-
 # Usa importações absolutas relativas a 'api/'
+# (o `.env` é carregado sob demanda por `get_settings()`, não no import)
+# Os módulos de `services` (turnos, monitores, multi-tenant, gravação de tráfego) são acessados
+# como `services.<módulo>` e só carregam no primeiro uso (PEP 562 em services/__init__.py)
 try:
+    from api.compression import CompressionMiddleware
+    from api.config import get_settings
     from api.models import ChatRequest, ChatResponse
-    from api.services import OpenAIService
+    from api import services
+    from api.services.redis_service import get_redis
+    from api.services.admission import AdmissionController, AdmissionRejected
+    from api.services.request_context import set_deadline, reset_deadline
 except ImportError:
     # Fallback para dev local (rodando de dentro da pasta backend/)
+    from compression import CompressionMiddleware
+    from config import get_settings
     from models import ChatRequest, ChatResponse
-    from services import OpenAIService
+    import services
+    from services.redis_service import get_redis
+    from services.admission import AdmissionController, AdmissionRejected
+    from services.request_context import set_deadline, reset_deadline
+
+if TYPE_CHECKING:
+    from api.services.openai_service import OpenAIService
+    from api.services.tenants import TenantRuntime
+
+
+def _profiling():
+    # Import tardio: profiling só é usado pelo middleware e pelas rotas internas
+    try:
+        from api import profiling
+    except ImportError:
+        import profiling
+    return profiling
 
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-app = FastAPI()
+
+async def _pipefy_mirror_reconcile_loop(interval: int, pages: int):
+    """Reconciliação periódica do espelho do Pipefy (processos de longa duração, ex: Docker)."""
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            service = get_pipefy_service()
+            await service.mirror.reconcile_step(service, max_pages=pages)
+        except Exception as e:
+            logger.warning(f"Pipefy mirror reconcile failed: {e}")
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    tasks = []
+    try:
+        settings = get_settings()
+    except ValueError as e:
+        # Config inválida continua falhando nas rotas que a usam, não no startup
+        logger.error(str(e))
+        settings = None
+    if settings and settings.pipefy_mirror_enabled and settings.pipefy_mirror_reconcile_seconds > 0:
+        tasks.append(asyncio.create_task(_pipefy_mirror_reconcile_loop(
+            settings.pipefy_mirror_reconcile_seconds, settings.pipefy_mirror_reconcile_pages
+        )))
+    if settings and settings.health_probe_interval_seconds > 0:
+        # Sondagem periódica das dependências: /api/health responde do snapshot em memória
+        tasks.append(asyncio.create_task(services.health_monitor.get_health_monitor().run()))
+    if settings and settings.loop_monitor_interval_seconds > 0:
+        # Atraso do event loop (histograma em /api/metrics; pilhas de bloqueio no modo debug)
+        tasks.append(asyncio.create_task(services.loop_monitor.get_loop_monitor().run()))
+    recovery = services.run_recovery.get_run_recovery() if settings else None
+    restore_signals = None
+    if recovery:
+        # No SIGTERM do redeploy a drenagem começa junto com o shutdown do uvicorn (antes desta fase)
+        restore_signals = services.run_recovery.install_signal_handlers(lambda: recovery.begin_drain(_chats_in_flight))
+        if settings.run_recovery_poll_seconds > 0:
+            # Retoma runs deixados por workers que encerraram (checkpoints no Redis)
+            # (cada run é retomado com o serviço da empresa dele)
+            tasks.append(asyncio.create_task(recovery.run(current_openai_service)))
+    yield
+    if recovery:
+        summary = await recovery.begin_drain(_chats_in_flight)
+        logger.info(f"Shutdown drain finished: {summary}")
+        restore_signals()
+    for task in tasks:
+        task.cancel()
+    if settings:
+        await services.health_monitor.get_health_monitor().aclose()
+        await services.tenants.get_tenant_registry().aclose()
+
+
+app = FastAPI(lifespan=lifespan)
 
 # --- Configuração do Cliente Redis ---
-# Mantém a URL global para fácil acesso
-redis_url = os.getenv("UPSTASH_REDIS_URL")
-if not redis_url:
-    redis_host = os.getenv("REDIS_HOST")
-    redis_port = os.getenv("REDIS_PORT")
-    redis_password = os.getenv("REDIS_PASSWORD")
-    if redis_host and redis_port:
-        redis_url = f"rediss://{':' + redis_password + '@' if redis_password else ''}{redis_host}:{redis_port}"
-    else:
-        raise ValueError("Variáveis de ambiente Redis não configuradas")
+# O cliente (e seu pool de conexões) é criado no primeiro uso por `get_redis()`
+# e reaproveitado pelas requisições seguintes. A URL vem de `get_settings()`,
+# que falha aqui (e não no import do módulo) se o Redis não estiver configurado.
 
 # --- NOVA FUNÇÃO DEPENDÊNCIA para obter o cliente Redis ---
 async def get_redis_client():
     try:
-        # Cria um novo cliente (ou obtém de um pool gerenciado pela biblioteca)
-        # para cada requisição que precisar dele.
         # A biblioteca redis.asyncio gerencia o pool de conexões por baixo dos panos.
-        client = redis.from_url(redis_url, decode_responses=True)
+        client = get_redis()
         # Verifica a conexão rapidamente (opcional, mas bom para debug inicial)
         # await asyncio.wait_for(client.ping(), timeout=1.0)
         yield client # Disponibiliza o cliente para a rota
+    except HTTPException:
+        # Erros HTTP levantados pela própria rota passam intactos (ex: 404, 429)
+        raise
     except redis.RedisError as e:
         logger.error(f"Falha ao obter conexão Redis: {e}")
         raise HTTPException(status_code=503, detail=f"Serviço Redis indisponível: {e}")
@@ -58,20 +134,134 @@ async def get_redis_client():
     except Exception as e:
         logger.error(f"Erro inesperado ao obter cliente Redis: {e}")
         raise HTTPException(status_code=500, detail=f"Erro interno ao conectar ao Redis: {e}")
-    # A conexão do pool é geralmente liberada automaticamente aqui,
-    # mas um 'finally' com 'await client.close()' poderia ser adicionado se necessário.
-    # No entanto, com from_url, a gestão do pool deve ser suficiente.
 
 # Define um tipo anotado para facilitar a injeção
 RedisClientDep = Annotated[redis.Redis, Depends(get_redis_client)]
 # --------------------------------------------------------
 
+# --- Serviço OpenAI (construído no primeiro request, não no import) ---
+# CHAT_ENGINE=completions troca threads/runs pelo motor de chat completions (mesma interface)
+@lru_cache(maxsize=1)
+def get_openai_service() -> "OpenAIService":
+    if get_settings().chat_engine == "completions":
+        try:
+            from api.services.chat_completions_service import ChatCompletionsService
+        except ImportError:
+            from services.chat_completions_service import ChatCompletionsService
+        return ChatCompletionsService()
+    return services.OpenAIService()
+
+
+def _request_host(connection: HTTPConnection) -> Optional[str]:
+    # Atrás do nginx/Vercel o host pedido pelo cliente vem no X-Forwarded-Host
+    return connection.headers.get("x-forwarded-host") or connection.headers.get("host")
+
+
+# --- Empresa (tenant) da requisição: pelo host ou pelo prefixo do session_id (services/tenants.py) ---
+async def resolve_tenant(connection: HTTPConnection):
+    session_id = connection.path_params.get("session_id")
+    if (session_id is None and isinstance(connection, Request) and connection.method == "POST"
+            and connection.headers.get("content-type", "").startswith("application/json")):
+        # /api/chat: session_id no corpo (já lido e guardado pelo FastAPI para validar o ChatRequest)
+        try:
+            payload = await connection.json()
+        except ValueError:
+            payload = None  # corpo inválido: a rota responde o erro (ex: webhooks)
+        session_id = payload.get("session_id") if isinstance(payload, dict) else None
+    try:
+        runtime = await services.tenants.get_tenant_registry().resolve(_request_host(connection), session_id)
+    except services.tenants.TenantMismatch as e:
+        raise HTTPException(status_code=403, detail=str(e))
+    except redis.RedisError as e:
+        # Sem a config não dá para saber de quem é a requisição: não cai na config do ambiente
+        logger.error(f"Falha ao carregar a config da empresa: {e}")
+        raise HTTPException(status_code=503, detail="Configuração da empresa indisponível")
+    tokens = services.tenants.activate(runtime)
+    try:
+        yield runtime
+    finally:
+        services.tenants.deactivate(tokens)
+
+TenantDep = Annotated[Optional["TenantRuntime"], Depends(resolve_tenant)]
+
+
+def current_openai_service() -> "OpenAIService":
+    # Instância aquecida da empresa em curso; sem empresa, a do ambiente
+    runtime = services.tenants.current_runtime()
+    return runtime.openai_service if runtime is not None else get_openai_service()
+
+
+async def _openai_service_for_tenant(tenant: TenantDep) -> "OpenAIService":
+    return current_openai_service()
+
+OpenAIServiceDep = Annotated["OpenAIService", Depends(_openai_service_for_tenant)]
+
+# --- Controle de admissão do /api/chat (limites por processo) ---
+@lru_cache(maxsize=1)
+def get_chat_admission() -> AdmissionController:
+    settings = get_settings()
+    return AdmissionController(
+        max_in_flight=settings.chat_max_in_flight,
+        max_queue=settings.chat_max_queue,
+        queue_timeout=settings.chat_queue_timeout_seconds,
+        rate_per_minute=settings.chat_rate_per_minute,
+        burst=settings.chat_rate_burst,
+        # Dependência obrigatória fora (monitor de saúde) ou shutdown em curso => 503 logo na entrada
+        readiness=_unready_reason,
+        unready_retry_after=max(settings.health_probe_interval_seconds, 1.0),
+    )
+
+
+def _chats_in_flight() -> int:
+    return get_chat_admission().in_flight
+
+
+def _unready_reason() -> Optional[str]:
+    # Worker drenando (shutdown) ou dependência obrigatória fora
+    return services.run_recovery.get_run_recovery().drain_reason() or services.health_monitor.get_health_monitor().unready_reason()
+
+
+def _client_ip(request: Request) -> Optional[str]:
+    # Atrás do nginx/Vercel o IP real vem no X-Forwarded-For
+    forwarded = request.headers.get("x-forwarded-for")
+    if forwarded:
+        return forwarded.split(",")[0].strip()
+    return request.client.host if request.client else None
+
+# --- Serviço Pipefy (webhooks/espelho); importado só no primeiro uso ---
+@lru_cache(maxsize=1)
+def get_pipefy_service():
+    try:
+        from api.services import PipefyService
+    except ImportError:
+        from services import PipefyService
+    return PipefyService()
+
+
+def get_mirror_service():
+    service = get_pipefy_service()
+    if service.mirror is None:
+        raise HTTPException(status_code=404, detail="Pipefy mirror is disabled (PIPEFY_MIRROR_ENABLED)")
+    return service
+
+
+def _token_matches(expected: Optional[str], received: Optional[str]) -> bool:
+    return bool(expected) and bool(received) and hmac.compare_digest(expected, received)
+
+
+async def require_internal_token(x_internal_token: Annotated[Optional[str], Header()] = None):
+    # Rotas internas só existem com INTERNAL_API_TOKEN configurado
+    if not _token_matches(get_settings().internal_api_token, x_internal_token):
+        raise HTTPException(status_code=401, detail="Invalid internal token")
+
 # --- CORS (Mantido para Docker local) ---
 origins = [
     "http://localhost",
     "http://localhost:3000",
     "http://127.0.0.1:3000",
 ]
+# Respostas acima de 1 KB saem comprimidas (brotli se disponível, senão gzip)
+app.add_middleware(CompressionMiddleware, minimum_size=1024)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=origins,
@@ -79,9 +269,9 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
-
-# Serviços
-openai_service = OpenAIService()
+# Profiling sob demanda (PROFILING_DIR + header X-Profile-Token ou amostragem); desligado, só repassa
+# (a classe é importada quando o Starlette monta a pilha de middlewares, no startup, e não no import)
+app.add_middleware(lambda inner, **kwargs: _profiling().ProfilingMiddleware(inner, **kwargs), settings_factory=get_settings)
 
 
 @app.get("/")
@@ -89,28 +279,103 @@ async def root():
     return {"message": "SDR Agent Backend API is running!"}
 
 # --- AJUSTE: Injeta o cliente Redis usando Depends ---
-@app.post("/api/chat", response_model=ChatResponse)
-async def chat(request: ChatRequest, redis_client: RedisClientDep):
+# Turnos interrompidos porque o cliente desconectou (neste processo)
+chat_disconnects = {"cancelled_turns": 0}
+
+
+async def _run_until_disconnect(http_request: Request, coro, poll_seconds: float):
+    """
+    Executa o turno numa task e verifica periodicamente se o cliente desconectou;
+    nesse caso cancela a task (o OpenAIService cancela o run e limpa os horários).
+    """
+    task = asyncio.create_task(coro)
+    try:
+        while True:
+            done, _ = await asyncio.wait({task}, timeout=poll_seconds)
+            if done:
+                return task.result()
+            if await http_request.is_disconnected():
+                chat_disconnects["cancelled_turns"] += 1
+                logger.info("Cliente desconectou; cancelando o turno em andamento.")
+                task.cancel()
+                try:
+                    await task  # Aguarda a limpeza (runs.cancel, holds)
+                except asyncio.CancelledError:
+                    pass
+                # 499 (convenção do nginx): o cliente fechou a conexão antes da resposta
+                raise HTTPException(status_code=499, detail="Client closed request")
+    finally:
+        if not task.done():
+            task.cancel()
+
+
+@app.post("/api/chat", response_model=ChatResponse, response_model_exclude_none=True, response_class=ORJSONResponse)
+async def chat(request: ChatRequest, http_request: Request, redis_client: RedisClientDep, openai_service: OpenAIServiceDep):
+    admission = get_chat_admission()
+    settings = get_settings()
+    try:
+        async with admission.admit(_client_ip(http_request), request.session_id, *services.tenants.concurrency_slot()):
+            # O prazo vale para o turno inteiro (fila de admissão não conta) e é herdado pela task
+            token = set_deadline(settings.chat_request_deadline_seconds)
+            try:
+                return await _run_until_disconnect(
+                    http_request, _chat_turn(request, redis_client, openai_service),
+                    settings.chat_disconnect_poll_seconds,
+                )
+            finally:
+                reset_deadline(token)
+    except AdmissionRejected as e:
+        logger.warning(f"Chat rejected for session {request.session_id} ({e.status_code}): {admission.stats()}")
+        raise HTTPException(status_code=e.status_code, detail=e.reason, headers={"Retry-After": e.retry_after_header})
+
+
+async def _get_or_create_thread(redis_client: redis.Redis, openai_service: "OpenAIService", session_id: str):
+    """
+    Thread da sessão (criado e salvo no Redis se ainda não existir). Retorna (thread_id, é_novo).
+    Cada consulta é um único EVALSHA atômico que também renova o TTL da sessão.
+    """
+    # Ids de thread locais (motor de completions) não custam nada: o candidato vai já na primeira chamada
+    candidate = await openai_service.create_thread() if getattr(openai_service, "local_threads", False) else None
+    thread_id, created = await services.session_store.get_or_create(redis_client, session_id, candidate)
+    if thread_id and created:
+        logger.info(f"Novo thread_id {thread_id} salvo para {session_id}")
+        return thread_id, True
+    if thread_id:
+        logger.info(f"Thread ID {thread_id} encontrado para {session_id}")
+        return thread_id, False
+    logger.info(f"Thread ID não encontrado para {session_id}, criando novo.")
+    candidate = await openai_service.create_thread()
+    thread_id, created = await services.session_store.get_or_create(redis_client, session_id, candidate)
+    if not created:
+        # Outra requisição da mesma sessão criou o thread primeiro: usa o dela
+        logger.info(f"Sessão {session_id} já ganhou o thread {thread_id}; descartando {candidate}")
+        await openai_service.cleanup_thread(candidate)
+        return thread_id, False
+    logger.info(f"Novo thread_id {thread_id} salvo para {session_id}")
+    return thread_id, True
+
+
+async def _chat_turn(request: ChatRequest, redis_client: redis.Redis, openai_service: "OpenAIService") -> ChatResponse:
     try:
         session_id = request.session_id
         user_message = request.message
+        services.traffic_recorder.current_session.set(session_id)
         logger.info(f"Processando chat para session_id: {session_id}")
 
-        # Usa o cliente injetado
-        thread_id = await redis_client.get(session_id)
-        if not thread_id:
-            logger.info(f"Thread ID não encontrado para {session_id}, criando novo.")
-            thread_id = openai_service.create_thread()
-            await redis_client.set(session_id, thread_id, ex=86400)
-            logger.info(f"Novo thread_id {thread_id} salvo para {session_id}")
-        else:
-            logger.info(f"Thread ID {thread_id} encontrado para {session_id}")
+        thread_id, is_new_thread = await _get_or_create_thread(redis_client, openai_service, session_id)
+        _profiling().tag(session_id=session_id, thread_id=thread_id)
 
-        ai_response_content = await openai_service.get_assistant_response(thread_id, user_message)
+        # Primeira mensagem de um thread novo não tem contexto da conversa: pode usar o cache
+        started_at, t0 = time.time(), time.perf_counter()
+        ai_response_content = await openai_service.get_assistant_response(
+            thread_id, user_message, cacheable=is_new_thread, session_id=session_id
+        )
+        services.traffic_recorder.record_chat_turn(session_id, user_message, ai_response_content,
+                                          started_at, time.perf_counter() - t0)
+        # thread_id é interno (OpenAI) e não é usado pelo frontend: fica fora da resposta
         return ChatResponse(
             response=ai_response_content,
-            session_id=session_id,
-            thread_id=thread_id
+            session_id=session_id
         )
     except Exception as e:
         logger.error(f"Error processing chat for session {session_id}: {e}", exc_info=True)
@@ -119,45 +384,143 @@ async def chat(request: ChatRequest, redis_client: RedisClientDep):
         elif isinstance(e, redis.RedisError): detail = f"Redis Error: {str(e)}" # Captura erros específicos do Redis
         raise HTTPException(status_code=500, detail=f"Error processing chat: {detail}")
 
+# --- Canal WebSocket do chat (tokens, status das ferramentas, heartbeat e resume) ---
+# Referências aos turnos em andamento (a task não pode ser coletada antes de terminar)
+_ws_turn_tasks = set()
+
+async def _ws_turn(stream, message: str, client_ip: Optional[str], openai_service: "OpenAIService"):
+    """Executa um turno do WebSocket; os eventos vão para `stream` (socket conectado + Redis)."""
+    session_id = stream.session_id
+    settings = get_settings()
+    services.traffic_recorder.current_session.set(session_id)
+    try:
+        async with get_chat_admission().admit(client_ip, session_id, *services.tenants.concurrency_slot()):
+            token = set_deadline(settings.chat_request_deadline_seconds)
+            try:
+                thread_id, is_new_thread = await _get_or_create_thread(get_redis(), openai_service, session_id)
+                await stream.emit({"type": "turn_start"})
+                started_at, t0 = time.time(), time.perf_counter()
+                async for event in services.chat_stream.engine_events(openai_service, thread_id, message,
+                                                             is_new_thread, session_id):
+                    if event["type"] == "done":
+                        services.traffic_recorder.record_chat_turn(session_id, message, event["response"],
+                                                          started_at, time.perf_counter() - t0)
+                    await stream.emit(event)
+            finally:
+                reset_deadline(token)
+    except AdmissionRejected as e:
+        await stream.emit({"type": "error", "status": e.status_code, "detail": e.reason,
+                           "retry_after": int(e.retry_after_header)})
+    except Exception as e:
+        logger.error(f"Error processing websocket turn for session {session_id}: {e}", exc_info=True)
+        await stream.emit({"type": "error", "status": 500, "detail": f"Error processing chat: {e}"})
+    finally:
+        await services.chat_stream.finish_turn(stream)
+
+
+@app.websocket("/api/ws/{session_id}")
+async def chat_websocket(websocket: WebSocket, session_id: str, tenant: TenantDep):
+    """
+    Protocolo (JSON por frame):
+      cliente -> {"type": "message", "message": "..."} | {"type": "ping"} |
+                 {"type": "resume", "turn": "<id>", "seq": <n>}
+      servidor -> ready, turn_start, token, tool (status + label), done, error, pong, heartbeat
+    """
+    await websocket.accept()
+    settings = get_settings()
+    # Os turnos (tasks) herdam a empresa resolvida na conexão
+    openai_service = current_openai_service()
+    client_ip = websocket.headers.get("x-forwarded-for", "").split(",")[0].strip() or (
+        websocket.client.host if websocket.client else None)
+    await services.chat_stream.send_event(websocket, {"type": "ready", "session_id": session_id})
+    idle = 0.0
+    try:
+        while True:
+            try:
+                raw = await asyncio.wait_for(websocket.receive_text(), timeout=settings.ws_heartbeat_seconds)
+            except asyncio.TimeoutError:
+                # Heartbeat mantém a conexão viva em proxies; conexões ociosas demais são fechadas
+                idle += settings.ws_heartbeat_seconds
+                if idle >= settings.ws_idle_timeout_seconds and services.chat_stream.active_turn(session_id) is None:
+                    await websocket.close(code=1000)
+                    return
+                if not await services.chat_stream.send_event(websocket, {"type": "heartbeat"}):
+                    return
+                continue
+            idle = 0.0
+            try:
+                payload = json.loads(raw)
+                kind = payload.get("type")
+            except (ValueError, AttributeError):
+                await services.chat_stream.send_event(websocket, {"type": "error", "status": 400, "detail": "Invalid JSON frame"})
+                continue
+
+            if kind == "ping":
+                await services.chat_stream.send_event(websocket, {"type": "pong"})
+            elif kind == "resume":
+                await services.chat_stream.resume(session_id, websocket, payload.get("turn"), int(payload.get("seq") or 0),
+                                         max_wait=settings.chat_request_deadline_seconds)
+            elif kind == "message" and str(payload.get("message") or "").strip():
+                if services.chat_stream.active_turn(session_id) is not None:
+                    await services.chat_stream.send_event(websocket, {"type": "error", "status": 409,
+                                                             "detail": "A previous message is still being processed"})
+                    continue
+                stream = services.chat_stream.start_turn(session_id, websocket)
+                # O turno não depende da conexão: se ela cair, o cliente retoma com "resume"
+                task = asyncio.create_task(_ws_turn(stream, payload["message"], client_ip, openai_service))
+                _ws_turn_tasks.add(task)
+                task.add_done_callback(_ws_turn_tasks.discard)
+            else:
+                await services.chat_stream.send_event(websocket, {"type": "error", "status": 400, "detail": "Unknown frame"})
+    except WebSocketDisconnect:
+        pass
+    finally:
+        services.chat_stream.detach(session_id, websocket)
+
+
 # --- AJUSTE: Injeta o cliente Redis ---
 @app.get("/api/history/{session_id}")
-async def get_history(session_id: str, redis_client: RedisClientDep): # <-- Injeta aqui
+async def get_history(session_id: str, redis_client: RedisClientDep, openai_service: OpenAIServiceDep,
+                      if_none_match: Annotated[Optional[str], Header()] = None): # <-- Injeta aqui
     thread_id = await redis_client.get(session_id)
     if not thread_id:
         raise HTTPException(status_code=404, detail="Session not found")
     try:
-        # ... (lógica para buscar mensagens da OpenAI - sem alterações) ...
-        messages = openai_service.client.beta.threads.messages.list(thread_id=thread_id)
-        formatted_messages = []
-        for msg in reversed(messages.data):
-            if msg.content and len(msg.content) > 0 and hasattr(msg.content[0], 'text'):
-                formatted_messages.append({
-                    "role": msg.role,
-                    "content": msg.content[0].text.value,
-                    "timestamp": msg.created_at
-                })
-        return formatted_messages
+        # Thread da OpenAI ou transcript local, conforme o motor (CHAT_ENGINE)
+        formatted_messages = await openai_service.get_history(thread_id)
     except Exception as e:
         logger.error(f"Error retrieving history for session {session_id}, thread {thread_id}: {e}", exc_info=True)
         raise HTTPException(status_code=500, detail=f"Error retrieving history: {str(e)}")
 
+    # Serializa uma vez com orjson; o ETag (hash do corpo) permite ao cliente que faz polling receber 304
+    body = orjson.dumps(formatted_messages)
+    etag = f'"{hashlib.blake2b(body, digest_size=16).hexdigest()}"'
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if if_none_match and etag in [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]:
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
+
 @app.post("/api/session")
-async def create_session():
-    # Esta rota não precisa do Redis
-    session_id = str(uuid.uuid4())
+async def create_session(tenant: TenantDep, tenant_id: Optional[str] = None):
+    # Esta rota não precisa do Redis (só para a config da empresa, em cache)
+    if tenant is None and tenant_id:
+        # Host compartilhado entre empresas: o widget informa a dele e o id da sessão a carrega
+        tenant = await services.tenants.get_tenant_registry().runtime(tenant_id)
+        if tenant is None:
+            raise HTTPException(status_code=404, detail="Tenant not found")
+    session_id = services.tenants.new_session_id(tenant)
     logger.info(f"Gerado novo session_id: {session_id}")
     return { "session_id": session_id, "message": "New session ID generated." }
 
 # --- AJUSTE: Injeta o cliente Redis ---
 @app.delete("/session/{session_id}")
-async def delete_session(session_id: str, redis_client: RedisClientDep): # <-- Injeta aqui
-    thread_id = await redis_client.get(session_id)
+async def delete_session(session_id: str, redis_client: RedisClientDep, openai_service: OpenAIServiceDep): # <-- Injeta aqui
+    # GET + DEL atômicos num único round-trip (sessão e estado derivado da conversa)
+    thread_id = await services.session_store.get_and_delete(redis_client, session_id)
     if thread_id:
         try:
-            deleted_count = await redis_client.delete(session_id)
-            if deleted_count > 0: logger.info(f"Session {session_id} deleted from Redis.")
-            else: logger.warning(f"Session {session_id} failed to delete from Redis.")
-            openai_service.cleanup_thread(thread_id)
+            logger.info(f"Session {session_id} deleted from Redis.")
+            await openai_service.cleanup_thread(thread_id)
         except Exception as e:
             logger.error(f"Error cleaning up session {session_id}, thread {thread_id}: {e}", exc_info=True)
             raise HTTPException(status_code=500, detail=f"Error cleaning up session: {str(e)}")
@@ -168,14 +531,12 @@ async def delete_session(session_id: str, redis_client: RedisClientDep): # <-- I
 
 # --- AJUSTE: Injeta o cliente Redis ---
 @app.post("/api/session/{session_id}/reset")
-async def reset_session(session_id: str, redis_client: RedisClientDep): # <-- Injeta aqui para passar para delete_session
+async def reset_session(session_id: str, redis_client: RedisClientDep, openai_service: OpenAIServiceDep): # <-- Injeta aqui para passar para delete_session
     try:
-        # Passa o cliente injetado para a função delete_session (requer ajuste em delete_session)
-        # Ou mais simples: refaz a lógica aqui
-        thread_id = await redis_client.get(session_id)
+        # Apaga a sessão e o estado derivado da conversa (resumo/uso, eventos do WebSocket) de uma vez
+        thread_id = await services.session_store.reset(redis_client, session_id)
         if thread_id:
-            await redis_client.delete(session_id)
-            openai_service.cleanup_thread(thread_id)
+            await openai_service.cleanup_thread(thread_id)
             logger.info(f"Session {session_id} reset (deleted).")
             return { "message": "Sessão resetada.", "session_id": session_id }
         else:
@@ -187,19 +548,186 @@ async def reset_session(session_id: str, redis_client: RedisClientDep): # <-- In
         raise HTTPException(status_code=500, detail=f"Error resetting session: {str(e)}")
 
 
-# --- AJUSTE: Injeta o cliente Redis ---
+# --- Saúde: respostas do snapshot do monitor de dependências (sem I/O por requisição) ---
 @app.get("/api/health")
-async def health_check(redis_client: RedisClientDep): # <-- Injeta aqui
-    redis_status = "disconnected"
-    try:
-        # Usa o cliente injetado para o ping
-        await asyncio.wait_for(redis_client.ping(), timeout=2.0)
-        redis_status = "connected"
-    except asyncio.TimeoutError:
-        logger.warning("Health check: Redis ping timed out.")
-    except Exception as e:
-        logger.warning(f"Health check: Redis ping failed: {e}")
+async def health_check():
+    # Estado, latência e taxa de erro por dependência; o 503 fica com /api/health/ready
+    return await services.health_monitor.get_health_monitor().ensure_fresh()
+
+
+@app.get("/api/health/live")
+async def liveness():
+    # Processo e event loop respondendo (o loop de sondagem continua rodando, se ativo)
+    monitor = services.health_monitor.get_health_monitor()
+    if monitor.running and not monitor.is_live():
+        return ORJSONResponse({"status": "stalled", "last_round_at": monitor.last_round_at}, status_code=503)
+    return {"status": "alive"}
+
+
+@app.get("/api/health/ready")
+async def readiness():
+    # Pronto para tráfego: sem drenagem e nenhuma dependência obrigatória fora (mesmo critério da admissão)
+    await services.health_monitor.get_health_monitor().ensure_fresh()
+    reason = _unready_reason()
+    if reason:
+        return ORJSONResponse({"status": "not_ready", "reason": reason}, status_code=503)
+    return {"status": "ready"}
+
+
+@app.get("/api/metrics")
+async def metrics(openai_service: OpenAIServiceDep):
+    # Métricas em memória deste worker, para ajuste fino das otimizações
+    response_cache = openai_service.response_cache
     return {
-        "status": "healthy" if redis_status == "connected" else "degraded",
-        "services": { "redis": redis_status }
+        "response_cache": response_cache.stats() if response_cache is not None else {"enabled": False},
+        "token_usage": await openai_service.usage_tracker.get_global_usage(),
+        "slot_prefetch": services.slot_store.stats(),
+        "slot_holds": services.slot_hold_service.stats(),
+        "slot_fast_path": services.slot_matcher.stats(),
+        "calcom_webhooks": services.calcom_webhook.stats(),
+        "chat_admission": get_chat_admission().stats(),
+        "chat_disconnects": dict(chat_disconnects),
+        "chat_engine": openai_service.stats() if hasattr(openai_service, "stats") else {"engine": "assistants"},
+        "model_routing": openai_service.model_router.stats(),
+        "event_loop": services.loop_monitor.get_loop_monitor().stats(),
+        "run_recovery": {**services.run_recovery.get_run_recovery().stats(),
+                         "pending": await services.run_recovery.get_run_recovery().pending_count()},
+        "tenants": services.tenants.get_tenant_registry().stats(),
     }
+
+
+@app.get("/api/usage/{session_id}")
+async def get_session_usage(session_id: str, openai_service: OpenAIServiceDep):
+    # Totais acumulados de tokens da sessão (prompt/completion/runs/truncados)
+    usage = await openai_service.usage_tracker.get_session_usage(session_id)
+    if not usage:
+        raise HTTPException(status_code=404, detail="No usage recorded for this session")
+    return {"session_id": session_id, "usage": usage}
+
+
+@app.post("/api/webhooks/pipefy")
+async def pipefy_webhook(payload: Dict[str, Any], x_pipefy_webhook_token: Annotated[Optional[str], Header()] = None):
+    # Mantém o espelho local do pipe atualizado (card.create, card.field_update, card.delete, ...)
+    if not _token_matches(get_settings().pipefy_webhook_token, x_pipefy_webhook_token):
+        raise HTTPException(status_code=401, detail="Invalid webhook token")
+    service = get_mirror_service()
+    try:
+        return await service.mirror.handle_webhook(service, payload)
+    except Exception as e:
+        logger.error(f"Error applying Pipefy webhook: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail=f"Error applying Pipefy webhook: {str(e)}")
+
+
+@app.post("/api/internal/pipefy-mirror/reconcile", dependencies=[Depends(require_internal_token)])
+async def reconcile_pipefy_mirror(full: bool = False):
+    # Passo de reconciliação por cursor (para cron externo); `full=true` refaz a sincronização inicial
+    service = get_mirror_service()
+    try:
+        if full:
+            result = {"cards": await service.mirror.full_sync(service), "complete": True}
+        else:
+            result = await service.mirror.reconcile_step(service, max_pages=get_settings().pipefy_mirror_reconcile_pages)
+        # Aproveita para reaplicar atualizações de reunião que falharam (webhooks do Cal.com)
+        result["lead_updates"] = await services.lead_update_queue.drain_lead_updates(service)
+        return result
+    except Exception as e:
+        logger.error(f"Error reconciling Pipefy mirror: {e}", exc_info=True)
+        raise HTTPException(status_code=502, detail=f"Error reconciling Pipefy mirror: {str(e)}")
+
+
+@app.get("/api/internal/availability-report", dependencies=[Depends(require_internal_token)])
+async def availability_report(days: int = 30):
+    # Slots livres e utilização por vendedor por dia (planejamento de capacidade)
+    try:
+        from api.services.availability_analytics import build_availability_report
+    except ImportError:
+        from services.availability_analytics import build_availability_report
+    try:
+        return await build_availability_report(days)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error(f"Error building availability report: {e}", exc_info=True)
+        raise HTTPException(status_code=502, detail=f"Error building availability report: {str(e)}")
+
+
+@app.get("/api/internal/tenants/{tenant_id}", dependencies=[Depends(require_internal_token)])
+async def get_tenant(tenant_id: str):
+    config = await services.tenants.get_tenant_registry().store.get(tenant_id)
+    if config is None:
+        raise HTTPException(status_code=404, detail="Tenant not found")
+    return {"tenant_id": tenant_id, **config.to_payload()}
+
+
+@app.put("/api/internal/tenants/{tenant_id}", dependencies=[Depends(require_internal_token)])
+async def put_tenant(tenant_id: str, payload: Dict[str, Any]):
+    # {"hosts": [...], "settings": {"openai_api_key": ..., "pipefy_pipe_id": ...}, "max_in_flight": n}
+    store = services.tenants.get_tenant_registry().store
+    try:
+        config = services.tenants.TenantConfig.from_payload(tenant_id, payload)
+        await store.put(config)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"tenant_id": tenant_id, **config.to_payload()}
+
+
+@app.delete("/api/internal/tenants/{tenant_id}", dependencies=[Depends(require_internal_token)])
+async def delete_tenant(tenant_id: str):
+    if not await services.tenants.get_tenant_registry().store.delete(tenant_id):
+        raise HTTPException(status_code=404, detail="Tenant not found")
+    return {"message": "Tenant deleted", "tenant_id": tenant_id}
+
+
+def _get_profile_store():
+    store = _profiling().get_profile_store(get_settings())
+    if store is None:
+        raise HTTPException(status_code=404, detail="Profiling is disabled (PROFILING_DIR)")
+    return store
+
+
+@app.get("/api/internal/profiles", dependencies=[Depends(require_internal_token)])
+async def list_profiles(session_id: Optional[str] = None, thread_id: Optional[str] = None, limit: int = 50):
+    # Perfis gravados (mais recentes primeiro), filtráveis por sessão/thread
+    store = _get_profile_store()
+    return {"profiles": await asyncio.to_thread(store.list, session_id, thread_id, min(max(limit, 1), 500))}
+
+
+@app.get("/api/internal/profiles/{profile_id}", dependencies=[Depends(require_internal_token)])
+async def download_profile(profile_id: str, format: str = "speedscope"):
+    # speedscope: abrir em https://www.speedscope.app; html: flamegraph do pyinstrument
+    path = _get_profile_store().file_path(profile_id, format)
+    if path is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    media_type = "text/html" if format == "html" else "application/json"
+    return FileResponse(path, media_type=media_type, filename=f"{profile_id}{_profiling().FORMATS[format]}")
+
+
+async def _drain_pipefy_updates():
+    try:
+        summary = await services.lead_update_queue.drain_lead_updates(get_pipefy_service())
+        logger.info(f"Pipefy meeting updates drained: {summary}")
+    except Exception as e:
+        logger.warning(f"Failed to drain Pipefy meeting updates: {e}")
+
+
+@app.post("/api/webhooks/calcom")
+async def calcom_booking_webhook(request: Request, background_tasks: BackgroundTasks, tenant: TenantDep):
+    # Eventos de booking do Cal.com (criado/remarcado/cancelado) mantêm holds, prefetches e Pipefy em dia
+    # (da empresa do host: a atualização do lead é enfileirada com ela)
+    body = await request.body()
+    signature = request.headers.get(services.calcom_webhook.SIGNATURE_HEADER)
+    if not services.calcom_webhook.verify_signature(get_settings().cal_com_webhook_secret, body, signature):
+        services.calcom_webhook.webhook_stats["invalid_signature"] += 1
+        raise HTTPException(status_code=401, detail="Invalid webhook signature")
+    try:
+        event = json.loads(body)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid JSON payload")
+    try:
+        result = await services.calcom_webhook.handle_booking_event(event)
+    except Exception as e:
+        logger.error(f"Error handling Cal.com webhook: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail=f"Error handling Cal.com webhook: {str(e)}")
+    if result.get("pipefy_update_queued"):
+        background_tasks.add_task(_drain_pipefy_updates)
+    return result
@@ -29,7 +29,8 @@ class ChatRequest(BaseModel):
     message: str
 
 class ChatResponse(BaseModel):
+    # Campos None são omitidos da resposta (response_model_exclude_none)
     response: str
-    lead_data: Optional[Lead] = None
     session_id: str
-    thread_id: str
+    lead_data: Optional[Lead] = None
+    thread_id: Optional[str] = None
@@ -0,0 +1,215 @@
+# api/profiling.py
+
+"""
+Profiling sob demanda de requisições em produção (pyinstrument).
+
+Uma requisição é perfilada quando traz o header X-Profile-Token igual a
+PROFILING_TOKEN, ou por amostragem (PROFILING_SAMPLE_RATE, de 0 a 1). O
+profiler de amostragem roda em modo async: o tempo esperando OpenAI, Pipefy
+ou Cal.com aparece na pilha de quem aguardou, de `chat()` até o handler da
+ferramenta.
+
+Cada perfil é salvo em PROFILING_DIR como speedscope (.speedscope.json, abre
+em https://www.speedscope.app) e HTML (flamegraph do pyinstrument), com um
+.meta.json marcado com session_id e thread_id (ver `tag`). Os mais antigos
+são apagados acima de PROFILING_MAX_FILES. Listagem e download:
+/api/internal/profiles.
+
+Sem PROFILING_DIR (ou sem token e sem amostragem) o middleware só repassa a
+requisição e `tag` não faz nada; o pyinstrument só é importado quando há um
+perfil a gravar.
+"""
+
+import asyncio
+import contextvars
+import hmac
+import json
+import os
+import random
+import re
+import time
+import uuid
+from typing import Any, Dict, List, Optional
+
+from starlette.datastructures import Headers
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+PROFILE_HEADER = "X-Profile-Token"
+_EXCLUDED_PREFIXES = ("/api/internal/profiles", "/api/health")
+_PROFILE_ID = re.compile(r"^[0-9]{8}T[0-9]{6}-[0-9a-f]{8}$")
+FORMATS = {"speedscope": ".speedscope.json", "html": ".html"}
+
+# Marcas do perfil em andamento (None = requisição sem profiling)
+_current_tags: contextvars.ContextVar[Optional[Dict[str, Any]]] = contextvars.ContextVar("profile_tags", default=None)
+
+
+def tag(**values: Any) -> None:
+    """Marca o perfil da requisição atual (ex: session_id, thread_id); sem perfil, não faz nada."""
+    tags = _current_tags.get()
+    if tags is not None:
+        tags.update({k: v for k, v in values.items() if v is not None})
+
+
+class ProfileStore:
+    """Perfis gravados em disco: <id>.speedscope.json, <id>.html e <id>.meta.json."""
+
+    def __init__(self, directory: str, max_files: int = 200):
+        self.directory = directory
+        self.max_files = max_files
+
+    def _path(self, profile_id: str, suffix: str) -> str:
+        return os.path.join(self.directory, profile_id + suffix)
+
+    def save(self, session, meta: Dict[str, Any]) -> str:
+        from pyinstrument.renderers import HTMLRenderer, SpeedscopeRenderer
+
+        os.makedirs(self.directory, exist_ok=True)
+        profile_id = f"{time.strftime('%Y%m%dT%H%M%S', time.gmtime())}-{uuid.uuid4().hex[:8]}"
+        with open(self._path(profile_id, FORMATS["speedscope"]), "w", encoding="utf-8") as f:
+            f.write(SpeedscopeRenderer().render(session))
+        with open(self._path(profile_id, FORMATS["html"]), "w", encoding="utf-8") as f:
+            f.write(HTMLRenderer().render(session))
+        # O .meta.json por último: só aparece na listagem o perfil completo
+        with open(self._path(profile_id, ".meta.json"), "w", encoding="utf-8") as f:
+            json.dump({"id": profile_id, **meta}, f, ensure_ascii=False, default=str)
+        self._prune()
+        return profile_id
+
+    def _meta_files(self) -> List[str]:
+        try:
+            return sorted(name for name in os.listdir(self.directory) if name.endswith(".meta.json"))
+        except FileNotFoundError:
+            return []
+
+    def _prune(self) -> None:
+        metas = self._meta_files()
+        for name in metas[:max(len(metas) - self.max_files, 0)]:
+            profile_id = name[:-len(".meta.json")]
+            for suffix in (*FORMATS.values(), ".meta.json"):
+                try:
+                    os.remove(self._path(profile_id, suffix))
+                except FileNotFoundError:
+                    pass
+
+    def list(self, session_id: Optional[str] = None, thread_id: Optional[str] = None,
+             limit: int = 50) -> List[Dict[str, Any]]:
+        """Perfis mais recentes primeiro, opcionalmente filtrados por sessão/thread."""
+        result = []
+        for name in reversed(self._meta_files()):
+            try:
+                with open(os.path.join(self.directory, name), encoding="utf-8") as f:
+                    meta = json.load(f)
+            except (OSError, ValueError):
+                continue
+            if session_id and meta.get("session_id") != session_id:
+                continue
+            if thread_id and meta.get("thread_id") != thread_id:
+                continue
+            result.append(meta)
+            if len(result) >= limit:
+                break
+        return result
+
+    def file_path(self, profile_id: str, fmt: str) -> Optional[str]:
+        if not _PROFILE_ID.match(profile_id) or fmt not in FORMATS:
+            return None
+        path = self._path(profile_id, FORMATS[fmt])
+        return path if os.path.exists(path) else None
+
+
+_store: Optional[ProfileStore] = None
+
+
+def get_profile_store(settings) -> Optional[ProfileStore]:
+    """Store dos perfis (None sem PROFILING_DIR)."""
+    global _store
+    if not settings.profiling_dir:
+        return None
+    if _store is None or _store.directory != settings.profiling_dir:
+        _store = ProfileStore(settings.profiling_dir, settings.profiling_max_files)
+    return _store
+
+
+class ProfilingMiddleware:
+    """
+    Perfila requisições HTTP escolhidas por header autenticado ou amostragem.
+
+    A configuração é lida na primeira requisição (o `.env` não é carregado no
+    import da API); com o profiling desligado, cada requisição custa só a
+    checagem de `self.enabled`.
+    """
+
+    def __init__(self, app: ASGIApp, settings_factory, interval: float = 0.001):
+        self.app = app
+        self.settings_factory = settings_factory
+        self.interval = interval
+        self.enabled: Optional[bool] = None
+        self.store: Optional[ProfileStore] = None
+        self.token: Optional[str] = None
+        self.sample_rate = 0.0
+        self.stats = {"profiled": 0, "saved": 0, "errors": 0}
+
+    def _configure(self) -> None:
+        try:
+            settings = self.settings_factory()
+        except ValueError:
+            self.enabled = False
+            return
+        self.store = get_profile_store(settings)
+        self.token = settings.profiling_token
+        self.sample_rate = settings.profiling_sample_rate
+        self.enabled = self.store is not None and (bool(self.token) or self.sample_rate > 0)
+
+    def _trigger(self, scope: Scope) -> Optional[str]:
+        if scope["type"] != "http" or scope["path"].startswith(_EXCLUDED_PREFIXES):
+            return None
+        if self.token:
+            received = Headers(scope=scope).get(PROFILE_HEADER)
+            if received and hmac.compare_digest(self.token, received):
+                return "header"
+        if self.sample_rate > 0 and random.random() < self.sample_rate:
+            return "sample"
+        return None
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if self.enabled is None:
+            self._configure()
+        if not self.enabled:
+            await self.app(scope, receive, send)
+            return
+        trigger = self._trigger(scope)
+        if trigger is None:
+            await self.app(scope, receive, send)
+            return
+
+        from pyinstrument import Profiler
+
+        status = {"code": None}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+            await send(message)
+
+        tags: Dict[str, Any] = {}
+        token = _current_tags.set(tags)
+        profiler = Profiler(interval=self.interval, async_mode="enabled")
+        started_at = time.time()
+        profiler.start()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            session = profiler.stop()
+            _current_tags.reset(token)
+            self.stats["profiled"] += 1
+            meta = {"created_at": started_at, "method": scope["method"], "path": scope["path"],
+                    "status": status["code"], "duration_ms": round((time.time() - started_at) * 1000, 1),
+                    "trigger": trigger, "session_id": tags.get("session_id"), "thread_id": tags.get("thread_id"),
+                    "tags": tags}
+            try:
+                # Render e escrita fora do event loop
+                await asyncio.to_thread(self.store.save, session, meta)
+                self.stats["saved"] += 1
+            except Exception as e:
+                self.stats["errors"] += 1
+                print(f"Error saving request profile: {e}")
@@ -6,15 +6,45 @@ para que possam ser facilmente importadas pelo resto da aplicação.
 
 Exemplo em main.py:
 from services import OpenAIService
+
+Os módulos são importados sob demanda (PEP 562): `from services import X`
+só carrega o módulo de X, e não os clientes HTTP/dateutil dos demais;
+`services.<submódulo>` carrega o submódulo no primeiro acesso.
+Isso reduz o tempo de cold start da função serverless.
 """
 
-from .openai_service import OpenAIService
-from .pipefy_service import PipefyService
-from .calendar_service import CalendarService
+import importlib
+
+# Mapeia o nome exportado -> módulo (relativo a este pacote) que o define
+_LAZY_EXPORTS = {
+    "OpenAIService": ".openai_service",
+    "PipefyService": ".pipefy_service",
+    "CalendarService": ".calendar_service",
+}
+
+
+def __getattr__(name):
+    module_name = _LAZY_EXPORTS.get(name)
+    if module_name is None:
+        # Submódulos (`services.tenants`, ...) também carregam só no primeiro acesso
+        try:
+            return importlib.import_module(f".{name}", __name__)
+        except ModuleNotFoundError as e:
+            if e.name != f"{__name__}.{name}":
+                raise
+            raise AttributeError(f"module {__name__!r} has no attribute {name!r}") from None
+    value = getattr(importlib.import_module(module_name, __name__), name)
+    globals()[name] = value  # Próximos acessos não passam mais por aqui
+    return value
+
+
+def __dir__():
+    return sorted(list(globals().keys()) + list(_LAZY_EXPORTS.keys()))
+
 
 # Opcional: define o que é exportado quando se faz "from services import *"
 __all__ = [
     "OpenAIService",
     "PipefyService",
     "CalendarService"
-]
\ No newline at end of file
+]
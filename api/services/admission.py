@@ -0,0 +1,185 @@
+# backend/services/admission.py
+
+"""
+Controle de admissão (backpressure) para o /api/chat.
+
+Cada chat pode ocupar o worker por até ~180s esperando o run da OpenAI. Para
+que um pico de tráfego não acumule requisições sem limite:
+
+- token bucket por IP e por sessão (429 + Retry-After ao exceder);
+- limite de turnos simultâneos por empresa (services/tenants.py), contando
+  os que esperam na fila: estourado, recusa com 429 sem ocupar a fila global;
+- limite global de runs simultâneos neste processo;
+- fila de espera limitada: com a fila cheia, ou após esperar
+  `queue_timeout` segundos, a requisição é recusada com 503 + Retry-After;
+- prontidão: se `readiness()` indicar uma dependência obrigatória fora
+  (services/health_monitor.py), recusa com 503 antes de ocupar o worker.
+
+O estado é por processo (cada worker/réplica aplica seus próprios limites).
+"""
+
+import asyncio
+import math
+import time
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from typing import Any, Callable, Dict, Optional
+
+from .rate_limiter import TokenBucket
+
+
+class AdmissionRejected(Exception):
+    """Requisição recusada; `status_code` é 429 (rate limit) ou 503 (saturado)."""
+
+    def __init__(self, status_code: int, reason: str, retry_after: float):
+        super().__init__(reason)
+        self.status_code = status_code
+        self.reason = reason
+        self.retry_after = retry_after
+
+    @property
+    def retry_after_header(self) -> str:
+        return str(max(1, math.ceil(self.retry_after)))
+
+
+class AdmissionController:
+    def __init__(self, max_in_flight: int, max_queue: int, queue_timeout: float,
+                 rate_per_minute: float, burst: float, max_tracked_keys: int = 10000,
+                 readiness: Optional[Callable[[], Optional[str]]] = None,
+                 unready_retry_after: float = 15.0):
+        self.max_in_flight = max_in_flight
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.rate = rate_per_minute / 60.0
+        self.burst = burst
+        self.max_tracked_keys = max_tracked_keys
+        # Retorna o motivo para recusar (dependência obrigatória fora) ou None
+        self.readiness = readiness
+        self.unready_retry_after = unready_retry_after
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._buckets: "OrderedDict[str, TokenBucket]" = OrderedDict()
+        self.in_flight = 0
+        self.waiting = 0
+        # Turnos admitidos ou na fila por empresa (só as que têm limite)
+        self.tenant_in_flight: Dict[str, int] = {}
+        # Média móvel da duração de um chat, para estimar o Retry-After
+        self.avg_run_seconds = 10.0
+        self.counters = {"admitted": 0, "queued": 0, "rejected_rate_limited": 0,
+                         "rejected_queue_full": 0, "rejected_queue_timeout": 0, "rejected_unready": 0,
+                         "rejected_tenant_limit": 0, "max_queue_depth": 0}
+
+    @property
+    def semaphore(self) -> asyncio.Semaphore:
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_in_flight)
+        return self._semaphore
+
+    def _bucket(self, key: str) -> TokenBucket:
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = TokenBucket(rate=self.rate, capacity=self.burst)
+            self._buckets[key] = bucket
+            if len(self._buckets) > self.max_tracked_keys:
+                self._buckets.popitem(last=False)
+        else:
+            self._buckets.move_to_end(key)
+        return bucket
+
+    def _check_rate(self, *keys: str) -> None:
+        # Confere todos os buckets antes de consumir: uma recusa pela sessão não gasta o token do IP
+        buckets = [self._bucket(key) for key in keys]
+        retry_after = max((bucket.retry_after() for bucket in buckets), default=0.0)
+        if retry_after > 0:
+            self.counters["rejected_rate_limited"] += 1
+            raise AdmissionRejected(429, "Muitas mensagens em pouco tempo. Aguarde um instante.", retry_after)
+        for bucket in buckets:
+            bucket.try_acquire()
+
+    def _saturated_retry_after(self) -> float:
+        return self.avg_run_seconds * (self.waiting + 1) / self.max_in_flight
+
+    @asynccontextmanager
+    async def _tenant_slot(self, tenant: Optional[str], limit: int):
+        if not tenant or limit <= 0:
+            yield
+            return
+        count = self.tenant_in_flight.get(tenant, 0)
+        if count >= limit:
+            self.counters["rejected_tenant_limit"] += 1
+            raise AdmissionRejected(429, "Muitas conversas simultâneas no momento. Tente novamente em instantes.",
+                                    self.avg_run_seconds)
+        self.tenant_in_flight[tenant] = count + 1
+        try:
+            yield
+        finally:
+            remaining = self.tenant_in_flight[tenant] - 1
+            if remaining:
+                self.tenant_in_flight[tenant] = remaining
+            else:
+                del self.tenant_in_flight[tenant]
+
+    @asynccontextmanager
+    async def admit(self, client_ip: Optional[str], session_id: Optional[str],
+                    tenant: Optional[str] = None, tenant_limit: int = 0):
+        keys = []
+        if client_ip:
+            keys.append(f"ip:{client_ip}")
+        if session_id:
+            keys.append(f"session:{session_id}")
+        self._check_rate(*keys)
+        unready = self.readiness() if self.readiness is not None else None
+        if unready:
+            self.counters["rejected_unready"] += 1
+            raise AdmissionRejected(503, "Serviço temporariamente indisponível. Tente novamente em instantes.",
+                                    self.unready_retry_after)
+
+        async with self._tenant_slot(tenant, tenant_limit):
+            async with self._global_slot():
+                yield
+
+    @asynccontextmanager
+    async def _global_slot(self):
+        semaphore = self.semaphore
+        if semaphore.locked():
+            if self.waiting >= self.max_queue:
+                self.counters["rejected_queue_full"] += 1
+                raise AdmissionRejected(503, "Serviço sobrecarregado. Tente novamente em instantes.",
+                                        self._saturated_retry_after())
+            self.counters["queued"] += 1
+            self.waiting += 1
+            self.counters["max_queue_depth"] = max(self.counters["max_queue_depth"], self.waiting)
+            try:
+                # asyncio.timeout e não wait_for: no 3.11, um acquire concluído junto com o
+                # timeout era descartado pelo wait_for sem devolver a vaga ao semáforo
+                async with asyncio.timeout(self.queue_timeout):
+                    await semaphore.acquire()
+            except TimeoutError:
+                self.counters["rejected_queue_timeout"] += 1
+                raise AdmissionRejected(503, "Serviço sobrecarregado. Tente novamente em instantes.",
+                                        self._saturated_retry_after())
+            finally:
+                self.waiting -= 1
+        else:
+            await semaphore.acquire()
+
+        self.in_flight += 1
+        self.counters["admitted"] += 1
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            self.in_flight -= 1
+            semaphore.release()
+            self.avg_run_seconds = 0.8 * self.avg_run_seconds + 0.2 * (time.monotonic() - started)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "in_flight": self.in_flight,
+            "max_in_flight": self.max_in_flight,
+            "queue_depth": self.waiting,
+            "max_queue": self.max_queue,
+            "avg_run_seconds": round(self.avg_run_seconds, 3),
+            "tracked_clients": len(self._buckets),
+            "tenant_in_flight": dict(self.tenant_in_flight),
+            **self.counters,
+        }
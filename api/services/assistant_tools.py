@@ -0,0 +1,253 @@
+# backend/services/assistant_tools.py
+
+"""
+Ferramentas (function calling) do assistente SDR.
+
+Cada ferramenta é uma função assíncrona registrada com `@tool`. A assinatura
+da função é a fonte da verdade: o schema JSON enviado à OpenAI
+(`tool_schemas()`) é gerado a partir dos parâmetros anotados com
+`Annotated[tipo, "descrição"]`, e `run_tool()` despacha as chamadas do
+assistente para o handler correspondente.
+"""
+
+import inspect
+from dataclasses import dataclass
+from typing import Annotated, Any, Callable, Dict, List, Optional, Union, get_args, get_origin, get_type_hints
+
+from ..models import Lead
+from . import slot_hold_service, slot_store, tenants
+from .slot_store import temp_slot_mapping
+
+_JSON_TYPES = {str: "string", int: "integer", float: "number", bool: "boolean"}
+
+
+@dataclass
+class ToolContext:
+    """Contexto da conversa passado a todo handler (não faz parte do schema)."""
+    thread_id: str
+
+
+@dataclass
+class ToolDefinition:
+    name: str
+    description: str
+    handler: Callable
+
+
+TOOLS: Dict[str, ToolDefinition] = {}
+
+
+def tool(name: str, description: str):
+    """Registra um handler como ferramenta do assistente com o nome público `name`."""
+    def decorator(func):
+        TOOLS[name] = ToolDefinition(name=name, description=description, handler=func)
+        return func
+    return decorator
+
+
+def _json_type(annotation) -> str:
+    # Optional[X] -> X
+    if get_origin(annotation) is Union:
+        args = [arg for arg in get_args(annotation) if arg is not type(None)]
+        annotation = args[0]
+    if annotation not in _JSON_TYPES:
+        raise TypeError(f"Tipo de parâmetro sem mapeamento JSON: {annotation!r}")
+    return _JSON_TYPES[annotation]
+
+
+def tool_schema(definition: ToolDefinition) -> Dict[str, Any]:
+    """Gera o schema `{"type": "function", ...}` a partir da assinatura do handler."""
+    hints = get_type_hints(definition.handler, include_extras=True)
+    properties: Dict[str, Any] = {}
+    required: List[str] = []
+    for param in list(inspect.signature(definition.handler).parameters.values())[1:]:  # pula o ctx
+        annotation = hints[param.name]
+        description = None
+        if get_origin(annotation) is Annotated:
+            annotation, *extras = get_args(annotation)
+            description = next((extra for extra in extras if isinstance(extra, str)), None)
+        prop = {"type": _json_type(annotation)}
+        if description:
+            prop["description"] = description
+        properties[param.name] = prop
+        if param.default is inspect.Parameter.empty:
+            required.append(param.name)
+    return {
+        "type": "function",
+        "function": {
+            "name": definition.name,
+            "description": definition.description,
+            "parameters": {"type": "object", "properties": properties, "required": required},
+        },
+    }
+
+
+def tool_schemas() -> List[Dict[str, Any]]:
+    """Schemas de todas as ferramentas registradas, na ordem de registro."""
+    return [tool_schema(definition) for definition in TOOLS.values()]
+
+
+async def run_tool(name: str, arguments: Dict[str, Any], ctx: ToolContext) -> Any:
+    """Executa a ferramenta `name` com os argumentos enviados pelo assistente."""
+    definition = TOOLS.get(name)
+    if definition is None:
+        return {"error": f"Função {name} não reconhecida"}
+    accepted = set(inspect.signature(definition.handler).parameters) - {"ctx"}
+    kwargs = {k: v for k, v in arguments.items() if k in accepted}
+    return await definition.handler(ctx, **kwargs)
+
+
+# --- Ferramentas ---
+
+@tool(
+    "registrarLead",
+    "Registra ou ATUALIZA um lead no Pipefy. Chame após coletar dados iniciais e NOVAMENTE após agendar (se bem-sucedido) para adicionar detalhes da reunião.",
+)
+async def registrar_lead(
+    ctx: ToolContext,
+    nome: Annotated[str, "Nome completo do lead."],
+    email: Annotated[str, "E-mail do lead."],
+    interesse_confirmado: Annotated[bool, "Se o lead confirmou interesse em agendar."],
+    empresa: Annotated[Optional[str], "Empresa do lead."] = None,
+    necessidade: Annotated[Optional[str], "Necessidade principal."] = None,
+    meeting_link: Annotated[Optional[str], "O link da reunião retornado por `agendarReuniao`."] = None,
+    meeting_datetime: Annotated[Optional[str], "A string 'start_time_utc' (formato ISO 8601 UTC) retornada por `agendarReuniao`."] = None,
+):
+    # O assistente já deve enviar meeting_datetime em UTC ISO
+    lead_data = {
+        "name": nome,
+        "email": email,
+        "company": empresa,
+        "need": necessidade,
+        "interest_confirmed": interesse_confirmado if interesse_confirmado is not None else False,
+        "meeting_link": meeting_link,
+        "meeting_datetime": meeting_datetime # Esperado em UTC ISO
+    }
+    lead_data_clean = {k: v for k, v in lead_data.items() if v is not None}
+    lead = Lead(**lead_data_clean)
+    # Guarda os dados do lead: o atalho de agendamento (slot_matcher) agenda e atualiza o lead sem o modelo
+    slot_store.lead_contacts[ctx.thread_id] = {
+        k: v for k, v in {"nome": nome, "email": email, "interesse_confirmado": interesse_confirmado,
+                          "empresa": empresa, "necessidade": necessidade}.items() if v is not None
+    }
+    if lead.interest_confirmed and not lead.meeting_link:
+        # Próximo passo do fluxo é `oferecerHorarios`: busca a agenda em paralelo ao Pipefy
+        slot_store.start_slot_prefetch(ctx.thread_id)
+    # Instância da empresa da conversa (pool HTTP aquecido) ou uma temporária com a config do ambiente
+    async with tenants.pipefy_service() as pipefy_service:
+        output = await pipefy_service.create_or_update_lead(lead)
+    print(f"Lead registration result: {output}")
+    return output
+
+
+@tool(
+    "oferecerHorarios",
+    "Consulta a agenda e retorna uma lista de horários disponíveis formatados para exibição.",
+)
+async def oferecer_horarios(
+    ctx: ToolContext,
+    dias: Annotated[int, "Número de dias (padrão: 7)."] = 7,
+):
+    from .calendar_service import CalendarService
+    thread_id = ctx.thread_id
+    result = await slot_store.take_prefetched_slots(thread_id, dias)
+    if result is not None:
+        print(f"Using prefetched slots for thread {thread_id}")
+    else:
+        calendar_service = tenants.calendar_service()
+        # Busca candidatos extras para compensar slots reservados por outros leads
+        result = await calendar_service.get_available_slots(
+            days=dias, max_slots=slot_hold_service.candidate_count(CalendarService.MAX_SLOTS)
+        )
+
+    if result.get("success"):
+        # Reserva (hold) os horários oferecidos, pulando os já reservados por outros leads
+        slots_utc, slots_display = await slot_hold_service.hold_offered_slots(
+            thread_id, result["slots_utc"], result["slots_display"], limit=CalendarService.MAX_SLOTS
+        )
+        # Nova rodada de oferta: libera os holds de horários oferecidos antes e não repetidos
+        offered_keys = {slot_hold_service.hold_key(slot) for slot in slots_utc}
+        previous = [slot for slot in temp_slot_mapping.get(thread_id, {}).values()
+                    if slot_hold_service.hold_key(slot) not in offered_keys]
+        await slot_hold_service.release_slots(thread_id, previous)
+        if not slots_utc:
+            result = {"success": False, "error": "Todos os horários próximos acabaram de ser reservados. Tente um período maior (mais dias)."}
+
+    if result.get("success"):
+        # Guarda o mapeamento
+        temp_slot_mapping[thread_id] = {
+            display: utc for display, utc in zip(slots_display, slots_utc)
+        }
+        # Envia apenas os slots de exibição para o assistente
+        output = {"status": "success", "available_slots_display": slots_display}
+        print(f"Available slots (display): {slots_display}")
+    else:
+        output = {"status": "error", "message": result.get("error", "Erro ao buscar horários.")}
+        print(f"Error fetching slots: {output['message']}")
+
+    # Limpa mapeamento antigo se houver nova busca (para o mesmo thread)
+    if thread_id in temp_slot_mapping and not result.get("success"):
+        del temp_slot_mapping[thread_id]
+    return output
+
+
+@tool(
+    "agendarReuniao",
+    "Agenda a reunião após o lead escolher um horário da lista apresentada.",
+)
+async def agendar_reuniao(
+    ctx: ToolContext,
+    data_inicio_display: Annotated[str, "A string EXATA do horário escolhido pelo usuário da lista apresentada (ex: '28 de Outubro às 12:00')."],
+    email_lead: Annotated[str, "E-mail do lead."],
+    nome_lead: Annotated[str, "Nome do lead."],
+):
+    # O assistente envia a *string de exibição* escolhida pelo usuário
+    thread_id = ctx.thread_id
+    chosen_display_slot_start = data_inicio_display
+
+    if not chosen_display_slot_start:
+        return {"success": False, "error": "Parâmetro 'data_inicio_display' não fornecido pelo assistente."}
+    if thread_id not in temp_slot_mapping or chosen_display_slot_start not in temp_slot_mapping[thread_id]:
+        return {"success": False, "error": f"Horário escolhido ('{chosen_display_slot_start}') inválido ou não encontrado no mapeamento. Peça para o usuário escolher novamente da lista."}
+
+    # Encontra o slot UTC correspondente
+    slot_utc = temp_slot_mapping[thread_id][chosen_display_slot_start]
+    start_time_utc_iso = slot_utc["start_time"]
+    end_time_utc_iso = slot_utc["end_time"]
+
+    print(f"--- [DEBUG] Mapeado '{chosen_display_slot_start}' para UTC: {start_time_utc_iso} ---")
+
+    # Confirma o hold antes de ir ao Cal.com: se outro lead pegou o horário, falha rápido
+    if not await slot_hold_service.claim_slot(thread_id, slot_utc):
+        del temp_slot_mapping[thread_id][chosen_display_slot_start]
+        return {"success": False, "error": f"O horário '{chosen_display_slot_start}' acabou de ser reservado por outra pessoa. Peça para o usuário escolher outro horário da lista (ou chame `oferecerHorarios` novamente)."}
+
+    from .calendar_service import format_datetime_sao_paulo
+    calendar_service = tenants.calendar_service()
+    result = await calendar_service.schedule_meeting_from_assistant(
+        start_time_utc_iso, end_time_utc_iso, email_lead, nome_lead,
+        event_type_id=slot_utc.get("event_type_id") # Host dono do slot (modo multi-host)
+    )
+
+    if not result.get("success"):
+        print(f"Error scheduling meeting: {result.get('error')}")
+        return result # Retorna o erro
+
+    # Converte o resultado UTC para exibição
+    confirmed_start_utc = result.get("start_time_utc")
+    display_time_sao_paulo = format_datetime_sao_paulo(confirmed_start_utc) if confirmed_start_utc else "Horário não confirmado"
+
+    print(f"Meeting scheduled successfully. Display time: {display_time_sao_paulo}")
+    # Libera os holds (o horário agendado já consta como ocupado no Cal.com)
+    await slot_hold_service.release_slots(thread_id, list(temp_slot_mapping.get(thread_id, {}).values()))
+    # Limpa o mapeamento após agendamento bem-sucedido
+    if thread_id in temp_slot_mapping:
+        del temp_slot_mapping[thread_id]
+
+    # Envia o resultado formatado para o assistente
+    return {
+        "success": True,
+        "meeting_link": result.get("meeting_link"),
+        "start_time_display": display_time_sao_paulo, # Hora para exibir
+        "start_time_utc": confirmed_start_utc # Hora UTC para registrarLead
+    }
@@ -0,0 +1,194 @@
+# backend/services/availability_analytics.py
+
+"""
+Relatório de capacidade da agenda: slots livres e utilização por vendedor
+(host) por dia, para janelas de 30–90 dias.
+
+`get_available_slots` gera slots um a um (e para nos primeiros 5); aqui a
+agenda inteira de cada host é convertida em arrays NumPy de minutos desde a
+epoch e contada de uma vez:
+
+- a grade de slots de cada `dateRange` é montada com `np.repeat` + `arange`;
+- um slot está ocupado se algum `busy` começa antes do fim do slot e termina
+  depois do seu início. Com os busy ordenados pelo início e o máximo
+  acumulado dos fins, basta um `searchsorted` por slot;
+- os slots são agrupados por dia local (São Paulo) com `np.bincount`.
+
+As regras são as mesmas de `CalendarService._iter_free_slots` (slots de
+`event_duration_minutes` a partir do início de cada range, descartando os que
+já começaram); `scalar_host_report` usa esse gerador como referência.
+
+NumPy é importado sob demanda: só o relatório precisa dele.
+"""
+
+from datetime import date, datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from dateutil import tz
+from dateutil.parser import parse as parse_datetime
+
+MAX_DAYS = 90
+
+
+def _epoch_minutes(values: Sequence[str]) -> List[int]:
+    """Converte timestamps ISO 8601 (com offset ou 'Z') em minutos desde a epoch."""
+    minutes = []
+    for value in values:
+        try:
+            dt = datetime.fromisoformat(value)
+        except ValueError:
+            dt = parse_datetime(value)
+        if dt.tzinfo is None:
+            dt = dt.replace(tzinfo=timezone.utc)
+        minutes.append(int(dt.timestamp()) // 60)
+    return minutes
+
+
+def interval_arrays(data: Dict[str, Any]):
+    """(range_start, range_end, busy_start, busy_end) de um host, em minutos (int64)."""
+    import numpy as np
+
+    ranges = data.get("dateRanges", [])
+    busy = data.get("busy", [])
+    return (
+        np.array(_epoch_minutes([r["start"] for r in ranges]), dtype=np.int64),
+        np.array(_epoch_minutes([r["end"] for r in ranges]), dtype=np.int64),
+        np.array(_epoch_minutes([b["start"] for b in busy]), dtype=np.int64),
+        np.array(_epoch_minutes([b["end"] for b in busy]), dtype=np.int64),
+    )
+
+
+def slot_grid(range_start, range_end, duration: int):
+    """Inícios de todos os slots de `duration` minutos que cabem nos ranges."""
+    import numpy as np
+
+    counts = np.maximum((range_end - range_start) // duration, 0)
+    total = int(counts.sum())
+    if total == 0:
+        return np.empty(0, dtype=np.int64)
+    # Posição de cada slot dentro do seu range: 0, 1, 2, ... reiniciando a cada range
+    offsets = np.arange(total, dtype=np.int64) - np.repeat(np.cumsum(counts) - counts, counts)
+    return np.repeat(range_start, counts) + offsets * duration
+
+
+def busy_mask(slot_start, duration: int, busy_start, busy_end):
+    """True para os slots que se sobrepõem a algum intervalo ocupado."""
+    import numpy as np
+
+    if busy_start.size == 0 or slot_start.size == 0:
+        return np.zeros(slot_start.size, dtype=bool)
+    order = np.argsort(busy_start, kind="stable")
+    sorted_start = busy_start[order]
+    max_end = np.maximum.accumulate(busy_end[order])
+    # Último busy que começa antes do fim do slot; entre eles, o que termina mais tarde
+    idx = np.searchsorted(sorted_start, slot_start + duration, side="left") - 1
+    return (idx >= 0) & (max_end[np.maximum(idx, 0)] > slot_start)
+
+
+def host_day_counts(data: Dict[str, Any], duration: int, now_minute: int,
+                    first_day: date, days: int, utc_offset_minutes: int):
+    """(capacidade, livres) por dia local para um host, como arrays de tamanho `days`."""
+    import numpy as np
+
+    range_start, range_end, busy_start, busy_end = interval_arrays(data)
+    starts = slot_grid(range_start, range_end, duration)
+    starts = starts[starts >= now_minute]
+    free = ~busy_mask(starts, duration, busy_start, busy_end)
+
+    first_day_minute = int(datetime(first_day.year, first_day.month, first_day.day,
+                                    tzinfo=timezone.utc).timestamp()) // 60
+    day_index = (starts + utc_offset_minutes - first_day_minute) // 1440
+    in_window = (day_index >= 0) & (day_index < days)
+    day_index, free = day_index[in_window], free[in_window]
+    capacity = np.bincount(day_index, minlength=days)
+    free_count = np.bincount(day_index, weights=free, minlength=days).astype(np.int64)
+    return capacity, free_count
+
+
+def scalar_host_report(calendar, data: Dict[str, Any], now_utc: datetime,
+                       first_day: date, days: int) -> Tuple[List[int], List[int]]:
+    """Referência escalar (loop de `_iter_free_slots`), usada no benchmark e para conferência."""
+    duration = timedelta(minutes=calendar.event_duration_minutes)
+    local_tz = tz.gettz(calendar.user_timezone)
+    capacity, free = [0] * days, [0] * days
+
+    for start, _ in calendar._iter_free_slots(data, now_utc):
+        day = (start.astimezone(local_tz).date() - first_day).days
+        if 0 <= day < days:
+            free[day] += 1
+    for r in data.get("dateRanges", []):
+        current, range_end = parse_datetime(r["start"]), parse_datetime(r["end"])
+        while current + duration <= range_end:
+            if current >= now_utc:
+                day = (current.astimezone(local_tz).date() - first_day).days
+                if 0 <= day < days:
+                    capacity[day] += 1
+            current += duration
+    return capacity, free
+
+
+def _host_entry(username: str, first_day: date, capacity, free) -> Dict[str, Any]:
+    day_rows = []
+    for i, (cap, fr) in enumerate(zip(capacity.tolist(), free.tolist())):
+        day_rows.append({
+            "date": (first_day + timedelta(days=i)).isoformat(),
+            "capacity": cap,
+            "free": fr,
+            "booked": cap - fr,
+            "utilization": round(1 - fr / cap, 4) if cap else None,
+        })
+    total_capacity, total_free = int(capacity.sum()), int(free.sum())
+    return {
+        "username": username,
+        "days": day_rows,
+        "totals": {
+            "capacity": total_capacity,
+            "free": total_free,
+            "booked": total_capacity - total_free,
+            "utilization": round(1 - total_free / total_capacity, 4) if total_capacity else None,
+        },
+    }
+
+
+def compute_report(calendar, host_data: Sequence[Any], days: int,
+                   now_utc: Optional[datetime] = None) -> Dict[str, Any]:
+    """
+    Monta o relatório a partir das respostas de /availability (na ordem de
+    `calendar.hosts`; exceções viram entradas em `errors`).
+    """
+    now_utc = now_utc or datetime.now(timezone.utc)
+    local_tz = tz.gettz(calendar.user_timezone)
+    now_local = now_utc.astimezone(local_tz)
+    first_day = now_local.date()
+    # São Paulo não tem horário de verão desde 2019: um único offset vale para a janela
+    utc_offset_minutes = int(now_local.utcoffset().total_seconds()) // 60
+    now_minute = -(-int(now_utc.timestamp()) // 60)  # slots que já começaram não contam
+
+    hosts, errors = [], []
+    for (username, _), data in zip(calendar.hosts, host_data):
+        if isinstance(data, Exception):
+            errors.append({"username": username, "error": str(data)})
+            continue
+        capacity, free = host_day_counts(data, calendar.event_duration_minutes, now_minute,
+                                         first_day, days, utc_offset_minutes)
+        hosts.append(_host_entry(username, first_day, capacity, free))
+
+    return {
+        "generated_at": now_utc.isoformat(),
+        "timezone": calendar.user_timezone,
+        "days": days,
+        "slot_minutes": calendar.event_duration_minutes,
+        "hosts": hosts,
+        "errors": errors,
+    }
+
+
+async def build_availability_report(days: int = 30, calendar=None) -> Dict[str, Any]:
+    """Busca /availability de todos os hosts para `days` dias e devolve o relatório."""
+    if not 1 <= days <= MAX_DAYS:
+        raise ValueError(f"days deve estar entre 1 e {MAX_DAYS}")
+    if calendar is None:
+        from .tenants import calendar_service
+        calendar = calendar_service()
+    host_data = await calendar.fetch_availability(days)
+    return compute_report(calendar, host_data, days)
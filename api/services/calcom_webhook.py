@@ -0,0 +1,91 @@
+# backend/services/calcom_webhook.py
+
+"""
+Tratamento dos webhooks de booking do Cal.com (BOOKING_CREATED,
+BOOKING_RESCHEDULED, BOOKING_CANCELLED).
+
+O webhook é da empresa do host da requisição (services/tenants.py; cada
+empresa aponta o webhook do Cal.com para o próprio host) ou do ambiente.
+A cada evento a agenda mudou, então:
+- os prefetches de horários da empresa são descartados: os deste processo
+  na hora e os dos outros workers pela versão da agenda no Redis
+  (services/slot_store.py);
+- holds sobre o horário liberado (cancelado/remarcado) são removidos, para
+  que ele volte a ser oferecido imediatamente;
+- a atualização dos campos de reunião do lead no Pipefy é enfileirada
+  (services/lead_update_queue.py), com a empresa, para o pipe dela.
+
+A assinatura vem no header `X-Cal-Signature-256`: HMAC-SHA256 (hex) do corpo
+bruto com o secret configurado no webhook (CAL_COM_WEBHOOK_SECRET).
+"""
+
+import hashlib
+import hmac
+from typing import Any, Dict, Optional
+
+from . import slot_hold_service, slot_store
+from .lead_update_queue import enqueue_lead_update
+
+SIGNATURE_HEADER = "X-Cal-Signature-256"
+
+webhook_stats = {"received": 0, "invalid_signature": 0, "ignored": 0}
+
+
+def verify_signature(secret: Optional[str], body: bytes, signature: Optional[str]) -> bool:
+    if not secret or not signature:
+        return False
+    expected = hmac.new(secret.encode(), body, hashlib.sha256).hexdigest()
+    return hmac.compare_digest(expected, signature.strip().lower())
+
+
+def _meeting_link(payload: Dict[str, Any]) -> Optional[str]:
+    link = (payload.get("metadata") or {}).get("videoCallUrl") or payload.get("videoCallUrl")
+    if not link:
+        location = payload.get("location") or ""
+        if location.startswith("http"):
+            link = location
+    if not link and payload.get("uid"):
+        link = f"https://cal.com/booking/{payload['uid']}"
+    return link
+
+
+async def handle_booking_event(event: Dict[str, Any]) -> Dict[str, Any]:
+    """Aplica um evento de booking já autenticado. Retorna um resumo do que foi feito."""
+    webhook_stats["received"] += 1
+    trigger = event.get("triggerEvent", "")
+    payload = event.get("payload") or {}
+    if trigger not in ("BOOKING_CREATED", "BOOKING_RESCHEDULED", "BOOKING_CANCELLED"):
+        webhook_stats["ignored"] += 1
+        return {"status": "ignored", "trigger": trigger}
+    webhook_stats[trigger.lower()] = webhook_stats.get(trigger.lower(), 0) + 1
+
+    invalidated = slot_store.invalidate_prefetches()
+    await slot_store.bump_availability_version()
+
+    # Horários que voltaram a ficar livres
+    event_type_id = payload.get("eventTypeId")
+    freed = []
+    if trigger == "BOOKING_CANCELLED" and payload.get("startTime"):
+        freed.append({"event_type_id": event_type_id, "start_time": payload["startTime"]})
+    if trigger == "BOOKING_RESCHEDULED" and payload.get("rescheduleStartTime"):
+        freed.append({"event_type_id": event_type_id, "start_time": payload["rescheduleStartTime"]})
+    released = await slot_hold_service.force_release(freed)
+
+    attendees = payload.get("attendees") or []
+    email = (attendees[0].get("email") or "").strip().lower() if attendees else ""
+    queued = False
+    if email:
+        if trigger == "BOOKING_CANCELLED":
+            await enqueue_lead_update(email, None, None, reason=trigger)
+        else:
+            await enqueue_lead_update(email, payload.get("startTime"), _meeting_link(payload), reason=trigger)
+        queued = True
+
+    print(f"Cal.com {trigger} for {email or 'unknown attendee'}: "
+          f"{invalidated} prefetches invalidated, {released} holds released")
+    return {"status": "processed", "trigger": trigger, "prefetches_invalidated": invalidated,
+            "holds_released": released, "pipefy_update_queued": queued}
+
+
+def stats() -> Dict[str, int]:
+    return dict(webhook_stats)
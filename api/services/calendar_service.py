@@ -1,171 +1,296 @@
 # backend/services/calendar_service.py
 
-import os
 import asyncio
+import heapq
+import itertools
 import httpx
 import json
+from contextlib import asynccontextmanager
 from datetime import datetime, timedelta, timezone
-from typing import List, Dict, Any, Tuple
+from typing import List, Dict, Any, Iterator, Optional, Tuple
 from dateutil.parser import parse as parse_datetime
 from dateutil import tz
-import locale
+
+from ..config import current_settings
+from . import traffic_recorder
+from .request_context import deadline_timeout
+
+# Meses em pt-BR: tabela fixa em vez de locale.setlocale, que altera o estado
+# global do processo (corrida entre requisições) e depende do locale instalado
+MONTHS_PT = ("Janeiro", "Fevereiro", "Março", "Abril", "Maio", "Junho", "Julho", "Agosto",
+             "Setembro", "Outubro", "Novembro", "Dezembro")
 
 
-# --- FUNÇÃO HELPER ATUALIZADA ---
 def format_datetime_sao_paulo(dt_utc_iso: str) -> str:
     """Converte uma string ISO 8601 UTC para um formato legível em São Paulo (pt-BR)."""
-    original_locale = None # Variável para guardar o locale original
     try:
-        # Tenta definir o locale para pt_BR.UTF-8 para formatar o mês
-        # Guarda o locale original para restaurá-lo depois
-        try:
-            original_locale = locale.getlocale(locale.LC_TIME) # Tenta pegar o atual (mais seguro)
-            locale.setlocale(locale.LC_TIME, 'pt_BR.UTF-8')
-        except locale.Error:
-            print("Aviso: Locale 'pt_BR.UTF-8' não encontrado ou não suportado. O mês pode aparecer em inglês.")
-            original_locale = None # Reseta se falhar
-
         dt_utc = parse_datetime(dt_utc_iso)
-        sao_paulo_tz = tz.gettz("America/Sao_Paulo")
-        dt_sao_paulo = dt_utc.astimezone(sao_paulo_tz)
+        dt_sao_paulo = dt_utc.astimezone(tz.gettz("America/Sao_Paulo"))
         # Formato: "Dia de Mês(pt-BR) às HH:MM" (ex: "28 de Outubro às 12:00")
-        formatted_string = dt_sao_paulo.strftime("%d de %B às %H:%M")
-        return formatted_string
-
+        return f"{dt_sao_paulo.day:02d} de {MONTHS_PT[dt_sao_paulo.month - 1]} às {dt_sao_paulo:%H:%M}"
     except Exception as e:
         print(f"Erro ao formatar data {dt_utc_iso}: {e}")
         return dt_utc_iso # Retorna original em caso de erro
-    finally:
-        # Garante que o locale original seja restaurado
-        if original_locale:
-            try:
-                locale.setlocale(locale.LC_TIME, original_locale)
-            except locale.Error:
-                pass # Ignora se não conseguir restaurar
-# --- FIM DA FUNÇÃO ATUALIZADA ---
+
+def parse_hosts(hosts_spec: str, default_event_type_id: Optional[int]) -> List[Tuple[str, int]]:
+    """
+    Converte CAL_COM_HOSTS ("usuario1:123,usuario2:456") em
+    [(username, event_type_id), ...]. Sem ":id", usa o CAL_COM_EVENT_TYPE_ID,
+    mas só com um único host: o booking é feito pelo `eventTypeId` (e o hold
+    do slot é por event type), então cada host precisa do seu próprio event
+    type para que o horário seja marcado com quem foi escolhido.
+    """
+    items = [item.strip() for item in (hosts_spec or "").split(",") if item.strip()]
+    hosts = []
+    for item in items:
+        username, _, event_type = item.partition(":")
+        if event_type.strip():
+            event_type_id = int(event_type)
+        elif len(items) > 1:
+            raise ValueError(f"CAL_COM_HOSTS: host '{username}' sem event type; com vários hosts, cada um precisa do seu (usuario:id)")
+        else:
+            event_type_id = default_event_type_id
+        if not event_type_id:
+            raise ValueError(f"CAL_COM_HOSTS: host '{username}' sem event type (e sem CAL_COM_EVENT_TYPE_ID)")
+        hosts.append((username.strip(), event_type_id))
+    event_type_ids = [event_type_id for _, event_type_id in hosts]
+    if len(set(event_type_ids)) != len(event_type_ids):
+        raise ValueError("CAL_COM_HOSTS: hosts diferentes com o mesmo event type; o booking não saberia qual host usar")
+    return hosts
+
+
+# Contador do round-robin entre hosts (compartilhado pelas instâncias do processo)
+_round_robin_counter = itertools.count()
+
 
 class CalendarService:
-    def __init__(self):
+    MAX_SLOTS = 5
+
+    def __init__(self, client: Optional[httpx.AsyncClient] = None):
         """
         Inicializa o serviço de calendário com as credenciais do Cal.com
         (Removida a dependência do CAL_COM_USER_ID)
+
+        Com CAL_COM_HOSTS definido, opera em modo de agregação: busca a agenda
+        de todos os vendedores em paralelo e oferece os horários mais cedo.
+
+        `client` é um httpx.AsyncClient compartilhado entre as chamadas (pool
+        aquecido, ex: instâncias por empresa); sem ele, cada chamada abre o seu.
         """
-        self.api_key = os.getenv("CAL_COM_API_KEY")
-        self.username = os.getenv("CAL_COM_USERNAME")
+        self.client = client
+        settings = current_settings()
+        self.api_key = settings.cal_com_api_key
+        self.username = settings.cal_com_username
         self.api_url = "https://api.cal.com/v1"
         self.user_timezone = "America/Sao_Paulo" # Mantemos para a API
 
-        event_type_id_str = os.getenv("CAL_COM_EVENT_TYPE_ID")
-        duration_str = os.getenv("CAL_COM_EVENT_DURATION_MINUTES", "30")
+        # Os valores numéricos já chegam convertidos/validados por `config.Settings`
+        self.event_type_id = settings.cal_com_event_type_id
+        self.event_duration_minutes = settings.cal_com_event_duration_minutes
 
-        if not all([self.api_key, event_type_id_str, self.username]):
-            raise ValueError("CAL_COM_API_KEY, CAL_COM_EVENT_TYPE_ID, e CAL_COM_USERNAME devem ser definidos no .env")
+        # Hosts (vendedores) consultados: CAL_COM_HOSTS ou o usuário único
+        self.hosts = parse_hosts(settings.cal_com_hosts, self.event_type_id)
+        self.host_selection = settings.cal_com_host_selection
+        self.max_concurrency = settings.cal_com_max_concurrency
 
-        try:
-            self.event_type_id = int(event_type_id_str)
-            self.event_duration_minutes = int(duration_str)
-        except (ValueError, TypeError):
-            raise ValueError("CAL_COM_EVENT_TYPE_ID e CAL_COM_EVENT_DURATION_MINUTES devem ser números válidos no .env")
+        if not self.hosts:
+            if not all([self.api_key, self.event_type_id, self.username]):
+                raise ValueError("CAL_COM_API_KEY, CAL_COM_EVENT_TYPE_ID, e CAL_COM_USERNAME devem ser definidos no .env")
+            self.hosts = [(self.username, self.event_type_id)]
+        elif not self.api_key:
+            raise ValueError("CAL_COM_API_KEY deve ser definido no .env")
 
-    async def get_available_slots(self, days: int = 7) -> Dict[str, Any]:
-        """
-        Busca horários disponíveis (UTC) e retorna ambos os formatos:
-        {
-            "success": True,
-            "slots_utc": [{"start_time": "ISO_UTC", "end_time": "ISO_UTC"}, ...],
-            "slots_display": ["Legível SP 1", "Legível SP 2", ...]
+    @asynccontextmanager
+    async def _http(self):
+        """Client HTTP da chamada: o compartilhado, se houver, ou um novo (fechado ao fim)."""
+        if self.client is not None:
+            yield self.client
+            return
+        async with httpx.AsyncClient(transport=traffic_recorder.transport_for("calcom", is_async=True)) as client:
+            yield client
+
+    async def close(self):
+        """Fecha o client compartilhado, se houver."""
+        if self.client is not None:
+            await self.client.aclose()
+
+    async def _fetch_host_availability(self, client: httpx.AsyncClient, semaphore: asyncio.Semaphore,
+                                       username: str, event_type_id: int,
+                                       start_date: str, end_date: str) -> Dict[str, Any]:
+        """Busca o JSON de /availability de um host (limitado pelo semáforo)."""
+        params = {
+            "username": username,
+            "eventTypeId": event_type_id,
+            "dateFrom": start_date,
+            "dateTo": end_date,
+            "apiKey": self.api_key,
+            "timezone": self.user_timezone
         }
-        ou {"success": False, "error": "..."}
+        print(f"--- [DEBUG] Parâmetros da API Availability ({username}): {params} ---")
+        async with semaphore:
+            response = await client.get(f"{self.api_url}/availability", params=params,
+                                        timeout=deadline_timeout(5.0))
+        print(f"--- [DEBUG] Resposta da API Availability ({username}) Status: {response.status_code} ---")
+        response.raise_for_status()
+        print(f"--- [DEBUG] Texto Bruto da Resposta Availability: {response.text[:200]}... ---")
+        return response.json()
+
+    async def fetch_availability(self, days: int = 7) -> List[Any]:
+        """
+        Busca /availability de todos os hosts concorrentemente (no máximo
+        `max_concurrency` requisições simultâneas, num único client HTTP).
+        Retorna, na ordem de `self.hosts`, o JSON de cada host ou a exceção.
         """
-        print("--- [DEBUG] Iniciando get_available_slots ---")
         sao_paulo_tz = tz.gettz(self.user_timezone)
         now_in_tz = datetime.now(tz=sao_paulo_tz)
         start_date = now_in_tz.isoformat()
         end_date = (now_in_tz + timedelta(days=days)).isoformat()
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        async with self._http() as client:
+            return await asyncio.gather(
+                *[
+                    self._fetch_host_availability(client, semaphore, username, event_type_id, start_date, end_date)
+                    for username, event_type_id in self.hosts
+                ],
+                return_exceptions=True,
+            )
 
-        params = {
-            "username": self.username,
-            "eventTypeId": self.event_type_id,
-            "dateFrom": start_date,
-            "dateTo": end_date,
-            "apiKey": self.api_key,
-            "timezone": self.user_timezone
+    def _iter_free_slots(self, data: Dict[str, Any], now_utc: datetime) -> Iterator[Tuple[datetime, datetime]]:
+        """Gera, em ordem cronológica, os slots livres de um host."""
+        duration = timedelta(minutes=self.event_duration_minutes)
+        busy_times = []
+        for busy in data.get("busy", []):
+            busy_times.append((parse_datetime(busy["start"]), parse_datetime(busy["end"])))
+
+        date_ranges = sorted(
+            ((parse_datetime(r["start"]), parse_datetime(r["end"])) for r in data.get("dateRanges", [])),
+            key=lambda r: r[0],
+        )
+        for current_slot_start, range_end in date_ranges:
+            while current_slot_start + duration <= range_end:
+                slot_end = current_slot_start + duration
+                if current_slot_start < now_utc:
+                    current_slot_start += duration
+                    continue
+                is_busy = False
+                for busy_start, busy_end in busy_times:
+                    if current_slot_start < busy_end and slot_end > busy_start:
+                        is_busy = True
+                        break
+                if not is_busy:
+                    yield current_slot_start, slot_end
+                current_slot_start += duration
+
+    def _tagged_slots(self, idx: int, data: Dict[str, Any], now_utc: datetime) -> Iterator[Tuple[datetime, datetime, int]]:
+        """Slots livres do host `idx` no formato (início, fim, idx) usado pelo merge."""
+        for start, end in self._iter_free_slots(data, now_utc):
+            yield start, end, idx
+
+    def _pick_host(self, candidates: List[int], loads: Dict[int, int], position: int) -> int:
+        """Escolhe, entre os hosts livres num mesmo horário, quem recebe o slot."""
+        if len(candidates) == 1:
+            return candidates[0]
+        if self.host_selection == "lowest_load":
+            return min(candidates, key=lambda idx: (loads[idx], idx))
+        if self.host_selection == "round_robin":
+            return candidates[position % len(candidates)]
+        return candidates[0]  # "first": ordem de CAL_COM_HOSTS
+
+    @staticmethod
+    def _availability_error(error: Exception) -> str:
+        if isinstance(error, httpx.HTTPStatusError):
+            print(f"--- [DEBUG] FALHA DE API Availability (Cal.com): {error.response.status_code} - {error.response.text} ---")
+            return f"Erro na API Cal.com (Availability): {error.response.text}"
+        if isinstance(error, httpx.RequestError):
+            print(f"--- [DEBUG] FALHA DE REDE Availability (httpx): Erro: {error} ---")
+            return f"Erro de rede ao buscar horários: {error}"
+        if isinstance(error, json.JSONDecodeError):
+            print(f"--- [DEBUG] FALHA Availability: Resposta não é um JSON válido. Erro: {error} ---")
+            return "Resposta inválida da API Cal.com"
+        print(f"--- [DEBUG] FALHA INESPERADA Availability (Python): Erro: {error} ---")
+        return f"Erro interno ao processar horários: {error}"
+
+    async def get_available_slots(self, days: int = 7, max_slots: Optional[int] = None) -> Dict[str, Any]:
+        """
+        Busca horários disponíveis (UTC) e retorna ambos os formatos:
+        {
+            "success": True,
+            "slots_utc": [{"start_time": "ISO_UTC", "end_time": "ISO_UTC",
+                           "username": "host", "event_type_id": 123}, ...],
+            "slots_display": ["Legível SP 1", "Legível SP 2", ...]
         }
-        print(f"--- [DEBUG] Parâmetros da API Availability: {params} ---")
+        ou {"success": False, "error": "..."}
 
+        Com vários hosts, os slots de cada um (já ordenados) são combinados com
+        um merge k-way (heap) e cada horário é atribuído a um único host, de
+        acordo com CAL_COM_HOST_SELECTION (round_robin, lowest_load ou first).
+        `max_slots` (padrão: MAX_SLOTS) limita quantos horários são retornados.
+        """
+        print("--- [DEBUG] Iniciando get_available_slots ---")
+        max_slots = max_slots or self.MAX_SLOTS
         try:
-            async with httpx.AsyncClient() as client:
-                response = await client.get(f"{self.api_url}/availability", params=params)
-                print(f"--- [DEBUG] Resposta da API Availability Status: {response.status_code} ---")
-                response.raise_for_status()
+            responses = await self.fetch_availability(days)
 
-            print(f"--- [DEBUG] Texto Bruto da Resposta Availability: {response.text[:200]}... ---")
-            try:
-                data = response.json()
-            except json.JSONDecodeError as e:
-                print(f"--- [DEBUG] FALHA Availability: Resposta não é um JSON válido. Erro: {e} ---")
-                return {"success": False, "error": "Resposta inválida da API Cal.com"}
+            host_data = {}
+            errors = []
+            for idx, response in enumerate(responses):
+                if isinstance(response, Exception):
+                    errors.append(self._availability_error(response))
+                else:
+                    host_data[idx] = response
+            if not host_data:
+                return {"success": False, "error": errors[0] if errors else "Nenhum host configurado"}
+
+            print(f"--- [DEBUG] JSON Availability parseado ({len(host_data)}/{len(self.hosts)} hosts). Analisando slots... ---")
+            now_utc = datetime.now(timezone.utc)
+            # Carga = compromissos já marcados na janela (para "lowest_load")
+            loads = {idx: len(data.get("busy", [])) for idx, data in host_data.items()}
+            streams = [self._tagged_slots(idx, data, now_utc) for idx, data in host_data.items()]
 
-            print("--- [DEBUG] JSON Availability parseado. Analisando slots... ---")
             slots_utc = []
             slots_display = []
-            duration = timedelta(minutes=self.event_duration_minutes)
-            now_utc = datetime.now(timezone.utc)
-            busy_times = []
-            for busy in data.get("busy", []):
-                busy_times.append((parse_datetime(busy["start"]), parse_datetime(busy["end"])))
-
-            for date_range in data.get("dateRanges", []):
-                current_slot_start = parse_datetime(date_range["start"])
-                range_end = parse_datetime(date_range["end"])
-
-                while current_slot_start + duration <= range_end:
-                    slot_end = current_slot_start + duration
-                    if current_slot_start < now_utc:
-                        current_slot_start += duration
-                        continue
-                    is_busy = False
-                    for busy_start, busy_end in busy_times:
-                        if current_slot_start < busy_end and slot_end > busy_start:
-                            is_busy = True
-                            break
-                    if not is_busy:
-                        start_iso = current_slot_start.isoformat()
-                        end_iso = slot_end.isoformat()
-                        slots_utc.append({"start_time": start_iso, "end_time": end_iso})
-                        # Gera a string de exibição convertida
-                        slots_display.append(format_datetime_sao_paulo(start_iso))
-
-                        if len(slots_utc) >= 5: break # Limita a 5
-                    current_slot_start += duration
-                if len(slots_utc) >= 5: break
+            rotation = next(_round_robin_counter)
+            merged = heapq.merge(*streams)
+            for start, group in itertools.groupby(merged, key=lambda item: item[0]):
+                group = list(group)
+                chosen = self._pick_host([idx for _, _, idx in group], loads, rotation + len(slots_utc))
+                slot_end = next(end for _, end, idx in group if idx == chosen)
+                username, event_type_id = self.hosts[chosen]
+                start_iso = start.isoformat()
+                slots_utc.append({
+                    "start_time": start_iso,
+                    "end_time": slot_end.isoformat(),
+                    "username": username,
+                    "event_type_id": event_type_id,
+                })
+                # Gera a string de exibição convertida
+                slots_display.append(format_datetime_sao_paulo(start_iso))
+                loads[chosen] += 1
+                if len(slots_utc) >= max_slots: break # Limita a 5 (padrão)
 
             print(f"--- [DEBUG] Slots encontrados: {len(slots_utc)} ---")
             # Retorna ambos os formatos
             return {"success": True, "slots_utc": slots_utc, "slots_display": slots_display}
 
-        except httpx.RequestError as e:
-            print(f"--- [DEBUG] FALHA DE REDE Availability (httpx): Erro: {e} ---")
-            return {"success": False, "error": f"Erro de rede ao buscar horários: {e}"}
-        except httpx.HTTPStatusError as e:
-            print(f"--- [DEBUG] FALHA DE API Availability (Cal.com): {e.response.status_code} - {e.response.text} ---")
-            return {"success": False, "error": f"Erro na API Cal.com (Availability): {e.response.text}"}
         except Exception as e:
-            print(f"--- [DEBUG] FALHA INESPERADA Availability (Python): Erro: {e} ---")
             import traceback
             traceback.print_exc()
-            return {"success": False, "error": f"Erro interno ao processar horários: {e}"}
+            return {"success": False, "error": self._availability_error(e)}
 
-    async def schedule_meeting_from_assistant(self, start_time_utc_iso: str, end_time_utc_iso: str, lead_email: str, lead_name: str) -> Dict[str, Any]:
+    async def schedule_meeting_from_assistant(self, start_time_utc_iso: str, end_time_utc_iso: str, lead_email: str, lead_name: str,
+                                              event_type_id: Optional[int] = None) -> Dict[str, Any]:
         """
         Agenda (cria um "booking") via API do Cal.com usando os horários UTC ISO.
         Retorna sucesso/falha, link e horários confirmados (em UTC ISO).
         (Removida a lógica de esperar e buscar - não é mais necessária)
+
+        `event_type_id` identifica o host dono do slot (modo multi-host);
+        se omitido, usa o event type padrão.
         """
         print("--- [DEBUG] Iniciando schedule_meeting_from_assistant ---")
         try:
             payload = {
-                "eventTypeId": self.event_type_id,
+                "eventTypeId": event_type_id or self.event_type_id or self.hosts[0][1],
                 "start": start_time_utc_iso,
                 "end": end_time_utc_iso,
                 "responses": {"email": lead_email, "name": lead_name},
@@ -177,17 +302,18 @@ class CalendarService:
             }
             params = {"apiKey": self.api_key}
 
-            print(f"--- [DEBUG] Payload da API Booking: {json.dumps(payload, indent=2)} ---")
+            print(f"--- [DEBUG] Payload da API Booking: {json.dumps(payload)} ---")
             print(f"--- [DEBUG] Parâmetros da API Booking: {params} ---")
 
-            async with httpx.AsyncClient() as client:
-                post_response = await client.post(f"{self.api_url}/bookings", json=payload, params=params)
+            async with self._http() as client:
+                post_response = await client.post(f"{self.api_url}/bookings", json=payload, params=params,
+                                                  timeout=deadline_timeout(5.0))
                 print(f"--- [DEBUG] Resposta POST do Booking Status: {post_response.status_code} ---")
                 post_response.raise_for_status()
 
             try:
                 data = post_response.json()
-                print(f"--- [DEBUG] Resposta JSON BRUTA do POST Booking: {json.dumps(data, indent=2)} ---")
+                print(f"--- [DEBUG] Resposta do POST Booking: id={data.get('id')} uid={data.get('uid')} ---")
                 booking_id = data.get("id")
                 booking_uid = data.get("uid")
                 if not booking_id:
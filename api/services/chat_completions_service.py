@@ -0,0 +1,425 @@
+# backend/services/chat_completions_service.py
+
+"""
+Motor de chat alternativo, sem threads/runs da API Assistants.
+
+Cada turno pela API Assistants custa no mínimo quatro chamadas sequenciais
+(`messages.create`, `runs.create`, polls de `runs.retrieve`, `messages.list`),
+mais outras a cada passo de ferramenta. Aqui o transcript da conversa fica
+no Redis (lista JSON por "thread") e cada passo é uma única chamada de
+streaming a `chat.completions`, com as mesmas instruções de
+`assistant_spec.py` e os mesmos schemas/handlers de `assistant_tools.py`; o
+loop de ferramentas roda no processo.
+
+A interface é a do `OpenAIService` (`create_thread`, `get_assistant_response`,
+`get_history`, `cleanup_thread`), então a API escolhe o motor por
+configuração (CHAT_ENGINE=completions). `stream_turn` expõe os eventos do
+turno (tokens, início/fim de ferramenta) para quem quiser transmiti-los.
+
+Sem Redis configurado (ou com o Redis fora do ar), o transcript fica em
+memória no processo, como fallback de desenvolvimento.
+"""
+
+import asyncio
+import json
+import time
+import uuid
+from dataclasses import dataclass, field
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+from ..config import current_settings
+from ..assistant_spec import ASSISTANT_INSTRUCTIONS, ASSISTANT_MODEL, spec_hash
+from .assistant_tools import ToolContext, run_tool, tool_schemas
+from . import slot_hold_service, slot_matcher, slot_store, traffic_recorder
+from .redis_service import get_redis
+from .model_router import ModelRouter, session_flags
+from .request_context import deadline_timeout, remaining
+from .response_cache import ResponseCache
+from .slot_store import temp_slot_mapping
+from .usage_service import SUMMARY_PROMPT, TokenBudgetPolicy, UsageTracker
+
+TRANSCRIPT_KEY_PREFIX = "chat:transcript:"
+TRANSCRIPT_TTL_SECONDS = 86400  # Mesmo TTL da sessão no Redis
+THREAD_ID_PREFIX = "cc_"
+# Histórico enviado ao modelo quando o orçamento de tokens não manda truncar
+MAX_TRANSCRIPT_MESSAGES = 200
+
+engine_stats = {"turns": 0, "api_calls": 0, "tool_calls": 0, "transcript_fallbacks": 0}
+
+
+class TranscriptStore:
+    """Transcript (mensagens no formato da API de chat) por thread, numa lista do Redis."""
+
+    def __init__(self, redis_factory, ttl_seconds: int = TRANSCRIPT_TTL_SECONDS):
+        self._redis_factory = redis_factory
+        self.ttl_seconds = ttl_seconds
+        self._local: Dict[str, List[Dict[str, Any]]] = {}
+
+    @staticmethod
+    def _key(thread_id: str) -> str:
+        return f"{TRANSCRIPT_KEY_PREFIX}{thread_id}"
+
+    def _fallback(self, action: str, thread_id: str, error: Exception) -> None:
+        engine_stats["transcript_fallbacks"] += 1
+        print(f"Transcript {action} for {thread_id} using local store (Redis unavailable: {error})")
+
+    async def load(self, thread_id: str, last: int = MAX_TRANSCRIPT_MESSAGES) -> List[Dict[str, Any]]:
+        try:
+            raw = await self._redis_factory().lrange(self._key(thread_id), -last, -1)
+            messages = [json.loads(item) for item in raw]
+        except Exception as e:
+            self._fallback("load", thread_id, e)
+            messages = self._local.get(thread_id, [])[-last:]
+        # O corte não pode começar no meio de um passo de ferramenta (tool sem o tool_call)
+        while messages and messages[0]["role"] != "user":
+            messages.pop(0)
+        return messages
+
+    async def append(self, thread_id: str, messages: List[Dict[str, Any]]) -> None:
+        if not messages:
+            return
+        try:
+            pipe = self._redis_factory().pipeline(transaction=False)
+            pipe.rpush(self._key(thread_id), *[json.dumps(m, ensure_ascii=False) for m in messages])
+            pipe.expire(self._key(thread_id), self.ttl_seconds)
+            await pipe.execute()
+        except Exception as e:
+            self._fallback("append", thread_id, e)
+            self._local.setdefault(thread_id, []).extend(messages)
+
+    async def delete(self, thread_id: str) -> None:
+        self._local.pop(thread_id, None)
+        try:
+            await self._redis_factory().delete(self._key(thread_id))
+        except Exception as e:
+            print(f"Error deleting transcript {thread_id}: {e}")
+
+
+@dataclass
+class _Usage:
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    total_tokens: int = 0
+
+
+@dataclass
+class _TurnRun:
+    """Resumo do turno no formato que `UsageTracker.record_run` espera de um run."""
+    id: str
+    status: str = "completed"
+    usage: _Usage = field(default_factory=_Usage)
+
+
+class ChatCompletionsService:
+    MAX_TOOL_ROUNDS = 8
+    # `create_thread` só gera um id (sem chamada de rede)
+    local_threads = True
+
+    def __init__(self):
+        settings = current_settings()
+        self.api_key = settings.openai_api_key
+        self.model = settings.chat_completions_model or ASSISTANT_MODEL
+        self.instructions = ASSISTANT_INSTRUCTIONS
+        self.tools = tool_schemas()
+        self.instructions_version = settings.openai_instructions_version or spec_hash()
+        self._client = None
+
+        self.budget_policy = TokenBudgetPolicy(settings)
+        self.usage_tracker = UsageTracker(get_redis)
+        self.model_router = ModelRouter(settings.model_routing_rules, self.model)
+        self.transcripts = TranscriptStore(get_redis)
+
+        self.response_cache = None
+        if settings.response_cache_enabled:
+            self.response_cache = ResponseCache(
+                ttl_seconds=settings.response_cache_ttl_seconds,
+                max_entries=settings.response_cache_max_entries,
+            )
+
+    @property
+    def client(self):
+        """Cliente OpenAI assíncrono, criado (e o SDK importado) apenas no primeiro uso."""
+        if self._client is None:
+            from openai import AsyncOpenAI, DefaultAsyncHttpxClient
+            transport = traffic_recorder.transport_for("openai", is_async=True)
+            http_client = DefaultAsyncHttpxClient(transport=transport) if transport else None
+            self._client = AsyncOpenAI(api_key=self.api_key, http_client=http_client)
+        return self._client
+
+    @property
+    def _api(self):
+        """Cliente para chamadas do fluxo da requisição: timeout limitado pelo prazo restante."""
+        if remaining() is None:
+            return self.client
+        return self.client.with_options(timeout=deadline_timeout(60.0))
+
+    async def create_thread(self) -> str:
+        """Cria um id de conversa local (nenhuma chamada à OpenAI)."""
+        thread_id = f"{THREAD_ID_PREFIX}{uuid.uuid4().hex}"
+        print(f"Thread created: {thread_id}")
+        return thread_id
+
+    async def _summarize(self, history: List[Dict[str, Any]]) -> str:
+        transcript = "\n".join(f"{m['role']}: {m['content']}" for m in history
+                               if m["role"] in ("user", "assistant") and m.get("content"))
+        completion = await self._api.chat.completions.create(
+            model=self.budget_policy.summary_model,
+            messages=[{"role": "system", "content": SUMMARY_PROMPT}, {"role": "user", "content": transcript}],
+            max_tokens=400,
+        )
+        engine_stats["api_calls"] += 1
+        return completion.choices[0].message.content or ""
+
+    async def _build_context(self, thread_id: str, usage_key: str):
+        """
+        Mensagens de sistema + histórico, aplicando a mesma política de
+        orçamento do motor Assistants. Retorna (mensagens, truncado, estado de uso).
+        """
+        state = await self.usage_tracker.get_state(usage_key)
+        trimmed = self.budget_policy.should_trim(state)
+        history = await self.transcripts.load(thread_id)
+        if self.budget_policy.should_summarize(state):
+            try:
+                summary = await self._summarize(history)
+                if summary:
+                    await self.usage_tracker.save_summary(usage_key, summary, int(state.get("runs", 0)))
+                    state["summary"] = summary
+                    print(f"Conversation summary updated for {usage_key}")
+            except Exception as e:
+                print(f"Error summarizing transcript {thread_id}: {e}")
+        system = [{"role": "system", "content": self.instructions}]
+        if trimmed:
+            history = history[-self.budget_policy.truncation_last_messages:]
+            while history and history[0]["role"] != "user":
+                history.pop(0)
+            if state.get("summary"):
+                system.append({"role": "system",
+                               "content": f"Resumo da conversa até aqui (mensagens antigas): {state['summary']}"})
+        return system + [self._for_api(m) for m in history], trimmed, state
+
+    async def _stream_completion(self, messages: List[Dict[str, Any]], run: _TurnRun,
+                                 model: Optional[str] = None) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Uma chamada de streaming. Gera eventos `token` e, ao final, um evento
+        `message` com a mensagem completa do assistente (texto e/ou tool_calls).
+        """
+        options: Dict[str, Any] = {}
+        if self.budget_policy.max_completion_tokens:
+            options["max_completion_tokens"] = self.budget_policy.max_completion_tokens
+        stream = await self._api.chat.completions.create(
+            model=model or self.model, messages=messages, tools=self.tools, stream=True,
+            stream_options={"include_usage": True}, **options,
+        )
+        engine_stats["api_calls"] += 1
+        content: List[str] = []
+        tool_calls: Dict[int, Dict[str, Any]] = {}
+        finish_reason = None
+        async with stream:
+            async for chunk in stream:
+                if chunk.usage:
+                    run.usage.prompt_tokens += chunk.usage.prompt_tokens or 0
+                    run.usage.completion_tokens += chunk.usage.completion_tokens or 0
+                    run.usage.total_tokens += chunk.usage.total_tokens or 0
+                if not chunk.choices:
+                    continue
+                choice = chunk.choices[0]
+                finish_reason = choice.finish_reason or finish_reason
+                delta = choice.delta
+                if delta.content:
+                    content.append(delta.content)
+                    yield {"type": "token", "text": delta.content}
+                for call in delta.tool_calls or []:
+                    entry = tool_calls.setdefault(call.index, {"id": None, "name": "", "arguments": ""})
+                    if call.id:
+                        entry["id"] = call.id
+                    if call.function and call.function.name:
+                        entry["name"] += call.function.name
+                    if call.function and call.function.arguments:
+                        entry["arguments"] += call.function.arguments
+
+        message: Dict[str, Any] = {"role": "assistant", "content": "".join(content) or None}
+        if tool_calls:
+            message["tool_calls"] = [
+                {"id": call["id"], "type": "function",
+                 "function": {"name": call["name"], "arguments": call["arguments"]}}
+                for _, call in sorted(tool_calls.items())
+            ]
+        if finish_reason == "length":
+            run.status = "incomplete"
+        yield {"type": "message", "message": message}
+
+    async def _run_tool_call(self, thread_id: str, call: Dict[str, Any]) -> Dict[str, Any]:
+        function_name = call["function"]["name"]
+        print(f"Executing tool: {function_name}")
+        try:
+            arguments = json.loads(call["function"]["arguments"] or "{}")
+            print(f"Arguments: {arguments}")
+            output = await run_tool(function_name, arguments, ToolContext(thread_id=thread_id))
+        except Exception as e:
+            print(f"Error executing tool {function_name}: {e}")
+            import traceback
+            traceback.print_exc()
+            output = {"error": f"Erro interno ao executar {function_name}: {e}"}
+        engine_stats["tool_calls"] += 1
+        return {"role": "tool", "tool_call_id": call["id"], "content": json.dumps(output, default=str)}
+
+    async def _discard_slot_state(self, thread_id: str) -> None:
+        offered = list(temp_slot_mapping.get(thread_id, {}).values())
+        if offered:
+            await slot_hold_service.release_slots(thread_id, offered)
+        slot_store.clear_thread(thread_id)
+
+    async def stream_turn(self, thread_id: str, message: str, cacheable: bool = False,
+                          session_id: str = None) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Executa um turno gerando eventos:
+
+        - `{"type": "token", "text": ...}` a cada trecho de texto do modelo;
+        - `{"type": "tool", "name": ..., "status": "start" | "done"}` em torno de cada ferramenta;
+        - `{"type": "done", "response": ...}` com a resposta final (sempre o último evento).
+        """
+        print(f"Processing message in thread: {thread_id}")
+        engine_stats["turns"] += 1
+        user_message = {"role": "user", "content": message, "created_at": int(time.time())}
+        cache_key = None
+        if cacheable and self.response_cache is not None:
+            cache_key = ResponseCache.make_key(message, self.model, self.instructions_version)
+            cached = self.response_cache.get(cache_key)
+            if cached is not None:
+                print(f"Response cache hit for thread {thread_id}")
+                await self.transcripts.append(thread_id, [
+                    user_message, {"role": "assistant", "content": cached, "created_at": int(time.time())},
+                ])
+                yield {"type": "token", "text": cached}
+                yield {"type": "done", "response": cached}
+                return
+
+        # Escolha de horário resolvida localmente: agenda sem chamar o modelo
+        arguments = slot_matcher.plan_booking(thread_id, message)
+        if arguments is not None:
+            yield {"type": "tool", "name": "agendarReuniao", "status": "start"}
+            output = await slot_matcher.book(thread_id, arguments)
+            yield {"type": "tool", "name": "agendarReuniao", "status": "done"}
+            if output is not None:
+                response = slot_matcher.confirmation_message(output)
+                await self.transcripts.append(thread_id, self._fast_path_messages(user_message, arguments,
+                                                                                  output, response))
+                print(f"Assistant response (fast path): {response}")
+                yield {"type": "token", "text": response}
+                yield {"type": "done", "response": response}
+                return
+
+        usage_key = session_id or thread_id
+        context, trimmed, state = await self._build_context(thread_id, usage_key)
+        route = self.model_router.route(thread_id, state)
+        run = _TurnRun(id=f"turn_{uuid.uuid4().hex[:12]}")
+        started = time.perf_counter()
+        # Mensagens novas do turno, persistidas de uma vez ao final
+        new_messages: List[Dict[str, Any]] = [user_message]
+        used_tools = False
+        response = None
+        try:
+            for _ in range(self.MAX_TOOL_ROUNDS):
+                request_messages = context + [self._for_api(m) for m in new_messages]
+                assistant_message = None
+                async for event in self._stream_completion(request_messages, run, route.model):
+                    if event["type"] == "message":
+                        assistant_message = event["message"]
+                    else:
+                        yield event
+                assistant_message["created_at"] = int(time.time())
+                new_messages.append(assistant_message)
+                if not assistant_message.get("tool_calls"):
+                    response = assistant_message["content"] or "Não recebi uma resposta do assistente."
+                    break
+                used_tools = True
+                for call in assistant_message["tool_calls"]:
+                    yield {"type": "tool", "name": call["function"]["name"], "status": "start"}
+                    new_messages.append(await self._run_tool_call(thread_id, call))
+                    yield {"type": "tool", "name": call["function"]["name"], "status": "done"}
+            else:
+                run.status = "failed"
+                response = "O assistente falhou (limite de chamadas de ferramentas atingido)"
+                await self._discard_slot_state(thread_id)
+        except asyncio.CancelledError:
+            # Cliente desconectou: guarda a pergunta e libera os horários oferecidos
+            print(f"Turn {run.id} aborted: request cancelled.")
+            await asyncio.shield(self._persist_aborted(thread_id, user_message))
+            raise
+        except TimeoutError:
+            print(f"Turn {run.id} timed out.")
+            await self._persist_aborted(thread_id, user_message)
+            yield {"type": "done", "response": "O assistente demorou muito para responder. Tente novamente."}
+            return
+        except Exception as e:
+            print(f"Error during completion turn: {e}")
+            import traceback
+            traceback.print_exc()
+            await self._persist_aborted(thread_id, user_message)
+            yield {"type": "done", "response": f"Ocorreu um erro inesperado: {e}"}
+            return
+
+        await self.transcripts.append(thread_id, new_messages)
+        self.model_router.record(route, run, time.perf_counter() - started)
+        await self.usage_tracker.record_run(usage_key, run, trimmed=trimmed, flags=session_flags(thread_id))
+        print(f"Assistant response: {response}")
+        if cache_key and not used_tools and run.status == "completed":
+            self.response_cache.set(cache_key, response)
+        yield {"type": "done", "response": response}
+
+    @staticmethod
+    def _fast_path_messages(user_message: Dict[str, Any], arguments: Dict[str, Any], output: Dict[str, Any],
+                            response: str) -> List[Dict[str, Any]]:
+        """Turno do atalho no transcript, como se o modelo tivesse chamado `agendarReuniao`."""
+        now = int(time.time())
+        call_id = f"call_local_{uuid.uuid4().hex[:12]}"
+        return [
+            user_message,
+            {"role": "assistant", "content": None, "created_at": now, "tool_calls": [
+                {"id": call_id, "type": "function",
+                 "function": {"name": "agendarReuniao", "arguments": json.dumps(arguments, ensure_ascii=False)}}]},
+            {"role": "tool", "tool_call_id": call_id, "content": json.dumps(output, default=str), "created_at": now},
+            {"role": "assistant", "content": response, "created_at": now},
+        ]
+
+    async def _persist_aborted(self, thread_id: str, user_message: Dict[str, Any]) -> None:
+        await self._discard_slot_state(thread_id)
+        await self.transcripts.append(thread_id, [user_message])
+
+    @staticmethod
+    def _for_api(message: Dict[str, Any]) -> Dict[str, Any]:
+        """Remove os campos locais (ex: created_at) antes de enviar à OpenAI."""
+        return {k: v for k, v in message.items() if k != "created_at"}
+
+    async def get_assistant_response(self, thread_id: str, message: str, cacheable: bool = False,
+                                     session_id: str = None) -> str:
+        """Mesma interface do `OpenAIService`: executa o turno e retorna a resposta final."""
+        response = ""
+        async for event in self.stream_turn(thread_id, message, cacheable=cacheable, session_id=session_id):
+            if event["type"] == "done":
+                response = event["response"]
+        return response
+
+    async def get_history(self, thread_id: str) -> List[Dict[str, Any]]:
+        """Mensagens visíveis (usuário/assistente com texto), em ordem cronológica."""
+        # Sem corte: o histórico exibido é o transcript inteiro, não a janela enviada ao modelo
+        messages = await self.transcripts.load(thread_id, last=0)
+        return [
+            {"role": m["role"], "content": m["content"], "timestamp": m.get("created_at")}
+            for m in messages
+            if m["role"] in ("user", "assistant") and m.get("content")
+        ]
+
+    def stats(self) -> Dict[str, Any]:
+        return {"engine": "completions", "model": self.model, **engine_stats}
+
+    async def cleanup_thread(self, thread_id: str):
+        """Remove o transcript e o estado de horários do thread."""
+        slot_store.clear_thread(thread_id)
+        await self.transcripts.delete(thread_id)
+        print(f"Thread {thread_id} deleted")
+
+    async def close(self):
+        """Fecha o pool HTTP do cliente OpenAI (instâncias por empresa despejadas do cache)."""
+        if self._client is not None:
+            await self._client.close()
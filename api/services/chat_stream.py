@@ -0,0 +1,208 @@
+# backend/services/chat_stream.py
+
+"""
+Eventos de turno do canal WebSocket (/api/ws/{session_id}).
+
+Um turno roda numa task própria, desacoplada da conexão: se o socket cair, o
+turno continua e seus eventos ficam guardados para o cliente retomar.
+
+- Cada evento leva `turn` (id do turno) e `seq` (sequência no turno).
+- Os eventos vão direto para o socket conectado e, em lotes (a cada
+  FLUSH_INTERVAL ou em eventos que não são tokens), para uma lista no Redis
+  com o turno mais recente da sessão (TTL curto).
+- No `resume`, o cliente informa o último (`turn`, `seq`) que recebeu e
+  recebe o que perdeu: da memória, se o turno roda neste worker; senão da
+  lista no Redis, acompanhando-a até o fim do turno.
+
+Conexões ociosas não guardam nada além do próprio handler; só os turnos em
+andamento mantêm seus eventos em memória.
+"""
+
+import asyncio
+import json
+import time
+import uuid
+from typing import Any, Dict, List, Optional
+
+from .redis_service import get_redis
+
+TURN_KEY_PREFIX = "chat:turn:"
+TURN_TTL_SECONDS = 600
+FLUSH_INTERVAL = 0.1  # segundos entre gravações de tokens no Redis
+RESUME_POLL_SECONDS = 0.5
+FINAL_EVENTS = ("done", "error")
+
+# Texto de progresso exibido enquanto cada ferramenta roda
+TOOL_STATUS = {
+    "registrarLead": "Registrando seus dados...",
+    "oferecerHorarios": "Consultando a agenda...",
+    "agendarReuniao": "Agendando a reunião...",
+}
+
+# Turnos em andamento neste worker, por sessão
+_active: Dict[str, "TurnStream"] = {}
+
+
+def _key(session_id: str) -> str:
+    return f"{TURN_KEY_PREFIX}{session_id}"
+
+
+async def send_event(websocket, event: Dict[str, Any]) -> bool:
+    """Envia um evento JSON; False se a conexão já caiu."""
+    try:
+        await websocket.send_text(json.dumps(event, ensure_ascii=False, default=str))
+        return True
+    except Exception:
+        return False
+
+
+class TurnStream:
+    __slots__ = ("session_id", "turn_id", "events", "subscriber", "_redis_factory", "_pending", "_reset",
+                 "_last_flush")
+
+    def __init__(self, session_id: str, redis_factory=None):
+        self.session_id = session_id
+        self.turn_id = uuid.uuid4().hex[:12]
+        self.events: List[Dict[str, Any]] = []
+        self.subscriber = None
+        self._redis_factory = redis_factory or get_redis
+        self._pending: List[Dict[str, Any]] = []
+        self._reset = True  # o primeiro flush substitui o turno anterior no Redis
+        self._last_flush = time.monotonic()
+
+    @property
+    def finished(self) -> bool:
+        return bool(self.events) and self.events[-1]["type"] in FINAL_EVENTS
+
+    async def emit(self, event: Dict[str, Any]) -> None:
+        event = {**event, "turn": self.turn_id, "seq": len(self.events) + 1}
+        self.events.append(event)
+        self._pending.append(event)
+        if self.subscriber is not None and not await send_event(self.subscriber, event):
+            self.subscriber = None  # Cliente caiu: segue gravando para o resume
+        if event["type"] != "token" or time.monotonic() - self._last_flush >= FLUSH_INTERVAL:
+            await self.flush()
+
+    async def flush(self) -> None:
+        if not self._pending:
+            return
+        pending, self._pending = self._pending, []
+        self._last_flush = time.monotonic()
+        try:
+            pipe = self._redis_factory().pipeline(transaction=False)
+            if self._reset:
+                pipe.delete(_key(self.session_id))
+            pipe.rpush(_key(self.session_id), *[json.dumps(e, ensure_ascii=False, default=str) for e in pending])
+            pipe.expire(_key(self.session_id), TURN_TTL_SECONDS)
+            await pipe.execute()
+            self._reset = False
+        except Exception as e:
+            # Sem Redis o resume só funciona neste worker (eventos em memória)
+            print(f"Error saving turn events for {self.session_id}: {e}")
+
+    async def attach(self, websocket, last_turn: Optional[str], last_seq: int) -> None:
+        """Envia ao socket os eventos que ele perdeu e passa a transmitir os próximos."""
+        sent = last_seq if last_turn == self.turn_id else 0
+        while sent < len(self.events):
+            if not await send_event(websocket, self.events[sent]):
+                return
+            sent += 1
+        # Sem await entre a última checagem e a troca: nenhum evento fica de fora
+        self.subscriber = websocket
+
+
+def active_turn(session_id: str) -> Optional[TurnStream]:
+    stream = _active.get(session_id)
+    return stream if stream is not None and not stream.finished else None
+
+
+def start_turn(session_id: str, websocket) -> TurnStream:
+    stream = TurnStream(session_id)
+    stream.subscriber = websocket
+    _active[session_id] = stream
+    return stream
+
+
+async def finish_turn(stream: TurnStream) -> None:
+    await stream.flush()
+    if _active.get(stream.session_id) is stream:
+        del _active[stream.session_id]
+
+
+def detach(session_id: str, websocket) -> None:
+    stream = _active.get(session_id)
+    if stream is not None and stream.subscriber is websocket:
+        stream.subscriber = None
+
+
+async def resume(session_id: str, websocket, last_turn: Optional[str], last_seq: int,
+                 max_wait: float, redis_factory=None) -> None:
+    """
+    Reenvia os eventos perdidos do turno mais recente da sessão. Se o turno
+    roda em outro worker, acompanha a lista no Redis até o evento final
+    (ou até `max_wait` segundos).
+    """
+    stream = active_turn(session_id)
+    if stream is not None:
+        await stream.attach(websocket, last_turn, last_seq)
+        return
+
+    redis_factory = redis_factory or get_redis
+    deadline = time.monotonic() + max_wait
+    sent = 0
+    while True:
+        try:
+            raw = await redis_factory().lrange(_key(session_id), sent, -1)
+        except Exception as e:
+            print(f"Error reading turn events for {session_id}: {e}")
+            return
+        for item in raw:
+            event = json.loads(item)
+            sent += 1
+            if event["turn"] == last_turn and event["seq"] <= last_seq:
+                continue
+            if not await send_event(websocket, event):
+                return
+            if event["type"] in FINAL_EVENTS:
+                return
+        if sent == 0 or time.monotonic() >= deadline:
+            return  # Nenhum turno registrado (ou o worker dono do turno sumiu)
+        await asyncio.sleep(RESUME_POLL_SECONDS)
+
+
+def _labeled(event: Dict[str, Any]) -> Dict[str, Any]:
+    if event["type"] == "tool":
+        return {**event, "label": TOOL_STATUS.get(event["name"], "Processando...")}
+    return event
+
+
+async def engine_events(service, thread_id: str, message: str, cacheable: bool, session_id: str):
+    """
+    Eventos de um turno do motor de chat. O motor de completions transmite
+    tokens e ferramentas; o de Assistants avisa o início e o fim de cada
+    ferramenta (callback `on_tool`) e entrega a resposta final.
+    """
+    if hasattr(service, "stream_turn"):
+        async for event in service.stream_turn(thread_id, message, cacheable=cacheable, session_id=session_id):
+            yield _labeled(event)
+        return
+
+    tool_events: asyncio.Queue = asyncio.Queue()
+    response_task = asyncio.create_task(service.get_assistant_response(
+        thread_id, message, cacheable=cacheable, session_id=session_id, on_tool=tool_events.put_nowait))
+    try:
+        while not response_task.done():
+            next_event = asyncio.ensure_future(tool_events.get())
+            await asyncio.wait({next_event, response_task}, return_when=asyncio.FIRST_COMPLETED)
+            if not next_event.done():
+                next_event.cancel()
+                break
+            yield _labeled(next_event.result())
+        while not tool_events.empty():
+            yield _labeled(tool_events.get_nowait())
+        yield {"type": "done", "response": response_task.result()}
+    finally:
+        if not response_task.done():
+            # Turno cancelado: cancela o run junto (e espera o checkpoint/aborto do motor)
+            response_task.cancel()
+            await asyncio.gather(response_task, return_exceptions=True)
@@ -0,0 +1,207 @@
+# backend/services/health_monitor.py
+
+"""
+Monitor de dependências em background (Redis, OpenAI, Pipefy, Cal.com).
+
+Uma task sonda cada dependência configurada a cada HEALTH_PROBE_INTERVAL_SECONDS
+e mantém, por dependência, o estado, a latência (última e média móvel) e a
+taxa de erro das últimas sondagens. O snapshot é montado ao fim de cada
+rodada, então /api/health responde da memória, sem abrir conexões.
+
+- Uma dependência só passa a "down" após `failure_threshold` falhas
+  seguidas (evita oscilar por uma sondagem perdida).
+- `unready_reason()` diz se alguma dependência obrigatória
+  (HEALTH_REQUIRED_DEPENDENCIES, padrão redis e openai) está fora; o
+  controle de admissão do chat usa isso para recusar turnos logo na entrada,
+  em vez de deixá-los falhar depois de ocupar o worker.
+- Sem a task rodando (ex: serverless sem lifespan), `ensure_fresh()` faz uma
+  rodada sob demanda quando o snapshot está velho.
+"""
+
+import asyncio
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from ..config import get_settings
+from .redis_service import get_redis
+
+WINDOW = 20  # sondagens consideradas na taxa de erro
+
+
+class DependencyProbe:
+    def __init__(self, name: str, check: Callable[[], Awaitable[None]], required: bool,
+                 failure_threshold: int = 2):
+        self.name = name
+        self.check = check
+        self.required = required
+        self.failure_threshold = failure_threshold
+        self.results: deque = deque(maxlen=WINDOW)
+        self.consecutive_failures = 0
+        self.last_latency_ms: Optional[float] = None
+        self.avg_latency_ms: Optional[float] = None
+        self.last_error: Optional[str] = None
+        self.last_checked: Optional[float] = None
+
+    @property
+    def status(self) -> str:
+        if self.last_checked is None:
+            return "unknown"
+        return "down" if self.consecutive_failures >= self.failure_threshold else "up"
+
+    async def run(self, timeout: float) -> None:
+        t0 = time.perf_counter()
+        try:
+            await asyncio.wait_for(self.check(), timeout=timeout)
+            ok, error = True, None
+        except asyncio.TimeoutError:
+            ok, error = False, f"timeout após {timeout}s"
+        except Exception as e:
+            ok, error = False, f"{type(e).__name__}: {e}"
+        latency_ms = (time.perf_counter() - t0) * 1000
+        self.results.append(ok)
+        self.last_checked = time.time()
+        self.last_latency_ms = latency_ms
+        self.avg_latency_ms = latency_ms if self.avg_latency_ms is None else 0.8 * self.avg_latency_ms + 0.2 * latency_ms
+        if ok:
+            self.consecutive_failures = 0
+        else:
+            self.consecutive_failures += 1
+            self.last_error = error
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "status": self.status,
+            "required": self.required,
+            "latency_ms": round(self.last_latency_ms, 1) if self.last_latency_ms is not None else None,
+            "avg_latency_ms": round(self.avg_latency_ms, 1) if self.avg_latency_ms is not None else None,
+            "error_rate": round(self.results.count(False) / len(self.results), 3) if self.results else None,
+            "consecutive_failures": self.consecutive_failures,
+            "last_checked": self.last_checked,
+            "last_error": self.last_error,
+        }
+
+
+class HealthMonitor:
+    def __init__(self, interval: float, timeout: float, required: List[str]):
+        self.interval = interval
+        self.timeout = timeout
+        self.required = set(required)
+        self.probes: List[DependencyProbe] = []
+        self.rounds = 0
+        self.last_round_at: Optional[float] = None
+        self.running = False  # task de sondagem periódica ativa (lifespan)
+        self._snapshot: Dict[str, Any] = {"status": "unknown", "services": {}}
+        self._http = None
+        self._lock = asyncio.Lock()
+        self._build_probes()
+
+    # --- Sondas ---
+    @property
+    def http(self):
+        # Client próprio (fora do recorder de tráfego): sondagens não entram nas gravações
+        if self._http is None:
+            import httpx
+            self._http = httpx.AsyncClient(timeout=self.timeout)
+        return self._http
+
+    def _add(self, name: str, check: Callable[[], Awaitable[None]]) -> None:
+        self.probes.append(DependencyProbe(name, check, required=name in self.required))
+
+    def _build_probes(self) -> None:
+        settings = get_settings()
+        if settings.redis_url:
+            self._add("redis", self._check_redis)
+        if settings.openai_api_key:
+            self._add("openai", self._check_openai)
+        if settings.pipefy_api_key:
+            self._add("pipefy", self._check_pipefy)
+        if settings.cal_com_api_key:
+            self._add("calcom", self._check_calcom)
+
+    async def _check_redis(self) -> None:
+        await get_redis().ping()
+
+    async def _check_openai(self) -> None:
+        response = await self.http.get("https://api.openai.com/v1/models?limit=1",
+                                       headers={"Authorization": f"Bearer {get_settings().openai_api_key}"})
+        response.raise_for_status()
+
+    async def _check_pipefy(self) -> None:
+        response = await self.http.post("https://api.pipefy.com/graphql", json={"query": "{ me { id } }"},
+                                        headers={"Authorization": f"Bearer {get_settings().pipefy_api_key}"})
+        response.raise_for_status()
+        errors = response.json().get("errors")
+        if errors:
+            raise RuntimeError(errors[0].get("message", "GraphQL error"))
+
+    async def _check_calcom(self) -> None:
+        response = await self.http.get("https://api.cal.com/v1/me", params={"apiKey": get_settings().cal_com_api_key})
+        response.raise_for_status()
+
+    # --- Rodadas ---
+    async def probe_all(self) -> Dict[str, Any]:
+        async with self._lock:
+            await asyncio.gather(*[probe.run(self.timeout) for probe in self.probes])
+            self.rounds += 1
+            self.last_round_at = time.time()
+            self._snapshot = self._build_snapshot()
+            return self._snapshot
+
+    async def run(self) -> None:
+        self.running = True
+        while True:
+            try:
+                await self.probe_all()
+            except Exception as e:
+                print(f"Health probe round failed: {e}")
+            await asyncio.sleep(self.interval)
+
+    async def ensure_fresh(self) -> Dict[str, Any]:
+        """Snapshot atual; sonda na hora se ele estiver mais velho que duas rodadas."""
+        if self.last_round_at is None or time.time() - self.last_round_at > 2 * self.interval:
+            return await self.probe_all()
+        return self._snapshot
+
+    def _build_snapshot(self) -> Dict[str, Any]:
+        services = {probe.name: probe.snapshot() for probe in self.probes}
+        if any(probe.required and probe.status == "down" for probe in self.probes):
+            status = "unhealthy"
+        elif any(probe.status == "down" for probe in self.probes):
+            status = "degraded"
+        else:
+            status = "healthy"
+        return {"status": status, "checked_at": self.last_round_at, "interval_seconds": self.interval,
+                "services": services}
+
+    def snapshot(self) -> Dict[str, Any]:
+        return self._snapshot
+
+    def unready_reason(self) -> Optional[str]:
+        """Motivo para não aceitar tráfego (dependência obrigatória fora), ou None."""
+        down = [probe.name for probe in self.probes if probe.required and probe.status == "down"]
+        return f"dependências indisponíveis: {', '.join(down)}" if down else None
+
+    def is_live(self) -> bool:
+        """O loop de sondagem continua rodando (o event loop não travou)."""
+        return self.last_round_at is not None and time.time() - self.last_round_at <= 3 * self.interval + self.timeout
+
+    async def aclose(self) -> None:
+        if self._http is not None:
+            await self._http.aclose()
+            self._http = None
+
+
+_monitor: Optional[HealthMonitor] = None
+
+
+def get_health_monitor() -> HealthMonitor:
+    global _monitor
+    if _monitor is None:
+        settings = get_settings()
+        _monitor = HealthMonitor(
+            interval=settings.health_probe_interval_seconds,
+            timeout=settings.health_probe_timeout_seconds,
+            required=[name.strip() for name in settings.health_required_dependencies.split(",") if name.strip()],
+        )
+    return _monitor
@@ -0,0 +1,68 @@
+# backend/services/lead_update_queue.py
+
+"""
+Fila (lista no Redis) de atualizações de reunião pendentes para o Pipefy.
+
+Eventos externos (ex: webhooks do Cal.com) apenas enfileiram a atualização e
+respondem rápido; `drain_lead_updates` aplica as pendências fora do caminho
+da requisição (BackgroundTasks) e devolve à fila as que falharem, até
+`MAX_ATTEMPTS` tentativas.
+
+Cada item guarda a empresa (services/tenants.py) em que foi enfileirado e é
+aplicado no pipe dela; itens sem empresa usam o serviço recebido (ambiente).
+"""
+
+import json
+from typing import Any, Dict, Optional
+
+from . import tenants
+from .redis_service import get_redis
+
+LEAD_UPDATES_KEY = "pipefy:lead_updates"
+MAX_ATTEMPTS = 5
+
+
+async def enqueue_lead_update(email: str, meeting_datetime: Optional[str], meeting_link: Optional[str],
+                              reason: str = "") -> None:
+    item = {"email": email, "meeting_datetime": meeting_datetime, "meeting_link": meeting_link,
+            "reason": reason, "attempts": 0, "tenant_id": tenants.current_tenant_id()}
+    await get_redis().rpush(LEAD_UPDATES_KEY, json.dumps(item))
+
+
+async def drain_lead_updates(pipefy_service, limit: int = 20) -> Dict[str, Any]:
+    """Aplica até `limit` atualizações pendentes. Retorna contagens de aplicadas/reenfileiradas/descartadas."""
+    client = get_redis()
+    summary = {"applied": 0, "requeued": 0, "dropped": 0}
+    for _ in range(limit):
+        raw = await client.lpop(LEAD_UPDATES_KEY)
+        if raw is None:
+            break
+        item = json.loads(raw)
+        try:
+            result = await _apply(pipefy_service, item)
+        except Exception as e:
+            # Ex: empresa removida (LookupError) ou Pipefy fora: conta como tentativa
+            result = {"success": False, "error": str(e)}
+        if result.get("success"):
+            summary["applied"] += 1
+            continue
+        item["attempts"] += 1
+        if item["attempts"] >= MAX_ATTEMPTS:
+            print(f"Dropping Pipefy meeting update for {item['email']} after {item['attempts']} attempts: {result}")
+            summary["dropped"] += 1
+        else:
+            await client.rpush(LEAD_UPDATES_KEY, json.dumps(item))
+            summary["requeued"] += 1
+    return summary
+
+
+async def _apply(pipefy_service, item: Dict[str, Any]) -> Dict[str, Any]:
+    tenant_id = item.get("tenant_id")
+    if not tenant_id:
+        return await pipefy_service.update_lead_meeting(item["email"], item["meeting_datetime"], item["meeting_link"])
+    async with tenants.scope(tenant_id), tenants.pipefy_service() as service:
+        return await service.update_lead_meeting(item["email"], item["meeting_datetime"], item["meeting_link"])
+
+
+async def pending_count() -> int:
+    return int(await get_redis().llen(LEAD_UPDATES_KEY))
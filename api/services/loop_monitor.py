@@ -0,0 +1,144 @@
+# backend/services/loop_monitor.py
+
+"""
+Monitor do event loop: quanto o loop atrasa para atender quem está pronto.
+
+Todo o I/O da API (OpenAI, Redis, Pipefy, Cal.com) é assíncrono num único
+loop por worker; uma chamada síncrona ou um processamento pesado no meio de
+um handler atrasa todos os turnos em andamento. A task `run()` dorme
+LOOP_MONITOR_INTERVAL_SECONDS e mede quanto acordou depois do previsto
+(atraso de agendamento), acumulando um histograma de buckets fixos em ms
+exposto em /api/metrics.
+
+Modo debug (LOOP_SLOW_CALLBACK_MS > 0): o heartbeat fica mais frequente e
+uma thread vigia o loop; quando ele passa do limite sem bater, a thread
+captura a pilha da thread do loop naquele instante (`sys._current_frames`),
+ou seja, o callback que está segurando o loop, e loga. Diferente do
+`slow_callback_duration` do modo debug do asyncio, que só diz qual task
+demorou depois que ela devolve o controle, a pilha aponta a linha que
+bloqueou.
+"""
+
+import asyncio
+import bisect
+import sys
+import threading
+import time
+import traceback
+from typing import Any, Dict, List, Optional
+
+from ..config import get_settings
+
+BUCKETS_MS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000)
+
+
+class LoopLagMonitor:
+    def __init__(self, interval: float, slow_callback_ms: float = 0.0):
+        self.interval = interval
+        self.slow_callback_ms = slow_callback_ms
+        self.counts: List[int] = [0] * (len(BUCKETS_MS) + 1)  # último = acima de 1000ms
+        self.samples = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.stalls = 0
+        self.last_stall: Optional[Dict[str, Any]] = None
+        self.running = False
+        self._last_beat: Optional[float] = None
+        self._loop_thread: Optional[int] = None
+        self._stop = threading.Event()
+
+    @property
+    def debug(self) -> bool:
+        return self.slow_callback_ms > 0
+
+    @property
+    def tick(self) -> float:
+        # No modo debug o heartbeat precisa ser bem menor que o limite vigiado
+        return min(self.interval, self.slow_callback_ms / 4000) if self.debug else self.interval
+
+    def observe(self, lag_ms: float) -> None:
+        self.counts[bisect.bisect_left(BUCKETS_MS, lag_ms)] += 1
+        self.samples += 1
+        self.total_ms += lag_ms
+        self.max_ms = max(self.max_ms, lag_ms)
+
+    async def run(self) -> None:
+        loop = asyncio.get_running_loop()
+        self._loop_thread = threading.get_ident()
+        self._last_beat = time.monotonic()
+        self._stop.clear()
+        self.running = True
+        if self.debug:
+            threading.Thread(target=self._watchdog, name="loop-watchdog", daemon=True).start()
+        try:
+            while True:
+                tick = self.tick
+                t0 = loop.time()
+                await asyncio.sleep(tick)
+                self._last_beat = time.monotonic()
+                self.observe(max(loop.time() - t0 - tick, 0.0) * 1000)
+        finally:
+            self.running = False
+            self._stop.set()
+
+    def _watchdog(self) -> None:
+        threshold_s = self.slow_callback_ms / 1000
+        reported_beat = None
+        while not self._stop.wait(threshold_s / 4):
+            beat = self._last_beat
+            if beat is None or beat == reported_beat:
+                continue
+            # Parado = atrasado em relação ao próximo heartbeat previsto
+            stalled_s = time.monotonic() - beat - self.tick
+            if stalled_s <= threshold_s:
+                continue
+            reported_beat = beat  # uma ocorrência por travamento
+            frame = sys._current_frames().get(self._loop_thread)
+            if frame is not None and frame.f_code.co_name == "select":
+                continue  # loop ocioso no selector: o heartbeat só acordou atrasado (agendamento do SO)
+            stack = "".join(traceback.format_stack(frame)) if frame is not None else ""
+            self.stalls += 1
+            self.last_stall = {"at": time.time(), "stalled_ms": round(stalled_s * 1000, 1), "stack": stack}
+            print(f"Event loop blocked for more than {stalled_s * 1000:.0f}ms; loop thread stack:\n{stack}")
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def _percentile(self, q: float) -> Optional[float]:
+        """Limite superior do bucket que contém o quantil (None sem amostras)."""
+        if not self.samples:
+            return None
+        rank, seen = q * self.samples, 0
+        for bound, count in zip(BUCKETS_MS, self.counts):
+            seen += count
+            if seen >= rank:
+                return bound
+        return round(self.max_ms, 1)
+
+    def stats(self) -> Dict[str, Any]:
+        histogram = {f"le_{bound}ms": count for bound, count in zip(BUCKETS_MS, self.counts)}
+        histogram[f"gt_{BUCKETS_MS[-1]}ms"] = self.counts[-1]
+        return {
+            "running": self.running,
+            "interval_seconds": self.tick,
+            "samples": self.samples,
+            "lag_ms_avg": round(self.total_ms / self.samples, 2) if self.samples else None,
+            "lag_ms_max": round(self.max_ms, 1),
+            "lag_ms_p50": self._percentile(0.5),
+            "lag_ms_p99": self._percentile(0.99),
+            "histogram": histogram,
+            "slow_callback_ms": self.slow_callback_ms,
+            "stalls": self.stalls,
+            "last_stall": self.last_stall,
+        }
+
+
+_monitor: Optional[LoopLagMonitor] = None
+
+
+def get_loop_monitor() -> LoopLagMonitor:
+    global _monitor
+    if _monitor is None:
+        settings = get_settings()
+        _monitor = LoopLagMonitor(settings.loop_monitor_interval_seconds, settings.loop_slow_callback_ms)
+    return _monitor
@@ -0,0 +1,141 @@
+# backend/services/model_router.py
+
+"""
+Escolha do modelo por run, de acordo com o estágio da conversa.
+
+O assistente fica fixo no modelo de `assistant_spec.py` (gpt-4o), mas boa
+parte dos turnos é saudação ou coleta de dados, que um modelo menor resolve
+mais rápido e mais barato. Com MODEL_ROUTING_RULES definido, cada run recebe
+o override `model` do estágio em que a conversa está:
+
+- `greeting`: primeiro run da sessão;
+- `collecting`: lead ainda não registrado (coletando nome, e-mail, ...);
+- `qualified`: lead registrado, ainda sem interesse confirmado em agendar;
+- `scheduling`: interesse confirmado ou horários oferecidos (a próxima
+  resposta deve chamar `oferecerHorarios`/`agendarReuniao`).
+
+Ex: MODEL_ROUTING_RULES="greeting=gpt-4o-mini,collecting=gpt-4o-mini".
+Estágios sem regra usam o modelo padrão. Um run roteado para outro modelo
+que termina em falha (failed/expired) é refeito no modelo padrão
+(escalonamento), exceto se já executou ferramentas: o novo run repetiria
+os efeitos (card duplicado no Pipefy, segunda reunião no Cal.com).
+
+Por modelo, o router acumula runs, latência, tokens e escalonamentos
+(/api/metrics), para ajustar as regras comparando qualidade e custo.
+"""
+
+from dataclasses import dataclass
+from typing import Any, Dict, Optional
+
+from .slot_store import lead_contacts, temp_slot_mapping
+
+STAGES = ("greeting", "collecting", "qualified", "scheduling")
+ESCALATE_STATUSES = ("failed", "expired")
+
+
+def parse_rules(spec: Optional[str]) -> Dict[str, str]:
+    """Converte "estagio=modelo,estagio=modelo" em {estagio: modelo}."""
+    rules = {}
+    for item in (spec or "").split(","):
+        item = item.strip()
+        if not item:
+            continue
+        stage, _, model = item.partition("=")
+        stage, model = stage.strip(), model.strip()
+        if stage not in STAGES or not model:
+            raise ValueError(f"MODEL_ROUTING_RULES: regra inválida '{item}' (estágios: {', '.join(STAGES)})")
+        rules[stage] = model
+    return rules
+
+
+def session_flags(thread_id: str) -> Optional[Dict[str, int]]:
+    """Marcas gravadas no estado de uso da sessão: o estágio vale também em outros workers."""
+    return {"lead_registered": 1} if thread_id in lead_contacts else None
+
+
+@dataclass
+class RouteDecision:
+    stage: str
+    model: Optional[str]  # None = modelo padrão (sem override)
+    escalated: bool = False
+
+
+class ModelRouter:
+    def __init__(self, rules_spec: Optional[str], default_model: str):
+        self.rules = parse_rules(rules_spec)
+        self.default_model = default_model
+        self.model_stats: Dict[str, Dict[str, Any]] = {}
+        self.stage_counts = {stage: 0 for stage in STAGES}
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.rules)
+
+    @staticmethod
+    def stage(thread_id: str, state: Dict[str, Any]) -> str:
+        """Estágio da conversa pelo estado de uso (Redis) e pelo estado do thread neste worker."""
+        lead = lead_contacts.get(thread_id)
+        if thread_id in temp_slot_mapping or (lead and lead.get("interesse_confirmado")):
+            return "scheduling"
+        if lead or state.get("lead_registered"):
+            return "qualified"
+        if int(state.get("runs", 0)) == 0:
+            return "greeting"
+        return "collecting"
+
+    def route(self, thread_id: str, state: Dict[str, Any]) -> RouteDecision:
+        stage = self.stage(thread_id, state)
+        self.stage_counts[stage] += 1
+        model = self.rules.get(stage)
+        return RouteDecision(stage=stage, model=model if model != self.default_model else None)
+
+    def should_escalate(self, decision: RouteDecision, run, used_tools: bool = False) -> bool:
+        if decision.model is None or decision.escalated or run.status not in ESCALATE_STATUSES:
+            return False
+        if used_tools:
+            # Ferramentas com efeito colateral já rodaram: refazer o run poderia repeti-las
+            self._entry(decision.model)["escalations_skipped"] += 1
+            print(f"Not escalating failed {decision.stage} run on {decision.model}: tools already executed")
+            return False
+        return True
+
+    def escalate(self, decision: RouteDecision) -> RouteDecision:
+        self._entry(decision.model)["escalations"] += 1
+        print(f"Escalating {decision.stage} run from {decision.model} to {self.default_model}")
+        return RouteDecision(stage=decision.stage, model=None, escalated=True)
+
+    def _entry(self, model: Optional[str]) -> Dict[str, Any]:
+        return self.model_stats.setdefault(model or self.default_model, {
+            "runs": 0, "failed_runs": 0, "escalations": 0, "escalations_skipped": 0, "latency_ms_total": 0.0, "latency_ms_max": 0.0,
+            "prompt_tokens": 0, "completion_tokens": 0, "stages": {},
+        })
+
+    def record(self, decision: RouteDecision, run, latency_s: float) -> None:
+        """Contabiliza um run finalizado no modelo em que ele rodou."""
+        entry = self._entry(decision.model)
+        latency_ms = latency_s * 1000
+        entry["runs"] += 1
+        entry["latency_ms_total"] += latency_ms
+        entry["latency_ms_max"] = max(entry["latency_ms_max"], latency_ms)
+        entry["stages"][decision.stage] = entry["stages"].get(decision.stage, 0) + 1
+        if run.status != "completed":
+            entry["failed_runs"] += 1
+        usage = getattr(run, "usage", None)
+        if usage:
+            entry["prompt_tokens"] += usage.prompt_tokens or 0
+            entry["completion_tokens"] += usage.completion_tokens or 0
+
+    def stats(self) -> Dict[str, Any]:
+        models = {}
+        for model, entry in self.model_stats.items():
+            runs = entry["runs"] or 1
+            models[model] = {
+                **{k: v for k, v in entry.items() if k != "latency_ms_total"},
+                "latency_ms_avg": round(entry["latency_ms_total"] / runs, 1),
+                "latency_ms_max": round(entry["latency_ms_max"], 1),
+                "prompt_tokens_avg": round(entry["prompt_tokens"] / runs, 1),
+                "completion_tokens_avg": round(entry["completion_tokens"] / runs, 1),
+                "escalation_rate": round(entry["escalations"] / runs, 3),
+            }
+        return {"enabled": self.enabled, "rules": self.rules, "default_model": self.default_model,
+                "stages": dict(self.stage_counts), "models": models}
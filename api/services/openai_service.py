@@ -1,35 +1,90 @@
 # backend/services/openai_service.py
 
-import os
 import time
 import asyncio
+import contextvars
 import json
-from openai import OpenAI
-from typing import List, Dict, Any
-
-# Importações relativas
-from .pipefy_service import PipefyService
-from .calendar_service import CalendarService, format_datetime_sao_paulo # Importa a função helper
+from typing import Callable, List, Dict, Any, Optional
 
 # Importação do pacote pai
-from ..models import Lead
+from ..config import current_settings
+from ..assistant_spec import ASSISTANT_MODEL, spec_hash
+from .model_router import ModelRouter, RouteDecision, session_flags
+from .response_cache import ResponseCache
+from .redis_service import get_redis
+from .usage_service import TokenBudgetPolicy, UsageTracker, SUMMARY_PROMPT
+
+# Os handlers das ferramentas (e o mapeamento de slots por thread) vivem em
+# assistant_tools.py; PipefyService, CalendarService e o SDK da OpenAI são
+# importados sob demanda para não pesarem no cold start da API.
+from .assistant_tools import ToolContext, run_tool
+from . import slot_hold_service, slot_matcher, slot_store, traffic_recorder
+from .request_context import deadline_timeout, remaining
+from .run_recovery import HANDOFF_MESSAGE, RunHandoff, get_run_recovery
+from .slot_store import lead_contacts, temp_slot_mapping
+
+# Quem acompanha as ferramentas do turno em curso (`on_tool` de get_assistant_response, ex: WebSocket)
+_tool_listener: contextvars.ContextVar[Optional[Callable[[Dict[str, Any]], None]]] = contextvars.ContextVar(
+    "tool_listener", default=None)
+
+
+def _tool_event(name: str, status: str) -> None:
+    listener = _tool_listener.get()
+    if listener is not None:
+        listener({"type": "tool", "name": name, "status": status})
 
-# --- NOVO: Armazenamento temporário para mapear slots ---
-# Em produção, isso deveria ser um cache (Redis) ou banco de dados
-# Mapeia thread_id -> { "display_slot_1": slot_utc_1, "display_slot_2": slot_utc_2, ... }
-temp_slot_mapping: Dict[str, Dict[str, Dict[str, str]]] = {}
 
 class OpenAIService:
     def __init__(self):
-        self.client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
-        self.assistant_id = os.getenv("OPENAI_ASSISTANT_ID")
+        settings = current_settings()
+        self.api_key = settings.openai_api_key
+        self.assistant_id = settings.openai_assistant_id
         if not self.assistant_id:
             raise ValueError("OPENAI_ASSISTANT_ID environment variable is required")
+        # Muda sempre que instruções/tools/modelo mudam em assistant_spec.py
+        self.instructions_version = settings.openai_instructions_version or spec_hash()
+        self._client = None
+        # Intervalo de polling do run (o replay de tráfego gravado o escala)
+        self.poll_interval = 1.0
+
+        # Orçamento de tokens por run e contabilização de uso no Redis
+        self.budget_policy = TokenBudgetPolicy(settings)
+        self.usage_tracker = UsageTracker(get_redis)
+        # Modelo por run conforme o estágio da conversa (MODEL_ROUTING_RULES)
+        self.model_router = ModelRouter(settings.model_routing_rules, ASSISTANT_MODEL)
 
-    def create_thread(self):
+        # Cache opcional de respostas para turnos determinísticos (ex: "oi")
+        self.response_cache = None
+        if settings.response_cache_enabled:
+            self.response_cache = ResponseCache(
+                ttl_seconds=settings.response_cache_ttl_seconds,
+                max_entries=settings.response_cache_max_entries,
+            )
+
+    @property
+    def client(self):
+        """
+        Cliente OpenAI assíncrono, criado (e o SDK importado) apenas no primeiro
+        uso. O cliente síncrono bloqueava o event loop durante cada chamada.
+        """
+        if self._client is None:
+            from openai import AsyncOpenAI, DefaultAsyncHttpxClient
+            transport = traffic_recorder.transport_for("openai", is_async=True)
+            http_client = DefaultAsyncHttpxClient(transport=transport) if transport else None
+            self._client = AsyncOpenAI(api_key=self.api_key, http_client=http_client)
+        return self._client
+
+    @property
+    def _api(self):
+        """Cliente para chamadas do fluxo da requisição: timeout limitado pelo prazo restante."""
+        if remaining() is None:
+            return self.client
+        return self.client.with_options(timeout=deadline_timeout(60.0))
+
+    async def create_thread(self):
         """Cria um novo thread"""
         try:
-            thread = self.client.beta.threads.create()
+            thread = await self._api.beta.threads.create()
             print(f"Thread created: {thread.id}")
             return thread.id
         except Exception as e:
@@ -40,16 +95,22 @@ class OpenAIService:
         """Aguarda a conclusão de um run com timeout"""
         # (Este método permanece igual)
         max_wait_time = 180
+        left = remaining()
+        if left is not None:
+            max_wait_time = max(0.0, min(max_wait_time, left))
         start_time = time.time()
         while True:
+            if get_run_recovery().handoff_due():
+                # Worker encerrando: o run fica na OpenAI e outro worker retoma o polling
+                raise RunHandoff(run_id)
             if time.time() - start_time > max_wait_time:
                 print(f"Run {run_id} timed out after {max_wait_time}s")
                 raise TimeoutError("Run execution timeout")
-            run = self.client.beta.threads.runs.retrieve(thread_id=thread_id, run_id=run_id)
+            run = await self._api.beta.threads.runs.retrieve(thread_id=thread_id, run_id=run_id)
             if run.status in ["queued", "in_progress"]:
                 print(f"Run {run_id} status: {run.status}")
-                await asyncio.sleep(1)
-            elif run.status in ["completed", "failed", "cancelled", "expired"]:
+                await asyncio.sleep(self.poll_interval)
+            elif run.status in ["completed", "incomplete", "failed", "cancelled", "expired"]:
                 print(f"Run {run_id} finished with status: {run.status}")
                 return run
             elif run.status == "requires_action":
@@ -60,159 +121,279 @@ class OpenAIService:
                 raise Exception(f"Unknown run status: {run.status}")
 
 
-    async def _handle_required_action(self, thread_id: str, run):
-        """Lida com ações requeridas pelo assistente, gerenciando conversões de horário."""
+    async def _handle_required_action(self, thread_id: str, run, record: Dict[str, Any] = None):
+        """
+        Lida com ações requeridas pelo assistente, gerenciando conversões de horário.
+
+        As saídas ficam em `record["tool_outputs"]` até serem submetidas: num
+        checkpoint (shutdown) a retomada só executa as ferramentas que faltam.
+        """
         try:
             tool_calls = run.required_action.submit_tool_outputs.tool_calls
             tool_outputs = []
+            done = record["tool_outputs"] if record is not None else {}
             print(f"Processing {len(tool_calls)} tool calls...")
 
             for tool_call in tool_calls:
                 function_name = tool_call.function.name
+                if tool_call.id in done:
+                    # Executada antes do checkpoint (ex: reunião já agendada): não repete
+                    print(f"Tool {function_name} already executed before recovery")
+                    tool_outputs.append({"tool_call_id": tool_call.id, "output": done[tool_call.id]})
+                    continue
                 arguments = json.loads(tool_call.function.arguments)
-                output = None
                 print(f"Executing tool: {function_name}")
                 print(f"Arguments: {arguments}")
 
+                _tool_event(function_name, "start")
                 try:
-                    if function_name == "registrarLead":
-                        # O assistente já deve enviar meeting_datetime em UTC ISO
-                        lead_data = {
-                            "name": arguments.get("nome"),
-                            "email": arguments.get("email"),
-                            "company": arguments.get("empresa"),
-                            "need": arguments.get("necessidade"),
-                            "interest_confirmed": arguments.get("interesse_confirmado", False),
-                            "meeting_link": arguments.get("meeting_link"),
-                            "meeting_datetime": arguments.get("meeting_datetime") # Esperado em UTC ISO
-                        }
-                        lead_data_clean = {k: v for k, v in lead_data.items() if v is not None}
-                        lead = Lead(**lead_data_clean)
-                        async with PipefyService() as pipefy_service:
-                            output = await pipefy_service.create_or_update_lead(lead)
-                        print(f"Lead registration result: {output}")
-
-                    elif function_name == "oferecerHorarios":
-                        calendar_service = CalendarService()
-                        dias = arguments.get("dias", 7)
-                        result = await calendar_service.get_available_slots(days=dias)
-
-                        if result.get("success"):
-                            # Guarda o mapeamento
-                            temp_slot_mapping[thread_id] = {
-                                display: utc for display, utc in zip(result["slots_display"], result["slots_utc"])
-                            }
-                            # Envia apenas os slots de exibição para o assistente
-                            output = {"status": "success", "available_slots_display": result["slots_display"]}
-                            print(f"Available slots (display): {result['slots_display']}")
-                        else:
-                            output = {"status": "error", "message": result.get("error", "Erro ao buscar horários.")}
-                            print(f"Error fetching slots: {output['message']}")
-                        
-                        # Limpa mapeamento antigo se houver nova busca (para o mesmo thread)
-                        if thread_id in temp_slot_mapping and not result.get("success"):
-                            del temp_slot_mapping[thread_id]
-
-
-                    elif function_name == "agendarReuniao":
-                        # O assistente envia a *string de exibição* escolhida pelo usuário
-                        chosen_display_slot_start = arguments.get("data_inicio_display") # Novo parâmetro esperado
-                        lead_email = arguments["email_lead"]
-                        lead_name = arguments.get("nome_lead", "Lead")
-
-                        if not chosen_display_slot_start:
-                            output = {"success": False, "error": "Parâmetro 'data_inicio_display' não fornecido pelo assistente."}
-                        elif thread_id not in temp_slot_mapping or chosen_display_slot_start not in temp_slot_mapping[thread_id]:
-                            output = {"success": False, "error": f"Horário escolhido ('{chosen_display_slot_start}') inválido ou não encontrado no mapeamento. Peça para o usuário escolher novamente da lista."}
-                        else:
-                            # Encontra o slot UTC correspondente
-                            slot_utc = temp_slot_mapping[thread_id][chosen_display_slot_start]
-                            start_time_utc_iso = slot_utc["start_time"]
-                            end_time_utc_iso = slot_utc["end_time"]
-
-                            print(f"--- [DEBUG] Mapeado '{chosen_display_slot_start}' para UTC: {start_time_utc_iso} ---")
-
-                            calendar_service = CalendarService()
-                            result = await calendar_service.schedule_meeting_from_assistant(
-                                start_time_utc_iso, end_time_utc_iso, lead_email, lead_name
-                            )
-
-                            if result.get("success"):
-                                # Converte o resultado UTC para exibição
-                                confirmed_start_utc = result.get("start_time_utc")
-                                display_time_sao_paulo = format_datetime_sao_paulo(confirmed_start_utc) if confirmed_start_utc else "Horário não confirmado"
-                                
-                                # Envia o resultado formatado para o assistente
-                                output = {
-                                    "success": True,
-                                    "meeting_link": result.get("meeting_link"),
-                                    "start_time_display": display_time_sao_paulo, # Hora para exibir
-                                    "start_time_utc": confirmed_start_utc # Hora UTC para registrarLead
-                                }
-                                print(f"Meeting scheduled successfully. Display time: {display_time_sao_paulo}")
-                                # Limpa o mapeamento após agendamento bem-sucedido
-                                if thread_id in temp_slot_mapping:
-                                    del temp_slot_mapping[thread_id]
-                            else:
-                                output = result # Retorna o erro
-                                print(f"Error scheduling meeting: {output.get('error')}")
-                    else:
-                        output = {"error": f"Função {function_name} não reconhecida"}
-
+                    output = await run_tool(function_name, arguments, ToolContext(thread_id=thread_id))
                 except Exception as e:
                     print(f"Error executing tool {function_name}: {e}")
                     import traceback
                     traceback.print_exc()
                     output = {"error": f"Erro interno ao executar {function_name}: {e}"}
+                finally:
+                    _tool_event(function_name, "done")
 
+                done[tool_call.id] = json.dumps(output, default=str)
                 tool_outputs.append({
                     "tool_call_id": tool_call.id,
-                    "output": json.dumps(output, default=str)
+                    "output": done[tool_call.id]
                 })
 
             if tool_outputs:
                 print(f"Submitting {len(tool_outputs)} tool outputs...")
-                run = self.client.beta.threads.runs.submit_tool_outputs(
+                run = await self._api.beta.threads.runs.submit_tool_outputs(
                     thread_id=thread_id,
                     run_id=run.id,
                     tool_outputs=tool_outputs
                 )
+                if record is not None:
+                    record["tool_outputs"] = {}
                 print("Waiting for completion after tool submission...")
                 run = await self._wait_for_run_completion(thread_id, run.id)
             return run
 
+        except (TimeoutError, RunHandoff):
+            # Prazo esgotado (quem chamou cancela o run) ou handoff do shutdown (vira checkpoint)
+            raise
         except Exception as e:
             print(f"Critical error in _handle_required_action: {e}")
             import traceback
             traceback.print_exc()
             try:
-                self.client.beta.threads.runs.cancel(thread_id=thread_id, run_id=run.id)
+                await self.client.beta.threads.runs.cancel(thread_id=thread_id, run_id=run.id)
             except Exception as cancel_e:
                 print(f"Error cancelling run after critical error: {cancel_e}")
             return run
 
 
-    async def get_assistant_response(self, thread_id: str, message: str) -> str:
-        """Obtém resposta do assistente"""
-        # (Este método permanece igual)
+    async def _get_cached_response(self, thread_id: str, message: str, cache_key: str):
+        """
+        Em caso de hit no cache, grava a pergunta e a resposta cacheada no thread
+        (mantendo o histórico consistente) e retorna a resposta; senão, None.
+        """
+        cached = self.response_cache.get(cache_key)
+        if cached is None:
+            return None
+        await self._api.beta.threads.messages.create(thread_id=thread_id, role="user", content=message)
+        await self._api.beta.threads.messages.create(thread_id=thread_id, role="assistant", content=cached)
+        print(f"Response cache hit for thread {thread_id}")
+        return cached
+
+    async def _summarize_thread(self, thread_id: str) -> str:
+        """Gera um resumo curto da conversa (modelo barato) para acompanhar o histórico truncado."""
+        messages = await self._api.beta.threads.messages.list(thread_id=thread_id, order="asc", limit=100)
+        transcript = "\n".join(
+            f"{msg.role}: {msg.content[0].text.value}"
+            for msg in messages.data
+            if msg.content and hasattr(msg.content[0], 'text')
+        )
+        completion = await self._api.chat.completions.create(
+            model=self.budget_policy.summary_model,
+            messages=[
+                {"role": "system", "content": SUMMARY_PROMPT},
+                {"role": "user", "content": transcript},
+            ],
+            max_tokens=400,
+        )
+        return completion.choices[0].message.content or ""
+
+    async def _prepare_run_options(self, thread_id: str, usage_key: str, state: Dict[str, Any]) -> Dict[str, Any]:
+        """Aplica a política de orçamento: trunca/resume o histórico quando ele fica grande."""
+        if self.budget_policy.should_summarize(state):
+            try:
+                summary = await self._summarize_thread(thread_id)
+                if summary:
+                    await self.usage_tracker.save_summary(usage_key, summary, int(state.get("runs", 0)))
+                    state["summary"] = summary
+                    print(f"Conversation summary updated for {usage_key}")
+            except Exception as e:
+                print(f"Error summarizing thread {thread_id}: {e}")
+        return self.budget_policy.run_options(state)
+
+    async def _create_run(self, thread_id: str, run_options: Dict[str, Any], route):
+        """Cria o run com o modelo escolhido pelo router; retorna (run, início)."""
+        options = {**run_options, "model": route.model} if route.model else run_options
+        run = await self._api.beta.threads.runs.create(thread_id=thread_id, assistant_id=self.assistant_id, **options)
+        print(f"Created run: {run.id} with status: {run.status} (stage {route.stage}, "
+              f"model {route.model or self.model_router.default_model})")
+        return run, time.perf_counter()
+
+    async def _drive_run(self, thread_id: str, run_id: str, record: Dict[str, Any]):
+        """Polling e ferramentas até o run terminar (status final)."""
+        run = await self._wait_for_run_completion(thread_id, run_id)
+        while run.status == "requires_action":
+            print("Run requires action, handling tool calls...")
+            record["used_tools"] = True
+            run = await self._handle_required_action(thread_id, run, record)
+        return run
+
+    async def resume_run(self, checkpoint: Dict[str, Any]) -> None:
+        """
+        Retoma um run deixado por um worker que encerrou (services/run_recovery.py):
+        restaura os horários oferecidos e o lead do thread, termina o polling e as
+        ferramentas e contabiliza o uso. A resposta final fica no thread.
+        """
+        thread_id, run_id = checkpoint["thread_id"], checkpoint["run_id"]
+        if checkpoint.get("slots"):
+            temp_slot_mapping.setdefault(thread_id, checkpoint["slots"])
+        if checkpoint.get("lead"):
+            lead_contacts.setdefault(thread_id, checkpoint["lead"])
+        route = RouteDecision(stage=checkpoint.get("stage") or "collecting", model=checkpoint.get("model"))
+        context = {k: checkpoint.get(k) for k in ("session_id", "usage_key", "trimmed", "stage", "model")}
+        recovery = get_run_recovery()
+        record = recovery.start(thread_id, run_id, **context)
+        record.update(used_tools=checkpoint.get("used_tools", False), tool_outputs=checkpoint.get("tool_outputs") or {})
+        started = time.perf_counter()
+        try:
+            run = await self._drive_run(thread_id, run_id, record)
+            self.model_router.record(route, run, time.perf_counter() - started)
+            await self.usage_tracker.record_run(context["usage_key"] or thread_id, run,
+                                                trimmed=bool(context["trimmed"]), flags=session_flags(thread_id))
+            print(f"Resumed run {run_id} finished with status: {run.status}")
+        except (RunHandoff, asyncio.CancelledError):
+            # Este worker também está encerrando: devolve o run à fila
+            if recovery.draining:
+                await recovery.checkpoint(record, "shutdown during recovery")
+            raise
+        except Exception:
+            # A retomada devolve o checkpoint à fila: leva as saídas das ferramentas que já rodaram
+            checkpoint.update(used_tools=record["used_tools"], tool_outputs=record["tool_outputs"])
+            raise
+        finally:
+            recovery.finish(record)
+
+    async def _abort_run(self, thread_id: str, run_id: str) -> None:
+        """Cancela o run na OpenAI e descarta o estado de horários do thread (holds, oferta, prefetch)."""
+        try:
+            await self.client.with_options(timeout=10.0).beta.threads.runs.cancel(thread_id=thread_id, run_id=run_id)
+            print(f"Run {run_id} cancelled")
+        except Exception as e:
+            print(f"Error cancelling run {run_id}: {e}")
+        offered = list(temp_slot_mapping.get(thread_id, {}).values())
+        if offered:
+            await slot_hold_service.release_slots(thread_id, offered)
+        slot_store.clear_thread(thread_id)
+
+    async def _fast_path_booking(self, thread_id: str, message: str):
+        """
+        Escolha de horário resolvida localmente (slot_matcher): agenda sem run e
+        grava a pergunta e a confirmação no thread. None = segue o fluxo normal.
+        """
+        arguments = slot_matcher.plan_booking(thread_id, message)
+        if arguments is None:
+            return None
+        _tool_event("agendarReuniao", "start")
+        try:
+            output = await slot_matcher.book(thread_id, arguments)
+        finally:
+            _tool_event("agendarReuniao", "done")
+        if output is None:
+            return None
+        response = slot_matcher.confirmation_message(output)
+        try:
+            await self._api.beta.threads.messages.create(thread_id=thread_id, role="user", content=message)
+            await self._api.beta.threads.messages.create(
+                thread_id=thread_id, role="assistant", content=response,
+                metadata={"fast_path": "agendarReuniao", "start_time_utc": str(output.get("start_time_utc"))},
+            )
+        except Exception as e:
+            # A reunião já foi agendada: responde mesmo sem conseguir registrar no thread
+            print(f"Error writing fast-path booking to thread {thread_id}: {e}")
+        print(f"Assistant response (fast path): {response}")
+        return response
+
+    async def get_assistant_response(self, thread_id: str, message: str, cacheable: bool = False,
+                                     session_id: str = None,
+                                     on_tool: Optional[Callable[[Dict[str, Any]], None]] = None) -> str:
+        """
+        Obtém resposta do assistente.
+
+        `cacheable=True` indica que o turno não depende do contexto da conversa
+        (ex: primeira mensagem do thread); nesse caso a resposta pode vir do
+        cache e, se o run terminar sem tool calls, é guardada nele.
+        O uso de tokens é contabilizado por `session_id` (ou pelo thread).
+        `on_tool` recebe `{"type": "tool", "name": ..., "status": "start" | "done"}`
+        em torno de cada ferramenta (progresso no WebSocket).
+        """
+        token = _tool_listener.set(on_tool)
+        try:
+            return await self._get_assistant_response(thread_id, message, cacheable, session_id)
+        finally:
+            _tool_listener.reset(token)
+
+    async def _get_assistant_response(self, thread_id: str, message: str, cacheable: bool,
+                                      session_id: Optional[str]) -> str:
         print(f"Processing message in thread: {thread_id}")
+        fast_response = await self._fast_path_booking(thread_id, message)
+        if fast_response is not None:
+            return fast_response
+        cache_key = None
+        if cacheable and self.response_cache is not None:
+            cache_key = ResponseCache.make_key(message, self.assistant_id, self.instructions_version)
+            try:
+                cached = await self._get_cached_response(thread_id, message, cache_key)
+            except Exception as e:
+                print(f"Error writing cached response to thread: {e}")
+                return f"Erro ao processar sua mensagem: {e}"
+            if cached is not None:
+                return cached
         try:
-            self.client.beta.threads.messages.create(thread_id=thread_id, role="user", content=message)
+            await self._api.beta.threads.messages.create(thread_id=thread_id, role="user", content=message)
         except Exception as e:
             print(f"Error adding message to thread: {e}")
             return f"Erro ao processar sua mensagem: {e}"
-        run = self.client.beta.threads.runs.create(thread_id=thread_id, assistant_id=self.assistant_id)
-        print(f"Created run: {run.id} with status: {run.status}")
+        usage_key = session_id or thread_id
+        state = await self.usage_tracker.get_state(usage_key)
+        run_options = await self._prepare_run_options(thread_id, usage_key, state)
+        trimmed = run_options["truncation_strategy"]["type"] == "last_messages"
+        route = self.model_router.route(thread_id, state)
+        run, started = await self._create_run(thread_id, run_options, route)
+        # Acompanhado para o shutdown: vira checkpoint se o worker encerrar no meio
+        recovery = get_run_recovery()
+        record = recovery.start(thread_id, run.id, session_id=session_id, usage_key=usage_key, trimmed=trimmed,
+                                stage=route.stage, model=route.model)
         try:
-            run = await self._wait_for_run_completion(thread_id, run.id)
-            while run.status == "requires_action":
-                print("Run requires action, handling tool calls...")
-                run = await self._handle_required_action(thread_id, run)
-            if run.status == "completed":
-                messages = self.client.beta.threads.messages.list(thread_id=thread_id, order="desc", limit=1)
-                if messages.data and messages.data[0].content:
+            while True:
+                run = await self._drive_run(thread_id, run.id, record)
+                self.model_router.record(route, run, time.perf_counter() - started)
+                await self.usage_tracker.record_run(usage_key, run, trimmed=trimmed, flags=session_flags(thread_id))
+                if not self.model_router.should_escalate(route, run, used_tools=record["used_tools"]):
+                    break
+                # Modelo roteado falhou: refaz o run no modelo padrão (a mensagem do usuário já está no thread)
+                route = self.model_router.escalate(route)
+                run, started = await self._create_run(thread_id, run_options, route)
+                record.update(run_id=run.id, model=route.model)
+            # "incomplete" = o run bateu no max_prompt/completion_tokens, mas pode ter respondido
+            if run.status in ["completed", "incomplete"]:
+                messages = await self._api.beta.threads.messages.list(thread_id=thread_id, order="desc", limit=1)
+                if messages.data and messages.data[0].content and messages.data[0].role == "assistant":
                     response = messages.data[0].content[0].text.value
                     print(f"Assistant response: {response}")
+                    if cache_key and not record["used_tools"] and run.status == "completed":
+                        self.response_cache.set(cache_key, response)
                     return response
                 else:
                     # Limpa mapeamento se a resposta final for vazia (pouco provável)
@@ -225,10 +406,23 @@ class OpenAIService:
                 # Limpa mapeamento se o run falhar
                 if thread_id in temp_slot_mapping: del temp_slot_mapping[thread_id]
                 return error_msg
+        except RunHandoff:
+            # Worker encerrando: outro worker retoma o run; a resposta aparece no histórico
+            await recovery.checkpoint(record, "shutdown")
+            return HANDOFF_MESSAGE
+        except asyncio.CancelledError:
+            if recovery.draining:
+                # Cancelado pelo shutdown: o run segue na OpenAI (com os horários) para outro worker retomar
+                await recovery.checkpoint(record, "cancelled during shutdown")
+                raise
+            # Cliente desconectou: para o run (e as tools pendentes) e libera os horários oferecidos
+            print(f"Run {run.id} aborted: request cancelled.")
+            await self._abort_run(thread_id, run.id)
+            raise
         except TimeoutError:
+            # Inclui o prazo da requisição esgotado (DeadlineExceeded)
             print(f"Run {run.id} timed out.")
-            # Limpa mapeamento em caso de timeout
-            if thread_id in temp_slot_mapping: del temp_slot_mapping[thread_id]
+            await self._abort_run(thread_id, run.id)
             return "O assistente demorou muito para responder. Tente novamente."
         except Exception as e:
             print(f"Error during run processing: {e}")
@@ -237,17 +431,33 @@ class OpenAIService:
             # Limpa mapeamento em caso de erro geral
             if thread_id in temp_slot_mapping: del temp_slot_mapping[thread_id]
             return f"Ocorreu um erro inesperado: {e}"
+        finally:
+            recovery.finish(record)
 
-    def cleanup_thread(self, thread_id: str):
+    async def get_history(self, thread_id: str) -> List[Dict[str, Any]]:
+        """Mensagens do thread com texto, em ordem cronológica."""
+        messages = await self.client.beta.threads.messages.list(thread_id=thread_id)
+        return [
+            {"role": msg.role, "content": msg.content[0].text.value, "timestamp": msg.created_at}
+            for msg in reversed(messages.data)
+            if msg.content and len(msg.content) > 0 and hasattr(msg.content[0], 'text')
+        ]
+
+    async def cleanup_thread(self, thread_id: str):
         """Deleta um thread específico da OpenAI e limpa o mapeamento"""
         try:
-            self.client.beta.threads.delete(thread_id)
+            await self.client.beta.threads.delete(thread_id)
             print(f"Thread {thread_id} deleted")
         except Exception as e:
             print(f"Error cleaning up thread {thread_id}: {e}")
         finally:
-            # Garante que o mapeamento seja limpo mesmo se a deleção falhar
+            # Garante que o mapeamento (e prefetch pendente) seja limpo mesmo se a deleção falhar
             if thread_id in temp_slot_mapping:
-                del temp_slot_mapping[thread_id]
                 print(f"Slot mapping for thread {thread_id} cleared.")
+            slot_store.clear_thread(thread_id)
+
+    async def close(self):
+        """Fecha o pool HTTP do cliente OpenAI (instâncias por empresa despejadas do cache)."""
+        if self._client is not None:
+            await self._client.close()
 
@@ -0,0 +1,199 @@
+# backend/services/pipefy_mirror.py
+
+"""
+Espelho local (no Redis) do pipe de leads do Pipefy.
+
+Permite que o `PipefyService` resolva e-mail -> card e leia os valores
+atuais dos campos sem consultar a API do Pipefy a cada registro de lead,
+e que só escreva campos que realmente mudaram.
+
+O espelho é mantido por três caminhos:
+- sincronização inicial paginada (`full_sync`);
+- webhooks do Pipefy (`handle_webhook`, rota POST /api/webhooks/pipefy);
+- reconciliação periódica por cursor (`reconcile_step`), que percorre o pipe
+  algumas páginas por vez e corrige eventuais webhooks perdidos.
+
+Redis foi escolhido (e não SQLite) porque a API roda como função serverless
+sem disco persistente e com várias instâncias simultâneas.
+"""
+
+import json
+import time
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+MIRROR_PREFIX = "pipefy:mirror:"
+META_KEY = f"{MIRROR_PREFIX}meta"
+
+CARD_SELECTION = "id title updated_at fields { field { id } value }"
+
+
+class PipefyMirror:
+    def __init__(self, redis_factory, email_field_id: str, page_size: int = 50):
+        self._redis_factory = redis_factory
+        self.email_field_id = email_field_id
+        self.page_size = page_size
+
+    # --- Chaves ---
+
+    @staticmethod
+    def _card_key(card_id: str) -> str:
+        return f"{MIRROR_PREFIX}card:{card_id}"
+
+    @staticmethod
+    def _email_key(email: str) -> str:
+        return f"{MIRROR_PREFIX}email:{email.strip().lower()}"
+
+    # --- Leitura ---
+
+    async def is_ready(self) -> bool:
+        """O espelho só responde consultas após uma sincronização inicial completa."""
+        return bool(await self._redis_factory().hget(META_KEY, "synced_at"))
+
+    async def get_card_id(self, email: str) -> Optional[str]:
+        return await self._redis_factory().get(self._email_key(email))
+
+    async def get_card_ids(self, emails: Iterable[str]) -> Dict[str, str]:
+        emails = list(emails)
+        if not emails:
+            return {}
+        card_ids = await self._redis_factory().mget([self._email_key(email) for email in emails])
+        return {email: card_id for email, card_id in zip(emails, card_ids) if card_id}
+
+    async def get_card(self, card_id: str) -> Optional[Dict[str, Any]]:
+        raw = await self._redis_factory().get(self._card_key(card_id))
+        return json.loads(raw) if raw else None
+
+    # --- Escrita ---
+
+    def _normalize_node(self, node: Dict[str, Any]) -> Dict[str, Any]:
+        """Converte um card da API ({fields: [{field: {id}, value}]}) para o formato do espelho."""
+        fields = {}
+        for field in node.get("fields") or []:
+            field_id = (field.get("field") or {}).get("id")
+            if field_id:
+                fields[field_id] = field.get("value")
+        return {
+            "id": str(node["id"]),
+            "title": node.get("title"),
+            "updated_at": node.get("updated_at"),
+            "fields": fields,
+        }
+
+    async def _store(self, card: Dict[str, Any], previous: Optional[Dict[str, Any]] = None) -> None:
+        pipe = self._redis_factory().pipeline(transaction=False)
+        old_email = ((previous or {}).get("fields") or {}).get(self.email_field_id)
+        new_email = card["fields"].get(self.email_field_id)
+        if old_email and (not new_email or old_email.lower() != new_email.lower()):
+            pipe.delete(self._email_key(old_email))
+        pipe.set(self._card_key(card["id"]), json.dumps(card, ensure_ascii=False))
+        if new_email:
+            pipe.set(self._email_key(new_email), card["id"])
+        await pipe.execute()
+
+    async def upsert_node(self, node: Dict[str, Any]) -> Dict[str, Any]:
+        """Grava um card vindo da API do Pipefy."""
+        card = self._normalize_node(node)
+        await self._store(card, await self.get_card(card["id"]))
+        return card
+
+    async def apply_local_update(self, card_id: str, field_values: Dict[str, Any], title: str = None) -> None:
+        """Write-through: reflete no espelho os campos que acabamos de gravar no Pipefy."""
+        previous = await self.get_card(card_id)
+        card = previous or {"id": str(card_id), "title": title, "updated_at": None, "fields": {}}
+        card = {**card, "fields": {**card["fields"], **{k: v for k, v in field_values.items() if v is not None}}}
+        if title:
+            card["title"] = title
+        await self._store(card, previous)
+
+    async def delete_card(self, card_id: str) -> None:
+        previous = await self.get_card(card_id)
+        pipe = self._redis_factory().pipeline(transaction=False)
+        pipe.delete(self._card_key(card_id))
+        email = ((previous or {}).get("fields") or {}).get(self.email_field_id)
+        if email:
+            pipe.delete(self._email_key(email))
+        await pipe.execute()
+
+    # --- Sincronização ---
+
+    async def fetch_page(self, pipefy_service, cursor: Optional[str]) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """Busca uma página de cards do pipe. Retorna (nodes, próximo cursor ou None)."""
+        after = f', after: {json.dumps(cursor)}' if cursor else ""
+        query = f'''
+        {{
+            cards(pipe_id: {pipefy_service.pipe_id}, first: {self.page_size}{after}) {{
+                pageInfo {{ hasNextPage endCursor }}
+                edges {{ node {{ {CARD_SELECTION} }} }}
+            }}
+        }}
+        '''
+        result = await pipefy_service._execute_query(query)
+        if result.get("errors"):
+            raise RuntimeError(f"Pipefy mirror sync failed: {result['errors']}")
+        cards = result["data"]["cards"]
+        nodes = [edge["node"] for edge in cards.get("edges", [])]
+        page_info = cards.get("pageInfo") or {}
+        return nodes, page_info.get("endCursor") if page_info.get("hasNextPage") else None
+
+    async def reconcile_step(self, pipefy_service, max_pages: int = 5) -> Dict[str, Any]:
+        """
+        Avança a reconciliação a partir do cursor salvo, no máximo `max_pages`
+        páginas. Ao chegar ao fim do pipe, marca o espelho como sincronizado e
+        reinicia o cursor para a próxima volta.
+        """
+        client = self._redis_factory()
+        cursor = await client.hget(META_KEY, "reconcile_cursor") or None
+        synced = 0
+        for _ in range(max_pages):
+            nodes, cursor = await self.fetch_page(pipefy_service, cursor)
+            for node in nodes:
+                await self.upsert_node(node)
+            synced += len(nodes)
+            if cursor is None:
+                break
+        meta = {"reconcile_cursor": cursor or "", "last_reconcile_at": int(time.time())}
+        if cursor is None:
+            meta["synced_at"] = int(time.time())
+        await client.hset(META_KEY, mapping=meta)
+        print(f"Pipefy mirror reconcile: {synced} cards, {'completo' if cursor is None else 'continua no próximo passo'}")
+        return {"cards": synced, "complete": cursor is None}
+
+    async def full_sync(self, pipefy_service) -> int:
+        """Sincronização inicial: percorre o pipe inteiro."""
+        await self._redis_factory().hset(META_KEY, "reconcile_cursor", "")
+        total = 0
+        while True:
+            step = await self.reconcile_step(pipefy_service, max_pages=20)
+            total += step["cards"]
+            if step["complete"]:
+                return total
+
+    async def fetch_card(self, pipefy_service, card_id: str) -> Optional[Dict[str, Any]]:
+        result = await pipefy_service._execute_query(f'{{ card(id: {json.dumps(str(card_id))}) {{ {CARD_SELECTION} }} }}')
+        if result.get("errors"):
+            raise RuntimeError(f"Pipefy card fetch failed: {result['errors']}")
+        return (result.get("data") or {}).get("card")
+
+    async def handle_webhook(self, pipefy_service, payload: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Aplica um evento de webhook do Pipefy (card.create, card.field_update,
+        card.move, card.done, card.delete...). O payload traz o id do card; o
+        estado atual é buscado na API para não depender do formato do evento.
+        """
+        data = payload.get("data") or payload
+        action = data.get("action", "")
+        card_id = (data.get("card") or {}).get("id")
+        if not card_id:
+            return {"status": "ignored", "reason": "evento sem card"}
+        if action == "card.delete":
+            await self.delete_card(str(card_id))
+            return {"status": "deleted", "card_id": str(card_id)}
+        node = await self.fetch_card(pipefy_service, card_id)
+        if node is None:
+            await self.delete_card(str(card_id))
+            return {"status": "deleted", "card_id": str(card_id)}
+        await self.upsert_node(node)
+        return {"status": "updated", "card_id": str(card_id), "action": action}
+
+    async def stats(self) -> Dict[str, Any]:
+        return await self._redis_factory().hgetall(META_KEY) or {}
@@ -1,11 +1,15 @@
-import os
 import asyncio
 import httpx
 from datetime import datetime
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Iterable, Optional
 import json
 
 from ..models import Lead
+from ..config import current_settings
+from .pipefy_mirror import PipefyMirror
+from .redis_service import get_redis
+from . import traffic_recorder
+from .request_context import deadline_timeout
 
 class PipefyService:
     """
@@ -13,22 +17,27 @@ class PipefyService:
     Gerencia criação e atualização de cards no pipe de leads
     """
     
-    def __init__(self):
-        self.api_key = os.getenv("PIPEFY_API_KEY")
-        self.pipe_id = os.getenv("PIPEFY_PIPE_ID")
+    def __init__(self, client: Optional[httpx.AsyncClient] = None):
+        """
+        `client` permite injetar um httpx.AsyncClient (ex: com transport
+        de teste/stand-in local); por padrão um novo client é criado.
+        """
+        settings = current_settings()
+        self.api_key = settings.pipefy_api_key
+        self.pipe_id = settings.pipefy_pipe_id
         self.api_url = "https://api.pipefy.com/graphql"
 
-        # Carrega IDs de campos do .env
-        self.field_id_name = os.getenv("PIPEFY_NAME_FIELD_ID", "nome_do_lead")
-        self.field_id_email = os.getenv("PIPEFY_EMAIL_FIELD_ID", "e_mail")
-        self.field_id_company = os.getenv("PIPEFY_COMPANY_FIELD_ID", "empresa")
-        self.field_id_need = os.getenv("PIPEFY_NEED_FIELD_ID", "necessidade_espec_fica")
-        self.field_id_interest = os.getenv("PIPEFY_INTEREST_FIELD_ID", "checklist_vertical")
-        self.field_id_meeting_link = os.getenv("PIPEFY_MEETING_LINK_FIELD_ID", "link_da_reuni_o")
-        self.field_id_meeting_time = os.getenv("PIPEFY_MEETING_TIME_FIELD_ID", "data_e_hora_da_reuni_o")
+        # IDs de campos (vindos do .env, já validados em `config.Settings`)
+        self.field_id_name = settings.pipefy_name_field_id
+        self.field_id_email = settings.pipefy_email_field_id
+        self.field_id_company = settings.pipefy_company_field_id
+        self.field_id_need = settings.pipefy_need_field_id
+        self.field_id_interest = settings.pipefy_interest_field_id
+        self.field_id_meeting_link = settings.pipefy_meeting_link_field_id
+        self.field_id_meeting_time = settings.pipefy_meeting_time_field_id
         
         # Nome do campo de email (para busca)
-        self.email_field_name = os.getenv("PIPEFY_EMAIL_FIELD_NAME", "E-mail")
+        self.email_field_name = settings.pipefy_email_field_name
 
         if not all([self.api_key, self.pipe_id, self.field_id_email]):
             raise ValueError("Pipefy environment variables are not properly configured (PIPEFY_API_KEY, PIPEFY_PIPE_ID, PIPEFY_EMAIL_FIELD_ID)")
@@ -37,7 +46,10 @@ class PipefyService:
             "Authorization": f"Bearer {self.api_key}",
             "Content-Type": "application/json"
         }
-        self.client = httpx.AsyncClient(timeout=30.0)
+        self.client = client or httpx.AsyncClient(timeout=30.0, transport=traffic_recorder.transport_for("pipefy", is_async=True))
+
+        # Espelho local do pipe (Redis): consultas e detecção de mudanças sem ir à API
+        self.mirror = PipefyMirror(get_redis, self.field_id_email) if settings.pipefy_mirror_enabled else None
 
     async def _execute_query(self, query: str) -> Dict[str, Any]:
         """Executa uma query GraphQL na API da Pipefy de forma assíncrona"""
@@ -45,7 +57,8 @@ class PipefyService:
             response = await self.client.post(
                 self.api_url, 
                 headers=self.headers, 
-                json={"query": query}
+                json={"query": query},
+                timeout=deadline_timeout(30.0)
             )
             response.raise_for_status()
             return response.json()
@@ -59,8 +72,42 @@ class PipefyService:
             print(f"Pipefy API unexpected error: {e}")
             return {"errors": [{"message": str(e)}]}
 
+    async def _mirror_ready(self) -> bool:
+        """True se o espelho está habilitado e já passou pela sincronização inicial."""
+        if self.mirror is None:
+            return False
+        try:
+            return await self.mirror.is_ready()
+        except Exception as e:
+            print(f"Pipefy mirror unavailable, falling back to API: {e}")
+            return False
+
+    async def _mirror_write_through(self, card_id: str, field_values: Dict[str, Any], title: str = None) -> None:
+        if self.mirror is None:
+            return
+        try:
+            await self.mirror.apply_local_update(card_id, field_values, title=title)
+        except Exception as e:
+            # O espelho é corrigido pelo webhook/reconciliação; não falha o registro do lead
+            print(f"Pipefy mirror write-through failed for card {card_id}: {e}")
+
+    @staticmethod
+    def _same_value(current: Any, new: Any) -> bool:
+        """Compara o valor do espelho com o que seria escrito (checklists vêm como '["x"]')."""
+        if current is None:
+            return False
+        return str(current) == str(new) or current == json.dumps([new], ensure_ascii=False)
+
     async def _find_card_by_email(self, email: str) -> Dict[str, Any]:
         """Encontra cards existentes pelo email"""
+        if await self._mirror_ready():
+            try:
+                card_id = await self.mirror.get_card_id(email)
+                edges = [{'node': {'id': card_id}}] if card_id else []
+                return {'data': {'cards': {'edges': edges}}}
+            except Exception as e:
+                print(f"Pipefy mirror lookup failed, falling back to API: {e}")
+
         # Esta query busca os últimos 50 cards. Para produção, considere uma busca mais robusta.
         query = f'''
         {{
@@ -140,18 +187,28 @@ class PipefyService:
         return f'"{str(value)}"'
 
 
-    async def _create_card(self, lead: Lead) -> Dict[str, Any]:
-        """Cria um novo card no pipe"""
-        
-        fields_map = {
-            self.field_id_name: lead.name or "Lead (Nome Pendente)",
+    def _lead_field_values(self, lead: Lead) -> Dict[str, Any]:
+        """Mapeia o Lead para {field_id: valor} (apenas campos preenchidos)."""
+        field_mapping = {
+            self.field_id_name: lead.name,
             self.field_id_email: lead.email,
-            self.field_id_company: lead.company or "Empresa não informada",
-            self.field_id_need: lead.need or "Interesse em nossos serviços",
+            self.field_id_company: lead.company,
+            self.field_id_need: lead.need,
             self.field_id_interest: "Confirmado" if lead.interest_confirmed else "Não confirmado",
             self.field_id_meeting_link: lead.meeting_link,
             self.field_id_meeting_time: lead.meeting_datetime.isoformat() if lead.meeting_datetime else None
         }
+        return {field_id: value for field_id, value in field_mapping.items() if value is not None}
+
+    async def _create_card(self, lead: Lead) -> Dict[str, Any]:
+        """Cria um novo card no pipe"""
+        
+        fields_map = self._lead_field_values(lead)
+        # Card novo: nome, empresa e necessidade nunca ficam em branco
+        for field_id, default in ((self.field_id_name, "Lead (Nome Pendente)"),
+                                  (self.field_id_company, "Empresa não informada"),
+                                  (self.field_id_need, "Interesse em nossos serviços")):
+            fields_map[field_id] = fields_map.get(field_id) or default
 
         fields_array = []
         for field_id, value in fields_map.items():
@@ -186,17 +243,35 @@ class PipefyService:
     async def _update_card_fields(self, card_id: str, lead: Lead) -> Dict[str, Any]:
         """Atualiza todos os campos de um card existente (um por um, em paralelo)"""
         
-        # Mapeia os campos do Pydantic para os IDs de campo do Pipefy
-        field_mapping = {
-            self.field_id_name: lead.name,
-            self.field_id_email: lead.email,
-            self.field_id_company: lead.company,
-            self.field_id_need: lead.need,
-            self.field_id_interest: "Confirmado" if lead.interest_confirmed else "Não confirmado",
-            self.field_id_meeting_link: lead.meeting_link,
-            self.field_id_meeting_time: lead.meeting_datetime.isoformat() if lead.meeting_datetime else None
-        }
-        
+        return await self._write_card_fields(card_id, self._lead_field_values(lead))
+
+    async def _write_card_fields(self, card_id: str, field_mapping: Dict[str, Any]) -> Dict[str, Any]:
+        """Escreve {field_id: valor} no card (campos None são ignorados), um campo por requisição, em paralelo"""
+        field_mapping = dict(field_mapping)
+
+        # Com o espelho, só escreve os campos cujo valor atual difere do novo
+        unchanged = []
+        if await self._mirror_ready():
+            try:
+                current = (await self.mirror.get_card(card_id) or {}).get("fields", {})
+            except Exception as e:
+                print(f"Pipefy mirror read failed for card {card_id}: {e}")
+                current = {}
+            for field_id, value in list(field_mapping.items()):
+                if value is not None and self._same_value(current.get(field_id), value):
+                    unchanged.append(field_id)
+                    field_mapping[field_id] = None
+            if unchanged and not any(value is not None for value in field_mapping.values()):
+                print(f"Card {card_id} already up to date, skipping write.")
+                return {
+                    'success': True,
+                    'message': 'No field changes',
+                    'card_id': card_id,
+                    'successful_updates': [],
+                    'failed_updates': [],
+                    'unchanged_fields': unchanged
+                }
+
         successful_updates = []
         failed_updates = []
         
@@ -223,12 +298,14 @@ class PipefyService:
                 failed_updates.append(field_id)
         
         if successful_updates:
+            await self._mirror_write_through(card_id, {fid: field_mapping[fid] for fid in successful_updates})
             return {
                 'success': True,
                 'message': f'Successfully updated {len(successful_updates)} fields',
                 'card_id': card_id,
                 'successful_updates': successful_updates,
-                'failed_updates': failed_updates
+                'failed_updates': failed_updates,
+                'unchanged_fields': unchanged
             }
         else:
             return {
@@ -238,6 +315,27 @@ class PipefyService:
                 'errors': [str(e) for e in results if isinstance(e, Exception)]
             }
 
+    async def update_lead_meeting(self, email: str, meeting_datetime: Optional[str],
+                                  meeting_link: Optional[str]) -> Dict[str, Any]:
+        """
+        Atualiza apenas os campos de reunião do card do lead (ex: booking
+        remarcado/cancelado no Cal.com). Valores None limpam o campo.
+        """
+        try:
+            existing_card_data = await self._find_card_by_email(email)
+            if existing_card_data.get('errors'):
+                return {"success": False, "error": "Search failed", "details": existing_card_data['errors']}
+            cards_edges = existing_card_data.get("data", {}).get("cards", {}).get("edges", [])
+            if not cards_edges:
+                return {"success": False, "error": f"No card found for email {email}"}
+            return await self._write_card_fields(cards_edges[0]["node"]["id"], {
+                self.field_id_meeting_time: meeting_datetime or "",
+                self.field_id_meeting_link: meeting_link or "",
+            })
+        except Exception as e:
+            print(f"Error in update_lead_meeting: {e}")
+            return {"success": False, "error": str(e)}
+
     async def create_or_update_lead(self, lead: Lead) -> Dict[str, Any]:
         """
         Cria ou atualiza um lead no Pipefy
@@ -261,10 +359,12 @@ class PipefyService:
                 print(f"No card found for email {lead.email}. Creating new card...")
                 result = await self._create_card(lead)
                 if result.get('data', {}).get('createCard'):
+                    card = result['data']['createCard']['card']
+                    await self._mirror_write_through(card['id'], self._lead_field_values(lead), title=card.get('title'))
                     return {
                         'success': True,
                         'message': 'Card created successfully',
-                        'card_id': result['data']['createCard']['card']['id']
+                        'card_id': card['id']
                     }
                 else:
                     return {
@@ -276,6 +376,88 @@ class PipefyService:
             print(f"Error in create_or_update_lead: {e}")
             return {"success": False, "error": str(e)}
 
+    # --- Operações em lote (importação/sincronização de leads) ---
+
+    async def find_cards_by_emails(self, emails: Iterable[str]) -> Dict[str, Any]:
+        """
+        Resolve vários e-mails em uma única requisição (um `findCards` com alias
+        por e-mail). Retorna {"cards": {email: card_id}} ou {"errors": [...]}.
+        """
+        emails = list(emails)
+        if not emails:
+            return {"cards": {}}
+        if await self._mirror_ready():
+            try:
+                return {"cards": await self.mirror.get_card_ids(emails)}
+            except Exception as e:
+                print(f"Pipefy mirror lookup failed, falling back to API: {e}")
+        selections = []
+        for i, email in enumerate(emails):
+            selections.append(f'''
+            e{i}: findCards(pipeId: {self.pipe_id}, first: 1, search: {{fieldId: "{self.field_id_email}", fieldValue: {json.dumps(email)}}}) {{
+                edges {{ node {{ id }} }}
+            }}''')
+        result = await self._execute_query("{" + "".join(selections) + "\n}")
+        data = result.get("data") or {}
+        if not data and result.get("errors"):
+            return {"errors": result["errors"]}
+        cards = {}
+        for i, email in enumerate(emails):
+            edges = (data.get(f"e{i}") or {}).get("edges") or []
+            if edges:
+                cards[email] = edges[0]["node"]["id"]
+        return {"cards": cards}
+
+    async def upsert_leads_batch(self, leads: List[Lead], existing_cards: Dict[str, str]) -> Dict[str, Any]:
+        """
+        Cria/atualiza um lote de leads em UMA mutation GraphQL (aliases):
+        `createCard` para e-mails novos e `updateFieldsValues` (todos os campos
+        de uma vez) para cards existentes.
+        Retorna {"created": [emails], "updated": [emails], "failed": {email: erro}}.
+        """
+        if not leads:
+            return {"created": [], "updated": [], "failed": {}}
+        operations = []
+        aliases = {}
+        for i, lead in enumerate(leads):
+            alias = f"m{i}"
+            values = self._lead_field_values(lead)
+            aliases[alias] = (lead, values)
+            card_id = existing_cards.get(lead.email)
+            if card_id:
+                values_str = ", ".join(
+                    f'{{fieldId: "{field_id}", value: {self._format_field_value(value)}}}' for field_id, value in values.items()
+                )
+                operations.append(f'''
+            {alias}: updateFieldsValues(input: {{nodeId: "{card_id}", values: [{values_str}]}}) {{ success }}''')
+            else:
+                fields_str = ", ".join(
+                    f'{{field_id: "{field_id}", field_value: {self._format_field_value(value)}}}' for field_id, value in values.items()
+                )
+                title = json.dumps(f"{lead.name or 'Novo Lead'} - {lead.email}")
+                operations.append(f'''
+            {alias}: createCard(input: {{pipe_id: {self.pipe_id}, title: {title}, fields_attributes: [{fields_str}]}}) {{ card {{ id }} }}''')
+
+        result = await self._execute_query("mutation {" + "".join(operations) + "\n}")
+        data = result.get("data") or {}
+        errors_by_alias = {}
+        for error in result.get("errors", []):
+            path = error.get("path") or []
+            errors_by_alias[path[0] if path else None] = error.get("message", "erro desconhecido")
+
+        summary = {"created": [], "updated": [], "failed": {}}
+        for alias, (lead, values) in aliases.items():
+            payload = data.get(alias)
+            if lead.email in existing_cards and payload and payload.get("success"):
+                summary["updated"].append(lead.email)
+                await self._mirror_write_through(existing_cards[lead.email], values)
+            elif lead.email not in existing_cards and payload and payload.get("card"):
+                summary["created"].append(lead.email)
+                await self._mirror_write_through(payload["card"]["id"], values)
+            else:
+                summary["failed"][lead.email] = errors_by_alias.get(alias) or errors_by_alias.get(None) or "sem resposta"
+        return summary
+
     async def close(self):
         """Fecha o client HTTP"""
         await self.client.aclose()
@@ -0,0 +1,43 @@
+# backend/services/rate_limiter.py
+
+import asyncio
+import time
+
+
+class TokenBucket:
+    """
+    Token bucket simples (em memória, por processo).
+
+    `rate` tokens são repostos por segundo, até `capacity`. Use `try_acquire`
+    para decidir sem esperar (ex: rejeitar requisições) ou `await acquire()`
+    para aguardar a vez (ex: respeitar o limite de uma API externa).
+    """
+
+    def __init__(self, rate: float, capacity: float = None):
+        if rate <= 0:
+            raise ValueError("rate deve ser maior que zero")
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(rate, 1.0)
+        self.tokens = self.capacity
+        self.updated_at = time.monotonic()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    def try_acquire(self, tokens: float = 1) -> bool:
+        self._refill()
+        if self.tokens >= tokens:
+            self.tokens -= tokens
+            return True
+        return False
+
+    def retry_after(self, tokens: float = 1) -> float:
+        """Segundos até haver `tokens` disponíveis."""
+        self._refill()
+        return max(0.0, (tokens - self.tokens) / self.rate)
+
+    async def acquire(self, tokens: float = 1) -> None:
+        while not self.try_acquire(tokens):
+            await asyncio.sleep(self.retry_after(tokens))
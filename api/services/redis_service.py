@@ -0,0 +1,20 @@
+# backend/services/redis_service.py
+
+"""
+Cliente Redis (Upstash) compartilhado pela API e pelos serviços.
+
+O cliente e seu pool de conexões são criados no primeiro uso e reaproveitados
+por todo o processo, em vez de um pool novo por requisição.
+"""
+
+from functools import lru_cache
+
+import redis.asyncio as redis
+
+from ..config import get_settings
+
+
+@lru_cache(maxsize=1)
+def get_redis() -> redis.Redis:
+    """Retorna o cliente Redis do processo (falha se o Redis não estiver configurado)."""
+    return redis.from_url(get_settings().require_redis_url(), decode_responses=True)
@@ -0,0 +1,44 @@
+# backend/services/request_context.py
+
+"""
+Prazo (deadline) por requisição, propagado por contextvar.
+
+A rota define o prazo uma vez (`set_deadline`); cada chamada de saída
+(OpenAI, Pipefy, Cal.com) usa `deadline_timeout(padrão)` como timeout, de
+modo que nenhuma chamada ultrapasse o tempo que resta à requisição. Fora de
+uma requisição com prazo, vale o timeout padrão de cada chamada.
+"""
+
+import contextvars
+import time
+from typing import Optional
+
+_deadline: contextvars.ContextVar[Optional[float]] = contextvars.ContextVar("request_deadline", default=None)
+
+
+class DeadlineExceeded(TimeoutError):
+    """O prazo da requisição acabou antes da chamada de saída."""
+
+
+def set_deadline(seconds: Optional[float]) -> contextvars.Token:
+    return _deadline.set(time.monotonic() + seconds if seconds else None)
+
+
+def reset_deadline(token: contextvars.Token) -> None:
+    _deadline.reset(token)
+
+
+def remaining() -> Optional[float]:
+    """Segundos restantes até o prazo (None se não houver prazo)."""
+    deadline = _deadline.get()
+    return None if deadline is None else deadline - time.monotonic()
+
+
+def deadline_timeout(default: float) -> float:
+    """Timeout para a próxima chamada: o menor entre `default` e o tempo restante."""
+    left = remaining()
+    if left is None:
+        return default
+    if left <= 0:
+        raise DeadlineExceeded("Prazo da requisição esgotado")
+    return min(default, left)
@@ -0,0 +1,89 @@
+# backend/services/response_cache.py
+
+import hashlib
+import re
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import Dict, Any, Optional, Tuple
+
+
+def normalize_message(message: str) -> str:
+    """
+    Normaliza a mensagem do usuário para uso como chave de cache:
+    minúsculas, sem acentos, sem pontuação e com espaços colapsados.
+    Ex: "Oi!!  O que vocês fazem?" -> "oi o que voces fazem"
+    """
+    text = unicodedata.normalize("NFKD", message or "")
+    text = "".join(ch for ch in text if not unicodedata.combining(ch))
+    text = re.sub(r"[^\w\s]", " ", text.lower())
+    return re.sub(r"\s+", " ", text).strip()
+
+
+class ResponseCache:
+    """
+    Cache em memória (LRU + TTL) de respostas do assistente para turnos
+    determinísticos (sem tool calls e sem contexto da conversa).
+
+    A chave combina a mensagem normalizada, o assistant_id e a versão das
+    instruções, de forma que trocar o assistente ou o prompt invalida
+    automaticamente as respostas antigas.
+    """
+
+    def __init__(self, ttl_seconds: int = 3600, max_entries: int = 256):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        # chave -> (expira_em, resposta)
+        self._entries: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    @staticmethod
+    def make_key(message: str, assistant_id: str, instructions_version: str) -> str:
+        raw = f"{assistant_id}|{instructions_version}|{normalize_message(message)}"
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        expires_at, response = entry
+        if expires_at <= time.monotonic():
+            del self._entries[key]
+            self.expirations += 1
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)  # Marca como usado recentemente
+        self.hits += 1
+        return response
+
+    def set(self, key: str, response: str) -> None:
+        if not response:
+            return
+        self._entries[key] = (time.monotonic() + self.ttl_seconds, response)
+        self._entries.move_to_end(key)
+        self.stores += 1
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)  # Remove o menos usado
+            self.evictions += 1
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl_seconds,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "stores": self.stores,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+        }
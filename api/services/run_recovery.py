@@ -0,0 +1,271 @@
+# backend/services/run_recovery.py
+
+"""
+Shutdown gracioso dos turnos em andamento e retomada de runs em outro worker.
+
+Num redeploy, o worker recebe SIGTERM com runs da API Assistants ainda em
+polling ou executando ferramentas. Matar o processo nesse ponto deixava o
+run pela metade na OpenAI (às vezes com a reunião já agendada e sem a
+atualização do Pipefy) e o lead recebia um erro. Agora:
+
+1. No sinal (encadeado ao handler do uvicorn) o worker entra em drenagem:
+   a admissão do chat recusa turnos novos com 503 e /api/health/ready
+   responde 503, para o balanceador tirar o worker da rotação.
+2. Os turnos em andamento têm SHUTDOWN_DRAIN_SECONDS para terminar
+   normalmente.
+3. Passado o prazo, cada run ainda em andamento é entregue (handoff) no
+   próximo ponto seguro: ferramentas em execução terminam e têm a saída
+   submetida; no polling seguinte o run vira um checkpoint no Redis (hash
+   `runs:recovery`, campo `<thread_id>:<run_id>`) e o turno responde ao lead
+   que a resposta aparece em instantes. Um turno cancelado durante a
+   drenagem também vira checkpoint, em vez de cancelar o run na OpenAI,
+   levando as saídas das ferramentas que já rodaram.
+4. Os outros workers (e os da versão nova) verificam a fila a cada
+   RUN_RECOVERY_POLL_SECONDS, tomam cada checkpoint de forma atômica (Lua) e
+   retomam o polling e as ferramentas do run, com os serviços da empresa do
+   turno (services/tenants.py); a resposta final fica no thread (histórico).
+5. Uma retomada que falha (OpenAI fora, timeout, empresa não encontrada)
+   devolve o checkpoint à fila, com as saídas das ferramentas que já rodaram,
+   e é tentada de novo com backoff; após RUN_RECOVERY_MAX_ATTEMPTS o
+   checkpoint vai para `runs:recovery:failed`, para inspeção manual.
+"""
+
+import asyncio
+import itertools
+import json
+import os
+import signal
+import socket
+import threading
+import time
+from functools import lru_cache
+from typing import Any, Callable, Dict, Optional
+
+from ..config import get_settings
+from . import tenants
+from .redis_service import get_redis
+from .slot_store import lead_contacts, temp_slot_mapping
+
+RECOVERY_KEY = "runs:recovery"
+FAILED_KEY = "runs:recovery:failed"
+MAX_RETRY_DELAY_SECONDS = 300
+HANDOFF_MESSAGE = ("Estou finalizando a sua resposta e ela aparece aqui na conversa em instantes. "
+                   "Não é preciso reenviar a mensagem.")
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}"
+
+# KEYS[1] = hash de checkpoints; ARGV[1] = campo, ARGV[2] = agora (epoch, s). Devolve o
+# checkpoint (ou nil) e o remove: só um worker retoma cada run. Um checkpoint devolvido
+# após uma falha só pode ser tomado depois do seu `retry_at`.
+_CLAIM_SCRIPT = """
+local value = redis.call('HGET', KEYS[1], ARGV[1])
+if not value then
+    return nil
+end
+local retry_at = cjson.decode(value)['retry_at']
+if type(retry_at) == 'number' and retry_at > tonumber(ARGV[2]) then
+    return nil
+end
+redis.call('HDEL', KEYS[1], ARGV[1])
+return value
+"""
+
+
+class RunHandoff(Exception):
+    """O worker está encerrando: o run deve virar checkpoint no próximo ponto seguro."""
+
+
+@lru_cache(maxsize=1)
+def _claim_script():
+    return get_redis().register_script(_CLAIM_SCRIPT)
+
+
+class RunRecovery:
+    def __init__(self, drain_seconds: float, handoff_seconds: float, poll_interval: float,
+                 max_attempts: int = 5):
+        self.drain_seconds = drain_seconds
+        self.handoff_seconds = handoff_seconds
+        self.poll_interval = poll_interval
+        self.max_attempts = max_attempts
+        self.draining = False
+        self.handoff = False
+        # Runs acompanhados por este worker (turnos e retomadas), para o checkpoint
+        self.in_flight: Dict[int, Dict[str, Any]] = {}
+        self.counters = {"checkpointed": 0, "resumed": 0, "resume_failed": 0, "requeued": 0,
+                         "gave_up": 0, "drains": 0, "drained_clean": 0}
+        self._ids = itertools.count(1)
+        self._drain_task: Optional[asyncio.Task] = None
+        self._resume_tasks = set()
+
+    # --- Runs em andamento ---
+    def start(self, thread_id: str, run_id: str, **context: Any) -> Dict[str, Any]:
+        """Passa a acompanhar um run; `record` guarda o que a retomada precisa (inclusive a empresa)."""
+        record = {"id": next(self._ids), "thread_id": thread_id, "run_id": run_id, "used_tools": False,
+                  "tool_outputs": {}, "started_at": time.time(), "tenant_id": tenants.current_tenant_id(),
+                  **context}
+        self.in_flight[record["id"]] = record
+        return record
+
+    def finish(self, record: Dict[str, Any]) -> None:
+        self.in_flight.pop(record["id"], None)
+
+    def handoff_due(self) -> bool:
+        return self.handoff
+
+    def drain_reason(self) -> Optional[str]:
+        return "worker encerrando (drenando turnos em andamento)" if self.draining else None
+
+    async def checkpoint(self, record: Dict[str, Any], reason: str) -> None:
+        """Grava o run no Redis para outro worker retomar (com os horários e o lead do thread)."""
+        thread_id = record["thread_id"]
+        payload = {**{k: v for k, v in record.items() if k != "id"},
+                   "slots": temp_slot_mapping.get(thread_id), "lead": lead_contacts.get(thread_id),
+                   "reason": reason, "worker": WORKER_ID, "checkpointed_at": time.time()}
+        await get_redis().hset(RECOVERY_KEY, f"{thread_id}:{record['run_id']}", json.dumps(payload, default=str))
+        self.counters["checkpointed"] += 1
+        print(f"Run {record['run_id']} of thread {thread_id} checkpointed for recovery ({reason})")
+
+    # --- Drenagem (shutdown) ---
+    def begin_drain(self, chats_in_flight: Callable[[], int]) -> asyncio.Task:
+        """Inicia a drenagem (uma vez por processo); devolve a task para aguardar o fim."""
+        if self._drain_task is None:
+            self._drain_task = asyncio.create_task(self._drain(chats_in_flight))
+        return self._drain_task
+
+    async def _wait_idle(self, chats_in_flight: Callable[[], int], timeout: float) -> bool:
+        deadline = time.monotonic() + timeout
+        while chats_in_flight() > 0 or self.in_flight:
+            if time.monotonic() >= deadline:
+                return False
+            await asyncio.sleep(0.1)
+        return True
+
+    async def _drain(self, chats_in_flight: Callable[[], int]) -> Dict[str, Any]:
+        self.draining = True
+        self.counters["drains"] += 1
+        print(f"Draining: {chats_in_flight()} chat turn(s) and {len(self.in_flight)} run(s) in flight")
+        if await self._wait_idle(chats_in_flight, self.drain_seconds):
+            self.counters["drained_clean"] += 1
+            return {"clean": True, "left": 0}
+        # Prazo esgotado: os runs restantes viram checkpoint no próximo ponto seguro
+        self.handoff = True
+        print(f"Drain deadline reached; handing off {len(self.in_flight)} run(s)")
+        await self._wait_idle(chats_in_flight, self.handoff_seconds)
+        left = len(self.in_flight)
+        if left:
+            print(f"Shutting down with {left} run(s) still in flight (checkpointed if cancelled)")
+        return {"clean": False, "left": left}
+
+    # --- Retomada (workers ativos) ---
+    async def _claim(self, field: str) -> Optional[Dict[str, Any]]:
+        raw = await _claim_script()(keys=[RECOVERY_KEY], args=[field, time.time()])
+        return json.loads(raw) if raw else None
+
+    async def _requeue(self, checkpoint: Dict[str, Any], error: Exception) -> None:
+        """Devolve à fila (com backoff) um checkpoint cuja retomada falhou; esgotadas as tentativas, para FAILED_KEY."""
+        attempts = int(checkpoint.get("attempts") or 0) + 1
+        payload = {**checkpoint, "attempts": attempts, "last_error": str(error)[:500], "worker": WORKER_ID}
+        field = f"{checkpoint['thread_id']}:{checkpoint['run_id']}"
+        try:
+            if attempts >= self.max_attempts:
+                await get_redis().hset(FAILED_KEY, field, json.dumps(payload, default=str))
+                self.counters["gave_up"] += 1
+                print(f"Giving up on run {checkpoint['run_id']} after {attempts} attempt(s); kept in {FAILED_KEY}")
+                return
+            payload["retry_at"] = time.time() + min(MAX_RETRY_DELAY_SECONDS, self.poll_interval * 2 ** attempts)
+            await get_redis().hset(RECOVERY_KEY, field, json.dumps(payload, default=str))
+            self.counters["requeued"] += 1
+        except Exception as e:
+            print(f"Error requeuing run {checkpoint['run_id']} of thread {checkpoint['thread_id']}: {e} "
+                  f"(checkpoint: {json.dumps(payload, default=str)})")
+
+    async def _resume(self, service_factory: Callable[[], Any], checkpoint: Dict[str, Any]) -> None:
+        try:
+            async with tenants.scope(checkpoint.get("tenant_id")):
+                service = service_factory()
+                if not hasattr(service, "resume_run"):
+                    raise RuntimeError("motor de chat da empresa não tem runs para retomar (CHAT_ENGINE)")
+                await service.resume_run(checkpoint)
+            self.counters["resumed"] += 1
+        except RunHandoff:
+            pass  # este worker também encerrou: resume_run já gravou o checkpoint de novo
+        except Exception as e:
+            self.counters["resume_failed"] += 1
+            print(f"Error resuming run {checkpoint.get('run_id')} of thread {checkpoint.get('thread_id')}: {e}")
+            await self._requeue(checkpoint, e)
+
+    async def resume_pending(self, service_factory: Callable[[], Any]) -> int:
+        """
+        Toma os checkpoints pendentes e retoma cada run em background, com o
+        serviço que `service_factory` devolve na empresa do checkpoint. Retorna quantos tomou.
+        """
+        if self.draining:
+            return 0
+        claimed = 0
+        for field in await get_redis().hkeys(RECOVERY_KEY):
+            checkpoint = await self._claim(field)
+            if checkpoint is None:
+                continue  # outro worker tomou antes
+            claimed += 1
+            print(f"Resuming run {checkpoint['run_id']} of thread {checkpoint['thread_id']} "
+                  f"(checkpointed by {checkpoint.get('worker')})")
+            task = asyncio.create_task(self._resume(service_factory, checkpoint))
+            self._resume_tasks.add(task)
+            task.add_done_callback(self._resume_tasks.discard)
+        return claimed
+
+    async def run(self, service_factory: Callable[[], Any]) -> None:
+        while True:
+            await asyncio.sleep(self.poll_interval)
+            try:
+                await self.resume_pending(service_factory)
+            except Exception as e:
+                print(f"Run recovery round failed: {e}")
+
+    async def pending_count(self) -> int:
+        return int(await get_redis().hlen(RECOVERY_KEY))
+
+    def stats(self) -> Dict[str, Any]:
+        return {"draining": self.draining, "handoff": self.handoff, "in_flight_runs": len(self.in_flight),
+                "resuming": len(self._resume_tasks), **self.counters}
+
+
+def install_signal_handlers(on_signal: Callable[[], Any]) -> Callable[[], None]:
+    """
+    Encadeia SIGTERM/SIGINT: agenda `on_signal` no loop e repassa o sinal ao
+    handler anterior (o do uvicorn, que inicia o shutdown). Sem um handler
+    Python anterior (ex: fora do uvicorn) nada é instalado. Retorna a função
+    que restaura os handlers.
+    """
+    if threading.current_thread() is not threading.main_thread():
+        return lambda: None
+    loop = asyncio.get_running_loop()
+    previous = {}
+
+    def handler(sig, frame):
+        loop.call_soon_threadsafe(on_signal)
+        previous[sig](sig, frame)
+
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        current = signal.getsignal(sig)
+        if callable(current):
+            previous[sig] = current
+            signal.signal(sig, handler)
+
+    def restore():
+        for sig, original in previous.items():
+            if signal.getsignal(sig) is handler:
+                signal.signal(sig, original)
+
+    return restore
+
+
+_recovery: Optional[RunRecovery] = None
+
+
+def get_run_recovery() -> RunRecovery:
+    global _recovery
+    if _recovery is None:
+        settings = get_settings()
+        _recovery = RunRecovery(settings.shutdown_drain_seconds, settings.shutdown_handoff_seconds,
+                                settings.run_recovery_poll_seconds, settings.run_recovery_max_attempts)
+    return _recovery
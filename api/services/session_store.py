@@ -0,0 +1,80 @@
+# backend/services/session_store.py
+
+"""
+Ciclo de vida da sessão (session_id -> thread_id) no Redis em scripts Lua.
+
+Antes, cada operação fazia duas idas ao Redis (GET + SET no primeiro contato,
+GET + DELETE ao apagar/resetar), e os pares corriam entre si: duas abas com
+a mesma sessão podiam criar dois threads, e um reset concorrente com um chat
+podia apagar o thread recém-criado. Cada operação agora é um único EVALSHA
+(`register_script` carrega o script com SCRIPT LOAD no primeiro uso) e é
+atômica no servidor:
+
+- `get_or_create`: devolve o thread e renova o TTL da sessão; se não houver
+  thread e um candidato for informado, grava-o (SET NX implícito);
+- `get_and_delete` / `reset`: devolvem o thread e apagam a sessão junto com
+  o estado derivado da conversa (uso/resumo de tokens e o buffer de eventos
+  do WebSocket), para que nada da conversa fique para trás e a próxima não
+  herde o resumo da anterior.
+"""
+
+from functools import lru_cache
+from typing import List, Optional, Tuple
+
+from .chat_stream import TURN_KEY_PREFIX
+from .redis_service import get_redis
+from .usage_service import USAGE_KEY_PREFIX
+
+SESSION_TTL_SECONDS = 86400
+
+# KEYS[1] = sessão; ARGV = thread candidato ('' = só consulta), TTL (s).
+# Retorna {thread_id, 1 se foi criado agora} ou {} se não existe (e não houve candidato).
+_GET_OR_CREATE_SCRIPT = """
+local current = redis.call('GET', KEYS[1])
+if current then
+    redis.call('EXPIRE', KEYS[1], ARGV[2])
+    return {current, 0}
+end
+if ARGV[1] == '' then
+    return {}
+end
+redis.call('SET', KEYS[1], ARGV[1], 'EX', ARGV[2])
+return {ARGV[1], 1}
+"""
+
+# KEYS[1] = sessão; KEYS[2..] = estado derivado da conversa. Retorna o thread (ou nil).
+_GET_AND_DELETE_SCRIPT = """
+local current = redis.call('GET', KEYS[1])
+redis.call('DEL', unpack(KEYS))
+return current
+"""
+
+
+@lru_cache(maxsize=1)
+def _scripts():
+    client = get_redis()
+    return client.register_script(_GET_OR_CREATE_SCRIPT), client.register_script(_GET_AND_DELETE_SCRIPT)
+
+
+def _derived_keys(session_id: str) -> List[str]:
+    return [f"{USAGE_KEY_PREFIX}{session_id}", f"{TURN_KEY_PREFIX}{session_id}"]
+
+
+async def get_or_create(redis_client, session_id: str, candidate: Optional[str] = None,
+                        ttl_seconds: int = SESSION_TTL_SECONDS) -> Tuple[Optional[str], bool]:
+    """(thread_id, criado_agora). Sem candidato e sem sessão: (None, False)."""
+    script, _ = _scripts()
+    result = await script(keys=[session_id], args=[candidate or "", ttl_seconds], client=redis_client)
+    if not result:
+        return None, False
+    return result[0], bool(int(result[1]))
+
+
+async def get_and_delete(redis_client, session_id: str) -> Optional[str]:
+    _, script = _scripts()
+    return await script(keys=[session_id, *_derived_keys(session_id)], client=redis_client)
+
+
+async def reset(redis_client, session_id: str) -> Optional[str]:
+    """Mesma operação do `get_and_delete`: a próxima mensagem cria um thread novo."""
+    return await get_and_delete(redis_client, session_id)
@@ -0,0 +1,159 @@
+# backend/services/slot_hold_service.py
+
+"""
+Reservas otimistas (holds) de horários no Redis, para evitar double-booking.
+
+Quando horários são oferecidos a um lead (`oferecerHorarios`), cada slot é
+reservado com um `SET NX EX` em nome do thread; slots já reservados por outro
+lead são pulados. Ao escolher (`agendarReuniao`) o hold é confirmado antes de
+chamar o Cal.com, e após o agendamento todos os holds do thread são liberados.
+Holds não usados simplesmente expiram (SLOT_HOLD_TTL_SECONDS).
+
+Se o Redis estiver indisponível, o comportamento degrada para o anterior
+(nenhum slot é filtrado) em vez de impedir o agendamento.
+"""
+
+from datetime import datetime, timezone
+from functools import lru_cache
+from typing import Any, Dict, List, Tuple
+
+from ..config import get_settings
+from .redis_service import get_redis
+
+HOLD_KEY_PREFIX = "slot_hold:"
+
+# Reserva (ou renova, se já for do mesmo dono) até ARGV[3] slots, em ordem.
+# KEYS = chaves dos slots; ARGV = dono, TTL (s), quantidade desejada.
+# Retorna os índices (1-based) das chaves reservadas.
+_ACQUIRE_SCRIPT = """
+local acquired = {}
+local wanted = tonumber(ARGV[3])
+for i, key in ipairs(KEYS) do
+    if redis.call('SET', key, ARGV[1], 'NX', 'EX', ARGV[2]) then
+        acquired[#acquired + 1] = i
+    elseif redis.call('GET', key) == ARGV[1] then
+        redis.call('EXPIRE', key, ARGV[2])
+        acquired[#acquired + 1] = i
+    end
+    if #acquired >= wanted then break end
+end
+return acquired
+"""
+
+# Libera apenas os holds que pertencem ao dono informado (ARGV[1]).
+_RELEASE_SCRIPT = """
+local released = 0
+for _, key in ipairs(KEYS) do
+    if redis.call('GET', key) == ARGV[1] then
+        released = released + redis.call('DEL', key)
+    end
+end
+return released
+"""
+
+hold_stats = {"acquired": 0, "skipped": 0, "conflicts": 0, "released": 0, "errors": 0}
+
+
+@lru_cache(maxsize=1)
+def _scripts():
+    # register_script usa EVALSHA (e faz o SCRIPT LOAD automaticamente se preciso)
+    client = get_redis()
+    return client.register_script(_ACQUIRE_SCRIPT), client.register_script(_RELEASE_SCRIPT)
+
+
+def holds_enabled() -> bool:
+    return get_settings().slot_holds_enabled
+
+
+def candidate_count(offered: int) -> int:
+    """Quantos slots buscar no Cal.com para sobrar `offered` após pular os reservados."""
+    if not holds_enabled():
+        return offered
+    return offered * get_settings().slot_hold_candidate_factor
+
+
+def _normalize_start(start_time: str) -> str:
+    """Início do slot em ISO UTC, para que '...Z' (webhooks) e '...+00:00' gerem a mesma chave."""
+    try:
+        return datetime.fromisoformat(start_time.replace("Z", "+00:00")).astimezone(timezone.utc).isoformat()
+    except ValueError:
+        return start_time
+
+
+def hold_key(slot: Dict[str, Any]) -> str:
+    # O event type identifica o host: com vários hosts, cada um tem o seu (calendar_service.parse_hosts)
+    return f"{HOLD_KEY_PREFIX}{slot.get('event_type_id') or 'default'}:{_normalize_start(slot['start_time'])}"
+
+
+async def hold_offered_slots(owner: str, slots_utc: List[Dict[str, Any]], slots_display: List[str],
+                             limit: int) -> Tuple[List[Dict[str, Any]], List[str]]:
+    """
+    Reserva até `limit` slots (na ordem recebida) para `owner`, pulando os
+    reservados por outros leads. Retorna as listas (utc, display) filtradas.
+    """
+    if not holds_enabled() or not slots_utc:
+        return slots_utc[:limit], slots_display[:limit]
+    try:
+        acquire, _ = _scripts()
+        indices = await acquire(
+            keys=[hold_key(slot) for slot in slots_utc],
+            args=[owner, get_settings().slot_hold_ttl_seconds, limit],
+        )
+    except Exception as e:
+        print(f"Error acquiring slot holds for {owner}: {e}")
+        hold_stats["errors"] += 1
+        return slots_utc[:limit], slots_display[:limit]
+    chosen = [int(i) - 1 for i in indices]
+    hold_stats["acquired"] += len(chosen)
+    hold_stats["skipped"] += (max(chosen) + 1 - len(chosen)) if chosen else len(slots_utc)
+    return [slots_utc[i] for i in chosen], [slots_display[i] for i in chosen]
+
+
+async def claim_slot(owner: str, slot: Dict[str, Any]) -> bool:
+    """Confirma (renova) o hold do slot escolhido; False se outro lead o reservou."""
+    if not holds_enabled():
+        return True
+    try:
+        acquire, _ = _scripts()
+        acquired = await acquire(keys=[hold_key(slot)], args=[owner, get_settings().slot_hold_ttl_seconds, 1])
+    except Exception as e:
+        print(f"Error claiming slot hold for {owner}: {e}")
+        hold_stats["errors"] += 1
+        return True
+    if not acquired:
+        hold_stats["conflicts"] += 1
+        return False
+    return True
+
+
+async def release_slots(owner: str, slots: List[Dict[str, Any]]) -> int:
+    """Libera os holds de `owner` sobre os slots informados."""
+    if not holds_enabled() or not slots:
+        return 0
+    try:
+        _, release = _scripts()
+        released = await release(keys=[hold_key(slot) for slot in slots], args=[owner])
+    except Exception as e:
+        print(f"Error releasing slot holds for {owner}: {e}")
+        hold_stats["errors"] += 1
+        return 0
+    hold_stats["released"] += int(released)
+    return int(released)
+
+
+async def force_release(slots: List[Dict[str, Any]]) -> int:
+    """Libera os holds dos slots independentemente do dono (ex: booking cancelado no Cal.com)."""
+    if not holds_enabled() or not slots:
+        return 0
+    try:
+        released = await get_redis().delete(*[hold_key(slot) for slot in slots])
+    except Exception as e:
+        print(f"Error force-releasing slot holds: {e}")
+        hold_stats["errors"] += 1
+        return 0
+    hold_stats["released"] += int(released)
+    return int(released)
+
+
+def stats() -> Dict[str, int]:
+    return dict(hold_stats)
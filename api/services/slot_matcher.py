@@ -0,0 +1,238 @@
+# backend/services/slot_matcher.py
+
+"""
+Atalho local para o turno de escolha de horário.
+
+Depois do `oferecerHorarios`, a resposta do lead costuma ser "a segunda",
+"1" ou uma cópia (quase exata) de um dos horários listados. Em vez de pagar
+um run inteiro para o modelo chamar `agendarReuniao`, o turno tenta resolver
+a escolha aqui, de forma determinística, contra os horários oferecidos ao
+thread (`temp_slot_mapping`):
+
+- ordinal: a mensagem é só uma posição da lista ("2", "a segunda opção",
+  "a última");
+- data/hora: dia, mês, dia da semana e horário citados (em São Paulo)
+  apontam para um único horário ("dia 28 às 14h", "terça às 10:30");
+- texto: a mensagem contém um horário da lista ou é muito parecida com ele
+  (difflib), com folga sobre o segundo colocado.
+
+Na dúvida (pergunta, negação, "outro horário", mais de um candidato,
+mensagem longa), não há atalho e o turno segue para o modelo. Com um match
+e os dados do lead já registrados (`registrarLead`), o agendamento usa o
+próprio handler de `agendarReuniao` (holds, Cal.com) e a atualização do
+lead no Pipefy roda em background; o motor grava o turno no histórico.
+"""
+
+import asyncio
+import re
+import unicodedata
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+from zoneinfo import ZoneInfo
+
+from ..config import get_settings
+from .assistant_tools import ToolContext, run_tool
+from .slot_store import lead_contacts, temp_slot_mapping
+
+SAO_PAULO_TZ = ZoneInfo("America/Sao_Paulo")
+MAX_WORDS = 12  # mensagens maiores dizem mais do que a escolha: vão para o modelo
+FUZZY_THRESHOLD = 0.85
+FUZZY_MARGIN = 0.1
+
+fast_path_stats = {"attempts": 0, "matched": 0, "booked": 0, "booking_failed": 0, "no_match": 0, "no_lead": 0}
+
+# Referências às atualizações do lead em background
+_background_tasks = set()
+
+_ORDINALS = {
+    "primeiro": 1, "primeira": 1, "segundo": 2, "segunda": 2, "terceiro": 3, "terceira": 3,
+    "quarto": 4, "quarta": 4, "quinto": 5, "quinta": 5, "sexto": 6, "sexta": 6,
+    "1o": 1, "1a": 1, "2o": 2, "2a": 2, "3o": 3, "3a": 3, "4o": 4, "4a": 4, "5o": 5, "5a": 5,
+}
+_LAST = {"ultimo", "ultima"}
+_MONTHS = {
+    "janeiro": 1, "jan": 1, "fevereiro": 2, "fev": 2, "marco": 3, "mar": 3, "abril": 4, "abr": 4,
+    "maio": 5, "mai": 5, "junho": 6, "jun": 6, "julho": 7, "jul": 7, "agosto": 8, "ago": 8,
+    "setembro": 9, "set": 9, "outubro": 10, "out": 10, "novembro": 11, "nov": 11, "dezembro": 12, "dez": 12,
+}
+# Dia da semana (0 = segunda). "segunda", "quarta" etc. sozinhos são ordinais; só valem com "feira"
+_WEEKDAYS = {"segunda": 0, "terca": 1, "quarta": 2, "quinta": 3, "sexta": 4, "sabado": 5, "domingo": 6}
+_UNAMBIGUOUS_WEEKDAYS = {"terca", "sabado", "domingo"}
+# Sinais de que o lead não está (só) escolhendo um horário da lista
+_REJECT_WORDS = {"nao", "nenhum", "nenhuma", "outro", "outra", "outros", "outras", "ou", "mais", "depois",
+                 "antes", "cedo", "tarde", "remarcar", "cancelar", "mudar", "trocar", "talvez"}
+# Palavras de preenchimento ignoradas no ordinal ("pode ser a segunda opção, por favor")
+_FILLER = {"a", "o", "as", "os", "e", "de", "da", "do", "no", "na", "n", "numero", "opcao", "horario", "pode",
+           "ser", "quero", "prefiro", "fico", "com", "esse", "essa", "este", "esta", "por", "favor", "ok", "sim",
+           "entao", "vou", "escolho", "pego", "marca", "marcar", "agenda", "agendar", "reservar", "perfeito",
+           "otimo", "beleza", "claro", "me", "para", "pra", "gostaria", "seria", "melhor", "bom", "boa",
+           "obrigado", "obrigada", "isso", "fechado", "vamos", "vai", "la"}
+
+_TIME_RE = re.compile(r"\b(\d{1,2})\s*(?:h|hs|horas?|:)\s*(\d{2})?\b|\bas (\d{1,2})\b")
+_DAY_MONTH_NAME_RE = re.compile(r"\b(\d{1,2}) de ([a-z]+)\b")
+_DAY_MONTH_NUM_RE = re.compile(r"\b(\d{1,2})\s*/\s*(\d{1,2})\b")
+_DAY_RE = re.compile(r"\bdia (\d{1,2})\b")
+
+
+def normalize(text: str) -> str:
+    """Minúsculas, sem acentos e sem pontuação (mantém ':' e '/' de horas e datas)."""
+    text = unicodedata.normalize("NFKD", text.lower())
+    text = "".join(ch for ch in text if not unicodedata.combining(ch))
+    text = re.sub(r"[^a-z0-9:/ ]+", " ", text.replace("º", "o").replace("ª", "a"))
+    return " ".join(text.split())
+
+
+def _ordinal(words: List[str], count: int) -> Optional[int]:
+    """Posição (0-based) quando a mensagem é só um ordinal, senão None."""
+    remaining = [word for word in words if word not in _FILLER]
+    if len(remaining) != 1:
+        return None
+    word = remaining[0]
+    if word in _LAST:
+        return count - 1
+    position = int(word) if word.isdigit() else _ORDINALS.get(word)
+    if position is None or not 1 <= position <= count:
+        return None
+    return position - 1
+
+
+def _local_start(slot_utc: Dict[str, Any]) -> datetime:
+    return datetime.fromisoformat(slot_utc["start_time"].replace("Z", "+00:00")).astimezone(SAO_PAULO_TZ)
+
+
+def _datetime_criteria(text: str, words: List[str]) -> Dict[str, int]:
+    """Dia, mês, dia da semana e horário citados na mensagem."""
+    criteria: Dict[str, int] = {}
+    time_match = _TIME_RE.search(text)
+    if time_match:
+        hour = int(time_match.group(1) or time_match.group(3))
+        if hour <= 23:
+            criteria["hour"] = hour
+            if time_match.group(2):
+                criteria["minute"] = int(time_match.group(2))
+    elif "meio dia" in text:
+        criteria.update(hour=12, minute=0)
+    date_match = _DAY_MONTH_NUM_RE.search(text)
+    if date_match:
+        criteria.update(day=int(date_match.group(1)), month=int(date_match.group(2)))
+    else:
+        name_match = _DAY_MONTH_NAME_RE.search(text)
+        if name_match:
+            criteria["day"] = int(name_match.group(1))
+            if name_match.group(2) in _MONTHS:  # mês com erro de digitação: fica só o dia
+                criteria["month"] = _MONTHS[name_match.group(2)]
+        else:
+            day_match = _DAY_RE.search(text)
+            if day_match:
+                criteria["day"] = int(day_match.group(1))
+    for i, word in enumerate(words):
+        if word in _WEEKDAYS and (word in _UNAMBIGUOUS_WEEKDAYS or words[i + 1:i + 2] == ["feira"]):
+            criteria["weekday"] = _WEEKDAYS[word]
+            break
+    return criteria
+
+
+def _matches(local: datetime, criteria: Dict[str, int]) -> bool:
+    values = {"hour": local.hour, "minute": local.minute, "day": local.day, "month": local.month,
+              "weekday": local.weekday()}
+    return all(values[name] == value for name, value in criteria.items())
+
+
+def match_slot(message: str, offered: Dict[str, Dict[str, Any]]) -> Optional[Tuple[str, str]]:
+    """
+    Resolve a mensagem contra os horários oferecidos (display -> slot UTC, na
+    ordem exibida). Retorna (display, método) só quando há um único candidato.
+    """
+    if not offered or "?" in message:
+        return None
+    text = normalize(message)
+    words = text.split()
+    if not words or len(words) > MAX_WORDS or _REJECT_WORDS.intersection(words):
+        return None
+    displays = list(offered)
+
+    position = _ordinal(words, len(displays))
+    if position is not None:
+        return displays[position], "ordinal"
+
+    criteria = _datetime_criteria(text, words)
+    if criteria:
+        candidates = [display for display in displays if _matches(_local_start(offered[display]), criteria)]
+        # Data/hora citada que não bate com nenhum horário da lista: é um pedido novo, não uma escolha
+        return (candidates[0], "datetime") if len(candidates) == 1 else None
+
+    normalized = {display: normalize(display) for display in displays}
+    contained = [display for display, norm in normalized.items() if norm in text]
+    if len(contained) == 1:
+        return contained[0], "text"
+    import difflib  # import tardio: só a comparação aproximada precisa dele (~30ms no cold start)
+
+    scores = sorted(((difflib.SequenceMatcher(None, text, norm).ratio(), display)
+                     for display, norm in normalized.items()), reverse=True)
+    best_score, best = scores[0]
+    runner_up = scores[1][0] if len(scores) > 1 else 0.0
+    if best_score >= FUZZY_THRESHOLD and best_score - runner_up >= FUZZY_MARGIN:
+        return best, "fuzzy"
+    return None
+
+
+def plan_booking(thread_id: str, message: str) -> Optional[Dict[str, Any]]:
+    """
+    Argumentos de `agendarReuniao` quando a mensagem escolhe, sem ambiguidade,
+    um dos horários oferecidos ao thread e o lead já foi registrado; senão None.
+    """
+    offered = temp_slot_mapping.get(thread_id)
+    if not offered or not get_settings().slot_fast_path_enabled:
+        return None
+    fast_path_stats["attempts"] += 1
+    match = match_slot(message, offered)
+    if match is None:
+        fast_path_stats["no_match"] += 1
+        return None
+    lead = lead_contacts.get(thread_id)
+    if not lead or not lead.get("nome") or not lead.get("email"):
+        fast_path_stats["no_lead"] += 1
+        return None
+    display, method = match
+    fast_path_stats["matched"] += 1
+    print(f"Slot choice matched locally ({method}): '{message}' -> '{display}'")
+    return {"data_inicio_display": display, "email_lead": lead["email"], "nome_lead": lead["nome"]}
+
+
+def confirmation_message(output: Dict[str, Any]) -> str:
+    """Mesma confirmação que as instruções pedem ao assistente."""
+    return (f"Perfeito! Sua reunião está agendada para {output.get('start_time_display')}. "
+            f"O link é: {output.get('meeting_link')}")
+
+
+async def _update_lead(thread_id: str, output: Dict[str, Any]) -> None:
+    # Passo 7 do fluxo (registrarLead com os dados da reunião), fora do caminho da resposta
+    # (o interesse vem depois dos dados guardados: o registro do passo 3 costuma ter False)
+    arguments = {**lead_contacts.get(thread_id, {}), "interesse_confirmado": True,
+                 "meeting_link": output.get("meeting_link"), "meeting_datetime": output.get("start_time_utc")}
+    try:
+        await run_tool("registrarLead", arguments, ToolContext(thread_id=thread_id))
+    except Exception as e:
+        print(f"Error updating lead after fast-path booking for thread {thread_id}: {e}")
+
+
+async def book(thread_id: str, arguments: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """
+    Agenda via `agendarReuniao` e dispara a atualização do lead. Retorna a
+    saída da ferramenta, ou None se o agendamento falhou (o turno segue para
+    o modelo, que trata o erro com o lead).
+    """
+    output = await run_tool("agendarReuniao", arguments, ToolContext(thread_id=thread_id))
+    if not output.get("success"):
+        fast_path_stats["booking_failed"] += 1
+        print(f"Fast-path booking failed for thread {thread_id}: {output.get('error')}")
+        return None
+    fast_path_stats["booked"] += 1
+    task = asyncio.create_task(_update_lead(thread_id, output))
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+    return output
+
+
+def stats() -> Dict[str, Any]:
+    return {"enabled": get_settings().slot_fast_path_enabled, **fast_path_stats}
@@ -0,0 +1,248 @@
+# backend/services/slot_store.py
+
+"""
+Estado de horários por thread, em memória do processo:
+
+- `temp_slot_mapping`: horários oferecidos (display -> UTC) ao lead.
+- `lead_contacts`: dados do último `registrarLead` do thread (para o atalho
+  de agendamento de services/slot_matcher.py). São dados pessoais: cada
+  entrada expira após `LEAD_CONTACTS_TTL_SECONDS` sem ser regravada e o
+  total é limitado a `LEAD_CONTACTS_MAX_ENTRIES` (LRU).
+- Prefetch especulativo: quando o lead confirma interesse (`registrarLead`
+  com `interesse_confirmado=True`), a busca no Cal.com já começa em segundo
+  plano e o `oferecerHorarios` seguinte só consome o resultado. Prefetches
+  não usados expiram após `SLOT_PREFETCH_TTL_SECONDS`. Cada prefetch guarda a
+  versão da agenda da empresa (`slots:availability_version:<empresa>`, no
+  Redis) lida antes da busca: um webhook de booking incrementa a versão em
+  qualquer worker e o prefetch com versão antiga é descartado no consumo.
+"""
+
+import asyncio
+import time
+from collections import OrderedDict
+from collections.abc import ItemsView, KeysView, ValuesView
+from typing import Any, Dict, Iterator, Optional, Tuple
+
+from ..config import current_settings
+from .redis_service import get_redis
+
+AVAILABILITY_VERSION_KEY_PREFIX = "slots:availability_version:"
+
+# --- Armazenamento temporário para mapear slots ---
+# Em produção, isso deveria ser um cache (Redis) ou banco de dados
+# Mapeia thread_id -> { "display_slot_1": slot_utc_1, "display_slot_2": slot_utc_2, ... }
+temp_slot_mapping: Dict[str, Dict[str, Dict[str, str]]] = {}
+
+
+class _ExpiringThreadDict(OrderedDict):
+    """
+    Dict por thread com TTL (desde a última gravação) e tamanho máximo (LRU).
+    Entradas vencidas não aparecem em nenhuma leitura (`[]`, `get`, `in`,
+    iteração, `items`, `values`) e saem na próxima gravação ou purga. TTL e
+    tamanho vêm de `current_settings()`, então valem os da empresa.
+    """
+
+    def __init__(self, ttl_setting: str, max_entries_setting: str):
+        super().__init__()
+        self._ttl_setting = ttl_setting
+        self._max_entries_setting = max_entries_setting
+        self._written_at: Dict[str, float] = {}
+
+    def _expired(self, key: str) -> bool:
+        written_at = self._written_at.get(key)
+        return written_at is not None and time.monotonic() - written_at > getattr(current_settings(), self._ttl_setting)
+
+    def __setitem__(self, key: str, value: Any) -> None:
+        super().__setitem__(key, value)
+        self.move_to_end(key)
+        self._written_at[key] = time.monotonic()
+        self.purge()
+        max_entries = getattr(current_settings(), self._max_entries_setting)
+        while super().__len__() > max_entries:
+            self.pop(next(super().__iter__()))
+
+    def __getitem__(self, key: str) -> Any:
+        if self._expired(key):
+            raise KeyError(key)
+        return super().__getitem__(key)
+
+    def __delitem__(self, key: str) -> None:
+        super().__delitem__(key)
+        self._written_at.pop(key, None)
+
+    def __contains__(self, key: object) -> bool:
+        return super().__contains__(key) and not self._expired(key)
+
+    def __iter__(self) -> Iterator[str]:
+        return (key for key in list(super().__iter__()) if not self._expired(key))
+
+    def __len__(self) -> int:
+        return sum(1 for _ in self)
+
+    def keys(self) -> KeysView:
+        return KeysView(self)
+
+    def items(self) -> ItemsView:
+        return ItemsView(self)
+
+    def values(self) -> ValuesView:
+        return ValuesView(self)
+
+    def get(self, key: str, default: Any = None) -> Any:
+        return super().__getitem__(key) if key in self else default
+
+    def setdefault(self, key: str, default: Any = None) -> Any:
+        if key not in self:
+            self[key] = default
+        return super().__getitem__(key)
+
+    def pop(self, key: str, *default: Any) -> Any:
+        # Em subclasses o OrderedDict.pop lê via __getitem__: tira o carimbo
+        # antes para que a entrada vencida também seja removida
+        expired = self._expired(key)
+        self._written_at.pop(key, None)
+        value = super().pop(key, *default)
+        if not expired:
+            return value
+        if default:
+            return default[0]
+        raise KeyError(key)
+
+    def clear(self) -> None:
+        super().clear()
+        self._written_at.clear()
+
+    def purge(self) -> int:
+        """Remove as entradas vencidas (as mais antigas ficam no início)."""
+        removed = 0
+        for key in list(super().__iter__()):
+            if not self._expired(key):
+                break
+            self.pop(key, None)
+            removed += 1
+        return removed
+
+
+# thread_id -> argumentos do último `registrarLead` (nome, email, empresa, ...)
+lead_contacts: Dict[str, Dict[str, Any]] = _ExpiringThreadDict("lead_contacts_ttl_seconds", "lead_contacts_max_entries")
+
+# thread_id -> (criado_em, dias, task com o resultado de get_available_slots)
+_prefetched_slots: Dict[str, Tuple[float, int, asyncio.Task]] = {}
+
+prefetch_stats = {"started": 0, "used": 0, "expired": 0, "failed": 0, "invalidated": 0}
+
+
+def _discard(thread_id: str) -> None:
+    entry = _prefetched_slots.pop(thread_id, None)
+    if entry and not entry[2].done():
+        entry[2].cancel()
+
+
+def purge_expired_prefetches() -> None:
+    """Descarta (e cancela, se ainda rodando) prefetches mais velhos que o TTL e dados de lead vencidos."""
+    lead_contacts.purge()
+    ttl = current_settings().slot_prefetch_ttl_seconds
+    now = time.monotonic()
+    for thread_id, (created_at, _, _) in list(_prefetched_slots.items()):
+        if now - created_at > ttl:
+            _discard(thread_id)
+            prefetch_stats["expired"] += 1
+
+
+def _availability_version_key() -> str:
+    from .tenants import DEFAULT_TENANT, current_tenant_id
+    return f"{AVAILABILITY_VERSION_KEY_PREFIX}{current_tenant_id() or DEFAULT_TENANT}"
+
+
+async def _availability_version() -> Optional[str]:
+    """Versão da agenda da empresa em curso (None se o Redis falhar: o prefetch não é usado)."""
+    try:
+        return await get_redis().get(_availability_version_key()) or "0"
+    except Exception as e:
+        print(f"Error reading availability version: {e}")
+        return None
+
+
+async def bump_availability_version() -> None:
+    """A agenda da empresa em curso mudou: invalida os prefetches de todos os workers."""
+    await get_redis().incr(_availability_version_key())
+
+
+def start_slot_prefetch(thread_id: str, days: int = 7) -> bool:
+    """Dispara em segundo plano a busca de horários para o thread (se habilitado)."""
+    if not current_settings().slot_prefetch_enabled:
+        return False
+    purge_expired_prefetches()
+    if thread_id in _prefetched_slots:
+        return False  # Já existe um prefetch válido para este thread
+
+    async def _fetch():
+        from .calendar_service import CalendarService
+        from .slot_hold_service import candidate_count
+        from .tenants import calendar_service  # a task herda a empresa do turno (contextvar)
+        version = await _availability_version()
+        result = await calendar_service().get_available_slots(
+            days=days, max_slots=candidate_count(CalendarService.MAX_SLOTS)
+        )
+        return version, result
+
+    task = asyncio.create_task(_fetch())
+    _prefetched_slots[thread_id] = (time.monotonic(), days, task)
+    prefetch_stats["started"] += 1
+    print(f"Slot prefetch started for thread {thread_id} ({days} dias)")
+    return True
+
+
+async def take_prefetched_slots(thread_id: str, days: int) -> Optional[Dict]:
+    """
+    Consome o prefetch do thread, se existir, ainda válido e para o mesmo número
+    de dias. Aguarda a task se ela ainda estiver em andamento. Retorna None se
+    não houver resultado utilizável (o chamador busca normalmente).
+    """
+    purge_expired_prefetches()
+    entry = _prefetched_slots.pop(thread_id, None)
+    if entry is None:
+        return None
+    _, prefetched_days, task = entry
+    if prefetched_days != days:
+        if not task.done():
+            task.cancel()
+        return None
+    try:
+        version, result = await task
+    except Exception as e:
+        print(f"Slot prefetch failed for thread {thread_id}: {e}")
+        prefetch_stats["failed"] += 1
+        return None
+    if version is None or version != await _availability_version():
+        # A agenda mudou depois da busca (webhook de booking, possivelmente em outro worker)
+        prefetch_stats["invalidated"] += 1
+        return None
+    if not result.get("success"):
+        prefetch_stats["failed"] += 1
+        return None
+    prefetch_stats["used"] += 1
+    return result
+
+
+def invalidate_prefetches() -> int:
+    """
+    Descarta todos os prefetches deste processo (a agenda mudou, ex: webhook de
+    booking do Cal.com); o próximo `oferecerHorarios` busca horários atualizados.
+    """
+    count = len(_prefetched_slots)
+    for thread_id in list(_prefetched_slots):
+        _discard(thread_id)
+    prefetch_stats["invalidated"] += count
+    return count
+
+
+def clear_thread(thread_id: str) -> None:
+    """Remove todo o estado de horários do thread (mapeamento, prefetch e dados do lead)."""
+    temp_slot_mapping.pop(thread_id, None)
+    lead_contacts.pop(thread_id, None)
+    _discard(thread_id)
+
+
+def stats() -> Dict[str, int]:
+    return {"pending": len(_prefetched_slots), "lead_contacts": len(lead_contacts), **prefetch_stats}
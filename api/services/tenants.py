@@ -0,0 +1,455 @@
+# backend/services/tenants.py
+
+"""
+Multi-tenant: um deploy atendendo várias empresas clientes.
+
+Cada empresa (tenant) tem uma config no Redis (`tenants:config:<id>`, JSON)
+com os hosts que a identificam, overrides das configurações (chave da
+OpenAI, assistente, pipe do Pipefy, agenda do Cal.com, ...) e o limite de
+turnos simultâneos. O índice host -> empresa fica no hash `tenants:hosts`.
+
+- Resolução por requisição: o host (X-Forwarded-Host/Host) e, se ele não
+  identificar a empresa, o prefixo do session_id (`<tenant>:<uuid>`, gerado
+  por POST /api/session). Sem empresa, vale a config do ambiente (.env).
+- Configs e hosts ficam num cache em memória com TTL
+  (TENANT_CONFIG_TTL_SECONDS), inclusive as ausências: uma mudança feita
+  por PUT /api/internal/tenants/{id} vale na hora neste worker e, nos
+  outros, em até um TTL.
+- Cada empresa ativa tem instâncias próprias dos serviços (OpenAI, Pipefy,
+  Cal.com), criadas sob demanda com a config dela e com pools HTTP
+  reaproveitados entre requisições. O cache é LRU (TENANT_MAX_ACTIVE): a
+  empresa há mais tempo sem tráfego sai e os clientes dela são fechados
+  depois do prazo de um turno, para não derrubar turnos em andamento.
+- O limite de turnos simultâneos por empresa (`max_in_flight` na config ou
+  TENANT_MAX_IN_FLIGHT) é aplicado pelo controle de admissão, antes da fila
+  global: uma empresa com pico de tráfego não ocupa os slots das demais.
+
+O webhook do Cal.com usa a empresa do host (atualiza o lead no pipe dela);
+o webhook e o espelho do Pipefy, os segredos dos webhooks e os limites
+globais do worker continuam com a config do ambiente.
+"""
+
+import asyncio
+import json
+import re
+import time
+import uuid
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+
+from ..config import Settings, get_settings, reset_settings, use_settings
+from .redis_service import get_redis
+
+CONFIG_KEY_PREFIX = "tenants:config:"
+HOSTS_KEY = "tenants:hosts"
+DEFAULT_TENANT = "default"
+SESSION_SEPARATOR = ":"
+_TENANT_ID_RE = re.compile(r"^[a-z0-9][a-z0-9_-]{0,39}$")
+
+# Configurações que uma empresa pode sobrescrever: credenciais e comportamento dos serviços
+# (inclusive a retenção dos dados do lead em slot_store). Limites do worker, Redis e rotas internas são do deploy.
+_OVERRIDABLE_PREFIXES = ("openai_", "chat_engine", "chat_completions_model", "model_routing_rules",
+                         "response_cache_", "pipefy_", "cal_com_", "lead_contacts_")
+# Espelho do Pipefy (chaves do Redis sem empresa) e segredos dos webhooks (rotas sem empresa)
+_NOT_OVERRIDABLE = {"pipefy_mirror_enabled", "pipefy_mirror_reconcile_seconds", "pipefy_mirror_reconcile_pages",
+                    "pipefy_webhook_token", "cal_com_webhook_secret"}
+
+
+class TenantMismatch(Exception):
+    """O host da requisição e o session_id apontam para empresas diferentes."""
+
+
+def overridable(name: str) -> bool:
+    return name in Settings.model_fields and name not in _NOT_OVERRIDABLE and name.startswith(_OVERRIDABLE_PREFIXES)
+
+
+def normalize_host(host: Optional[str]) -> Optional[str]:
+    """Host sem porta, em minúsculas (o primeiro, se vier uma lista do proxy)."""
+    if not host:
+        return None
+    host = host.split(",")[0].strip().lower()
+    if host.startswith("["):  # IPv6 literal
+        return host.split("]")[0] + "]"
+    return host.rsplit(":", 1)[0] if host.count(":") == 1 else host
+
+
+def session_tenant_id(session_id: Optional[str]) -> Optional[str]:
+    """Empresa do prefixo do session_id (`<tenant>:<uuid>`), se houver."""
+    if not session_id or SESSION_SEPARATOR not in session_id:
+        return None
+    prefix = session_id.split(SESSION_SEPARATOR, 1)[0]
+    return prefix if _TENANT_ID_RE.match(prefix) else None
+
+
+@dataclass
+class TenantConfig:
+    tenant_id: str
+    settings: Dict[str, Any] = field(default_factory=dict)
+    hosts: List[str] = field(default_factory=list)
+    max_in_flight: Optional[int] = None  # None = TENANT_MAX_IN_FLIGHT
+
+    @classmethod
+    def from_payload(cls, tenant_id: str, payload: Dict[str, Any]) -> "TenantConfig":
+        """Valida a config recebida (rota interna ou Redis); ValueError se inválida."""
+        if not _TENANT_ID_RE.match(tenant_id or "") or tenant_id == DEFAULT_TENANT:
+            raise ValueError(f"tenant_id inválido: '{tenant_id}' (minúsculas, dígitos, '-' e '_')")
+        unknown = set(payload) - {"settings", "hosts", "max_in_flight"}
+        if unknown:
+            raise ValueError(f"Campos desconhecidos: {', '.join(sorted(unknown))}")
+        settings = dict(payload.get("settings") or {})
+        rejected = [name for name in settings if not overridable(name)]
+        if rejected:
+            raise ValueError(f"Configurações que não podem ser sobrescritas por empresa: {', '.join(sorted(rejected))}")
+        hosts = sorted({normalize_host(host) for host in payload.get("hosts") or [] if normalize_host(host)})
+        max_in_flight = payload.get("max_in_flight")
+        config = cls(tenant_id=tenant_id, settings=settings, hosts=hosts,
+                     max_in_flight=int(max_in_flight) if max_in_flight is not None else None)
+        config.build_settings(get_settings())  # valores com tipo errado falham aqui, não na requisição
+        return config
+
+    def to_payload(self) -> Dict[str, Any]:
+        return {"settings": self.settings, "hosts": self.hosts, "max_in_flight": self.max_in_flight}
+
+    def build_settings(self, base: Settings) -> Settings:
+        """
+        Configuração efetiva da empresa: a do ambiente com os overrides dela. O
+        espelho do Pipefy fica sempre desligado: as chaves dele no Redis não têm
+        empresa, e herdar PIPEFY_MIRROR_ENABLED misturaria os cards dos pipes.
+        """
+        try:
+            return Settings.model_validate({**base.model_dump(), **self.settings, "pipefy_mirror_enabled": False})
+        except ValueError as e:
+            raise ValueError(f"Configuração inválida para a empresa '{self.tenant_id}': {e}") from e
+
+
+_MISSING = object()
+
+
+class _TTLCache:
+    """Cache em memória (LRU + TTL) que também guarda ausências (None)."""
+
+    def __init__(self, ttl_seconds: float, max_entries: int = 1024):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+
+    def get(self, key: str) -> Any:
+        entry = self._entries.get(key)
+        if entry is None or time.monotonic() - entry[0] > self.ttl_seconds:
+            return _MISSING
+        self._entries.move_to_end(key)
+        return entry[1]
+
+    def set(self, key: str, value: Any) -> None:
+        self._entries[key] = (time.monotonic(), value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, key: str) -> None:
+        self._entries.pop(key, None)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class TenantConfigStore:
+    """Configs das empresas no Redis, com cache em memória (TTL) por empresa e por host."""
+
+    def __init__(self, redis_factory, ttl_seconds: float):
+        self._redis_factory = redis_factory
+        self._configs = _TTLCache(ttl_seconds)
+        self._hosts = _TTLCache(ttl_seconds)
+        self.counters = {"cache_hits": 0, "cache_misses": 0}
+
+    async def get(self, tenant_id: str) -> Optional[TenantConfig]:
+        cached = self._configs.get(tenant_id)
+        if cached is not _MISSING:
+            self.counters["cache_hits"] += 1
+            return cached
+        self.counters["cache_misses"] += 1
+        raw = await self._redis_factory().get(f"{CONFIG_KEY_PREFIX}{tenant_id}")
+        config = None
+        if raw:
+            try:
+                config = TenantConfig.from_payload(tenant_id, json.loads(raw))
+            except ValueError as e:
+                # Config gravada inválida (ex: campo removido numa versão nova): a empresa fica sem config
+                print(f"Ignoring invalid tenant config for {tenant_id}: {e}")
+        self._configs.set(tenant_id, config)
+        return config
+
+    async def tenant_for_host(self, host: str) -> Optional[str]:
+        cached = self._hosts.get(host)
+        if cached is not _MISSING:
+            self.counters["cache_hits"] += 1
+            return cached
+        self.counters["cache_misses"] += 1
+        tenant_id = await self._redis_factory().hget(HOSTS_KEY, host) or None
+        self._hosts.set(host, tenant_id)
+        return tenant_id
+
+    async def put(self, config: TenantConfig) -> None:
+        """Grava a config e reindexa os hosts da empresa (vale na hora neste worker)."""
+        client = self._redis_factory()
+        previous = await self.get(config.tenant_id)
+        stale_hosts = [host for host in (previous.hosts if previous else []) if host not in config.hosts]
+        taken = {host: owner for host, owner in zip(config.hosts, await client.hmget(HOSTS_KEY, config.hosts))
+                 if owner and owner != config.tenant_id} if config.hosts else {}
+        if taken:
+            raise ValueError(f"Hosts já usados por outra empresa: {taken}")
+        async with client.pipeline(transaction=True) as pipe:
+            pipe.set(f"{CONFIG_KEY_PREFIX}{config.tenant_id}", json.dumps(config.to_payload()))
+            if stale_hosts:
+                pipe.hdel(HOSTS_KEY, *stale_hosts)
+            if config.hosts:
+                pipe.hset(HOSTS_KEY, mapping={host: config.tenant_id for host in config.hosts})
+            await pipe.execute()
+        self._configs.set(config.tenant_id, config)
+        for host in [*stale_hosts, *config.hosts]:
+            self._hosts.invalidate(host)
+
+    async def delete(self, tenant_id: str) -> bool:
+        config = await self.get(tenant_id)
+        if config is None:
+            return False
+        async with self._redis_factory().pipeline(transaction=True) as pipe:
+            pipe.delete(f"{CONFIG_KEY_PREFIX}{tenant_id}")
+            if config.hosts:
+                pipe.hdel(HOSTS_KEY, *config.hosts)
+            await pipe.execute()
+        self._configs.set(tenant_id, None)
+        for host in config.hosts:
+            self._hosts.invalidate(host)
+        return True
+
+    def stats(self) -> Dict[str, Any]:
+        return {"cached_configs": len(self._configs), "cached_hosts": len(self._hosts), **self.counters}
+
+
+class TenantRuntime:
+    """Config efetiva e instâncias aquecidas dos serviços de uma empresa."""
+
+    def __init__(self, config: TenantConfig, settings: Settings):
+        self.config = config
+        self.settings = settings
+        self.tenant_id = config.tenant_id
+        self.max_in_flight = (config.max_in_flight if config.max_in_flight is not None
+                              else get_settings().tenant_max_in_flight)
+        self.last_used = time.monotonic()
+        self._services: Dict[str, Any] = {}
+
+    def _service(self, name: str, build):
+        service = self._services.get(name)
+        if service is None:
+            # Os construtores leem `current_settings()`: aqui, a config da empresa
+            token = use_settings(self.settings)
+            try:
+                service = build()
+            finally:
+                reset_settings(token)
+            self._services[name] = service
+        return service
+
+    def _build_openai(self):
+        if self.settings.chat_engine == "completions":
+            from .chat_completions_service import ChatCompletionsService
+            return ChatCompletionsService()
+        from .openai_service import OpenAIService
+        return OpenAIService()
+
+    def _build_calendar(self):
+        import httpx
+        from . import traffic_recorder
+        from .calendar_service import CalendarService
+        return CalendarService(client=httpx.AsyncClient(transport=traffic_recorder.transport_for("calcom", is_async=True)))
+
+    def _build_pipefy(self):
+        from .pipefy_service import PipefyService
+        return PipefyService()
+
+    @property
+    def openai_service(self):
+        return self._service("openai", self._build_openai)
+
+    @property
+    def pipefy_service(self):
+        return self._service("pipefy", self._build_pipefy)
+
+    @property
+    def calendar_service(self):
+        return self._service("calendar", self._build_calendar)
+
+    async def aclose(self) -> None:
+        for name, service in self._services.items():
+            try:
+                await service.close()
+            except Exception as e:
+                print(f"Error closing {name} service of tenant {self.tenant_id}: {e}")
+        self._services.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        return {"services": sorted(self._services), "max_in_flight": self.max_in_flight,
+                "idle_seconds": round(time.monotonic() - self.last_used, 1)}
+
+
+class TenantRegistry:
+    """Resolve a empresa da requisição e mantém as empresas ativas (LRU) deste worker."""
+
+    def __init__(self, store: TenantConfigStore, max_active: int, close_delay: float):
+        self.store = store
+        self.max_active = max_active
+        # Despejada do cache, a empresa ainda pode ter turnos usando os clientes dela
+        self.close_delay = close_delay
+        self._runtimes: "OrderedDict[str, TenantRuntime]" = OrderedDict()
+        self._closing = set()
+        self.counters = {"built": 0, "reloaded": 0, "evicted": 0}
+
+    async def runtime(self, tenant_id: str) -> Optional[TenantRuntime]:
+        """Instâncias da empresa (criadas ou recriadas se a config mudou); None se ela não existe."""
+        config = await self.store.get(tenant_id)
+        current = self._runtimes.get(tenant_id)
+        if config is None:
+            if current is not None:
+                self._retire(self._runtimes.pop(tenant_id))
+            return None
+        if current is not None and current.config == config:
+            self._runtimes.move_to_end(tenant_id)
+            current.last_used = time.monotonic()
+            return current
+        if current is not None:
+            self.counters["reloaded"] += 1
+            self._retire(self._runtimes.pop(tenant_id))
+        runtime = TenantRuntime(config, config.build_settings(get_settings()))
+        self._runtimes[tenant_id] = runtime
+        self.counters["built"] += 1
+        while len(self._runtimes) > self.max_active:
+            _, evicted = self._runtimes.popitem(last=False)
+            self.counters["evicted"] += 1
+            print(f"Tenant {evicted.tenant_id} evicted from the active cache")
+            self._retire(evicted)
+        return runtime
+
+    async def resolve(self, host: Optional[str], session_id: Optional[str]) -> Optional[TenantRuntime]:
+        """Empresa da requisição pelo host ou, se o host não a identifica, pelo session_id."""
+        host = normalize_host(host)
+        host_tenant = await self.store.tenant_for_host(host) if host else None
+        session_tenant = session_tenant_id(session_id)
+        if session_tenant and (session_tenant == host_tenant or await self.store.get(session_tenant) is None):
+            session_tenant = None  # mesmo tenant do host, ou prefixo que não é de empresa
+        if host_tenant and session_tenant:
+            raise TenantMismatch("Sessão pertence a outra empresa")
+        tenant_id = host_tenant or session_tenant
+        return await self.runtime(tenant_id) if tenant_id else None
+
+    def _retire(self, runtime: TenantRuntime) -> None:
+        async def close_later():
+            await asyncio.sleep(self.close_delay)
+            await runtime.aclose()
+
+        try:
+            task = asyncio.get_running_loop().create_task(close_later())
+        except RuntimeError:
+            return  # fora do loop (ex: testes síncronos): o GC fecha os clientes
+        self._closing.add(task)
+        task.add_done_callback(self._closing.discard)
+
+    async def aclose(self) -> None:
+        """Shutdown: fecha os clientes de todas as empresas."""
+        for task in list(self._closing):
+            task.cancel()
+        while self._runtimes:
+            _, runtime = self._runtimes.popitem()
+            await runtime.aclose()
+
+    def stats(self) -> Dict[str, Any]:
+        return {"active": {tenant_id: runtime.stats() for tenant_id, runtime in self._runtimes.items()},
+                "max_active": self.max_active, "closing": len(self._closing),
+                **self.counters, **self.store.stats()}
+
+
+# --- Empresa da requisição em curso (propagada por contextvar, como o prazo) ---
+_current: ContextVar[Optional[TenantRuntime]] = ContextVar("tenant_runtime", default=None)
+
+
+def current_runtime() -> Optional[TenantRuntime]:
+    return _current.get()
+
+
+def current_tenant_id() -> Optional[str]:
+    runtime = _current.get()
+    return runtime.tenant_id if runtime is not None else None
+
+
+def activate(runtime: Optional[TenantRuntime]):
+    """Torna `runtime` a empresa do contexto (serviços e `current_settings()`); retorna os tokens."""
+    return _current.set(runtime), use_settings(runtime.settings if runtime is not None else None)
+
+
+def deactivate(tokens) -> None:
+    runtime_token, settings_token = tokens
+    reset_settings(settings_token)
+    _current.reset(runtime_token)
+
+
+@asynccontextmanager
+async def scope(tenant_id: Optional[str]):
+    """Executa o bloco como a empresa `tenant_id` (None = config do ambiente), ex: retomada de runs."""
+    runtime = await get_tenant_registry().runtime(tenant_id) if tenant_id else None
+    if tenant_id and runtime is None:
+        raise LookupError(f"Empresa '{tenant_id}' não encontrada")
+    tokens = activate(runtime)
+    try:
+        yield runtime
+    finally:
+        deactivate(tokens)
+
+
+def concurrency_slot() -> Tuple[str, int]:
+    """(empresa, limite de turnos simultâneos) da requisição em curso, para a admissão."""
+    runtime = _current.get()
+    if runtime is None:
+        return DEFAULT_TENANT, get_settings().tenant_max_in_flight
+    return runtime.tenant_id, runtime.max_in_flight
+
+
+def new_session_id(runtime: Optional[TenantRuntime]) -> str:
+    session_id = str(uuid.uuid4())
+    return f"{runtime.tenant_id}{SESSION_SEPARATOR}{session_id}" if runtime is not None else session_id
+
+
+def calendar_service():
+    """CalendarService da empresa em curso (pool aquecido) ou um novo com a config do ambiente."""
+    runtime = _current.get()
+    if runtime is not None:
+        return runtime.calendar_service
+    from .calendar_service import CalendarService
+    return CalendarService()
+
+
+@asynccontextmanager
+async def pipefy_service():
+    """PipefyService da empresa em curso (mantido aberto) ou um temporário com a config do ambiente."""
+    runtime = _current.get()
+    if runtime is not None:
+        yield runtime.pipefy_service
+        return
+    from .pipefy_service import PipefyService
+    async with PipefyService() as service:
+        yield service
+
+
+_registry: Optional[TenantRegistry] = None
+
+
+def get_tenant_registry() -> TenantRegistry:
+    global _registry
+    if _registry is None:
+        settings = get_settings()
+        _registry = TenantRegistry(TenantConfigStore(get_redis, settings.tenant_config_ttl_seconds),
+                                   max_active=settings.tenant_max_active,
+                                   close_delay=settings.chat_request_deadline_seconds)
+    return _registry
@@ -0,0 +1,278 @@
+# backend/services/traffic_recorder.py
+
+"""
+Gravação e replay do tráfego HTTP com OpenAI, Pipefy e Cal.com.
+
+Com TRAFFIC_RECORD_PATH definido, os clientes HTTP dos serviços passam por
+um transport que grava cada requisição/resposta (com tempo de resposta e a
+sessão do chat em andamento) em um arquivo JSONL; os turnos do chat também
+são gravados. Credenciais não são gravadas (headers de requisição são
+descartados e `apiKey` é removido da URL). A serialização e a escrita no
+disco rodam em uma thread própria: gravar não bloqueia o event loop.
+
+`ReplayTransport` devolve as respostas gravadas, com a latência original
+(ou escalada), permitindo reproduzir e perfilar uma conversa real offline:
+ver api/utils/replay_conversation.py.
+
+httpx é importado sob demanda para não pesar no cold start da API.
+"""
+
+import asyncio
+import atexit
+import contextvars
+import itertools
+import json
+import queue
+import threading
+import time
+from collections import defaultdict, deque
+from typing import Any, Callable, Dict, List, Optional
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+from ..config import get_settings
+
+# Sessão do chat em andamento (marca as requisições gravadas)
+current_session: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("traffic_session", default=None)
+
+_REDACTED_PARAMS = {"apikey", "api_key", "key", "token"}
+
+
+def redact_url(url: str) -> str:
+    parts = urlsplit(url)
+    query = [(k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True) if k.lower() not in _REDACTED_PARAMS]
+    return urlunsplit((parts.scheme, parts.netloc, parts.path, urlencode(query), parts.fragment))
+
+
+_STOP = object()
+
+
+class TrafficRecorder:
+    """
+    Anexa registros JSONL a `path` (seguro entre threads). `write` só enfileira;
+    a thread "traffic-writer" serializa e grava em lotes, com um flush por lote.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._seq = itertools.count()
+        self._file = open(path, "a", encoding="utf-8")
+        self._queue: "queue.SimpleQueue[Any]" = queue.SimpleQueue()
+        self._writer = threading.Thread(target=self._drain, name="traffic-writer", daemon=True)
+        self._writer.start()
+        atexit.register(self.close)  # a thread é daemon: grava o que faltar ao encerrar o processo
+
+    def write(self, record: Dict[str, Any]) -> None:
+        # A sessão é lida aqui (contextvar do turno); o lock mantém a fila na ordem do seq
+        with self._lock:
+            self._queue.put({"seq": next(self._seq), "session_id": current_session.get(), **record})
+
+    def _drain(self) -> None:
+        stopping = False
+        while not stopping:
+            batch = [self._queue.get()]
+            while True:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            lines, flushed = [], []
+            for item in batch:
+                if item is _STOP:
+                    stopping = True
+                elif isinstance(item, threading.Event):
+                    flushed.append(item)
+                else:
+                    lines.append(json.dumps(item, ensure_ascii=False, default=str) + "\n")
+            if lines:
+                try:
+                    self._file.writelines(lines)
+                    self._file.flush()
+                except (OSError, ValueError) as e:
+                    print(f"Traffic recorder: falha ao gravar {len(lines)} registro(s) em {self.path}: {e}")
+            for event in flushed:
+                event.set()
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """Espera a gravação de tudo que já foi enfileirado (bloqueante: fora do event loop)."""
+        if not self._writer.is_alive():
+            return False
+        done = threading.Event()
+        self._queue.put(done)
+        return done.wait(timeout)
+
+    def close(self) -> None:
+        """Grava o que estiver na fila e fecha o arquivo."""
+        if self._writer.is_alive():
+            self._queue.put(_STOP)
+            self._writer.join(timeout=5)
+        if not self._writer.is_alive() and not self._file.closed:
+            self._file.close()
+        atexit.unregister(self.close)
+
+    def record_http(self, service: str, request, response, started_at: float, elapsed_s: float) -> None:
+        self.write({
+            "kind": "http",
+            "service": service,
+            "method": request.method,
+            "url": redact_url(str(request.url)),
+            "request_body": request.content.decode("utf-8", errors="replace"),
+            "status": response.status_code,
+            "content_type": response.headers.get("content-type"),
+            "response_body": response.content.decode("utf-8", errors="replace"),
+            "started_at": started_at,
+            "elapsed_ms": round(elapsed_s * 1000, 3),
+        })
+
+
+class _TransportLifecycle:
+    """Protocolo de context manager dos transports httpx (sem importar httpx no módulo)."""
+
+    def close(self):
+        pass
+
+    async def aclose(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.aclose()
+
+
+class RecordingTransport(_TransportLifecycle):
+    """Transport httpx (sync e async) que delega ao transport real e grava a troca."""
+
+    def __init__(self, service: str, recorder: TrafficRecorder, is_async: bool):
+        import httpx
+        self.service = service
+        self.recorder = recorder
+        self.inner = httpx.AsyncHTTPTransport() if is_async else httpx.HTTPTransport()
+
+    def handle_request(self, request):
+        started_at, t0 = time.time(), time.perf_counter()
+        response = self.inner.handle_request(request)
+        response.read()
+        self.recorder.record_http(self.service, request, response, started_at, time.perf_counter() - t0)
+        return response
+
+    async def handle_async_request(self, request):
+        started_at, t0 = time.time(), time.perf_counter()
+        response = await self.inner.handle_async_request(request)
+        await response.aread()
+        self.recorder.record_http(self.service, request, response, started_at, time.perf_counter() - t0)
+        return response
+
+    def close(self):
+        self.inner.close()
+
+    async def aclose(self):
+        await self.inner.aclose()
+
+
+class ReplayTransport(_TransportLifecycle):
+    """
+    Responde com o tráfego gravado de um serviço. As requisições são casadas
+    por método + path, na ordem gravada (preferindo corpo idêntico); esgotada a
+    fila de um path, repete a última resposta (ex: polling de runs).
+    """
+
+    def __init__(self, records: List[Dict[str, Any]], latency_scale: float = 1.0):
+        self.latency_scale = latency_scale
+        self._queues: Dict[tuple, deque] = defaultdict(deque)
+        self._last: Dict[tuple, Dict[str, Any]] = {}
+        self.stats = {"served": 0, "repeated": 0, "missed": 0}
+        for record in records:
+            self._queues[self._key(record["method"], record["url"])].append(record)
+
+    @staticmethod
+    def _key(method: str, url: str) -> tuple:
+        return method.upper(), urlsplit(url).path
+
+    def _match(self, request) -> Optional[Dict[str, Any]]:
+        key = self._key(request.method, str(request.url))
+        queue = self._queues.get(key)
+        if queue:
+            body = request.content.decode("utf-8", errors="replace")
+            record = next((r for r in queue if r["request_body"] == body), queue[0])
+            queue.remove(record)
+            self._last[key] = record
+            self.stats["served"] += 1
+            return record
+        if key in self._last:
+            self.stats["repeated"] += 1
+            return self._last[key]
+        self.stats["missed"] += 1
+        return None
+
+    def _response(self, request, record: Optional[Dict[str, Any]]):
+        import httpx
+        if record is None:
+            return httpx.Response(599, json={"error": "no recorded response"}, request=request)
+        headers = {"content-type": record["content_type"]} if record.get("content_type") else {}
+        return httpx.Response(record["status"], headers=headers, content=record["response_body"].encode("utf-8"),
+                              request=request)
+
+    def handle_request(self, request):
+        record = self._match(request)
+        if record:
+            time.sleep(record["elapsed_ms"] / 1000 * self.latency_scale)
+        return self._response(request, record)
+
+    async def handle_async_request(self, request):
+        record = self._match(request)
+        if record:
+            await asyncio.sleep(record["elapsed_ms"] / 1000 * self.latency_scale)
+        return self._response(request, record)
+
+
+_recorder: Optional[TrafficRecorder] = None
+_transport_factory: Optional[Callable[[str, bool], Any]] = None
+
+
+def get_recorder() -> Optional[TrafficRecorder]:
+    """Recorder do processo, se TRAFFIC_RECORD_PATH estiver definido."""
+    global _recorder
+    path = get_settings().traffic_record_path
+    if path and (_recorder is None or _recorder.path != path):
+        if _recorder is not None:
+            _recorder.close()
+        _recorder = TrafficRecorder(path)
+    return _recorder if path else None
+
+
+def install_transport_factory(factory: Optional[Callable[[str, bool], Any]]) -> None:
+    """Substitui os transports dos serviços (ex: replay). `None` restaura o padrão."""
+    global _transport_factory
+    _transport_factory = factory
+
+
+def transport_for(service: str, is_async: bool):
+    """Transport a usar no client httpx de `service` ("openai", "pipefy", "calcom"); None = padrão do httpx."""
+    if _transport_factory is not None:
+        return _transport_factory(service, is_async)
+    recorder = get_recorder()
+    if recorder is None:
+        return None
+    return RecordingTransport(service, recorder, is_async)
+
+
+def record_chat_turn(session_id: str, message: str, response: str, started_at: float, elapsed_s: float) -> None:
+    recorder = get_recorder()
+    if recorder is None:
+        return
+    recorder.write({
+        "kind": "chat",
+        "session_id": session_id,
+        "message": message,
+        "response": response,
+        "started_at": started_at,
+        "elapsed_ms": round(elapsed_s * 1000, 3),
+    })
@@ -0,0 +1,157 @@
+# backend/services/usage_service.py
+
+"""
+Orçamento de tokens por run e contabilização de uso por sessão.
+
+- `TokenBudgetPolicy` decide os parâmetros de cada `runs.create`
+  (`truncation_strategy`, `max_prompt_tokens`, `max_completion_tokens` e,
+  quando houver, o resumo da conversa em `additional_instructions`).
+- `UsageTracker` grava no Redis o uso de tokens de cada run, com totais
+  acumulados por sessão e globais (expostos em /api/metrics).
+"""
+
+from typing import Dict, Any, Optional
+
+from ..config import Settings
+
+USAGE_KEY_PREFIX = "usage:"
+USAGE_GLOBAL_KEY = "usage:global"
+USAGE_TTL_SECONDS = 86400  # Mesmo TTL da sessão no Redis
+
+SUMMARY_PROMPT = (
+    "Resuma a conversa abaixo entre um SDR e um lead em no máximo 8 linhas, em português. "
+    "Preserve SEMPRE: nome, e-mail, empresa, necessidade, se o interesse foi confirmado, "
+    "horários oferecidos/escolhidos e links de reunião. Não invente dados."
+)
+
+
+class TokenBudgetPolicy:
+    """
+    Política de corte do histórico:
+
+    - Enquanto o último run usou menos de `trim_threshold_tokens` de prompt,
+      a OpenAI trunca sozinha (`truncation_strategy: auto`).
+    - Ao cruzar o limite, só as últimas `truncation_last_messages` mensagens
+      são enviadas e (se habilitado) um resumo das mais antigas vai em
+      `additional_instructions`, para não perder os dados do lead.
+    - O corte é permanente na sessão (marca `trimming` no Redis): o prompt do
+      run cortado fica abaixo do limite, e decidir só por ele voltaria a
+      mandar o thread inteiro no run seguinte, alternando a cada turno.
+    """
+
+    def __init__(self, settings: Settings):
+        self.max_prompt_tokens = settings.openai_max_prompt_tokens
+        self.max_completion_tokens = settings.openai_max_completion_tokens
+        self.trim_threshold_tokens = settings.openai_trim_threshold_tokens
+        self.truncation_last_messages = settings.openai_truncation_last_messages
+        self.summary_enabled = settings.openai_summary_enabled
+        self.summary_model = settings.openai_summary_model
+        self.summary_every_runs = settings.openai_summary_every_runs
+
+    def should_trim(self, state: Dict[str, Any]) -> bool:
+        return bool(state.get("trimming")) or int(state.get("last_prompt_tokens", 0)) >= self.trim_threshold_tokens
+
+    def should_summarize(self, state: Dict[str, Any]) -> bool:
+        if not self.summary_enabled or not self.should_trim(state):
+            return False
+        if not state.get("summary"):
+            return True
+        runs_since_summary = int(state.get("runs", 0)) - int(state.get("summary_at_run", 0))
+        return runs_since_summary >= self.summary_every_runs
+
+    def run_options(self, state: Dict[str, Any]) -> Dict[str, Any]:
+        """Parâmetros extras para `runs.create` de acordo com o estado da sessão."""
+        options: Dict[str, Any] = {}
+        if self.max_prompt_tokens:
+            options["max_prompt_tokens"] = self.max_prompt_tokens
+        if self.max_completion_tokens:
+            options["max_completion_tokens"] = self.max_completion_tokens
+        if self.should_trim(state):
+            options["truncation_strategy"] = {
+                "type": "last_messages",
+                "last_messages": self.truncation_last_messages,
+            }
+            if state.get("summary"):
+                options["additional_instructions"] = f"Resumo da conversa até aqui (mensagens antigas): {state['summary']}"
+        else:
+            options["truncation_strategy"] = {"type": "auto"}
+        return options
+
+
+class UsageTracker:
+    """Contabiliza o uso de tokens dos runs no Redis (por sessão e global)."""
+
+    def __init__(self, redis_factory):
+        # Recebe a função que cria o cliente, para não abrir conexão no import
+        self._redis_factory = redis_factory
+
+    @staticmethod
+    def _key(usage_key: str) -> str:
+        return f"{USAGE_KEY_PREFIX}{usage_key}"
+
+    async def get_state(self, usage_key: str) -> Dict[str, Any]:
+        """Estado de uso da sessão (totais, último prompt, resumo)."""
+        try:
+            return await self._redis_factory().hgetall(self._key(usage_key)) or {}
+        except Exception as e:
+            print(f"Error reading token usage for {usage_key}: {e}")
+            return {}
+
+    async def record_run(self, usage_key: str, run, trimmed: bool = False,
+                         flags: Optional[Dict[str, Any]] = None) -> Optional[Dict[str, Any]]:
+        """
+        Grava o `run.usage` do run finalizado. `flags` são marcas de estado da
+        sessão gravadas junto (ex: lead_registered, usada pelo model_router).
+        Falhas no Redis não quebram o turno.
+        """
+        usage = getattr(run, "usage", None)
+        if not usage:
+            return None
+        prompt_tokens = usage.prompt_tokens or 0
+        completion_tokens = usage.completion_tokens or 0
+        total_tokens = usage.total_tokens or (prompt_tokens + completion_tokens)
+        try:
+            key = self._key(usage_key)
+            pipe = self._redis_factory().pipeline(transaction=False)
+            for target in (key, USAGE_GLOBAL_KEY):
+                pipe.hincrby(target, "prompt_tokens", prompt_tokens)
+                pipe.hincrby(target, "completion_tokens", completion_tokens)
+                pipe.hincrby(target, "total_tokens", total_tokens)
+                pipe.hincrby(target, "runs", 1)
+                if trimmed:
+                    pipe.hincrby(target, "trimmed_runs", 1)
+                if run.status == "incomplete":
+                    pipe.hincrby(target, "incomplete_runs", 1)
+            state = {"last_prompt_tokens": prompt_tokens, "last_run_id": run.id, **(flags or {})}
+            if trimmed:
+                state["trimming"] = 1  # o thread só cresce: a sessão segue cortada
+            pipe.hset(key, mapping=state)
+            pipe.expire(key, USAGE_TTL_SECONDS)
+            await pipe.execute()
+        except Exception as e:
+            print(f"Error recording token usage for {usage_key}: {e}")
+            return None
+        print(f"Run {run.id} usage: prompt={prompt_tokens} completion={completion_tokens} total={total_tokens}")
+        return {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens, "total_tokens": total_tokens}
+
+    async def save_summary(self, usage_key: str, summary: str, at_run: int) -> None:
+        try:
+            key = self._key(usage_key)
+            pipe = self._redis_factory().pipeline(transaction=False)
+            pipe.hset(key, mapping={"summary": summary, "summary_at_run": at_run})
+            pipe.hincrby(USAGE_GLOBAL_KEY, "summaries", 1)
+            await pipe.execute()
+        except Exception as e:
+            print(f"Error saving conversation summary for {usage_key}: {e}")
+
+    async def get_session_usage(self, usage_key: str) -> Dict[str, Any]:
+        state = await self.get_state(usage_key)
+        state.pop("summary", None)  # O resumo pode ser grande e tem dados do lead
+        return state
+
+    async def get_global_usage(self) -> Dict[str, Any]:
+        try:
+            return await self._redis_factory().hgetall(USAGE_GLOBAL_KEY) or {}
+        except Exception as e:
+            print(f"Error reading global token usage: {e}")
+            return {}
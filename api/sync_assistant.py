@@ -0,0 +1,139 @@
+# api/sync_assistant.py
+
+"""
+Sincroniza o Assistente da OpenAI com a definição em `assistant_spec.py`.
+
+- Se `OPENAI_ASSISTANT_ID` não existir, cria o assistente e grava o ID no `.env`.
+- Se existir, compara a definição local com o assistente publicado e só chama
+  `assistants.update` quando algo mudou (nome, modelo, instruções ou tools).
+- O hash da definição aplicada fica em cache local (`.assistant_sync.json`):
+  no deploy, se nada mudou, a sincronização termina sem nenhuma chamada de rede.
+
+Uso (a partir da raiz do repositório):
+    python -m api.sync_assistant            # sincroniza (se necessário)
+    python -m api.sync_assistant --dry-run  # só mostra o diff
+    python -m api.sync_assistant --force    # ignora o cache local
+"""
+
+import argparse
+import json
+import os
+from pathlib import Path
+from typing import Any, Dict, List
+
+try:
+    from api.assistant_spec import ASSISTANT_SPEC_VERSION, build_assistant_spec, spec_hash
+    from api.config import get_settings
+except ImportError:
+    from assistant_spec import ASSISTANT_SPEC_VERSION, build_assistant_spec, spec_hash
+    from config import get_settings
+
+SYNC_CACHE_FILE = Path(os.getenv("ASSISTANT_SYNC_CACHE", Path(__file__).resolve().parent / ".assistant_sync.json"))
+
+
+def _load_sync_cache() -> Dict[str, Any]:
+    try:
+        return json.loads(SYNC_CACHE_FILE.read_text())
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+
+def _save_sync_cache(assistant_id: str, digest: str) -> None:
+    SYNC_CACHE_FILE.write_text(json.dumps({"assistant_id": assistant_id, "spec_hash": digest}, indent=2))
+
+
+def _normalize_tools(tools: List[Any]) -> List[Dict[str, Any]]:
+    """Reduz as tools (locais ou da API) a name/description/parameters para comparação."""
+    normalized = []
+    for item in tools:
+        if hasattr(item, "model_dump"):
+            item = item.model_dump(exclude_none=True)
+        function = item.get("function", {})
+        normalized.append({
+            "type": item.get("type"),
+            "name": function.get("name"),
+            "description": function.get("description"),
+            "parameters": function.get("parameters"),
+        })
+    return normalized
+
+
+def diff_assistant(spec: Dict[str, Any], live) -> List[str]:
+    """Lista os campos do assistente publicado que diferem da definição local."""
+    changed = []
+    for field in ("name", "model", "instructions"):
+        if (getattr(live, field, None) or "") != spec[field]:
+            changed.append(field)
+    if _normalize_tools(live.tools or []) != _normalize_tools(spec["tools"]):
+        changed.append("tools")
+    return changed
+
+
+def _write_assistant_id_to_env(assistant_id: str) -> None:
+    # Atualiza o .env (mesmo comportamento do antigo create_assistant.py)
+    env_lines = []
+    if os.path.exists(".env"):
+        with open(".env", "r") as f:
+            for line in f:
+                if not line.startswith("OPENAI_ASSISTANT_ID="): env_lines.append(line)
+    with open(".env", "w") as f:
+        f.writelines(env_lines)
+        if env_lines and not env_lines[-1].endswith('\n'): f.write('\n')
+        f.write(f"OPENAI_ASSISTANT_ID={assistant_id}\n")
+    print("Arquivo .env atualizado com o novo ASSISTANT_ID.")
+
+
+def sync_assistant(dry_run: bool = False, force: bool = False) -> str:
+    """Aplica a definição local; retorna "unchanged", "cached", "updated", "created" ou "dry-run"."""
+    settings = get_settings()
+    spec = build_assistant_spec()
+    digest = spec_hash(spec)
+    assistant_id = settings.openai_assistant_id
+    metadata = {"spec_version": ASSISTANT_SPEC_VERSION, "spec_hash": digest}
+
+    cache = _load_sync_cache()
+    if not force and assistant_id and cache.get("assistant_id") == assistant_id and cache.get("spec_hash") == digest:
+        print(f"Assistente {assistant_id} já está na versão {digest} (cache local). Nada a fazer.")
+        return "cached"
+
+    from openai import OpenAI
+    client = OpenAI(api_key=settings.openai_api_key)
+
+    if not assistant_id:
+        if dry_run:
+            print("OPENAI_ASSISTANT_ID não definido: um novo assistente seria criado.")
+            return "dry-run"
+        assistant = client.beta.assistants.create(**spec, metadata=metadata)
+        print(f"Assistant ID: {assistant.id}")
+        _write_assistant_id_to_env(assistant.id)
+        _save_sync_cache(assistant.id, digest)
+        return "created"
+
+    live = client.beta.assistants.retrieve(assistant_id)
+    changed = diff_assistant(spec, live)
+    if not changed:
+        print(f"Assistente {assistant_id} já corresponde à definição local ({digest}).")
+        if not dry_run:
+            _save_sync_cache(assistant_id, digest)
+        return "unchanged"
+
+    print(f"Campos alterados em {assistant_id}: {', '.join(changed)}")
+    if dry_run:
+        return "dry-run"
+    update = {field: spec[field] for field in changed}
+    client.beta.assistants.update(assistant_id, **update, metadata=metadata)
+    _save_sync_cache(assistant_id, digest)
+    print(f"Assistente {assistant_id} atualizado para a versão {digest}.")
+    return "updated"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Sincroniza o Assistente OpenAI com assistant_spec.py")
+    parser.add_argument("--dry-run", action="store_true", help="Mostra o diff sem alterar o assistente")
+    parser.add_argument("--force", action="store_true", help="Ignora o cache local do hash")
+    args = parser.parse_args()
+    sync_assistant(dry_run=args.dry_run, force=args.force)
+
+
+if __name__ == "__main__":
+    main()
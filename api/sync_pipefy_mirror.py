@@ -0,0 +1,44 @@
+# api/sync_pipefy_mirror.py
+
+"""
+Sincronização do espelho local (Redis) do pipe de leads do Pipefy.
+
+Faz a carga inicial paginada de todos os cards; depois disso o espelho é
+mantido pelos webhooks (POST /api/webhooks/pipefy) e pela reconciliação
+periódica por cursor. Requer PIPEFY_MIRROR_ENABLED=true.
+
+Uso (a partir da raiz do repositório):
+    python -m api.sync_pipefy_mirror              # carga completa
+    python -m api.sync_pipefy_mirror --step 5     # só um passo de reconciliação (5 páginas)
+"""
+
+import argparse
+import asyncio
+
+try:
+    from api.services.pipefy_service import PipefyService
+except ImportError:
+    from services.pipefy_service import PipefyService
+
+
+async def run(step_pages: int = 0) -> None:
+    async with PipefyService() as service:
+        if service.mirror is None:
+            raise SystemExit("Espelho desabilitado: defina PIPEFY_MIRROR_ENABLED=true")
+        if step_pages:
+            result = await service.mirror.reconcile_step(service, max_pages=step_pages)
+            print(f"Reconciliação: {result}")
+        else:
+            total = await service.mirror.full_sync(service)
+            print(f"Espelho sincronizado: {total} cards")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Sincroniza o espelho local do pipe do Pipefy")
+    parser.add_argument("--step", type=int, default=0, help="Executa só um passo de reconciliação com N páginas")
+    args = parser.parse_args()
+    asyncio.run(run(args.step))
+
+
+if __name__ == "__main__":
+    main()
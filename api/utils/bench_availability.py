@@ -0,0 +1,92 @@
+"""
+Benchmark do relatório de capacidade da agenda: loop escalar
+(`CalendarService._iter_free_slots`, slot a slot) vs. contagem vetorizada
+com NumPy (services/availability_analytics.py).
+
+Gera uma agenda sintética por host (expediente 9h–18h em dias úteis, ~40%
+dos horários ocupados) e confere que as duas versões dão as mesmas contagens.
+
+Uso (a partir da raiz do repositório):
+    python api/utils/bench_availability.py --hosts 10 --days 90
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+
+os.environ.setdefault("CAL_COM_API_KEY", "bench")
+os.environ.setdefault("CAL_COM_USERNAME", "bench")
+os.environ.setdefault("CAL_COM_EVENT_TYPE_ID", "1")
+
+from api.services import availability_analytics as analytics  # noqa: E402
+from api.services.calendar_service import CalendarService  # noqa: E402
+
+SAO_PAULO = timezone(timedelta(hours=-3))
+
+
+def synthetic_host(rng: random.Random, start: datetime, days: int, duration: int):
+    date_ranges, busy = [], []
+    for d in range(days):
+        day = (start + timedelta(days=d)).replace(hour=9, minute=0, second=0, microsecond=0)
+        if day.weekday() >= 5:
+            continue
+        day_end = day.replace(hour=18)
+        date_ranges.append({"start": day.isoformat(), "end": day_end.isoformat()})
+        slot = day
+        while slot < day_end:
+            if rng.random() < 0.4:
+                length = duration * rng.choice((1, 1, 2, 3))
+                offset = rng.choice((0, 0, 15))
+                busy_start = (slot + timedelta(minutes=offset)).astimezone(timezone.utc)
+                busy.append({"start": busy_start.strftime("%Y-%m-%dT%H:%M:%S.000Z"),
+                             "end": (busy_start + timedelta(minutes=length)).strftime("%Y-%m-%dT%H:%M:%S.000Z")})
+            slot += timedelta(minutes=duration)
+    return {"dateRanges": date_ranges, "busy": busy}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--hosts", type=int, default=10)
+    parser.add_argument("--days", type=int, default=90)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    calendar = CalendarService()
+    calendar.hosts = [(f"vendedor{i}", 1) for i in range(args.hosts)]
+    duration = calendar.event_duration_minutes
+    now_utc = datetime.now(timezone.utc)
+    rng = random.Random(args.seed)
+    host_data = [synthetic_host(rng, now_utc.astimezone(SAO_PAULO), args.days, duration)
+                 for _ in range(args.hosts)]
+    busy_total = sum(len(d["busy"]) for d in host_data)
+    print(f"{args.hosts} hosts x {args.days} dias, slots de {duration} min, {busy_total} intervalos ocupados")
+
+    first_day = now_utc.astimezone(SAO_PAULO).date()
+    scalar_times, vector_times = [], []
+    for _ in range(args.repeat):
+        t0 = time.perf_counter()
+        scalar = [analytics.scalar_host_report(calendar, data, now_utc, first_day, args.days) for data in host_data]
+        scalar_times.append(time.perf_counter() - t0)
+
+        t0 = time.perf_counter()
+        report = analytics.compute_report(calendar, host_data, args.days, now_utc=now_utc)
+        vector_times.append(time.perf_counter() - t0)
+
+    for (capacity, free), host in zip(scalar, report["hosts"]):
+        assert capacity == [d["capacity"] for d in host["days"]], f"capacidade diverge em {host['username']}"
+        assert free == [d["free"] for d in host["days"]], f"livres divergem em {host['username']}"
+
+    scalar_ms, vector_ms = min(scalar_times) * 1000, min(vector_times) * 1000
+    print(f"escalar:     {scalar_ms:9.1f} ms")
+    print(f"vetorizado:  {vector_ms:9.1f} ms  ({scalar_ms / vector_ms:.1f}x)  — contagens idênticas")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,218 @@
+"""
+Benchmark dos motores de chat: API Assistants (threads/runs, `OpenAIService`)
+vs. chat completions com transcript local (`ChatCompletionsService`).
+
+Os dois motores rodam de verdade (SDK da OpenAI, loop de ferramentas,
+`assistant_tools.run_tool`), mas as requisições HTTP vão para um dublê local
+da OpenAI (instalado via `traffic_recorder.install_transport_factory`) que
+simula a latência de rede por requisição e o tempo de geração do modelo por
+passo. Metade dos turnos chama uma ferramenta (registrada só aqui).
+
+Mede latência por turno e chamadas à API por turno:
+
+    python api/utils/bench_chat_engines.py --turns 6 --network-ms 60 --generation-ms 700
+
+Sem --redis-url o transcript do motor de completions fica em memória (sem o
+custo de ida ao Redis); com ele, usa o Redis informado.
+"""
+
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import os
+import statistics
+import sys
+import time
+import uuid
+from pathlib import Path
+
+import httpx
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+
+
+class OpenAIStandIn(httpx.BaseTransport, httpx.AsyncBaseTransport):
+    """Dublê das rotas da OpenAI usadas pelos motores (threads/runs/messages e chat/completions)."""
+
+    def __init__(self, network_s: float, generation_s: float):
+        self.network_s = network_s
+        self.generation_s = generation_s
+        self.calls = 0
+        self.threads = {}
+        self.runs = {}
+        self.tool_turns = set()  # conteúdo das mensagens de usuário que pedem ferramenta
+        self.tool_calls = {}  # conteúdo da mensagem de usuário -> (ferramenta, argumentos)
+
+    # --- helpers ---
+    @staticmethod
+    def _json(request, payload, status=200):
+        return httpx.Response(status, json=payload, request=request)
+
+    def _message(self, thread_id, role, text):
+        return {"id": f"msg_{uuid.uuid4().hex[:8]}", "object": "thread.message", "created_at": int(time.time()),
+                "thread_id": thread_id, "role": role, "status": "completed", "attachments": [], "metadata": {},
+                "content": [{"type": "text", "text": {"value": text, "annotations": []}}]}
+
+    def _tool_for(self, text):
+        if text in self.tool_calls:
+            return self.tool_calls[text]
+        return ("consultarBench", {}) if text in self.tool_turns else None
+
+    def _run(self, run_id):
+        run = self.runs[run_id]
+        payload = {"id": run_id, "object": "thread.run", "created_at": 1, "thread_id": run["thread_id"],
+                   "assistant_id": "asst_bench", "status": run["status"],
+                   "usage": {"prompt_tokens": 500, "completion_tokens": 50, "total_tokens": 550}}
+        if run["status"] == "requires_action":
+            name, arguments = run["tool"]
+            payload["required_action"] = {"type": "submit_tool_outputs", "submit_tool_outputs": {"tool_calls": [
+                {"id": "call_1", "type": "function", "function": {"name": name, "arguments": json.dumps(arguments)}}]}}
+        return payload
+
+    def _advance(self, run_id):
+        run = self.runs[run_id]
+        if run["status"] in ("queued", "in_progress") and time.monotonic() >= run["ready_at"]:
+            if run["tool"] and not run["tool_done"]:
+                run["status"] = "requires_action"
+            else:
+                run["status"] = "completed"
+                self.threads[run["thread_id"]].append(self._message(run["thread_id"], "assistant", "Resposta."))
+        elif run["status"] == "queued":
+            run["status"] = "in_progress"
+
+    def _sse(self, request, chunks):
+        body = "".join(f"data: {json.dumps(chunk)}\n\n" for chunk in chunks) + "data: [DONE]\n\n"
+        return httpx.Response(200, headers={"content-type": "text/event-stream"}, content=body.encode(),
+                              request=request)
+
+    def _chunk(self, delta, finish_reason=None):
+        return {"id": "chatcmpl-bench", "object": "chat.completion.chunk", "created": 1, "model": "bench",
+                "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}]}
+
+    # --- roteamento ---
+    def _handle(self, request):
+        self.calls += 1
+        path = request.url.path.removeprefix("/v1")
+        body = json.loads(request.content) if request.content else {}
+        parts = path.strip("/").split("/")
+
+        if path == "/chat/completions":
+            last = body["messages"][-1]
+            tool = self._tool_for(last["content"]) if last["role"] == "user" else None
+            if tool:
+                name, arguments = tool
+                return self._sse(request, [
+                    self._chunk({"role": "assistant", "tool_calls": [{"index": 0, "id": "call_1", "type": "function",
+                                 "function": {"name": name, "arguments": json.dumps(arguments)}}]}),
+                    self._chunk({}, "tool_calls"),
+                    {"id": "chatcmpl-bench", "object": "chat.completion.chunk", "created": 1, "model": "bench",
+                     "choices": [], "usage": {"prompt_tokens": 500, "completion_tokens": 20, "total_tokens": 520}},
+                ])
+            return self._sse(request, [self._chunk({"role": "assistant", "content": "Resp"}),
+                                       self._chunk({"content": "osta."}, "stop")])
+
+        if parts == ["threads"]:
+            thread_id = f"thread_{uuid.uuid4().hex[:8]}"
+            self.threads[thread_id] = []
+            return self._json(request, {"id": thread_id, "object": "thread", "created_at": 1, "metadata": {}})
+        thread_id = parts[1]
+        if parts[2:] == ["messages"] and request.method == "POST":
+            message = self._message(thread_id, body["role"], body["content"])
+            self.threads[thread_id].append(message)
+            return self._json(request, message)
+        if parts[2:] == ["messages"]:
+            data = list(reversed(self.threads[thread_id]))[:1]
+            return self._json(request, {"object": "list", "data": data, "has_more": False})
+        if parts[2:] == ["runs"]:
+            run_id = f"run_{uuid.uuid4().hex[:8]}"
+            tool = self._tool_for(self.threads[thread_id][-1]["content"][0]["text"]["value"])
+            self.runs[run_id] = {"thread_id": thread_id, "status": "queued", "tool": tool,
+                                 "tool_done": False, "ready_at": time.monotonic() + self.generation_s}
+            return self._json(request, self._run(run_id))
+        run_id = parts[3]
+        if parts[4:] == ["submit_tool_outputs"]:
+            run = self.runs[run_id]
+            run.update(status="queued", tool_done=True, ready_at=time.monotonic() + self.generation_s)
+            return self._json(request, self._run(run_id))
+        self._advance(run_id)
+        return self._json(request, self._run(run_id))
+
+    def _generation_delay(self, request) -> float:
+        return self.generation_s if request.url.path.endswith("/chat/completions") else 0.0
+
+    def handle_request(self, request):
+        time.sleep(self.network_s + self._generation_delay(request))
+        return self._handle(request)
+
+    async def handle_async_request(self, request):
+        await asyncio.sleep(self.network_s + self._generation_delay(request))
+        return self._handle(request)
+
+
+async def run_engine(service, stand_in: OpenAIStandIn, messages):
+    thread_id = await service.create_thread()
+    latencies, calls = [], []
+    for message in messages:
+        before = stand_in.calls
+        t0 = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):  # os serviços fazem log com print
+            await service.get_assistant_response(thread_id, message, session_id=thread_id)
+        latencies.append((time.perf_counter() - t0) * 1000)
+        calls.append(stand_in.calls - before)
+    return latencies, calls
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--turns", type=int, default=6, help="Turnos por motor (metade com ferramenta)")
+    parser.add_argument("--network-ms", type=float, default=60.0, help="Latência de rede por requisição")
+    parser.add_argument("--generation-ms", type=float, default=700.0, help="Tempo de geração do modelo por passo")
+    parser.add_argument("--poll-interval", type=float, default=None,
+                        help="Intervalo de polling do run (padrão: o do OpenAIService)")
+    parser.add_argument("--redis-url", default=None)
+    args = parser.parse_args()
+
+    os.environ.update(OPENAI_API_KEY="bench", OPENAI_ASSISTANT_ID="asst_bench")
+    if args.redis_url:
+        os.environ["UPSTASH_REDIS_URL"] = args.redis_url
+
+    from api.services import traffic_recorder
+    from api.services.assistant_tools import tool
+    from api.services.chat_completions_service import ChatCompletionsService
+    from api.services.openai_service import OpenAIService
+
+    @tool("consultarBench", "Ferramenta do benchmark (não faz I/O).")
+    async def consultar_bench(ctx):
+        return {"ok": True}
+
+    stand_in = OpenAIStandIn(args.network_ms / 1000, args.generation_ms / 1000)
+    traffic_recorder.install_transport_factory(lambda service, is_async: stand_in)
+    messages = [f"mensagem {i}" for i in range(args.turns)]
+    stand_in.tool_turns = set(messages[1::2])
+
+    assistants = OpenAIService()
+    if args.poll_interval is not None:
+        assistants.poll_interval = args.poll_interval
+    completions = ChatCompletionsService()
+
+    results = {}
+    for name, service in (("assistants", assistants), ("completions", completions)):
+        results[name] = asyncio.run(run_engine(service, stand_in, messages))
+
+    print(f"{args.turns} turnos (metade com ferramenta), rede {args.network_ms:.0f}ms/req, "
+          f"geração {args.generation_ms:.0f}ms/passo, poll {assistants.poll_interval}s, "
+          f"transcript {'Redis' if args.redis_url else 'em memória'}")
+    print(f"\n{'motor':<12} {'p50 ms':>8} {'máx ms':>8} {'chamadas/turno':>15}")
+    for name, (latencies, calls) in results.items():
+        print(f"{name:<12} {statistics.median(latencies):>8.0f} {max(latencies):>8.0f} "
+              f"{statistics.mean(calls):>15.1f}")
+    for label, selector in (("sem ferramenta", slice(0, None, 2)), ("com ferramenta", slice(1, None, 2))):
+        row = ", ".join(f"{name} {statistics.mean(lat[selector]):.0f}ms/{statistics.mean(c[selector]):.0f} chamadas"
+                        for name, (lat, c) in results.items())
+        print(f"  {label}: {row}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+"""
+Benchmark da importação em lote de leads contra um stand-in local do Pipefy.
+
+O stand-in (httpx.MockTransport) entende as queries/mutations usadas pelo
+PipefyService (cards, findCards, createCard, updateCardField,
+updateFieldsValues) e simula a latência de rede de cada requisição.
+Compara, em leads/segundo:
+
+- caminho atual do chat: `create_or_update_lead` um lead por vez;
+- `import_leads`: lotes com resolução e upsert em uma requisição cada.
+
+Uso (a partir da raiz do repositório):
+    python api/utils/bench_import_leads.py --leads 500 --latency-ms 80
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import re
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import httpx
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+os.environ.setdefault("PIPEFY_API_KEY", "bench")
+os.environ.setdefault("PIPEFY_PIPE_ID", "1")
+
+from api.import_leads import import_leads  # noqa: E402
+from api.models import Lead  # noqa: E402
+from api.services.pipefy_service import PipefyService  # noqa: E402
+
+_STRING = r'("(?:[^"\\]|\\.)*")'
+
+
+class PipefyStandIn:
+    """Pipe em memória que responde ao subconjunto GraphQL usado pelo serviço."""
+
+    def __init__(self, latency_s: float, email_field_id: str = "e_mail"):
+        self.latency_s = latency_s
+        self.email_field_id = email_field_id
+        self.cards = {}  # email -> card_id
+        self.requests = 0
+
+    def _create(self, block: str):
+        match = re.search(rf'field_id: "{self.email_field_id}", field_value: {_STRING}', block)
+        email = json.loads(match.group(1)) if match else f"sem-email-{len(self.cards)}"
+        card_id = str(1000 + len(self.cards))
+        self.cards[email] = card_id
+        return {"card": {"id": card_id, "title": email}}
+
+    async def handler(self, request: httpx.Request) -> httpx.Response:
+        self.requests += 1
+        await asyncio.sleep(self.latency_s)
+        query = json.loads(request.content)["query"]
+        data = {}
+        if "findCards" in query:
+            for alias, value in re.findall(rf'(e\d+): findCards\(.*?fieldValue: {_STRING}', query):
+                card_id = self.cards.get(json.loads(value))
+                data[alias] = {"edges": [{"node": {"id": card_id}}] if card_id else []}
+        elif re.search(r'\bm\d+: ', query):
+            for alias, operation, block in re.findall(r'(m\d+): (createCard|updateFieldsValues)\((.*?)\) \{', query):
+                data[alias] = self._create(block) if operation == "createCard" else {"success": True}
+        elif "createCard" in query:
+            data["createCard"] = self._create(query)
+        elif "updateCardField" in query:
+            data["updateCardField"] = {"card": {"id": "x", "title": "x"}, "success": True}
+        elif "cards(" in query:
+            recent = list(self.cards.items())[-50:]
+            data["cards"] = {"edges": [
+                {"node": {"id": card_id, "title": email, "fields": [{"name": "E-mail", "value": email}]}}
+                for email, card_id in recent
+            ]}
+        return httpx.Response(200, json={"data": data})
+
+
+def write_leads_file(path: Path, count: int, duplicate_every: int = 10) -> None:
+    with open(path, "w") as f:
+        for i in range(count):
+            n = i - 1 if duplicate_every and i and i % duplicate_every == 0 else i
+            f.write(json.dumps({"nome": f"Lead {n}", "email": f"lead{n}@example.com", "empresa": "ACME",
+                                "necessidade": "Bench", "interesse_confirmado": i % 2 == 0}) + "\n")
+
+
+async def bench_one_by_one(count: int, latency_s: float) -> float:
+    stand_in = PipefyStandIn(latency_s)
+    service = PipefyService(client=httpx.AsyncClient(transport=httpx.MockTransport(stand_in.handler)))
+    started = time.perf_counter()
+    for i in range(count):
+        await service.create_or_update_lead(Lead(name=f"Lead {i}", email=f"lead{i}@example.com"))
+    elapsed = time.perf_counter() - started
+    await service.close()
+    print(f"um por vez : {count} leads em {elapsed:.2f}s -> {count / elapsed:8.1f} leads/s ({stand_in.requests} requisições)")
+    return count / elapsed
+
+
+async def bench_batched(path: Path, count: int, latency_s: float, batch_size: int) -> float:
+    stand_in = PipefyStandIn(latency_s)
+    service = PipefyService(client=httpx.AsyncClient(transport=httpx.MockTransport(stand_in.handler)))
+    stats = await import_leads(path, batch_size=batch_size, rate_per_second=1000, pipefy_service=service)
+    await service.close()
+    imported = stats["created"] + stats["updated"]
+    print(f"em lote    : {imported} leads em {stats['elapsed_seconds']:.2f}s -> "
+          f"{stats['leads_per_second']:8.1f} leads/s ({stand_in.requests} requisições)")
+    return stats["leads_per_second"]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--leads", type=int, default=300)
+    parser.add_argument("--latency-ms", type=float, default=80.0)
+    parser.add_argument("--batch-size", type=int, default=50)
+    args = parser.parse_args()
+    latency_s = args.latency_ms / 1000
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "leads.jsonl"
+        write_leads_file(path, args.leads)
+        sequential = asyncio.run(bench_one_by_one(min(args.leads, 100), latency_s))
+        batched = asyncio.run(bench_batched(path, args.leads, latency_s, args.batch_size))
+    print(f"speedup    : {batched / sequential:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
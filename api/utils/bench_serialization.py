@@ -0,0 +1,88 @@
+"""
+Benchmark de serialização e compressão das respostas da API.
+
+Compara, para um histórico sintético de conversa e para o ChatResponse:
+
+- encode: caminho padrão do FastAPI (jsonable_encoder + JSONResponse)
+  vs. orjson (usado por /api/chat e /api/history);
+- tamanho do payload: sem compressão, gzip e brotli (se instalado);
+- ChatResponse antigo (com thread_id e lead_data=null) vs. enxuto.
+
+Uso (a partir da raiz do repositório):
+    python api/utils/bench_serialization.py --messages 200 --repeat 2000
+"""
+
+import argparse
+import gzip
+import sys
+import time
+from pathlib import Path
+
+import orjson
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, ORJSONResponse
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+
+from api.models import ChatResponse  # noqa: E402
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+def build_history(count: int):
+    messages = []
+    for i in range(count):
+        role = "user" if i % 2 == 0 else "assistant"
+        content = ("Olá! Gostaria de saber mais sobre a automação de vendas para a minha empresa. " * (1 + i % 4)
+                   if role == "user" else
+                   "Claro! Tenho os seguintes horários disponíveis: 21 de outubro às 10:00, "
+                   "21 de outubro às 14:30 e 22 de outubro às 09:00. Qual prefere? " * (1 + i % 3))
+        messages.append({"role": role, "content": content, "timestamp": 1760000000 + i * 30})
+    return messages
+
+
+def timed(label: str, fn, repeat: int) -> float:
+    started = time.perf_counter()
+    for _ in range(repeat):
+        body = fn()
+    per_call_us = (time.perf_counter() - started) / repeat * 1e6
+    print(f"{label:<34} {per_call_us:9.1f} µs/resp  ({len(body):7d} bytes)")
+    return per_call_us
+
+
+def sizes(label: str, body: bytes) -> None:
+    line = f"{label:<34} raw={len(body):7d}  gzip={len(gzip.compress(body, compresslevel=6)):7d}"
+    if brotli is not None:
+        line += f"  br={len(brotli.compress(body, quality=4)):7d}"
+    print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--messages", type=int, default=200)
+    parser.add_argument("--repeat", type=int, default=2000)
+    args = parser.parse_args()
+
+    history = build_history(args.messages)
+    print(f"--- Histórico com {args.messages} mensagens ---")
+    before = timed("antes  (jsonable_encoder+json)", lambda: JSONResponse(jsonable_encoder(history)).body, args.repeat)
+    after = timed("depois (orjson)", lambda: orjson.dumps(history), args.repeat)
+    print(f"{'speedup':<34} {before / after:9.1f}x")
+    sizes("tamanho do histórico", orjson.dumps(history))
+
+    print("--- ChatResponse ---")
+    reply = history[1]["content"]
+    old = ChatResponse(response=reply, session_id="5f2b1c9e-0d4e-4a8b-9c1e-7a3f2d6b8e10",
+                       thread_id="thread_abc123DEF456ghi789JKL0")
+    lean = ChatResponse(response=reply, session_id="5f2b1c9e-0d4e-4a8b-9c1e-7a3f2d6b8e10")
+    before = timed("antes  (todos os campos)", lambda: JSONResponse(jsonable_encoder(old)).body, args.repeat)
+    after = timed("depois (orjson, sem None)",
+                  lambda: ORJSONResponse(lean.model_dump(exclude_none=True)).body, args.repeat)
+    print(f"{'speedup':<34} {before / after:9.1f}x")
+
+
+if __name__ == "__main__":
+    main()
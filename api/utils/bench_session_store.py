@@ -0,0 +1,170 @@
+"""
+Benchmark do ciclo de vida da sessão no Redis: versões antigas com vários
+comandos (GET + SET, GET + DEL) vs. scripts Lua de services/session_store.py
+(um EVALSHA por operação).
+
+Por padrão usa um Redis em memória (fakeredis via TCP) atrás de um proxy
+local que adiciona `--rtt-ms` de latência por ida e volta, para simular o
+Upstash; com --redis-url usa um Redis real (o proxy continua aplicando o RTT
+extra, use --rtt-ms 0 para medir só a rede real).
+
+Também mede a corrida do primeiro contato: N requisições simultâneas da
+mesma sessão nova, contando quantos threads cada versão cria.
+
+Uso (a partir da raiz do repositório):
+    python api/utils/bench_session_store.py --rtt-ms 20 --ops 200
+"""
+
+import argparse
+import asyncio
+import statistics
+import sys
+import threading
+import time
+import uuid
+from pathlib import Path
+
+import redis.asyncio as redis
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+
+from api.services import session_store  # noqa: E402
+
+
+async def start_latency_proxy(target_host: str, target_port: int, rtt_s: float):
+    """Proxy TCP que atrasa cada trecho em rtt/2 por sentido, preservando a ordem."""
+    loop = asyncio.get_running_loop()
+
+    async def pipe(reader, writer):
+        try:
+            while data := await reader.read(65536):
+                loop.call_later(rtt_s / 2, writer.write, data)
+        finally:
+            loop.call_later(rtt_s / 2 + 0.001, writer.close)
+
+    async def handle(client_reader, client_writer):
+        upstream_reader, upstream_writer = await asyncio.open_connection(target_host, target_port)
+        try:
+            await asyncio.gather(pipe(client_reader, upstream_writer), pipe(upstream_reader, client_writer),
+                                 return_exceptions=True)
+        except asyncio.CancelledError:
+            pass  # fim do benchmark
+
+    server = await asyncio.start_server(handle, "127.0.0.1", 0)
+    return server, server.sockets[0].getsockname()[1]
+
+
+def start_fake_redis() -> int:
+    from fakeredis import TcpFakeServer
+
+    server = TcpFakeServer(("127.0.0.1", 0), server_type="redis")
+    server.daemon_threads = True  # conexões abertas não seguram o fim do processo
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server.server_address[1]
+
+
+# --- Versões antigas (como estavam em index.py) ---
+async def legacy_get_or_create(client, session_id, create_thread):
+    thread_id = await client.get(session_id)
+    if thread_id:
+        return thread_id, False
+    thread_id = create_thread()
+    await client.set(session_id, thread_id, ex=86400)
+    return thread_id, True
+
+
+async def legacy_get_and_delete(client, session_id):
+    thread_id = await client.get(session_id)
+    if thread_id:
+        await client.delete(session_id)
+    return thread_id
+
+
+async def lua_get_or_create(client, session_id, create_thread):
+    thread_id, _ = await session_store.get_or_create(client, session_id)
+    if thread_id:
+        return thread_id, False
+    return await session_store.get_or_create(client, session_id, create_thread())
+
+
+async def timed(coro_factory, ops):
+    samples = []
+    for i in range(ops):
+        t0 = time.perf_counter()
+        await coro_factory(i)
+        samples.append((time.perf_counter() - t0) * 1000)
+    return statistics.median(samples), statistics.quantiles(samples, n=20)[-1]
+
+
+async def race(get_or_create, client, concurrency):
+    created = []
+
+    def create_thread():
+        thread_id = f"thread_{uuid.uuid4().hex[:8]}"
+        created.append(thread_id)
+        return thread_id
+
+    session_id = f"race:{uuid.uuid4().hex}"
+    results = await asyncio.gather(*[get_or_create(client, session_id, create_thread) for _ in range(concurrency)])
+    return len(created), len({thread_id for thread_id, _ in results})
+
+
+async def main_async(args):
+    if args.redis_url:
+        parsed = redis.Redis.from_url(args.redis_url).connection_pool.connection_kwargs
+        host, port = parsed.get("host", "127.0.0.1"), parsed.get("port", 6379)
+    else:
+        host, port = "127.0.0.1", start_fake_redis()
+    proxy, proxy_port = await start_latency_proxy(host, port, args.rtt_ms / 1000)
+    client = redis.Redis(host="127.0.0.1", port=proxy_port, decode_responses=True)
+    session_store.get_redis = lambda: client  # scripts registrados neste cliente
+    session_store._scripts.cache_clear()
+
+    def new_thread():
+        return f"thread_{uuid.uuid4().hex[:8]}"
+
+    existing = [f"bench:{i}" for i in range(args.ops)]
+    for key in existing:
+        await client.set(key, new_thread(), ex=3600)
+    await session_store.get_or_create(client, "bench:warmup")  # SCRIPT LOAD fora da medição
+
+    rows = []
+    rows.append(("get_or_create (sessão existente)",
+                 await timed(lambda i: legacy_get_or_create(client, existing[i], new_thread), args.ops),
+                 await timed(lambda i: lua_get_or_create(client, existing[i], new_thread), args.ops)))
+    rows.append(("get_or_create (primeiro contato)",
+                 await timed(lambda i: legacy_get_or_create(client, f"new:a:{i}", new_thread), args.ops),
+                 await timed(lambda i: lua_get_or_create(client, f"new:b:{i}", new_thread), args.ops)))
+    rows.append(("  com ids locais (completions)",
+                 await timed(lambda i: legacy_get_or_create(client, f"new:c:{i}", new_thread), args.ops),
+                 await timed(lambda i: session_store.get_or_create(client, f"new:d:{i}", new_thread()), args.ops)))
+    rows.append(("get_and_delete",
+                 await timed(lambda i: legacy_get_and_delete(client, f"new:a:{i}"), args.ops),
+                 await timed(lambda i: session_store.get_and_delete(client, f"new:b:{i}"), args.ops)))
+
+    print(f"RTT simulado {args.rtt_ms:.0f}ms, {args.ops} operações por caso "
+          f"({'Redis ' + args.redis_url if args.redis_url else 'fakeredis'})\n")
+    print(f"{'operação':<34} {'antigo p50/p95 ms':>18} {'Lua p50/p95 ms':>16}")
+    for name, (old_p50, old_p95), (new_p50, new_p95) in rows:
+        print(f"{name:<34} {old_p50:>8.1f} / {old_p95:<7.1f} {new_p50:>7.1f} / {new_p95:<7.1f}")
+
+    print(f"\nCorrida: {args.concurrency} requisições simultâneas no primeiro contato da mesma sessão")
+    for name, get_or_create in (("antigo", legacy_get_or_create), ("Lua", lua_get_or_create)):
+        threads_created, distinct = await race(get_or_create, client, args.concurrency)
+        print(f"  {name:<7} threads criados: {threads_created}, threads distintos devolvidos: {distinct}")
+
+    await client.aclose()
+    proxy.close()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--redis-url", default=None)
+    parser.add_argument("--rtt-ms", type=float, default=20.0)
+    parser.add_argument("--ops", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=5)
+    asyncio.run(main_async(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
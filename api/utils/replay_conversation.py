@@ -0,0 +1,145 @@
+"""
+Replay determinístico de uma conversa gravada (TRAFFIC_RECORD_PATH).
+
+Reexecuta os turnos de chat de uma sessão pelo `OpenAIService` real (tools,
+PipefyService e CalendarService incluídos), mas com as respostas HTTP de
+OpenAI, Pipefy e Cal.com servidas da gravação, com a latência original
+multiplicada por `--latency-scale` (0 = só custo de CPU do backend). O
+"agora" do CalendarService é congelado no instante da gravação, para que
+os mesmos horários sejam gerados.
+
+Serve para perfilar uma conversa real ponta a ponta e comparar mudanças de
+código sobre tráfego idêntico:
+
+    python api/utils/replay_conversation.py gravacao.jsonl
+    python api/utils/replay_conversation.py gravacao.jsonl --latency-scale 0 --profile replay.prof
+    py-spy record -o replay.svg -- python api/utils/replay_conversation.py gravacao.jsonl
+
+Redis é usado como na API (holds, uso de tokens); sem Redis configurado
+esses caminhos degradam sem falhar.
+"""
+
+import argparse
+import asyncio
+import cProfile
+import json
+import os
+import pstats
+import sys
+import time
+from collections import defaultdict
+from datetime import datetime
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+
+
+def load_recording(path: Path, session_id: str = None):
+    records = [json.loads(line) for line in path.read_text(encoding="utf-8").splitlines() if line.strip()]
+    chats = [r for r in records if r["kind"] == "chat"]
+    if not chats:
+        raise SystemExit(f"{path} não contém turnos de chat gravados")
+    session_id = session_id or chats[0]["session_id"]
+    turns = [r for r in chats if r["session_id"] == session_id]
+    http = defaultdict(list)
+    for record in records:
+        if record["kind"] == "http" and record["session_id"] == session_id:
+            http[record["service"]].append(record)
+    return session_id, turns, http
+
+
+def _recorded_assistant_id(openai_records):
+    for record in openai_records:
+        if record["method"] == "POST" and record["url"].endswith("/runs"):
+            try:
+                return json.loads(record["request_body"]).get("assistant_id")
+            except ValueError:
+                pass
+    return None
+
+
+def prepare_environment(http, latency_scale: float):
+    """Configura env/transports/relógio para o replay. Retorna os ReplayTransports por serviço."""
+    os.environ.pop("TRAFFIC_RECORD_PATH", None)
+    os.environ.setdefault("OPENAI_API_KEY", "replay")
+    os.environ.setdefault("OPENAI_ASSISTANT_ID", _recorded_assistant_id(http["openai"]) or "asst_replay")
+    os.environ.setdefault("PIPEFY_API_KEY", "replay")
+    os.environ.setdefault("PIPEFY_PIPE_ID", "0")
+    os.environ.setdefault("CAL_COM_API_KEY", "replay")
+    os.environ.setdefault("CAL_COM_USERNAME", "replay")
+    os.environ.setdefault("CAL_COM_EVENT_TYPE_ID", "1")
+
+    from api.services import calendar_service, traffic_recorder
+
+    replayers = {service: traffic_recorder.ReplayTransport(http[service], latency_scale)
+                 for service in ("openai", "pipefy", "calcom")}
+    traffic_recorder.install_transport_factory(lambda service, is_async: replayers[service])
+
+    # Congela o "agora" do CalendarService no início da gravação (avançando com o replay)
+    recorded_start = min((r["started_at"] for records in http.values() for r in records), default=time.time())
+    replay_start = time.time()
+
+    class ReplayDatetime(datetime):
+        @classmethod
+        def now(cls, tz=None):
+            return datetime.fromtimestamp(recorded_start + time.time() - replay_start, tz)
+
+    calendar_service.datetime = ReplayDatetime
+    return replayers
+
+
+async def replay(session_id, turns, latency_scale: float):
+    from api.services import OpenAIService
+
+    service = OpenAIService()
+    service.poll_interval = 1.0 * latency_scale
+    thread_id = await service.create_thread()
+    results = []
+    for i, turn in enumerate(turns, start=1):
+        t0 = time.perf_counter()
+        response = await service.get_assistant_response(thread_id, turn["message"], session_id=session_id)
+        elapsed_ms = (time.perf_counter() - t0) * 1000
+        results.append((i, turn, response, elapsed_ms))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay de uma conversa gravada com TRAFFIC_RECORD_PATH")
+    parser.add_argument("recording", type=Path)
+    parser.add_argument("--session", default=None, help="session_id a reproduzir (padrão: a primeira gravada)")
+    parser.add_argument("--latency-scale", type=float, default=1.0, help="Fator sobre a latência gravada (0 = sem espera)")
+    parser.add_argument("--profile", type=Path, default=None, help="Grava o perfil cProfile neste arquivo")
+    parser.add_argument("--top", type=int, default=25, help="Funções exibidas no resumo do perfil")
+    args = parser.parse_args()
+
+    session_id, turns, http = load_recording(args.recording, args.session)
+    replayers = prepare_environment(http, args.latency_scale)
+    print(f"Sessão {session_id}: {len(turns)} turnos, "
+          + ", ".join(f"{service}={len(records)} req" for service, records in http.items()))
+
+    profiler = cProfile.Profile() if args.profile else None
+    started = time.perf_counter()
+    if profiler:
+        profiler.enable()
+    results = asyncio.run(replay(session_id, turns, args.latency_scale))
+    if profiler:
+        profiler.disable()
+    total_ms = (time.perf_counter() - started) * 1000
+
+    print(f"\n{'turno':>5} {'gravado':>10} {'replay':>10}  resposta")
+    for i, turn, response, elapsed_ms in results:
+        same = "igual" if response == turn["response"] else "DIFERENTE"
+        print(f"{i:>5} {turn['elapsed_ms']:>8.0f}ms {elapsed_ms:>8.0f}ms  {same}")
+    recorded_total = sum(turn["elapsed_ms"] for turn in turns)
+    print(f"\ntotal: gravado {recorded_total:.0f}ms, replay {total_ms:.0f}ms (latency-scale {args.latency_scale})")
+    for service, replayer in replayers.items():
+        print(f"{service}: {replayer.stats}")
+
+    if profiler:
+        profiler.dump_stats(args.profile)
+        print(f"\nPerfil salvo em {args.profile}")
+        pstats.Stats(profiler).sort_stats("cumulative").print_stats(args.top)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""
+Testes do controle de admissão (services/admission.py): buckets de rate
+limit e vagas do semáforo global.
+
+Uso (a partir da raiz do repositório):
+    python -m pytest api/utils/test_admission.py
+"""
+
+import asyncio
+import sys
+from pathlib import Path
+
+import pytest
+
+REPO_ROOT = Path(__file__).resolve().parents[2]
+sys.path.insert(0, str(REPO_ROOT))
+
+from api.services.admission import AdmissionController, AdmissionRejected  # noqa: E402
+
+
+def _controller(**overrides) -> AdmissionController:
+    options = dict(max_in_flight=1, max_queue=5, queue_timeout=0.05, rate_per_minute=60, burst=1)
+    options.update(overrides)
+    return AdmissionController(**options)
+
+
+def test_session_rejection_does_not_charge_ip_bucket():
+    async def scenario():
+        controller = _controller(burst=2)
+        async with controller.admit("1.1.1.1", "s1"):
+            pass
+        controller._bucket("session:s1").tokens = 0  # a sessão estourou o limite
+        with pytest.raises(AdmissionRejected) as rejected:
+            async with controller.admit("1.1.1.1", "s1"):
+                pass
+        assert rejected.value.status_code == 429
+        # O IP ainda tem o token que a recusa pela sessão não pode ter gasto
+        assert controller._bucket("ip:1.1.1.1").tokens >= 1
+        async with controller.admit("1.1.1.1", "s2"):
+            pass
+
+    asyncio.run(scenario())
+
+
+def test_queue_timeout_and_cancel_keep_permits():
+    async def scenario():
+        controller = _controller()
+        release = asyncio.Event()
+
+        async def holder():
+            async with controller.admit(None, None):
+                await release.wait()
+
+        holding = asyncio.create_task(holder())
+        await asyncio.sleep(0)
+        with pytest.raises(AdmissionRejected) as rejected:
+            async with controller.admit(None, None):
+                pass
+        assert rejected.value.status_code == 503
+
+        async def waiter():
+            async with controller.admit(None, None):
+                pass
+
+        waiting = asyncio.create_task(waiter())
+        await asyncio.sleep(0)
+        waiting.cancel()
+        release.set()
+        await holding
+        with pytest.raises(asyncio.CancelledError):
+            await waiting
+
+        assert controller.waiting == 0 and controller.in_flight == 0
+        assert controller.semaphore._value == controller.max_in_flight
+
+    asyncio.run(scenario())
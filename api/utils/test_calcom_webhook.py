@@ -0,0 +1,124 @@
+"""
+Testes do webhook de booking do Cal.com (services/calcom_webhook.py) com um
+Redis em memória (fakeredis): a atualização do lead vai para o pipe da
+empresa do webhook e a invalidação dos prefetches alcança outros workers.
+
+Uso (a partir da raiz do repositório):
+    python -m pytest api/utils/test_calcom_webhook.py
+"""
+
+import asyncio
+import json
+import sys
+from pathlib import Path
+from types import SimpleNamespace
+
+import pytest
+
+fakeredis = pytest.importorskip("fakeredis")
+
+REPO_ROOT = Path(__file__).resolve().parents[2]
+sys.path.insert(0, str(REPO_ROOT))
+
+from api.services import calcom_webhook, lead_update_queue, redis_service, slot_store, tenants  # noqa: E402
+
+APP_ENV = {
+    "OPENAI_API_KEY": "test", "OPENAI_ASSISTANT_ID": "asst_test",
+    "UPSTASH_REDIS_URL": "redis://fake:6379",
+    "PIPEFY_API_KEY": "test", "PIPEFY_PIPE_ID": "1",
+    "CAL_COM_API_KEY": "test", "CAL_COM_USERNAME": "vendas", "CAL_COM_EVENT_TYPE_ID": "1",
+    "SLOT_HOLDS_ENABLED": "false",
+}
+
+BOOKING = {"triggerEvent": "BOOKING_CREATED",
+           "payload": {"eventTypeId": 1, "startTime": "2026-10-27T17:00:00Z", "uid": "abc",
+                       "attendees": [{"email": "Lead@X.com"}]}}
+
+
+class FakePipefyService:
+    def __init__(self):
+        self.updates = []
+
+    async def update_lead_meeting(self, email, meeting_datetime, meeting_link):
+        self.updates.append((email, meeting_datetime, meeting_link))
+        return {"success": True}
+
+
+@pytest.fixture
+def acme(monkeypatch):
+    from api.config import get_settings
+
+    for name, value in APP_ENV.items():
+        monkeypatch.setenv(name, value)
+    get_settings.cache_clear()
+    server = fakeredis.FakeServer()
+    monkeypatch.setattr(redis_service.redis, "from_url",
+                        lambda url, **kwargs: fakeredis.FakeAsyncRedis(server=server, **kwargs))
+    redis_service.get_redis.cache_clear()
+
+    config = tenants.TenantConfig.from_payload("acme", {"settings": {"pipefy_pipe_id": "999"}})
+    runtime = tenants.TenantRuntime(config, config.build_settings(get_settings()))
+    runtime._services["pipefy"] = FakePipefyService()
+
+    async def resolve_runtime(tenant_id):
+        return runtime if tenant_id == "acme" else None
+
+    monkeypatch.setattr(tenants, "get_tenant_registry", lambda: SimpleNamespace(runtime=resolve_runtime))
+    yield runtime
+    redis_service.get_redis.cache_clear()
+    get_settings.cache_clear()
+
+
+def test_tenant_booking_updates_tenant_pipe(acme):
+    async def scenario():
+        async with tenants.scope("acme"):
+            result = await calcom_webhook.handle_booking_event(BOOKING)
+        assert result["pipefy_update_queued"]
+        queued = json.loads((await redis_service.get_redis().lrange(lead_update_queue.LEAD_UPDATES_KEY, 0, -1))[0])
+        assert queued["tenant_id"] == "acme"
+
+        env_service = FakePipefyService()
+        summary = await lead_update_queue.drain_lead_updates(env_service)
+        assert summary == {"applied": 1, "requeued": 0, "dropped": 0}
+        assert acme.pipefy_service.updates == [("lead@x.com", "2026-10-27T17:00:00Z", "https://cal.com/booking/abc")]
+        assert env_service.updates == []
+
+    asyncio.run(scenario())
+
+
+def test_unknown_tenant_update_is_requeued(acme):
+    async def scenario():
+        item = {"email": "lead@x.com", "meeting_datetime": None, "meeting_link": None, "reason": "",
+                "attempts": 0, "tenant_id": "removida"}
+        await redis_service.get_redis().rpush(lead_update_queue.LEAD_UPDATES_KEY, json.dumps(item))
+        summary = await lead_update_queue.drain_lead_updates(FakePipefyService(), limit=1)
+        assert summary == {"applied": 0, "requeued": 1, "dropped": 0}
+
+    asyncio.run(scenario())
+
+
+def test_booking_invalidates_prefetches_of_other_workers(acme, monkeypatch):
+    class FakeCalendar:
+        async def get_available_slots(self, days, max_slots):
+            return {"success": True, "slots_utc": [], "slots_display": []}
+
+    monkeypatch.setattr(tenants, "calendar_service", lambda: FakeCalendar())
+
+    async def scenario():
+        async with tenants.scope("acme"):
+            assert slot_store.start_slot_prefetch("t1")
+            await asyncio.sleep(0.01)
+            assert (await slot_store.take_prefetched_slots("t1", 7))["success"]
+
+            assert slot_store.start_slot_prefetch("t1")
+            await asyncio.sleep(0.01)
+            # Outro worker recebeu o webhook: só a versão no Redis muda, não a memória deste
+            await slot_store.bump_availability_version()
+            before = slot_store.prefetch_stats["invalidated"]
+            assert await slot_store.take_prefetched_slots("t1", 7) is None
+            assert slot_store.prefetch_stats["invalidated"] == before + 1
+
+        # A versão é por empresa: a do ambiente não mudou
+        assert await redis_service.get_redis().get(f"{slot_store.AVAILABILITY_VERSION_KEY_PREFIX}default") is None
+
+    asyncio.run(scenario())
@@ -0,0 +1,105 @@
+"""
+Testes do modo multi-host do CalendarService (services/calendar_service.py):
+merge dos horários dos hosts, escolha do host por horário e o booking feito
+com o event type do host escolhido. O Cal.com é simulado com httpx.MockTransport.
+
+Uso (a partir da raiz do repositório):
+    python -m pytest api/utils/test_calendar_service.py
+"""
+
+import asyncio
+import json
+import sys
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+import httpx
+import pytest
+
+REPO_ROOT = Path(__file__).resolve().parents[2]
+sys.path.insert(0, str(REPO_ROOT))
+
+APP_ENV = {
+    "OPENAI_API_KEY": "test", "OPENAI_ASSISTANT_ID": "asst_test",
+    "UPSTASH_REDIS_URL": "redis://fake:6379",
+    "CAL_COM_API_KEY": "test", "CAL_COM_USERNAME": "vendas", "CAL_COM_EVENT_TYPE_ID": "1",
+    "CAL_COM_HOSTS": "ana:11,bia:22", "CAL_COM_EVENT_DURATION_MINUTES": "30",
+}
+
+# Amanhã, 12:00 UTC: base dos horários simulados
+BASE = (datetime.now(timezone.utc) + timedelta(days=1)).replace(hour=12, minute=0, second=0, microsecond=0)
+
+
+def _at(minutes: int) -> str:
+    return (BASE + timedelta(minutes=minutes)).isoformat()
+
+
+# ana: 12:00-13:00 (2 slots); bia: 12:30-13:30 (2 slots) e um compromisso já marcado fora da janela
+AVAILABILITY = {
+    "ana": {"dateRanges": [{"start": _at(0), "end": _at(60)}], "busy": []},
+    "bia": {"dateRanges": [{"start": _at(30), "end": _at(90)}],
+            "busy": [{"start": _at(-600), "end": _at(-570)}]},
+}
+
+
+@pytest.fixture
+def settings(monkeypatch):
+    from api.config import get_settings
+
+    for name, value in APP_ENV.items():
+        monkeypatch.setenv(name, value)
+    get_settings.cache_clear()
+    yield
+    get_settings.cache_clear()
+
+
+def _service(monkeypatch, host_selection: str, bookings: list):
+    from api.services import calendar_service
+
+    monkeypatch.setenv("CAL_COM_HOST_SELECTION", host_selection)
+    from api.config import get_settings
+    get_settings.cache_clear()
+    monkeypatch.setattr(calendar_service, "_round_robin_counter", iter(range(100)))
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        if request.url.path.endswith("/availability"):
+            return httpx.Response(200, json=AVAILABILITY[request.url.params["username"]])
+        bookings.append(json.loads(request.content))
+        return httpx.Response(200, json={"id": 7, "uid": "abc", "startTime": bookings[-1]["start"]})
+
+    return calendar_service.CalendarService(client=httpx.AsyncClient(transport=httpx.MockTransport(handler)))
+
+
+def test_merge_and_round_robin(settings, monkeypatch):
+    service = _service(monkeypatch, "round_robin", [])
+    result = asyncio.run(service.get_available_slots(max_slots=5))
+    slots = [(slot["start_time"], slot["username"], slot["event_type_id"]) for slot in result["slots_utc"]]
+    # Merge em ordem cronológica, um host por horário; 12:30 (os dois livres) alterna
+    assert slots == [(_at(0), "ana", 11), (_at(30), "bia", 22), (_at(60), "bia", 22)]
+
+
+def test_lowest_load_prefers_less_busy_host(settings, monkeypatch):
+    service = _service(monkeypatch, "lowest_load", [])
+    result = asyncio.run(service.get_available_slots(max_slots=5))
+    # Às 12:30 a ana já recebeu o slot das 12:00 e a bia tem 1 compromisso: empate -> ordem dos hosts
+    assert [slot["username"] for slot in result["slots_utc"]] == ["ana", "ana", "bia"]
+
+
+def test_booking_uses_event_type_of_chosen_host(settings, monkeypatch):
+    bookings = []
+    service = _service(monkeypatch, "round_robin", bookings)
+    slot = asyncio.run(service.get_available_slots(max_slots=5))["slots_utc"][1]
+    result = asyncio.run(service.schedule_meeting_from_assistant(
+        slot["start_time"], slot["end_time"], "lead@x.com", "Lead", event_type_id=slot["event_type_id"]))
+    assert result["success"]
+    assert bookings[0]["eventTypeId"] == 22 and bookings[0]["start"] == _at(30)
+
+
+def test_hosts_must_have_distinct_event_types():
+    from api.services.calendar_service import parse_hosts
+
+    assert parse_hosts("ana", 1) == [("ana", 1)]
+    with pytest.raises(ValueError):
+        parse_hosts("ana:11,bia", 1)
+    with pytest.raises(ValueError):
+        parse_hosts("ana:11,bia:11", 1)
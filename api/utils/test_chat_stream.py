@@ -0,0 +1,93 @@
+"""
+Testes dos eventos de turno do WebSocket (services/chat_stream.py) com o
+motor de Assistants (OpenAIService) e um cliente OpenAI falso: as
+ferramentas do run geram eventos de progresso antes da resposta final.
+
+Uso (a partir da raiz do repositório):
+    python -m pytest api/utils/test_chat_stream.py
+"""
+
+import asyncio
+import json
+import sys
+from pathlib import Path
+from types import SimpleNamespace
+
+import pytest
+
+REPO_ROOT = Path(__file__).resolve().parents[2]
+sys.path.insert(0, str(REPO_ROOT))
+
+APP_ENV = {"OPENAI_API_KEY": "test", "OPENAI_ASSISTANT_ID": "asst_test", "UPSTASH_REDIS_URL": "redis://fake:6379"}
+
+
+def _tool_call(call_id: str, name: str, arguments: dict):
+    return SimpleNamespace(id=call_id, function=SimpleNamespace(name=name, arguments=json.dumps(arguments)))
+
+
+@pytest.fixture
+def service(monkeypatch):
+    from api.config import get_settings
+    from api.services import openai_service
+    from api.services.openai_service import OpenAIService
+
+    for name, value in APP_ENV.items():
+        monkeypatch.setenv(name, value)
+    get_settings.cache_clear()
+
+    async def noop(*args, **kwargs):
+        return None
+
+    async def submit_tool_outputs(thread_id, run_id, tool_outputs):
+        return SimpleNamespace(id=run_id, status="in_progress")
+
+    async def list_messages(thread_id, order, limit):
+        content = [SimpleNamespace(text=SimpleNamespace(value="Tenho estes horários."))]
+        return SimpleNamespace(data=[SimpleNamespace(role="assistant", content=content)])
+
+    threads = SimpleNamespace(messages=SimpleNamespace(create=noop, list=list_messages),
+                              runs=SimpleNamespace(submit_tool_outputs=submit_tool_outputs))
+    api = SimpleNamespace(beta=SimpleNamespace(threads=threads))
+    monkeypatch.setattr(OpenAIService, "_api", property(lambda self: api))
+    service = OpenAIService()
+
+    async def get_state(usage_key):
+        return {}
+
+    async def create_run(thread_id, run_options, route):
+        return SimpleNamespace(id="run_1", status="queued"), 0.0
+
+    polls = iter([
+        SimpleNamespace(id="run_1", status="requires_action", required_action=SimpleNamespace(
+            submit_tool_outputs=SimpleNamespace(tool_calls=[_tool_call("call_1", "oferecerHorarios", {})]))),
+        SimpleNamespace(id="run_1", status="completed", usage=None),
+    ])
+
+    async def wait_for_run_completion(thread_id, run_id):
+        return next(polls)
+
+    async def run_tool(name, arguments, ctx):
+        await asyncio.sleep(0.01)
+        return {"success": True, "horarios_disponiveis": []}
+
+    monkeypatch.setattr(service.usage_tracker, "get_state", get_state)
+    monkeypatch.setattr(service.usage_tracker, "record_run", noop)
+    monkeypatch.setattr(service, "_create_run", create_run)
+    monkeypatch.setattr(service, "_wait_for_run_completion", wait_for_run_completion)
+    monkeypatch.setattr(openai_service, "run_tool", run_tool)
+    yield service
+    get_settings.cache_clear()
+
+
+def test_assistants_engine_emits_tool_progress(service):
+    from api.services.chat_stream import engine_events
+
+    async def collect():
+        return [event async for event in engine_events(service, "thread_1", "Quero agendar", False, "s1")]
+
+    events = asyncio.run(collect())
+    assert events == [
+        {"type": "tool", "name": "oferecerHorarios", "status": "start", "label": "Consultando a agenda..."},
+        {"type": "tool", "name": "oferecerHorarios", "status": "done", "label": "Consultando a agenda..."},
+        {"type": "done", "response": "Tenho estes horários."},
+    ]
@@ -0,0 +1,48 @@
+"""
+Testes da importação em lote de leads (api/import_leads.py) com um
+PipefyService falso: linhas JSONL malformadas são rejeitadas sem abortar.
+
+Uso (a partir da raiz do repositório):
+    python -m pytest api/utils/test_import_leads.py
+"""
+
+import asyncio
+import json
+import sys
+from pathlib import Path
+
+REPO_ROOT = Path(__file__).resolve().parents[2]
+sys.path.insert(0, str(REPO_ROOT))
+
+from api.import_leads import import_leads  # noqa: E402
+
+
+class FakePipefyService:
+    def __init__(self):
+        self.upserted = []
+
+    async def find_cards_by_emails(self, emails):
+        list(emails)
+        return {"cards": {}}
+
+    async def upsert_leads_batch(self, leads, cards):
+        self.upserted.extend(lead.email for lead in leads)
+        return {"created": [lead.email for lead in leads], "updated": [], "failed": {}}
+
+
+def test_malformed_jsonl_lines_are_rejected(tmp_path, capsys):
+    source = tmp_path / "leads.jsonl"
+    source.write_text("\n".join([
+        json.dumps({"nome": "Ana", "email": "ana@x.com"}),
+        '{"nome": "Bruno", "email": ',
+        "[1, 2]",
+        json.dumps({"nome": "Carla", "email": "carla@x.com"}),
+    ]) + "\n", encoding="utf-8")
+    service = FakePipefyService()
+
+    stats = asyncio.run(import_leads(source, rate_per_second=1000, pipefy_service=service))
+
+    assert service.upserted == ["ana@x.com", "carla@x.com"]
+    assert stats["created"] == 2 and stats["invalid"] == 2
+    output = capsys.readouterr().out
+    assert "linha 2: JSON malformado" in output and "linha 3:" in output
@@ -0,0 +1,132 @@
+"""
+Teste de regressão do tempo de import (cold start) de `api.index`.
+
+Roda `python -X importtime -c "import api.index"` em um processo limpo,
+sem nenhuma variável de ambiente da aplicação, e verifica que:
+
+- o import não falha (nada de validar Redis/OpenAI no import);
+- módulos pesados (SDK da OpenAI, dateutil, serviços) não são
+  carregados no import, apenas no primeiro uso;
+- o tempo gasto pela própria aplicação fica dentro do orçamento.
+
+O orçamento cobre só o que é da aplicação: o tempo próprio dos módulos
+`api.*` mais o tempo cumulativo das dependências que eles importam
+diretamente, exceto o framework (FastAPI, Starlette, pydantic, redis...),
+cujo custo depende da máquina e não de mudanças neste repositório.
+
+Uso (a partir da raiz do repositório):
+    python -m pytest api/utils/test_import_time.py
+    python api/utils/test_import_time.py
+
+O orçamento pode ser ajustado com IMPORT_TIME_BUDGET_MS.
+"""
+
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+REPO_ROOT = Path(__file__).resolve().parents[2]
+
+# Orçamento padrão para o tempo de import da aplicação (sem o framework);
+# hoje ~80ms, quase todo no registro das rotas em api.index
+IMPORT_TIME_BUDGET_MS = float(os.getenv("IMPORT_TIME_BUDGET_MS", "150"))
+
+# Módulos que NÃO podem ser importados durante o import da API
+LAZY_MODULES = [
+    "openai",
+    "dateutil",
+    "dotenv",
+    "difflib",
+    "api.profiling",
+    "api.services.openai_service",
+    "api.services.pipefy_service",
+    "api.services.calendar_service",
+    "api.services.traffic_recorder",
+    "api.services.loop_monitor",
+    "api.services.health_monitor",
+    "api.services.tenants",
+]
+
+# Pacotes do framework: ficam fora do orçamento da aplicação
+FRAMEWORK_PACKAGES = (
+    "fastapi", "starlette", "pydantic", "pydantic_core", "redis", "anyio",
+    "typing_extensions", "annotated_types", "email_validator", "sniffio",
+)
+
+# Variáveis que não devem vazar do ambiente do desenvolvedor para o teste
+APP_ENV_PREFIXES = ("OPENAI_", "PIPEFY_", "CAL_COM_", "UPSTASH_", "REDIS_")
+
+
+def _is_app_module(name: str) -> bool:
+    return name == "api" or name.startswith("api.")
+
+
+def _is_framework_module(name: str) -> bool:
+    return name.split(".", 1)[0] in FRAMEWORK_PACKAGES
+
+
+def measure_import(module: str = "api.index"):
+    """Retorna (tempo da aplicação em ms, {módulo: custo atribuído à aplicação em us})."""
+    env = {k: v for k, v in os.environ.items() if not k.startswith(APP_ENV_PREFIXES)}
+    env.pop("PYTHONPATH", None)
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=REPO_ROOT,
+        env=env,
+        capture_output=True,
+        text=True,
+    )
+    if proc.returncode != 0:
+        raise AssertionError(f"Falha ao importar {module}:\n{proc.stderr[-2000:]}")
+
+    # A saída é uma árvore em pós-ordem: os filhos aparecem antes do pai, com
+    # dois espaços de indentação a mais. Guarda os filhos pendentes por nível.
+    pending = {}
+    costs = {}
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        self_us, cumulative_us, raw_name = line[len("import time:"):].split("|")
+        name = raw_name.strip()
+        depth = (len(raw_name) - len(raw_name.lstrip())) // 2
+        children = pending.pop(depth + 1, [])
+        if _is_app_module(name):
+            costs[name] = int(self_us) + sum(
+                int(child_cumulative) for child, child_cumulative in children
+                if not _is_app_module(child) and not _is_framework_module(child)
+            )
+            for child, child_cumulative in children:
+                if not _is_app_module(child) and not _is_framework_module(child):
+                    costs[child] = int(child_cumulative)
+        pending.setdefault(depth, []).append((name, cumulative_us))
+    app_us = sum(us for name, us in costs.items() if _is_app_module(name))
+    loaded = {name.strip() for line in proc.stderr.splitlines()
+              if line.startswith("import time:") and "[us]" not in line
+              for name in [line.rsplit("|", 1)[1]]}
+    return app_us / 1000.0, costs, loaded
+
+
+def test_heavy_modules_are_lazy():
+    _, _, loaded = measure_import()
+    eager = [name for name in LAZY_MODULES if name in loaded]
+    assert not eager, f"Módulos pesados importados no cold start: {eager}"
+
+
+def test_import_time_budget():
+    app_ms, costs, _ = measure_import()
+    slowest = sorted(costs.items(), key=lambda item: item[1], reverse=True)[:10]
+    assert app_ms <= IMPORT_TIME_BUDGET_MS, (
+        f"a aplicação levou {app_ms:.1f}ms no import de api.index (orçamento: {IMPORT_TIME_BUDGET_MS:.0f}ms). "
+        f"Mais lentos: {[(name, f'{us / 1000:.1f}ms') for name, us in slowest]}"
+    )
+
+
+if __name__ == "__main__":
+    app_ms, costs, loaded = measure_import()
+    print(f"import api.index (aplicação): {app_ms:.1f}ms (orçamento: {IMPORT_TIME_BUDGET_MS:.0f}ms)")
+    print("Top 15 (custo atribuído à aplicação):")
+    for name, us in sorted(costs.items(), key=lambda item: item[1], reverse=True)[:15]:
+        print(f"  {us / 1000:8.1f}ms  {name}")
+    eager = [name for name in LAZY_MODULES if name in loaded]
+    print(f"Módulos pesados carregados no import: {eager or 'nenhum'}")
@@ -0,0 +1,145 @@
+"""
+Teste de bloqueio do event loop: nenhum handler segura o loop por mais que
+alguns milissegundos.
+
+Roda a API (ASGI, sem servidor) com cada motor de chat contra dublês locais
+(OpenAI de bench_chat_engines.py, Pipefy e Cal.com via MockTransport, Redis
+em memória via fakeredis) e percorre uma conversa completa: saudação,
+`registrarLead`, `oferecerHorarios`, escolha do horário (atalho local),
+histórico e métricas. O `LoopLagMonitor` roda em modo debug durante a
+conversa e o teste falha se o loop atrasar mais que o orçamento, mostrando
+a pilha de quem bloqueou.
+
+A primeira conversa de cada motor fica fora da medição: imports tardios
+(SDK da OpenAI, dateutil, serviços) são um custo único do processo.
+
+Uso (a partir da raiz do repositório):
+    python -m pytest api/utils/test_loop_blocking.py
+
+O orçamento pode ser ajustado com LOOP_BLOCKING_BUDGET_MS.
+"""
+
+import asyncio
+import contextlib
+import io
+import json
+import os
+import sys
+import uuid
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+import httpx
+import pytest
+
+fakeredis = pytest.importorskip("fakeredis")
+
+REPO_ROOT = Path(__file__).resolve().parents[2]
+sys.path.insert(0, str(REPO_ROOT))
+
+# Orçamento por bloqueio: acomoda o processamento do SDK da OpenAI (montagem e parse dos
+# requests, alguns ms), mas não uma chamada síncrona de rede (dublês com 20ms+ por requisição)
+LOOP_BLOCKING_BUDGET_MS = float(os.getenv("LOOP_BLOCKING_BUDGET_MS", "20"))
+
+APP_ENV = {
+    "OPENAI_API_KEY": "test", "OPENAI_ASSISTANT_ID": "asst_test",
+    "UPSTASH_REDIS_URL": "redis://fake:6379",
+    "PIPEFY_API_KEY": "test", "PIPEFY_PIPE_ID": "1",
+    "CAL_COM_API_KEY": "test", "CAL_COM_USERNAME": "vendas", "CAL_COM_EVENT_TYPE_ID": "1",
+    "CHAT_RATE_PER_MINUTE": "1000", "CHAT_RATE_BURST": "1000",
+    "HEALTH_PROBE_INTERVAL_SECONDS": "0",
+}
+
+CONVERSATION = ["Olá", "Sou a Ana, ana@example.com, da ACME", "Quero agendar uma conversa", "a primeira"]
+
+
+def calcom_handler(request):
+    if request.url.path.endswith("/availability"):
+        day = (datetime.now(timezone.utc) + timedelta(days=1)).replace(hour=13, minute=0, second=0, microsecond=0)
+        return httpx.Response(200, json={"busy": [], "dateRanges": [
+            {"start": day.isoformat(), "end": (day + timedelta(hours=4)).isoformat()}]})
+    payload = json.loads(request.content)
+    return httpx.Response(200, json={"id": 1, "uid": "booking_test", "startTime": payload["start"],
+                                     "endTime": payload["end"], "videoCallUrl": "https://meet.google.com/test"})
+
+
+def pipefy_handler(request):
+    query = json.loads(request.content)["query"]
+    if "createCard" in query:
+        return httpx.Response(200, json={"data": {"createCard": {"card": {"id": "1", "title": "Ana"}}}})
+    return httpx.Response(200, json={"data": {"cards": {"edges": []}}})
+
+
+@pytest.fixture
+def app_env(monkeypatch):
+    from api.utils.bench_chat_engines import OpenAIStandIn
+
+    for name, value in APP_ENV.items():
+        monkeypatch.setenv(name, value)
+    stand_in = OpenAIStandIn(network_s=0.02, generation_s=0.03)
+    stand_in.tool_calls = {
+        CONVERSATION[1]: ("registrarLead", {"nome": "Ana", "email": "ana@example.com", "empresa": "ACME",
+                                            "interesse_confirmado": False}),
+        CONVERSATION[2]: ("oferecerHorarios", {}),
+    }
+    transports = {"openai": stand_in, "calcom": httpx.MockTransport(calcom_handler),
+                  "pipefy": httpx.MockTransport(pipefy_handler)}
+
+    from api import index
+    from api.config import get_settings
+    from api.services import redis_service, session_store, slot_hold_service, traffic_recorder
+
+    monkeypatch.setattr(redis_service.redis, "from_url", lambda url, **kwargs: fakeredis.FakeAsyncRedis(**kwargs))
+    traffic_recorder.install_transport_factory(lambda service, is_async: transports[service])
+    caches = (get_settings, redis_service.get_redis, session_store._scripts, slot_hold_service._scripts,
+              index.get_openai_service, index.get_chat_admission, index.get_pipefy_service)
+    for cached in caches:
+        cached.cache_clear()
+    yield index
+    traffic_recorder.install_transport_factory(None)
+    for cached in caches:
+        cached.cache_clear()
+
+
+async def converse(client, engine: str):
+    session_id = f"{engine}-{uuid.uuid4().hex[:8]}"
+    for message in CONVERSATION:
+        response = await client.post("/api/chat", json={"session_id": session_id, "message": message})
+        assert response.status_code == 200, response.text
+    assert "meet.google.com" in response.json()["response"]  # escolha resolvida e agendada
+    for path in (f"/api/history/{session_id}", "/api/metrics"):
+        response = await client.get(path)
+        assert response.status_code == 200, response.text
+
+
+async def measure(index, engine: str):
+    from api.services.loop_monitor import LoopLagMonitor
+
+    service = index.get_openai_service()
+    service.poll_interval = 0.005
+    transport = httpx.ASGITransport(app=index.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        await converse(client, engine)  # aquecimento (imports tardios, SCRIPT LOAD)
+        monitor = LoopLagMonitor(interval=0.05, slow_callback_ms=LOOP_BLOCKING_BUDGET_MS)
+        task = asyncio.create_task(monitor.run())
+        await asyncio.sleep(0.01)
+        try:
+            await converse(client, engine)
+        finally:
+            task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await task
+    return monitor
+
+
+@pytest.mark.parametrize("engine", ["assistants", "completions"])
+def test_handlers_do_not_block_the_loop(app_env, monkeypatch, engine):
+    monkeypatch.setenv("CHAT_ENGINE", engine)
+    with contextlib.redirect_stdout(io.StringIO()):  # os serviços fazem log com print
+        monitor = asyncio.run(measure(app_env, engine))
+    assert monitor.samples > 0
+    stall = monitor.last_stall or {}
+    assert monitor.stalls == 0 and monitor.max_ms <= LOOP_BLOCKING_BUDGET_MS, (
+        f"event loop bloqueado por {monitor.max_ms:.1f}ms (orçamento: {LOOP_BLOCKING_BUDGET_MS:.0f}ms), "
+        f"{monitor.stalls} travamento(s). Pilha do loop:\n{stall.get('stack', '')}"
+    )
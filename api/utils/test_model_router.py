@@ -0,0 +1,76 @@
+"""
+Testes do escalonamento de modelo (services/model_router.py) no motor de
+threads/runs: um run roteado que falha só é refeito no modelo padrão se não
+executou ferramentas.
+
+Uso (a partir da raiz do repositório):
+    python -m pytest api/utils/test_model_router.py
+"""
+
+import asyncio
+import sys
+from pathlib import Path
+from types import SimpleNamespace
+
+import pytest
+
+REPO_ROOT = Path(__file__).resolve().parents[2]
+sys.path.insert(0, str(REPO_ROOT))
+
+APP_ENV = {"OPENAI_API_KEY": "test", "OPENAI_ASSISTANT_ID": "asst_test", "UPSTASH_REDIS_URL": "redis://fake:6379",
+           "MODEL_ROUTING_RULES": "greeting=gpt-4o-mini"}
+
+
+@pytest.fixture
+def service(monkeypatch):
+    from api.config import get_settings
+    from api.services.openai_service import OpenAIService
+
+    for name, value in APP_ENV.items():
+        monkeypatch.setenv(name, value)
+    get_settings.cache_clear()
+
+    async def noop(*args, **kwargs):
+        return None
+
+    # Cliente OpenAI só para gravar a mensagem do usuário no thread
+    api = SimpleNamespace(beta=SimpleNamespace(threads=SimpleNamespace(messages=SimpleNamespace(create=noop))))
+    monkeypatch.setattr(OpenAIService, "_api", property(lambda self: api))
+    service = OpenAIService()
+
+    async def get_state(usage_key):
+        return {}
+
+    monkeypatch.setattr(service.usage_tracker, "get_state", get_state)
+    monkeypatch.setattr(service.usage_tracker, "record_run", noop)
+    yield service
+    get_settings.cache_clear()
+
+
+def run_turn(service, tools_before_failure: bool):
+    created = []
+
+    async def create_run(thread_id, run_options, route):
+        created.append(route.model)
+        return SimpleNamespace(id=f"run_{len(created)}", status="queued"), 0.0
+
+    async def drive_run(thread_id, run_id, record):
+        record["used_tools"] = tools_before_failure
+        return SimpleNamespace(id=run_id, status="failed", last_error=None, usage=None)
+
+    service._create_run = create_run
+    service._drive_run = drive_run
+    response = asyncio.run(service.get_assistant_response("thread_1", "Olá", session_id="session_1"))
+    return created, response
+
+
+def test_failed_routed_run_without_tools_is_escalated(service):
+    created, _ = run_turn(service, tools_before_failure=False)
+    assert created == ["gpt-4o-mini", None]  # refeito no modelo padrão
+
+
+def test_failed_routed_run_with_tools_is_not_recreated(service):
+    created, response = run_turn(service, tools_before_failure=True)
+    assert created == ["gpt-4o-mini"]
+    assert "falhou" in response
+    assert service.model_router.stats()["models"]["gpt-4o-mini"]["escalations_skipped"] == 1
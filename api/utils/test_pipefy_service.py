@@ -0,0 +1,102 @@
+"""
+Testes do PipefyService com um transport httpx falso: a atualização de um
+card, o lote e a criação escrevem os mesmos campos para o mesmo Lead.
+
+Uso (a partir da raiz do repositório):
+    python -m pytest api/utils/test_pipefy_service.py
+"""
+
+import asyncio
+import json
+import re
+import sys
+from datetime import datetime, timezone
+from pathlib import Path
+
+import httpx
+import pytest
+
+REPO_ROOT = Path(__file__).resolve().parents[2]
+sys.path.insert(0, str(REPO_ROOT))
+
+from api.models import Lead  # noqa: E402
+
+APP_ENV = {
+    "OPENAI_API_KEY": "test", "OPENAI_ASSISTANT_ID": "asst_test",
+    "UPSTASH_REDIS_URL": "redis://fake:6379",
+    "PIPEFY_API_KEY": "test", "PIPEFY_PIPE_ID": "1",
+}
+
+LEAD = Lead(name='Ana "A"', email="ana@x.com", company="ACME", need="CRM", interest_confirmed=True,
+            meeting_link="https://cal.com/booking/abc", meeting_datetime=datetime(2026, 10, 27, 17, tzinfo=timezone.utc))
+
+_STRING = r'("(?:[^"\\]|\\.)*")'
+
+
+@pytest.fixture
+def service(monkeypatch):
+    from api.config import get_settings
+    from api.services.pipefy_service import PipefyService
+
+    for name, value in APP_ENV.items():
+        monkeypatch.setenv(name, value)
+    get_settings.cache_clear()
+    queries = []
+
+    def handler(request):
+        query = json.loads(request.content)["query"]
+        queries.append(query)
+        if "createCard" in query:
+            return httpx.Response(200, json={"data": {"m0": {"card": {"id": "c2"}},
+                                                      "createCard": {"card": {"id": "c2", "title": "t"}}}})
+        if "updateFieldsValues" in query:
+            return httpx.Response(200, json={"data": {"m0": {"success": True}}})
+        return httpx.Response(200, json={"data": {"updateCardField": {"success": True}}})
+
+    yield PipefyService(client=httpx.AsyncClient(transport=httpx.MockTransport(handler))), queries
+    get_settings.cache_clear()
+
+
+def _fields(queries, pattern):
+    return {field_id: json.loads(value) for query in queries for field_id, value in re.findall(pattern, query)}
+
+
+def test_single_and_batch_writes_share_the_field_mapping(service):
+    pipefy, queries = service
+
+    async def scenario():
+        assert (await pipefy._update_card_fields("c1", LEAD))["success"]
+        single = _fields(queries, rf'field_id: "(\w+)",\s*new_value: {_STRING}')
+
+        queries.clear()
+        assert (await pipefy.upsert_leads_batch([LEAD], {LEAD.email: "c1"}))["updated"] == [LEAD.email]
+        batch_update = _fields(queries, rf'fieldId: "(\w+)", value: {_STRING}')
+
+        queries.clear()
+        assert (await pipefy.upsert_leads_batch([LEAD], {}))["created"] == [LEAD.email]
+        batch_create = _fields(queries, rf'field_id: "(\w+)", field_value: {_STRING}')
+
+        queries.clear()
+        await pipefy._create_card(LEAD)
+        single_create = _fields(queries, rf'field_id: "(\w+)", field_value: {_STRING}')
+
+        assert single == batch_update == batch_create == single_create == pipefy._lead_field_values(LEAD)
+        assert single[pipefy.field_id_interest] == "Confirmado"
+        assert single[pipefy.field_id_meeting_time] == "2026-10-27T17:00:00+00:00"
+
+    asyncio.run(scenario())
+
+
+def test_create_card_fills_blank_fields(service):
+    pipefy, queries = service
+    lead = Lead(name="", email="bia@x.com", company=None, need=None)
+
+    async def scenario():
+        await pipefy._create_card(lead)
+        fields = _fields(queries, rf'field_id: "(\w+)", field_value: {_STRING}')
+        assert fields[pipefy.field_id_name] == "Lead (Nome Pendente)"
+        assert fields[pipefy.field_id_company] == "Empresa não informada"
+        assert fields[pipefy.field_id_need] == "Interesse em nossos serviços"
+        assert pipefy.field_id_meeting_link not in fields
+
+    asyncio.run(scenario())
@@ -0,0 +1,131 @@
+"""
+Testes da drenagem e retomada de runs (services/run_recovery.py) com um
+Redis em memória (fakeredis) e um serviço de chat falso: o run entregue no
+shutdown é retomado por outro worker, e uma retomada que falha volta à fila.
+
+Uso (a partir da raiz do repositório):
+    python -m pytest api/utils/test_run_recovery.py
+"""
+
+import asyncio
+import json
+import sys
+from pathlib import Path
+
+import pytest
+
+fakeredis = pytest.importorskip("fakeredis")
+
+REPO_ROOT = Path(__file__).resolve().parents[2]
+sys.path.insert(0, str(REPO_ROOT))
+
+from api.services import run_recovery  # noqa: E402
+
+
+class FakeChatService:
+    """Motor com `resume_run`: falha nas primeiras `failures` retomadas."""
+
+    def __init__(self, failures: int = 0):
+        self.failures = failures
+        self.resumed = []
+
+    async def resume_run(self, checkpoint):
+        if self.failures:
+            self.failures -= 1
+            checkpoint["tool_outputs"] = {"call_1": "{\"success\": true}"}  # progresso antes da falha
+            raise RuntimeError("OpenAI 503")
+        self.resumed.append(checkpoint)
+
+
+@pytest.fixture
+def redis_client(monkeypatch):
+    client = fakeredis.FakeAsyncRedis(decode_responses=True)
+    monkeypatch.setattr(run_recovery, "get_redis", lambda: client)
+    run_recovery._claim_script.cache_clear()
+    yield client
+    run_recovery._claim_script.cache_clear()
+
+
+async def _settle(recovery):
+    while recovery._resume_tasks:
+        await asyncio.sleep(0)
+
+
+def test_drain_handoff_checkpoint_and_resume(redis_client):
+    async def scenario():
+        leaving = run_recovery.RunRecovery(drain_seconds=0.05, handoff_seconds=1, poll_interval=0)
+
+        async def turn():
+            # Turno em polling: no ponto seguro após o prazo de drenagem, vira checkpoint
+            record = leaving.start("thread_1", "run_1", session_id="s1")
+            try:
+                while not leaving.handoff_due():
+                    await asyncio.sleep(0.01)
+                await leaving.checkpoint(record, "handoff")
+            finally:
+                leaving.finish(record)
+
+        turn_task = asyncio.create_task(turn())
+        await asyncio.sleep(0)
+        result = await leaving.begin_drain(lambda: 0)
+        await turn_task
+        assert result == {"clean": False, "left": 0}
+        assert leaving.counters["checkpointed"] == 1
+
+        service = FakeChatService()
+        other = run_recovery.RunRecovery(drain_seconds=1, handoff_seconds=1, poll_interval=0)
+        assert await other.resume_pending(lambda: service) == 1
+        await _settle(other)
+        assert [(c["thread_id"], c["run_id"], c["session_id"]) for c in service.resumed] == [
+            ("thread_1", "run_1", "s1")]
+        assert await redis_client.hlen(run_recovery.RECOVERY_KEY) == 0
+        assert other.counters["resumed"] == 1
+
+    asyncio.run(scenario())
+
+
+def test_failed_resume_is_requeued_then_resumed(redis_client):
+    async def scenario():
+        await redis_client.hset(run_recovery.RECOVERY_KEY, "thread_1:run_1",
+                                json.dumps({"thread_id": "thread_1", "run_id": "run_1", "tenant_id": None}))
+        service = FakeChatService(failures=1)
+        worker = run_recovery.RunRecovery(drain_seconds=1, handoff_seconds=1, poll_interval=0)
+
+        assert await worker.resume_pending(lambda: service) == 1
+        await _settle(worker)
+        requeued = json.loads(await redis_client.hget(run_recovery.RECOVERY_KEY, "thread_1:run_1"))
+        assert requeued["attempts"] == 1 and "OpenAI 503" in requeued["last_error"]
+        assert requeued["tool_outputs"] == {"call_1": "{\"success\": true}"}
+
+        assert await worker.resume_pending(lambda: service) == 1
+        await _settle(worker)
+        assert service.resumed[0]["tool_outputs"] == {"call_1": "{\"success\": true}"}
+        assert await redis_client.hlen(run_recovery.RECOVERY_KEY) == 0
+        assert worker.counters["requeued"] == 1 and worker.counters["resumed"] == 1
+
+    asyncio.run(scenario())
+
+
+def test_retry_waits_for_backoff_and_gives_up(redis_client):
+    async def scenario():
+        await redis_client.hset(run_recovery.RECOVERY_KEY, "thread_1:run_1",
+                                json.dumps({"thread_id": "thread_1", "run_id": "run_1", "tenant_id": None}))
+        service = FakeChatService(failures=5)
+        worker = run_recovery.RunRecovery(drain_seconds=1, handoff_seconds=1, poll_interval=60, max_attempts=2)
+
+        await worker.resume_pending(lambda: service)
+        await _settle(worker)
+        # Devolvido com retry_at no futuro: ainda não pode ser tomado
+        assert await worker.resume_pending(lambda: service) == 0
+
+        checkpoint = json.loads(await redis_client.hget(run_recovery.RECOVERY_KEY, "thread_1:run_1"))
+        checkpoint["retry_at"] = 0
+        await redis_client.hset(run_recovery.RECOVERY_KEY, "thread_1:run_1", json.dumps(checkpoint))
+        assert await worker.resume_pending(lambda: service) == 1
+        await _settle(worker)
+        # Segunda falha com max_attempts=2: sai da fila, mas fica guardado para inspeção
+        assert await redis_client.hlen(run_recovery.RECOVERY_KEY) == 0
+        failed = json.loads(await redis_client.hget(run_recovery.FAILED_KEY, "thread_1:run_1"))
+        assert failed["attempts"] == 2 and worker.counters["gave_up"] == 1
+
+    asyncio.run(scenario())
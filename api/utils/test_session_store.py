@@ -0,0 +1,69 @@
+"""
+Testes dos scripts Lua de sessão (services/session_store.py) num Redis em
+memória (fakeredis): criação/consulta com TTL e remoção da sessão junto com
+o estado derivado da conversa.
+
+Uso (a partir da raiz do repositório):
+    python -m pytest api/utils/test_session_store.py
+"""
+
+import asyncio
+import sys
+from pathlib import Path
+
+import pytest
+
+fakeredis = pytest.importorskip("fakeredis")
+
+REPO_ROOT = Path(__file__).resolve().parents[2]
+sys.path.insert(0, str(REPO_ROOT))
+
+from api.services import session_store  # noqa: E402
+from api.services.chat_stream import TURN_KEY_PREFIX  # noqa: E402
+from api.services.usage_service import USAGE_KEY_PREFIX  # noqa: E402
+
+
+@pytest.fixture
+def client(monkeypatch):
+    redis_client = fakeredis.FakeAsyncRedis(decode_responses=True)
+    monkeypatch.setattr(session_store, "get_redis", lambda: redis_client)
+    session_store._scripts.cache_clear()
+    yield redis_client
+    session_store._scripts.cache_clear()
+
+
+async def _with_derived_state(client, session_id):
+    await client.set(session_id, "thread_1")
+    await client.hset(f"{USAGE_KEY_PREFIX}{session_id}", "tokens", 10)
+    await client.rpush(f"{TURN_KEY_PREFIX}{session_id}", "evento")
+
+
+def test_get_or_create(client):
+    async def scenario():
+        # Só consulta: sem sessão e sem candidato, nada é criado
+        assert await session_store.get_or_create(client, "s1") == (None, False)
+        assert not await client.exists("s1")
+
+        assert await session_store.get_or_create(client, "s1", "thread_1", ttl_seconds=60) == ("thread_1", True)
+        assert await client.ttl("s1") == 60
+
+        # Já existe: devolve o thread atual, ignora o candidato e renova o TTL
+        await client.expire("s1", 5)
+        assert await session_store.get_or_create(client, "s1", "thread_2", ttl_seconds=60) == ("thread_1", False)
+        assert await client.ttl("s1") == 60
+        assert await session_store.get_or_create(client, "s1") == ("thread_1", False)
+
+    asyncio.run(scenario())
+
+
+@pytest.mark.parametrize("operation", [session_store.get_and_delete, session_store.reset])
+def test_delete_removes_session_and_derived_state(client, operation):
+    async def scenario():
+        await _with_derived_state(client, "s1")
+        await client.set("s2", "thread_2")
+        assert await operation(client, "s1") == "thread_1"
+        assert await client.exists("s1", f"{USAGE_KEY_PREFIX}s1", f"{TURN_KEY_PREFIX}s1") == 0
+        assert await client.get("s2") == "thread_2"
+        assert await operation(client, "s1") is None
+
+    asyncio.run(scenario())
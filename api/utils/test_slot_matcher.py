@@ -0,0 +1,104 @@
+"""
+Testes do atalho de escolha de horário (services/slot_matcher.py): como a
+resposta do lead é resolvida contra os horários oferecidos e quando o turno
+fica com o modelo.
+
+Uso (a partir da raiz do repositório):
+    python -m pytest api/utils/test_slot_matcher.py
+"""
+
+import asyncio
+import sys
+from pathlib import Path
+
+import pytest
+
+REPO_ROOT = Path(__file__).resolve().parents[2]
+sys.path.insert(0, str(REPO_ROOT))
+
+from api.services import slot_matcher, slot_store  # noqa: E402
+
+APP_ENV = {
+    "OPENAI_API_KEY": "test", "OPENAI_ASSISTANT_ID": "asst_test",
+    "UPSTASH_REDIS_URL": "redis://fake:6379",
+}
+
+# Segunda 26/10 10:00, terça 27/10 14:00 e quarta 28/10 10:30 (São Paulo), na ordem exibida
+OFFERED = {
+    "26 de Outubro às 10:00": {"start_time": "2026-10-26T13:00:00+00:00", "event_type_id": 1},
+    "27 de Outubro às 14:00": {"start_time": "2026-10-27T17:00:00+00:00", "event_type_id": 1},
+    "28 de Outubro às 10:30": {"start_time": "2026-10-28T13:30:00+00:00", "event_type_id": 1},
+}
+MONDAY, TUESDAY, WEDNESDAY = OFFERED
+
+
+@pytest.fixture
+def settings(monkeypatch):
+    from api.config import get_settings
+
+    for name, value in APP_ENV.items():
+        monkeypatch.setenv(name, value)
+    get_settings.cache_clear()
+    yield
+    slot_store.temp_slot_mapping.clear()
+    slot_store.lead_contacts.clear()
+    get_settings.cache_clear()
+
+
+@pytest.mark.parametrize("message, expected", [
+    ("2", (TUESDAY, "ordinal")),
+    ("Pode ser a segunda opção, por favor", (TUESDAY, "ordinal")),
+    ("a última", (WEDNESDAY, "ordinal")),
+    ("3º", (WEDNESDAY, "ordinal")),
+    # "a segunda" é sempre o ordinal (2º horário), nunca segunda-feira
+    ("a segunda", (TUESDAY, "ordinal")),
+    ("segunda-feira", (MONDAY, "datetime")),
+    ("dia 27 às 14h", (TUESDAY, "datetime")),
+    ("quarta-feira 10:30", (WEDNESDAY, "datetime")),
+    ("27outubro as 1400", (TUESDAY, "fuzzy")),
+])
+def test_match_slot_resolves_choice(message, expected):
+    assert slot_matcher.match_slot(message, OFFERED) == expected
+
+
+@pytest.mark.parametrize("message", [
+    "a segunda?",                  # pergunta
+    "nenhum desses",               # recusa
+    "tem outro horário",           # pede outro
+    "terça às 10:30",              # data/hora que não foi oferecida
+    "7",                           # posição fora da lista
+    "quero falar com um vendedor antes de decidir qualquer coisa sobre isso",  # longa demais
+])
+def test_match_slot_defers_to_model(message):
+    assert slot_matcher.match_slot(message, OFFERED) is None
+
+
+def test_plan_booking_requires_registered_lead(settings):
+    slot_store.temp_slot_mapping["t1"] = OFFERED
+    before = dict(slot_matcher.fast_path_stats)
+    assert slot_matcher.plan_booking("t1", "2") is None
+    assert slot_matcher.fast_path_stats["no_lead"] == before["no_lead"] + 1
+
+    slot_store.lead_contacts["t1"] = {"nome": "Ana", "email": "ana@x.com", "interesse_confirmado": False}
+    assert slot_matcher.plan_booking("t1", "2") == {
+        "data_inicio_display": TUESDAY, "email_lead": "ana@x.com", "nome_lead": "Ana",
+    }
+    assert slot_matcher.plan_booking("t2", "2") is None  # nada oferecido ao thread
+
+
+def test_update_lead_confirms_interest(settings, monkeypatch):
+    calls = []
+
+    async def fake_run_tool(name, arguments, ctx):
+        calls.append((name, arguments))
+        return {"success": True}
+
+    monkeypatch.setattr(slot_matcher, "run_tool", fake_run_tool)
+    # O registro do passo 3 guarda interesse_confirmado=False
+    slot_store.lead_contacts["t1"] = {"nome": "Ana", "email": "ana@x.com", "interesse_confirmado": False}
+    asyncio.run(slot_matcher._update_lead("t1", {"meeting_link": "https://cal.com/x",
+                                                 "start_time_utc": "2026-10-27T17:00:00Z"}))
+    name, arguments = calls[0]
+    assert name == "registrarLead"
+    assert arguments["interesse_confirmado"] is True
+    assert arguments["meeting_link"] == "https://cal.com/x" and arguments["email"] == "ana@x.com"
@@ -0,0 +1,92 @@
+"""
+Testes do estado de horários por thread (services/slot_store.py): os dados
+do lead guardados para o atalho de agendamento expiram e têm tamanho máximo.
+
+Uso (a partir da raiz do repositório):
+    python -m pytest api/utils/test_slot_store.py
+"""
+
+import sys
+from pathlib import Path
+
+import pytest
+
+REPO_ROOT = Path(__file__).resolve().parents[2]
+sys.path.insert(0, str(REPO_ROOT))
+
+APP_ENV = {
+    "OPENAI_API_KEY": "test", "OPENAI_ASSISTANT_ID": "asst_test",
+    "UPSTASH_REDIS_URL": "redis://fake:6379",
+    "LEAD_CONTACTS_TTL_SECONDS": "60", "LEAD_CONTACTS_MAX_ENTRIES": "2",
+}
+
+
+@pytest.fixture
+def store(monkeypatch):
+    from api.config import get_settings
+    from api.services import slot_store
+
+    for name, value in APP_ENV.items():
+        monkeypatch.setenv(name, value)
+    get_settings.cache_clear()
+    clock = [1000.0]
+    monkeypatch.setattr(slot_store.time, "monotonic", lambda: clock[0])
+    slot_store.lead_contacts.clear()
+    yield slot_store, clock
+    slot_store.lead_contacts.clear()
+    get_settings.cache_clear()
+
+
+def test_lead_contacts_expire(store):
+    slot_store, clock = store
+    slot_store.lead_contacts["t1"] = {"email": "a@x.com"}
+    clock[0] += 30
+    assert slot_store.lead_contacts.get("t1") == {"email": "a@x.com"}
+    clock[0] += 31
+    assert "t1" not in slot_store.lead_contacts
+    assert slot_store.lead_contacts.get("t1") is None
+    slot_store.purge_expired_prefetches()
+    assert len(slot_store.lead_contacts) == 0
+
+
+def test_lead_contacts_are_bounded(store):
+    slot_store, _ = store
+    for thread_id in ("t1", "t2", "t3"):
+        slot_store.lead_contacts[thread_id] = {"email": f"{thread_id}@x.com"}
+    assert list(slot_store.lead_contacts) == ["t2", "t3"]
+    # Regravar renova a entrada (LRU pela última gravação)
+    slot_store.lead_contacts["t2"] = {"email": "t2@x.com"}
+    slot_store.lead_contacts.setdefault("t4", {"email": "t4@x.com"})
+    assert list(slot_store.lead_contacts) == ["t2", "t4"]
+    slot_store.clear_thread("t2")
+    assert list(slot_store.lead_contacts) == ["t4"]
+
+
+def test_expired_lead_contacts_are_not_read(store):
+    slot_store, clock = store
+    slot_store.lead_contacts["t1"] = {"email": "a@x.com"}
+    slot_store.lead_contacts["t2"] = {"email": "b@x.com"}
+    clock[0] += 61
+    # Sem gravação nem purga, as entradas vencidas continuam guardadas
+    with pytest.raises(KeyError):
+        slot_store.lead_contacts["t1"]
+    assert list(slot_store.lead_contacts.items()) == []
+    assert list(slot_store.lead_contacts.values()) == []
+    assert list(slot_store.lead_contacts.keys()) == []
+    assert not slot_store.lead_contacts
+    assert slot_store.lead_contacts.pop("t1", None) is None
+    slot_store.lead_contacts["t3"] = {"email": "c@x.com"}
+    assert list(slot_store.lead_contacts.items()) == [("t3", {"email": "c@x.com"})]
+
+
+def test_lead_contacts_use_tenant_settings(store):
+    from api.config import get_settings, reset_settings, use_settings
+
+    slot_store, clock = store
+    token = use_settings(get_settings().model_copy(update={"lead_contacts_ttl_seconds": 10}))
+    try:
+        slot_store.lead_contacts["t1"] = {"email": "a@x.com"}
+        clock[0] += 11
+        assert slot_store.lead_contacts.get("t1") is None
+    finally:
+        reset_settings(token)
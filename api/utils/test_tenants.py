@@ -0,0 +1,62 @@
+"""
+Testes do multi-tenant (services/tenants.py): a config efetiva de cada
+empresa e as instâncias de serviço construídas com ela.
+
+Uso (a partir da raiz do repositório):
+    python -m pytest api/utils/test_tenants.py
+"""
+
+import sys
+from pathlib import Path
+
+import pytest
+
+REPO_ROOT = Path(__file__).resolve().parents[2]
+sys.path.insert(0, str(REPO_ROOT))
+
+APP_ENV = {
+    "OPENAI_API_KEY": "test", "OPENAI_ASSISTANT_ID": "asst_test",
+    "UPSTASH_REDIS_URL": "redis://fake:6379",
+    "PIPEFY_API_KEY": "test", "PIPEFY_PIPE_ID": "1",
+    "CAL_COM_API_KEY": "test", "CAL_COM_USERNAME": "vendas", "CAL_COM_EVENT_TYPE_ID": "1",
+    "PIPEFY_MIRROR_ENABLED": "true",
+}
+
+
+@pytest.fixture
+def settings(monkeypatch):
+    from api.config import get_settings
+
+    for name, value in APP_ENV.items():
+        monkeypatch.setenv(name, value)
+    get_settings.cache_clear()
+    yield get_settings()
+    get_settings.cache_clear()
+
+
+def test_tenant_pipefy_service_has_no_mirror(settings):
+    from api.config import reset_settings, use_settings
+    from api.services.pipefy_service import PipefyService
+    from api.services.tenants import TenantConfig, TenantRuntime
+
+    config = TenantConfig.from_payload("acme", {"settings": {"pipefy_pipe_id": "999"}})
+    runtime = TenantRuntime(config, config.build_settings(settings))
+    tenant_service = runtime.pipefy_service
+    assert tenant_service.pipe_id == "999"
+    # O espelho usa chaves globais no Redis: a empresa não pode ler nem escrever nele
+    assert runtime.settings.pipefy_mirror_enabled is False
+    assert tenant_service.mirror is None
+
+    token = use_settings(None)
+    try:
+        default_service = PipefyService()
+    finally:
+        reset_settings(token)
+    assert default_service.pipe_id == "1" and default_service.mirror is not None
+
+
+def test_mirror_settings_are_not_overridable(settings):
+    from api.services.tenants import TenantConfig
+
+    with pytest.raises(ValueError):
+        TenantConfig.from_payload("acme", {"settings": {"pipefy_mirror_enabled": True}})
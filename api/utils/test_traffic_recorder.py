@@ -0,0 +1,61 @@
+"""
+Testes da gravação de tráfego (services/traffic_recorder.py): a escrita
+no arquivo acontece fora da thread que grava (o event loop).
+
+Uso (a partir da raiz do repositório):
+    python -m pytest api/utils/test_traffic_recorder.py
+"""
+
+import json
+import sys
+import threading
+from pathlib import Path
+
+REPO_ROOT = Path(__file__).resolve().parents[2]
+sys.path.insert(0, str(REPO_ROOT))
+
+from api.services import traffic_recorder  # noqa: E402
+
+
+def test_writes_happen_on_writer_thread(tmp_path):
+    recorder = traffic_recorder.TrafficRecorder(str(tmp_path / "traffic.jsonl"))
+    real_file = recorder._file
+    writer_threads = set()
+
+    class SpyFile:
+        closed = False
+
+        def writelines(self, lines):
+            writer_threads.add(threading.current_thread().name)
+            real_file.writelines(lines)
+
+        def flush(self):
+            real_file.flush()
+
+        def close(self):
+            real_file.close()
+
+    recorder._file = SpyFile()
+    try:
+        for i in range(3):
+            token = traffic_recorder.current_session.set(f"s{i}")
+            recorder.write({"kind": "chat", "message": f"m{i}"})
+            traffic_recorder.current_session.reset(token)
+        assert recorder.flush(timeout=5)
+    finally:
+        recorder.close()
+
+    assert writer_threads == {"traffic-writer"}
+    records = [json.loads(line) for line in (tmp_path / "traffic.jsonl").read_text().splitlines()]
+    assert [(r["seq"], r["session_id"], r["message"]) for r in records] == [
+        (0, "s0", "m0"), (1, "s1", "m1"), (2, "s2", "m2"),
+    ]
+
+
+def test_close_writes_pending_records(tmp_path):
+    path = tmp_path / "traffic.jsonl"
+    recorder = traffic_recorder.TrafficRecorder(str(path))
+    for i in range(100):
+        recorder.write({"kind": "chat", "message": f"m{i}"})
+    recorder.close()
+    assert len(path.read_text().splitlines()) == 100
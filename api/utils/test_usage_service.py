@@ -0,0 +1,48 @@
+"""
+Testes da política de corte do histórico (services/usage_service.py) com o
+estado de uso gravado num Redis em memória (fakeredis).
+
+Uso (a partir da raiz do repositório):
+    python -m pytest api/utils/test_usage_service.py
+"""
+
+import asyncio
+import sys
+from pathlib import Path
+from types import SimpleNamespace
+
+import pytest
+
+fakeredis = pytest.importorskip("fakeredis")
+
+REPO_ROOT = Path(__file__).resolve().parents[2]
+sys.path.insert(0, str(REPO_ROOT))
+
+
+def make_run(run_id: str, prompt_tokens: int):
+    usage = SimpleNamespace(prompt_tokens=prompt_tokens, completion_tokens=50, total_tokens=prompt_tokens + 50)
+    return SimpleNamespace(id=run_id, status="completed", usage=usage)
+
+
+async def three_turns():
+    from api.config import Settings
+    from api.services.usage_service import TokenBudgetPolicy, UsageTracker
+
+    client = fakeredis.FakeAsyncRedis(decode_responses=True)
+    policy = TokenBudgetPolicy(Settings(openai_trim_threshold_tokens=8000))
+    tracker = UsageTracker(lambda: client)
+    # Prompt que o run usaria com o thread inteiro e com o corte (last_messages)
+    prompt_sizes = {"auto": 9000, "last_messages": 3000}
+    strategies = []
+    for turn in range(3):
+        state = await tracker.get_state("session")
+        strategy = policy.run_options(state)["truncation_strategy"]["type"]
+        strategies.append(strategy)
+        await tracker.record_run("session", make_run(f"run_{turn}", prompt_sizes[strategy]),
+                                 trimmed=strategy == "last_messages")
+    return strategies
+
+
+def test_trimming_stays_on_after_the_threshold_is_crossed():
+    # 1º turno passa do limite; os seguintes seguem cortados mesmo com o prompt já menor
+    assert asyncio.run(three_turns()) == ["auto", "last_messages", "last_messages"]
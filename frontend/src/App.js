@@ -140,12 +140,19 @@ const parseTimeSlots = (content) => {
 };
 
 
+const API_URL = 'http://localhost:8000';
+const WS_URL = 'ws://localhost:8000';
+
 function App() {
   const [messages, setMessages] = useState([]);
   const [input, setInput] = useState('');
   const [sessionId, setSessionId] = useState(null);
+  const [toolStatus, setToolStatus] = useState(null); // Ex: "Consultando a agenda..."
 
   const messagesEndRef = useRef(null);
+  const socketRef = useRef(null);
+  // Último evento recebido ({turn, seq}); enviado no "resume" ao reconectar
+  const lastEventRef = useRef(null);
 
   const scrollToBottom = () => {
     messagesEndRef.current?.scrollIntoView({ behavior: "smooth" });
@@ -164,6 +171,75 @@ function App() {
     }]);
   }, []);
 
+  // --- Canal WebSocket: tokens em streaming, status das ferramentas, heartbeat e resume ---
+  useEffect(() => {
+    if (!sessionId) return;
+    let closed = false;
+    let retryDelay = 1000;
+    let retryTimer = null;
+
+    const updateTurn = (turn, update) => {
+      setMessages(prev => {
+        if (!prev.some(m => m.turn === turn)) {
+          return [...prev, update({ role: 'assistant', content: '', turn })];
+        }
+        return prev.map(m => (m.turn === turn ? update(m) : m));
+      });
+    };
+
+    const handleEvent = (event) => {
+      if (event.turn) lastEventRef.current = { turn: event.turn, seq: event.seq };
+      switch (event.type) {
+        case 'turn_start':
+          updateTurn(event.turn, m => m);
+          break;
+        case 'token':
+          updateTurn(event.turn, m => ({ ...m, content: m.content + event.text }));
+          break;
+        case 'tool':
+          setToolStatus(event.status === 'start' ? event.label : null);
+          break;
+        case 'done':
+          setToolStatus(null);
+          updateTurn(event.turn, m => ({ ...m, content: event.response }));
+          break;
+        case 'error':
+          setToolStatus(null);
+          setMessages(prev => [...prev, { role: 'assistant', content: `Desculpe, ocorreu um erro: ${event.detail}` }]);
+          break;
+        default:
+          break; // ready, pong, heartbeat
+      }
+    };
+
+    const connect = () => {
+      const socket = new WebSocket(`${WS_URL}/api/ws/${sessionId}`);
+      socketRef.current = socket;
+      socket.onopen = () => {
+        retryDelay = 1000;
+        // Reconexão: recebe o que se perdeu do turno em andamento (ou já concluído)
+        if (lastEventRef.current) {
+          socket.send(JSON.stringify({ type: 'resume', ...lastEventRef.current }));
+        }
+      };
+      socket.onmessage = (message) => handleEvent(JSON.parse(message.data));
+      socket.onclose = () => {
+        socketRef.current = null;
+        if (!closed) {
+          retryTimer = setTimeout(connect, retryDelay);
+          retryDelay = Math.min(retryDelay * 2, 10000);
+        }
+      };
+    };
+
+    connect();
+    return () => {
+      closed = true;
+      clearTimeout(retryTimer);
+      if (socketRef.current) socketRef.current.close();
+    };
+  }, [sessionId]);
+
   const handleSend = async () => {
     if (input.trim() && sessionId) {
       const userMessageContent = input;
@@ -171,8 +247,15 @@ function App() {
       setMessages(newMessages);
       setInput('');
 
+      const socket = socketRef.current;
+      if (socket && socket.readyState === WebSocket.OPEN) {
+        socket.send(JSON.stringify({ type: 'message', message: userMessageContent }));
+        return;
+      }
+
+      // Sem WebSocket conectado: POST /api/chat
       try {
-          const response = await fetch('http://localhost:8000/api/chat', {
+          const response = await fetch(`${API_URL}/api/chat`, {
             method: 'POST',
             headers: { 'Content-Type': 'application/json' },
             body: JSON.stringify({ session_id: sessionId, message: userMessageContent }),
@@ -207,6 +290,8 @@ function App() {
       <div className="chat-window">
         <div className="messages">
           {messages.map((msg, index) => {
+              // Turno em streaming que ainda não recebeu nenhum token
+              if (msg.turn && !msg.content) return null;
               let contentToRender;
               // Verifica se msg.content existe e é uma string
               if (msg.content && typeof msg.content === 'string') {
@@ -280,6 +365,7 @@ function App() {
               );
             })
           }
+          {toolStatus && <div className="message assistant status">{toolStatus}</div>}
           <div ref={messagesEndRef} /> {/* Para o auto-scroll */}
         </div>
         <div className="input-area">